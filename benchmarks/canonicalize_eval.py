@@ -0,0 +1,128 @@
+"""
+Evaluation of the canonicalize.py name index.
+
+1. Resolves every character name in a volume's extraction results
+   and reports how many resolved by each method, with examples.
+2. Perturbs wiki character titles the way extractions drift (first/last name
+   only, a truncated name, a dropped/swapped/doubled letter, stripped
+   apostrophes, added diacritics) and reports accuracy per perturbation.
+3. Times resolution cold (empty LRU cache) and warm (names repeated).
+
+Usage (from the repo root):
+    python -m benchmarks.canonicalize_eval [--volume Vol_01] [--names 5000] [--seed 0]
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+from canonicalize import Canonicalizer, lookup_form
+from chunk_chapters import PROCESSED_DIR
+from gazetteer import TOKEN_RE, normalize_name
+
+ACCENTS = {"a": "á", "e": "é", "i": "í", "o": "ö", "u": "ü"}
+
+
+def _typo(name, rng):
+    i = rng.randrange(len(name) - 1)
+    edit = rng.choice(("drop", "swap", "double"))
+    if edit == "drop":
+        return name[:i] + name[i + 1:]
+    if edit == "swap":
+        return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+    return name[:i] + name[i] + name[i:]
+
+
+PERTURBATIONS = {
+    "exact": lambda name, rng: name,
+    "first_name": lambda name, rng: TOKEN_RE.findall(normalize_name(name))[0],
+    "truncated": lambda name, rng: TOKEN_RE.findall(normalize_name(name))[0][:-1],
+    "typo": _typo,
+    "apostrophes": lambda name, rng: name.replace("'", ""),
+    "diacritics": lambda name, rng: "".join(ACCENTS.get(c, c) for c in name),
+}
+
+
+def resolve_extractions(canonicalizer, volume):
+    path = os.path.join(PROCESSED_DIR, volume, "extracted_entities.json")
+    if not os.path.exists(path):
+        print(f"No extraction results for {volume}; skipping the extraction pass")
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    names = [entity["name"] for record in records
+             for entity in (record.get("extraction") or {}).get("characters") or []
+             if isinstance(entity, dict) and entity.get("name")]
+    by_method = {}
+    for name in names:
+        canonical, method = canonicalizer.resolve(name)
+        by_method.setdefault(method, []).append((name, canonical))
+    print(f"{volume}: {len(names)} extracted character names ({len(set(names))} distinct)")
+    for method, pairs in sorted(by_method.items(), key=lambda kv: -len(kv[1])):
+        examples = ", ".join(f"{name} -> {canonical}" if canonical else name
+                             for name, canonical in sorted(set(pairs))[:3])
+        print(f"  {method:<10} {len(pairs):>5} ({len(pairs) / len(names):.0%})  e.g. {examples}")
+    return {method: len(pairs) for method, pairs in by_method.items()}
+
+
+def synthetic_cases(canonicalizer, count, rng):
+    """[(perturbation, query, expected title)] for titles that resolve to themselves unperturbed."""
+    titles = sorted(t for names in canonicalizer.exact.values() if len(names) == 1 for t in names)
+    cases = []
+    while len(cases) < count:
+        title = rng.choice(titles)
+        kind = rng.choice(list(PERTURBATIONS))
+        if kind in ("first_name", "truncated") and " " not in normalize_name(title):
+            continue
+        query = PERTURBATIONS[kind](title, rng)
+        if len(query) >= 3:
+            cases.append((kind, query, title))
+    return cases
+
+
+def run(volume="Vol_01", names=5000, seed=0):
+    started = time.perf_counter()
+    canonicalizer = Canonicalizer.from_wiki()
+    print(f"Built index over {len(canonicalizer.exact)} titles, {len(canonicalizer.tokens)} name tokens "
+          f"in {time.perf_counter() - started:.2f}s")
+    methods = resolve_extractions(canonicalizer, volume)
+
+    cases = synthetic_cases(canonicalizer, names, random.Random(seed))
+    canonicalizer = Canonicalizer.from_wiki()  # Fresh cache for the cold timing
+    results = {}
+    started = time.perf_counter()
+    for kind, query, expected in cases:
+        canonical, _ = canonicalizer.resolve(query)
+        correct, wrong, total = results.get(kind, (0, 0, 0))
+        results[kind] = (correct + (canonical == expected), wrong + (canonical not in (None, expected)), total + 1)
+    cold = time.perf_counter() - started
+    started = time.perf_counter()
+    for _, query, _ in cases:
+        canonicalizer.resolve(query)
+    warm = time.perf_counter() - started
+
+    print(f"Synthetic perturbations of wiki titles ({len(cases)} queries):")
+    print(f"  {'perturbation':<12} {'queries':>7} {'correct':>8} {'wrong':>6}")
+    for kind in PERTURBATIONS:
+        correct, wrong, total = results.get(kind, (0, 0, 0))
+        if total:
+            print(f"  {kind:<12} {total:>7} {correct / total:>8.1%} {wrong / total:>6.1%}")
+    distinct = len({lookup_form(query) for _, query, _ in cases})
+    print(f"Cold: {len(cases) / cold:,.0f} names/s ({distinct} distinct)  "
+          f"warm: {len(cases) / warm:,.0f} names/s  cache: {canonicalizer.cache_info()}")
+    return {"methods": methods, "accuracy": results, "cold_per_sec": len(cases) / cold,
+            "warm_per_sec": len(cases) / warm}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--volume", default="Vol_01")
+    parser.add_argument("--names", type=int, default=5000, help="Synthetic queries to generate")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.volume, args.names, args.seed)
+
+
+if __name__ == "__main__":
+    main()
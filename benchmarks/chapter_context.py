@@ -0,0 +1,122 @@
+"""
+Benchmark for the rolling chapter state (chapter_state.py) in extract_entities.
+
+The spotter's per-chunk characters stand in for extraction records, so this
+runs offline over a whole volume:
+
+1. Context quality: for each chunk, how many of the characters it names the
+   chapter state already held (coverage), and how many slice entries the chunk
+   names (precision), against the slice size.
+2. Prompt size: roster-only prompts vs state prompts (the slice as the roster,
+   plus the wiki names it does not cover), in estimated tokens.
+3. Resume: rebuilding the state from a result log of every chunk, no API calls.
+4. Ordering cost: mock extraction with chapters as sequential lanes vs every
+   chunk in parallel, at the same concurrency and simulated latency.
+
+Usage (from the repo root):
+    python -m benchmarks.chapter_context [--volume Vol_01] [--chunks 200] [--latency 0.02]
+"""
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+
+import extract_entities
+from chapter_state import ChapterState, render_slice
+from checkpoint_store import ResultLog
+from chunk_chapters import load_chunks
+from entity_spotter import load_mentions, spot_volume, spotter_extraction
+from extract_entities import (DATA_DIR, WIKI_DIR, construct_prompt, estimate_tokens, get_chunk_roster)
+from gazetteer import Gazetteer
+
+
+def context_quality(volume):
+    chunks = load_chunks(volume, DATA_DIR)
+    with contextlib.redirect_stdout(io.StringIO()):
+        spot_volume(volume, processed_dir=DATA_DIR, wiki_dir=WIKI_DIR)
+    mentions = load_mentions(volume, DATA_DIR)
+    gazetteer = Gazetteer.from_wiki(WIKI_DIR)
+
+    state = ChapterState()
+    named = covered = slice_entries = slice_named = 0
+    roster_tokens = state_tokens = 0
+    for chunk in chunks:
+        record = mentions.get(chunk["chunk_id"])
+        entries = state.slice([chunk])
+        names = set(record["entities"].get("character", [])) if record else set()
+        in_slice = {entry["name"] for entry in entries}
+        named += len(names)
+        covered += len(names & in_slice)
+        slice_entries += len(entries)
+        slice_named += len(names & in_slice)
+
+        roster = get_chunk_roster(chunk["text"], gazetteer)
+        state_roster = render_slice(entries, gazetteer.candidates(chunk["text"]))
+        roster_tokens += estimate_tokens(construct_prompt(chunk["text"], roster))
+        state_tokens += estimate_tokens(construct_prompt(chunk["text"], state_roster))
+        if record:
+            state.add({"chunk_id": chunk["chunk_id"], "chapter_order": chunk["chapter_order"],
+                       "extraction": spotter_extraction(record)})
+
+    print(f"{volume}: {len(chunks)} chunks, {slice_entries / len(chunks):.1f} entities per slice")
+    print(f"  characters named in a chunk already in its slice: {covered}/{named} = {covered / max(1, named):.1%}")
+    print(f"  slice entries named in the chunk: {slice_named}/{slice_entries} = "
+          f"{slice_named / max(1, slice_entries):.1%}")
+    print(f"  prompt tokens: roster {roster_tokens:,}, state {state_tokens:,} "
+          f"({(state_tokens - roster_tokens) / roster_tokens:+.1%})")
+    return chunks, mentions, {"coverage": covered / max(1, named), "precision": slice_named / max(1, slice_entries),
+                              "roster_tokens": roster_tokens, "state_tokens": state_tokens}
+
+
+def resume_cost(volume, chunks, mentions):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ResultLog.for_volume(volume, tmp, fsync=False).open()
+        for chunk in chunks:
+            record = mentions.get(chunk["chunk_id"])
+            store.append({"chunk_id": chunk["chunk_id"], "chapter_order": chunk["chapter_order"],
+                          "scene_index": chunk["scene_index"],
+                          "extraction": spotter_extraction(record) if record else {"characters": [], "locations": []}})
+        store.close()
+        started = time.perf_counter()
+        state = ChapterState.from_records(ResultLog.for_volume(volume, tmp).latest_records())
+        elapsed = time.perf_counter() - started
+    print(f"Rebuilt the state of {len(state.chapters)} chapters from {len(chunks)} logged records "
+          f"in {elapsed * 1000:.1f} ms")
+    return elapsed
+
+
+def ordering_cost(volume, chunks, latency, concurrency):
+    results = {}
+    for mode in ("roster", "state"):
+        with tempfile.TemporaryDirectory() as tmp:
+            extract_entities.OUTPUT_DIR = tmp
+            with contextlib.redirect_stdout(io.StringIO()):
+                stats = extract_entities.run_extraction_batch(
+                    volume, force_mock=True, mock_latency=latency, max_chunks=chunks, route="all",
+                    concurrency=concurrency, context_mode=mode)
+        results[mode] = stats
+        print(f"context={mode:<7} {stats['processed']} chunks in {stats['elapsed']:.2f}s "
+              f"({stats['chunks_per_sec']:.0f} chunks/s, {concurrency} workers)")
+    return results
+
+
+def run(volume="Vol_01", chunks=200, latency=0.02, concurrency=extract_entities.MAX_CONCURRENCY):
+    all_chunks, mentions, quality = context_quality(volume)
+    rebuild = resume_cost(volume, all_chunks, mentions)
+    throughput = ordering_cost(volume, chunks, latency, concurrency)
+    return {"quality": quality, "rebuild_s": rebuild, "throughput": throughput}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--volume", default="Vol_01")
+    parser.add_argument("--chunks", type=int, default=200, help="Chunks for the mock extraction runs")
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated seconds per request")
+    parser.add_argument("--workers", type=int, default=extract_entities.MAX_CONCURRENCY)
+    args = parser.parse_args()
+    run(args.volume, args.chunks, args.latency, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Chunk sizing report: legacy len // 4 packing vs token-budget packing.
+
+For every volume, chunks each chapter both ways (in memory) and measures every
+chunk with the reference tokenizer (tiktoken if it loads, else the local regex
+BPE approximation). Reports chunk counts, mean fill ratio against the
+MAX_TOKENS_PER_CHUNK budget, and how many chunks overflow it.
+
+Usage (from the repo root):
+    python -m benchmarks.chunk_sizing [--tokenizer auto] [--overlap 0] [Vol_01 ...]
+"""
+import argparse
+import json
+import os
+import time
+
+from chunk_chapters import MAX_TOKENS_PER_CHUNK, RAW_DIR, chapter_spans, list_volumes, load_chapter
+from token_count import CachedCounter, get_counter, reference_counter
+
+
+def volume_texts(vol_name):
+    index_path = os.path.join(RAW_DIR, vol_name, "index.json")
+    if not os.path.exists(index_path):
+        return []
+    with open(index_path, "r", encoding="utf-8") as f:
+        chapter_index = json.load(f)
+    texts = []
+    for chapter_meta in chapter_index:
+        filepath = os.path.join(RAW_DIR, vol_name, chapter_meta.get("filename") or "")
+        if os.path.isfile(filepath):
+            texts.append(load_chapter(filepath))
+    return texts
+
+
+def measure(texts, counter, overlap_tokens, reference):
+    count = 0
+    fill = 0.0
+    overflow = 0
+    for text in texts:
+        for _, _, start, end, _ in chapter_spans(text, counter, overlap_tokens):
+            tokens = reference.count(text[start:end])
+            count += 1
+            fill += min(tokens, MAX_TOKENS_PER_CHUNK) / MAX_TOKENS_PER_CHUNK
+            overflow += tokens > MAX_TOKENS_PER_CHUNK
+    return count, (fill / count if count else 0.0), overflow
+
+
+def run(volumes=None, tokenizer="auto", overlap_tokens=0):
+    reference = CachedCounter(reference_counter())
+    legacy = get_counter("chars")
+    counter = get_counter(tokenizer)
+    print(f"Reference: {reference.name}; new packing: {counter.name}, budget {MAX_TOKENS_PER_CHUNK}, overlap {overlap_tokens}")
+    print(f"{'Volume':<12} {'legacy':>7} {'fill':>6} {'over':>5}   {'new':>7} {'fill':>6} {'over':>5}")
+
+    totals = [0, 0.0, 0, 0, 0.0, 0]
+    started = time.perf_counter()
+    for vol_name in volumes or list_volumes():
+        texts = volume_texts(vol_name)
+        if not texts:
+            continue
+        old = measure(texts, legacy, 0, reference)
+        new = measure(texts, counter, overlap_tokens, reference)
+        print(f"{vol_name:<12} {old[0]:>7} {old[1]:>6.1%} {old[2]:>5}   {new[0]:>7} {new[1]:>6.1%} {new[2]:>5}")
+        for i, value in enumerate(old + new):
+            totals[i] += value * (old[0] if i == 1 else new[0] if i == 4 else 1)
+
+    if totals[0] and totals[3]:
+        print(f"{'Total':<12} {totals[0]:>7} {totals[1] / totals[0]:>6.1%} {totals[2]:>5}   "
+              f"{totals[3]:>7} {totals[4] / totals[3]:>6.1%} {totals[5]:>5}")
+        print(f"Chunk count change: {totals[3] / totals[0] - 1:+.1%}  ({time.perf_counter() - started:.1f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("volumes", nargs="*")
+    parser.add_argument("--tokenizer", default="auto")
+    parser.add_argument("--overlap", type=int, default=0)
+    args = parser.parse_args()
+    run(args.volumes, args.tokenizer, args.overlap)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Micro-benchmark: reading chunks from chunks.json / chunks.jsonl vs the columnar corpus store.
+
+Times a full load, one random chunk lookup and one chapter's chunks for each
+format of a volume, plus on-disk size. The corpus store must already exist
+(python chunk_chapters.py Vol_XX builds it).
+
+Usage (from the repo root):
+    python -m benchmarks.corpus_access [--volume Vol_01] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+from chunk_chapters import CHUNKS_FILENAME, LEGACY_CHUNKS_FILENAME, PROCESSED_DIR
+from corpus_store import CorpusStore, corpus_dir
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def load_json_file(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_jsonl_file(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def open_and_get(volume, chunk_id):
+    with CorpusStore(volume) as store:
+        return store.get(chunk_id)
+
+
+def run(volume="Vol_01", repeat=5):
+    vol_dir = os.path.join(PROCESSED_DIR, volume)
+    loaders = []
+    for name, loader in ((LEGACY_CHUNKS_FILENAME, load_json_file), (CHUNKS_FILENAME, load_jsonl_file)):
+        path = os.path.join(vol_dir, name)
+        if os.path.exists(path):
+            loaders.append((name, path, loader))
+
+    with CorpusStore(volume) as store:
+        rng = random.Random(0)
+        row = rng.randrange(len(store))
+        chunk_id = store.chunk_id(row)
+        order = store.columns["chapter_order"][row]
+        store_dir = corpus_dir(volume)
+        store_size = sum(os.path.getsize(os.path.join(store_dir, name)) for name in os.listdir(store_dir))
+        print(f"{volume}: {len(store)} chunks; lookup {chunk_id}, chapter {order}")
+
+        for name, path, loader in loaders:
+            full = best_of(lambda: loader(path), repeat)
+            # Without an index, one chunk or one chapter still means parsing the whole file
+            print(f"{name:>16}: {os.path.getsize(path) / 1024 / 1024:6.2f} MB  full load {full * 1000:8.2f} ms  "
+                  f"(one chunk / one chapter need the same)")
+
+        full = best_of(lambda: list(store.iter_chunks()), repeat)
+        one = best_of(lambda: open_and_get(volume, chunk_id), repeat)
+        chapter = best_of(lambda: list(store.iter_chunks(store.chapter_rows(order))), repeat)
+        print(f"{'corpus store':>16}: {store_size / 1024 / 1024:6.2f} MB  full load {full * 1000:8.2f} ms  "
+              f"open+one chunk {one * 1000:.3f} ms  one chapter {chapter * 1000:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--volume", default="Vol_01")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.volume, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
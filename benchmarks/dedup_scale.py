@@ -0,0 +1,115 @@
+"""
+Benchmark for dedup.py over every raw chapter file (indexed or not).
+
+1. Signs every data/raw/*/*.txt file (shingles + one-permutation MinHash),
+   serially and on a process pool, and reports MB/s.
+2. Plants near-duplicates: copies of random chapters with a share of words
+   altered, an author's note appended or the last tenth cut off, and checks
+   which the LSH stage finds at the default threshold (recall) and whether any
+   unrelated chapter gets flagged (false positives).
+3. Compares the LSH candidate pairs with the all-pairs count.
+
+Usage (from the repo root):
+    python -m benchmarks.dedup_scale [--planted 100] [--workers 4]
+"""
+import argparse
+import glob
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import dedup
+from chunk_chapters import RAW_DIR
+
+VARIANTS = {
+    "edits_1pct": lambda words, rng: [w + "s" if rng.random() < 0.01 else w for w in words],
+    "edits_3pct": lambda words, rng: [w + "s" if rng.random() < 0.03 else w for w in words],
+    "author_note": lambda words, rng: words + "Thanks for reading! Author's note: this chapter was late".split() * 20,
+    "cut_tail": lambda words, rng: words[:len(words) * 9 // 10],
+}
+
+
+def read(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def sign_corpus(paths, workers):
+    started = time.perf_counter()
+    serial = [dedup.chapter_signature(path) for path in paths]
+    serial_time = time.perf_counter() - started
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pooled = list(pool.map(dedup.chapter_signature, paths, chunksize=4))
+    pooled_time = time.perf_counter() - started
+    assert all((a[0] == b[0]).all() for a, b in zip(serial, pooled))
+    return serial, serial_time, pooled_time
+
+
+def run(planted=100, workers=4, seed=0):
+    paths = sorted(glob.glob(os.path.join(RAW_DIR, "*", "*.txt")))
+    if not paths:
+        print(f"No chapter files under {RAW_DIR}")
+        return
+    size = sum(os.path.getsize(path) for path in paths) / 1024 / 1024
+    signatures, serial_time, pooled_time = sign_corpus(paths, workers)
+    print(f"Signed {len(paths)} files ({size:.1f} MB): serial {serial_time:.1f}s ({size / serial_time:.1f} MB/s), "
+          f"{workers} processes {pooled_time:.1f}s ({size / pooled_time:.1f} MB/s)")
+
+    keys = [tuple(os.path.relpath(path, RAW_DIR).split(os.sep)) for path in paths]
+    ranks = [(dedup.volume_rank(vol_name), name) for vol_name, name in keys]
+    sigs = [signature for signature, _ in signatures]
+    comparable = [ok for _, ok in signatures]
+    started = time.perf_counter()
+    existing = dedup.find_duplicates(keys, ranks, sigs)
+    print(f"Existing near-duplicates among raw files: {len(existing)} ({time.perf_counter() - started:.2f}s)")
+    for (vol_name, name), ((canonical_vol, canonical), score) in sorted(existing.items())[:10]:
+        print(f"  {vol_name}/{name} -> {canonical_vol}/{canonical} ({score:.2f})")
+
+    rng = random.Random(seed)
+    planted_keys = {}
+    for i in range(planted):
+        source = rng.randrange(len(paths))
+        kind = rng.choice(list(VARIANTS))
+        words = read(paths[source]).split()
+        signature, ok = dedup.text_signature(" ".join(VARIANTS[kind](words, rng)))
+        key = ("Vol_Unknown", f"planted_{i}_{kind}")
+        keys.append(key)
+        ranks.append((dedup.volume_rank("Vol_Unknown"), key[1]))
+        sigs.append(signature)
+        comparable.append(ok)
+        planted_keys[key] = (keys[source], kind)
+
+    started = time.perf_counter()
+    keep = [i for i, ok in enumerate(comparable) if ok]
+    found = dedup.find_duplicates([keys[i] for i in keep], [ranks[i] for i in keep], [sigs[i] for i in keep])
+    lsh_time = time.perf_counter() - started
+    pairs = len(dedup.candidate_pairs(np.asarray([sigs[i] for i in keep])))
+
+    print(f"LSH over {len(keep)} signatures: {lsh_time:.2f}s, {pairs} candidate pairs "
+          f"(all pairs: {len(keep) * (len(keep) - 1) // 2})")
+    print(f"{'variant':<12} {'planted':>7} {'found':>6}")
+    for kind in VARIANTS:
+        wanted = [key for key, (_, k) in planted_keys.items() if k == kind]
+        hits = sum(key in found and found[key][0] == planted_keys[key][0] for key in wanted)
+        print(f"{kind:<12} {len(wanted):>7} {hits / len(wanted) if wanted else 0:>6.0%}")
+    false_positives = [key for key in found if key not in planted_keys and key not in existing]
+    print(f"Unplanted files flagged: {len(false_positives)}")
+    return {"files": len(paths), "mb": size, "serial_s": serial_time, "pooled_s": pooled_time,
+            "lsh_s": lsh_time, "candidate_pairs": pairs, "false_positives": len(false_positives)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--planted", type=int, default=100, help="Near-duplicates to plant")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.planted, args.workers, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark for embedding_index.py over every raw volume.
+
+1. Chunks every data/raw volume into a temp dir (legacy chars sizing), fits the
+   idf model and embeds all volumes: chunks/s and MB/s. Then adds one more
+   volume to show that only it is embedded.
+2. Runs "scenes like this one" (random chunks) and "scenes about X" (random
+   sentences) queries across all volumes, IVF (NPROBE lists) vs an exact scan:
+   p50/p99 latency in ms and IVF recall@10 against the exact top 10.
+
+Usage (from the repo root):
+    python -m benchmarks.embedding_search [--queries 200] [--nprobe 16]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import time
+
+import numpy as np
+
+import embedding_index
+from chunk_chapters import RAW_DIR, build_chapter_chunks, list_volumes, load_chapter
+
+
+def chunk_volume(vol_name, processed_dir):
+    """Writes chunks.jsonl for one raw volume; returns (chunks, bytes of text)."""
+    with open(os.path.join(RAW_DIR, vol_name, "index.json"), "r", encoding="utf-8") as f:
+        chapter_index = json.load(f)
+    os.makedirs(os.path.join(processed_dir, vol_name), exist_ok=True)
+    count = size = 0
+    with open(os.path.join(processed_dir, vol_name, "chunks.jsonl"), "w", encoding="utf-8") as f:
+        for chapter_meta in chapter_index:
+            path = os.path.join(RAW_DIR, vol_name, chapter_meta.get("filename") or "")
+            if not chapter_meta.get("filename") or not os.path.exists(path):
+                continue
+            for chunk in build_chapter_chunks(load_chapter(path), chapter_meta):
+                f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+                count += 1
+                size += len(chunk["text"].encode("utf-8"))
+    return count, size
+
+
+def percentiles(times):
+    ms = np.array(times) * 1000
+    return float(np.percentile(ms, 50)), float(np.percentile(ms, 99))
+
+
+def recall(approx, exact):
+    wanted = {hit[1:3] for hit in exact}
+    return len(wanted & {hit[1:3] for hit in approx}) / len(wanted) if wanted else 1.0
+
+
+def run(queries=200, nprobe=embedding_index.NPROBE, seed=0):
+    vol_names = [vol_name for vol_name in list_volumes()
+                 if os.path.exists(os.path.join(RAW_DIR, vol_name, "index.json"))]
+    if len(vol_names) < 2:
+        print(f"Need at least two raw volumes under {RAW_DIR}")
+        return
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        processed_dir = os.path.join(tmp, "processed")
+        vector_dir = os.path.join(tmp, "vectors")
+        counts = {vol_name: chunk_volume(vol_name, processed_dir) for vol_name in vol_names}
+        last = vol_names[-1]
+        chunks = sum(count for vol_name, (count, _) in counts.items() if vol_name != last)
+        size = sum(nbytes for vol_name, (_, nbytes) in counts.items() if vol_name != last) / 1024 / 1024
+        os.rename(os.path.join(processed_dir, last), os.path.join(tmp, last))  # Held back for step 1b
+
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            embedding_index.build_indexes(processed_dir=processed_dir, vector_dir=vector_dir)
+        build_time = time.perf_counter() - started
+        print(f"Embedded {len(vol_names) - 1} volumes ({chunks:,} chunks, {size:.1f} MB) in {build_time:.1f}s "
+              f"incl. idf fit ({chunks / build_time:,.0f} chunks/s, {size / build_time:.1f} MB/s)")
+
+        os.rename(os.path.join(tmp, last), os.path.join(processed_dir, last))
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            statuses = embedding_index.build_indexes(processed_dir=processed_dir, vector_dir=vector_dir)
+        built = [vol_name for vol_name, status in statuses.items() if status == "built"]
+        print(f"Added {last} ({counts[last][0]:,} chunks): {time.perf_counter() - started:.2f}s, "
+              f"embedded {built}")
+
+        index = embedding_index.VectorIndex(vector_dir)
+        rows = [(vol_name, doc[0]) for vol_name in vol_names for doc in index.volume(vol_name).docs]
+        texts = {}
+        for vol_name in vol_names:
+            for chunk in embedding_index.iter_chunks(vol_name, processed_dir):
+                texts[vol_name, chunk["chunk_id"]] = chunk["text"]
+
+        samples = [rng.choice(rows) for _ in range(queries)]
+        sentences = []
+        for key in samples:
+            candidates = [s for s in re.split(r"(?<=[.!?])\s+", texts[key]) if len(s.split()) >= 8]
+            sentences.append(rng.choice(candidates) if candidates else texts[key][:200])
+        del texts
+
+        print(f"{'query':<10} {'mode':<6} {'p50 ms':>8} {'p99 ms':>8} {'recall@10':>10}")
+        results = {}
+        for kind, calls in (("similar", [lambda exact, key=key: index.similar(*key, 10, nprobe=nprobe, exact=exact)
+                                         for key in samples]),
+                            ("about", [lambda exact, text=text: index.search(text, 10, nprobe=nprobe, exact=exact)
+                                       for text in sentences])):
+            for exact in (False, True):  # Warm the memmaps
+                calls[0](exact)
+            timings = {False: [], True: []}
+            recalls = []
+            for call in calls:
+                hits = {}
+                for exact in (False, True):
+                    started = time.perf_counter()
+                    hits[exact] = call(exact)
+                    timings[exact].append(time.perf_counter() - started)
+                recalls.append(recall(hits[False], hits[True]))
+            for exact, mode in ((False, "ivf"), (True, "exact")):
+                p50, p99 = percentiles(timings[exact])
+                row_recall = float(np.mean(recalls)) if not exact else 1.0
+                print(f"{kind:<10} {mode:<6} {p50:>8.2f} {p99:>8.2f} {row_recall:>10.1%}")
+                results[f"{kind}_{mode}"] = {"p50_ms": p50, "p99_ms": p99, "recall": row_recall}
+    return {"chunks": chunks, "mb": size, "build_s": build_time, "queries": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200, help="Queries of each kind")
+    parser.add_argument("--nprobe", type=int, default=embedding_index.NPROBE, help="IVF lists scanned per volume")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.queries, args.nprobe, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+End-to-end pipeline benchmark over synthetic corpora (benchmarks/synthetic_corpus.py).
+
+For each scale (1x = --chapters chapters of --words words), generates a corpus
+into a scratch directory and runs, each stage in a fresh subprocess so its
+peak RSS is its own:
+
+1. scrape   scrape_chapters.scrape against the generated site on a local
+            fixture_server (no politeness delay); the scraped text is checked
+            against the generated chapters
+2. chunk    chunk_chapters.process_volumes (scenes, token packing, corpus store)
+3. extract  extract_entities.run_extraction_batch in mock mode, no simulated
+            latency, every chunk sent (--route all): the loop's own overhead
+4. ingest   graph_store ingestion of the exports into a scratch database
+
+Prints items/s, MB/s and peak RSS (the stage's process and its pool workers)
+per stage and scale, and appends the run to a JSON-lines history
+(data/metrics/end_to_end_history.jsonl). Stages more than 20% slower, or using
+20% more memory, than the previous comparable run (same sizes, same CPU count)
+are flagged (stages under half a second are not compared); --fail-on-regression
+exits non-zero then.
+
+Usage (from the repo root):
+    python -m benchmarks.end_to_end [--scales 1 10 100] [--chapters 10] [--words 6000] [--stages chunk extract]
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import checkpoint_store
+import chunk_chapters
+import corpus_store
+import extract_entities
+import scrape_chapters
+from benchmarks.synthetic_corpus import CHAPTER_WORDS, generate
+from fixture_server import serve
+from graph_store import GraphStore
+from metrics import REPORT_DIR
+
+STAGES = ("scrape", "chunk", "extract", "ingest")
+HISTORY_PATH = os.path.join(REPORT_DIR, "end_to_end_history.jsonl")
+REGRESSION_THRESHOLD = 0.2  # Slower / larger than the previous comparable run by this much is flagged
+MIN_COMPARE_SECONDS = 0.5   # Shorter stages are too noisy to flag
+
+
+def peak_rss_mb():
+    """Peak RSS of this process and of its largest (waited-for) child, in MB."""
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)  # Bytes on macOS, KB elsewhere
+
+
+def use_workdir(workdir):
+    """Points the pipeline modules' data directories at `workdir`."""
+    processed = os.path.join(workdir, "processed")
+    chunk_chapters.RAW_DIR = os.path.join(workdir, "raw")
+    chunk_chapters.PROCESSED_DIR = corpus_store.PROCESSED_DIR = processed
+    extract_entities.DATA_DIR = extract_entities.OUTPUT_DIR = checkpoint_store.OUTPUT_DIR = processed
+    return processed
+
+
+def volume_names(workdir):
+    raw = os.path.join(workdir, "raw")
+    return sorted(name for name in os.listdir(raw) if name.startswith("Vol_"))
+
+
+def chapter_index(workdir, vol_name):
+    with open(os.path.join(workdir, "raw", vol_name, "index.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def read_text(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def dir_bytes(path, suffix=""):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path)
+               for name in names if name.endswith(suffix))
+
+
+def stage_scrape(workdir, base_url, workers):
+    scraped = os.path.join(workdir, "scraped")
+    counts = scrape_chapters.scrape(base_url, scraped, workers=workers or scrape_chapters.MAX_WORKERS,
+                                    min_interval=0, jitter=0)
+    mismatched = 0
+    for vol_name in volume_names(workdir):
+        for entry in chapter_index(workdir, vol_name):
+            texts = [read_text(os.path.join(workdir, tree, vol_name, entry["filename"])) for tree in ("raw", "scraped")]
+            mismatched += texts[0] != texts[1]
+    return {"items": sum((counts or {}).values()), "unit": "pages", "bytes": dir_bytes(os.path.join(workdir, "site")),
+            "mismatched": mismatched}
+
+
+def stage_chunk(workdir, base_url, workers):
+    processed = use_workdir(workdir)
+    chunk_chapters.process_volumes(volume_names(workdir), workers=workers)
+    chunks = sum(1 for vol_name in volume_names(workdir) for _ in chunk_chapters.iter_chunks(vol_name, processed))
+    chapters = sum(len(chapter_index(workdir, vol_name)) for vol_name in volume_names(workdir))
+    return {"items": chapters, "unit": "chapters", "bytes": dir_bytes(os.path.join(workdir, "raw"), ".txt"), "chunks": chunks}
+
+
+def stage_extract(workdir, base_url, workers):
+    use_workdir(workdir)
+    processed = failed = 0
+    for vol_name in volume_names(workdir):
+        stats = extract_entities.run_extraction_batch(
+            vol_name, force_mock=True, mock_latency=0, route="all",
+            concurrency=workers or extract_entities.MAX_CONCURRENCY) or {}
+        processed += stats.get("processed", 0)
+        failed += stats.get("failed", 0)
+    return {"items": processed, "unit": "chunks", "bytes": dir_bytes(os.path.join(workdir, "processed"), chunk_chapters.CHUNKS_FILENAME),
+            "failed": failed}
+
+
+def stage_ingest(workdir, base_url, workers):
+    processed = use_workdir(workdir)
+    with GraphStore(os.path.join(workdir, "graph", "entities.sqlite")) as graph:
+        graph.ingest(output_dir=processed, force=True)
+        counts = graph.stats()
+    return {"items": counts["mentions"], "unit": "mentions",
+            "bytes": dir_bytes(processed, checkpoint_store.EXPORT_FILENAME), **counts}
+
+
+RUNNERS = {"scrape": stage_scrape, "chunk": stage_chunk, "extract": stage_extract, "ingest": stage_ingest}
+
+
+def run_stage(stage, workdir, base_url=None, workers=None):
+    """Subprocess side: runs one stage with its output silenced, prints its result as one JSON line."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        result = RUNNERS[stage](workdir, base_url, workers)
+        result["seconds"] = time.perf_counter() - started
+    result["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(result))
+
+
+def spawn_stage(stage, workdir, base_url=None, workers=None):
+    command = [sys.executable, "-m", "benchmarks.end_to_end", "--stage", stage, "--workdir", workdir]
+    if base_url:
+        command += ["--base-url", base_url]
+    if workers:
+        command += ["--workers", str(workers)]
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"{stage} failed:\n{process.stderr[-2000:]}")
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def run_scale(scale, chapters, words, stages, workers, seed):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        started = time.perf_counter()
+        totals = generate(workdir, chapters * scale, words, site="scrape" in stages, seed=seed)
+        print(f"{scale}x: {totals['volumes']} volumes, {totals['chapters']} chapters, {totals['words']:,} words "
+              f"({totals['bytes'] / 1e6:.1f} MB), generated in {time.perf_counter() - started:.1f}s")
+        for stage in stages:
+            server = None
+            base_url = None
+            if stage == "scrape":
+                server, url = serve(os.path.join(workdir, "site"))
+                base_url = url + "/table-of-contents/"
+            try:
+                result = spawn_stage(stage, workdir, base_url, workers)
+            finally:
+                if server:
+                    server.shutdown()
+            result["items_per_sec"] = result["items"] / result["seconds"] if result["seconds"] else 0.0
+            result["mb_per_sec"] = result["bytes"] / 1e6 / result["seconds"] if result["seconds"] else 0.0
+            results[stage] = result
+            extra = ""
+            if result.get("mismatched"):
+                extra = f"  ({result['mismatched']} chapters scraped differently!)"
+            elif stage == "chunk":
+                extra = f"  ({result['chunks']:,} chunks)"
+            elif result.get("failed"):
+                extra = f"  ({result['failed']} failed)"
+            print(f"  {stage:<8} {result['items']:>8,} {result['unit']:<9} {result['seconds']:>7.2f}s "
+                  f"{result['items_per_sec']:>9,.0f}/s {result['mb_per_sec']:>7.1f} MB/s "
+                  f"{result['peak_rss_mb']:>7.0f} MB peak{extra}")
+    return totals, results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+    return entries
+
+
+def compare(entry, history):
+    """Regressions of `entry` against the latest earlier run with the same config: [(scale, stage, message)]."""
+    previous = next((old for old in reversed(history)
+                     if old["config"] == entry["config"] and old.get("cpus") == entry["cpus"]), None)
+    if previous is None:
+        print("No comparable earlier run in the history.")
+        return []
+    print(f"Against the run of {previous['time']} ({previous.get('commit') or 'unknown commit'}):")
+    regressions = []
+    for scale, stages in entry["results"].items():
+        for stage, result in stages.items():
+            old = previous["results"].get(scale, {}).get(stage)
+            if not old or not old.get("items_per_sec"):
+                continue
+            if min(result["seconds"], old["seconds"]) < MIN_COMPARE_SECONDS:
+                print(f"  {scale:>4}x {stage:<8} too short to compare")
+                continue
+            speed = result["items_per_sec"] / old["items_per_sec"] - 1
+            memory = result["peak_rss_mb"] / old["peak_rss_mb"] - 1
+            flags = []
+            if speed < -REGRESSION_THRESHOLD:
+                flags.append("slower")
+            if memory > REGRESSION_THRESHOLD:
+                flags.append("more memory")
+            print(f"  {scale:>4}x {stage:<8} throughput {speed:+.0%}, peak RSS {memory:+.0%}"
+                  + (f"  REGRESSION ({', '.join(flags)})" if flags else ""))
+            if flags:
+                regressions.append((scale, stage, ", ".join(flags)))
+    return regressions
+
+
+def run(scales=(1, 10, 100), chapters=10, words=CHAPTER_WORDS, stages=STAGES, workers=None, seed=0,
+        history_path=HISTORY_PATH):
+    entry = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": git_commit(), "cpus": os.cpu_count(),
+             "python": sys.version.split()[0],
+             "config": {"chapters": chapters, "words": words, "seed": seed, "workers": workers},
+             "corpus": {}, "results": {}}
+    for scale in scales:
+        entry["corpus"][str(scale)], entry["results"][str(scale)] = run_scale(
+            scale, chapters, words, stages, workers, seed)
+    regressions = compare(entry, load_history(history_path))
+    os.makedirs(os.path.dirname(history_path) or ".", exist_ok=True)
+    with open(history_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+    print(f"Appended to {history_path}")
+    return entry, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--chapters", type=int, default=10, help="Chapters at 1x")
+    parser.add_argument("--words", type=int, default=CHAPTER_WORDS, help="Mean words per chapter")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--workers", type=int, default=None, help="Workers per stage (default: each stage's own)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--history", default=HISTORY_PATH)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--stage", choices=STAGES, help=argparse.SUPPRESS)  # Subprocess mode: one stage
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        run_stage(args.stage, args.workdir, args.base_url, args.workers)
+        return
+    stages = [stage for stage in STAGES if stage in args.stages]
+    _, regressions = run(args.scales, args.chapters, args.words, stages, args.workers, args.seed, args.history)
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Mock-mode throughput benchmark for the extraction engine.
+
+Runs `run_extraction_batch` against a scratch output directory with simulated
+request latency at several concurrency levels.
+
+Usage (from the repo root):
+    python -m benchmarks.extraction_throughput [--chunks 100] [--latency 0.05] [--batch-budget 3000]
+"""
+import argparse
+import contextlib
+import io
+import tempfile
+
+import extract_entities
+
+CONCURRENCY_LEVELS = [1, 2, 4, 8, 16]
+
+
+def run(volume="Vol_01", chunks=100, latency=0.05, levels=CONCURRENCY_LEVELS, batch_budget=0):
+    results = []
+    for concurrency in levels:
+        with tempfile.TemporaryDirectory() as tmp:
+            extract_entities.OUTPUT_DIR = tmp
+            with contextlib.redirect_stdout(io.StringIO()):
+                stats = extract_entities.run_extraction_batch(
+                    volume, force_mock=True, concurrency=concurrency,
+                    mock_latency=latency, chapter_prefix=None, max_chunks=chunks,
+                    route="all", batch_budget=batch_budget
+                )
+        results.append((concurrency, stats))
+        print(f"concurrency={concurrency:>3}  chunks={stats['processed']:>4}  "
+              f"requests={stats['requests']:>4} ({stats['chunks_per_request']:.2f} chunks/req)  "
+              f"elapsed={stats['elapsed']:6.2f}s  throughput={stats['chunks_per_sec']:7.1f} chunks/s")
+
+    base = results[0][1]["chunks_per_sec"]
+    if base:
+        print("Speedup vs concurrency=1: " + ", ".join(
+            f"{c}x -> {s['chunks_per_sec'] / base:.1f}x" for c, s in results))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--volume", default="Vol_01")
+    parser.add_argument("--chunks", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per request")
+    parser.add_argument("--batch-budget", type=int, default=0, help="Pack small chunks into shared requests")
+    args = parser.parse_args()
+    run(args.volume, args.chunks, args.latency, batch_budget=args.batch_budget)
+
+
+if __name__ == "__main__":
+    main()
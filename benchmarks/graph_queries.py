@@ -0,0 +1,100 @@
+"""
+Benchmark for graph_store ingestion and queries at full-series scale.
+
+Writes synthetic extracted_entities.json exports for N volumes (names drawn
+from data/wiki with a Zipf-like skew, so a few characters are everywhere) into
+a scratch directory, ingests them into a scratch database and times the query
+helpers over a sample of names.
+
+Usage (from the repo root):
+    python -m benchmarks.graph_queries [--volumes 16] [--chunks 450] [--queries 200]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from extract_entities import WIKI_DIR, load_json
+from graph_store import GraphStore
+
+
+def synthetic_volume(rng, characters, locations, vol_index, chunks):
+    records = []
+    chapters = max(1, chunks // 7)
+    for i in range(chunks):
+        order = i * chapters // chunks + 1
+        cast = {characters[min(len(characters) - 1, int(rng.paretovariate(1.2)) - 1 + vol_index * 3)]
+                for _ in range(rng.randint(2, 8))}
+        records.append({
+            "chunk_id": f"{order}_{i}_0",
+            "chapter_order": order,
+            "scene_index": i,
+            "extraction": {
+                "characters": [{"name": name, "type": "known", "confidence": 0.9, "context": ""} for name in cast],
+                "locations": [{"name": rng.choice(locations)} for _ in range(rng.randint(0, 2))],
+            },
+        })
+    return records
+
+
+def run(volumes=16, chunks=450, queries=200, seed=0):
+    rng = random.Random(seed)
+    characters = [c["title"] for c in load_json(os.path.join(WIKI_DIR, "characters.json"))]
+    locations = [c["title"] for c in load_json(os.path.join(WIKI_DIR, "locations.json"))]
+    if not characters or not locations:
+        print("Needs data/wiki/characters.json and locations.json")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output_dir = os.path.join(tmp, "processed")
+        for v in range(1, volumes + 1):
+            vol_dir = os.path.join(output_dir, f"Vol_{v:02d}")
+            os.makedirs(vol_dir)
+            with open(os.path.join(vol_dir, "extracted_entities.json"), "w", encoding="utf-8") as f:
+                json.dump(synthetic_volume(rng, characters, locations, v - 1, chunks), f)
+
+        with GraphStore(os.path.join(tmp, "graph.sqlite")) as graph:
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                graph.ingest(output_dir=output_dir)
+            ingest_time = time.perf_counter() - started
+            counts = graph.stats()
+            print(f"Ingested {volumes} volumes in {ingest_time:.2f}s: " +
+                  ", ".join(f"{n:,} {table}" for table, n in counts.items()))
+
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                graph.ingest(output_dir=output_dir)
+            print(f"Re-ingest with nothing changed: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+            names = [row[0] for row in graph.conn.execute("SELECT name FROM entities ORDER BY id")]
+            # Mix of hubs (first entities are the common ones) and random names
+            sample = names[:queries // 4] + rng.sample(names, min(len(names), queries - queries // 4))
+            for label, fn in (("appearances", graph.appearances), ("neighbours", graph.neighbours),
+                              ("first_appearance", graph.first_appearance)):
+                times = []
+                for name in sample:
+                    t0 = time.perf_counter()
+                    fn(name)
+                    times.append((time.perf_counter() - t0) * 1000)
+                times.sort()
+                print(f"{label:>17}: median {statistics.median(times):6.2f} ms  "
+                      f"p99 {times[int(len(times) * 0.99) - 1]:6.2f} ms  max {times[-1]:6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--volumes", type=int, default=16)
+    parser.add_argument("--chunks", type=int, default=450, help="Chunks per volume")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    run(args.volumes, args.chunks, args.queries)
+
+
+if __name__ == "__main__":
+    main()
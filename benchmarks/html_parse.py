@@ -0,0 +1,105 @@
+"""
+Micro-benchmark: chapter-page parsing, BeautifulSoup get_text vs html_extract.
+
+Parses every chapter page under fixtures/site (repeated --copies times to get a
+measurable corpus) with the original BeautifulSoup path and each html_extract
+backend, checks that all paths yield the same word sequence (ignoring the
+"——" scene-break lines the new extractor adds) and reports pages/sec and
+peak traced memory per page.
+
+Usage (from the repo root):
+    python -m benchmarks.html_parse [--copies 200] [--repeat 3]
+"""
+import argparse
+import glob
+import os
+import time
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from fixture_server import FIXTURE_DIR
+from html_extract import HAS_LXML, SCENE_BREAK, extract_chapter_text
+
+
+def legacy_extract(html):
+    """The scraper's original path: full html.parser tree, then get_text on the content div."""
+    soup = BeautifulSoup(html, "html.parser")
+    content_div = soup.find(id="reader-content") or soup.find("div", class_="entry-content") \
+        or soup.find("article", class_="twi-article")
+    return content_div.get_text(separator="\n", strip=True) if content_div else None
+
+
+def words(text):
+    return [word for word in (text or "").split() if word != SCENE_BREAK]
+
+
+def load_pages(root=FIXTURE_DIR):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(root, "**", "index.html"), recursive=True)):
+        if "table-of-contents" in path:
+            continue
+        with open(path, "rb") as f:
+            pages.append(f.read())
+    return pages
+
+
+def peak_memory(fn, page):
+    tracemalloc.start()
+    fn(page)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def run(copies=200, repeat=3):
+    pages = load_pages()
+    if not pages:
+        print(f"No chapter pages under {FIXTURE_DIR}")
+        return False
+    corpus = pages * copies
+    total_bytes = sum(len(page) for page in corpus)
+    print(f"Corpus: {len(pages)} pages x {copies} = {len(corpus)} pages, {total_bytes / 1024 / 1024:.1f} MB")
+
+    paths = [("bs4", legacy_extract), ("stream", lambda html: extract_chapter_text(html, "stream"))]
+    if HAS_LXML:
+        paths.append(("lxml", lambda html: extract_chapter_text(html, "lxml")))
+    else:
+        print("lxml not installed; skipping the lxml backend.")
+
+    expected = [words(legacy_extract(page)) for page in pages]
+    ok = True
+    for name, fn in paths[1:]:
+        if [words(fn(page)) for page in pages] != expected:
+            print(f"MISMATCH: {name} word sequence differs from bs4")
+            ok = False
+    if ok:
+        print("Word sequences identical across all paths.")
+
+    results = {}
+    for name, fn in paths:
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for page in corpus:
+                fn(page)
+            best = min(best, time.perf_counter() - started)
+        peak = max(peak_memory(fn, page) for page in pages)
+        results[name] = best
+        print(f"{name:>7}: {len(corpus) / best:8.1f} pages/s  peak {peak / 1024:8.1f} KB/page")
+    for name in results:
+        if name != "bs4":
+            print(f"Speedup {name} vs bs4: {results['bs4'] / results[name]:.2f}x")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.copies, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark for tolerant reply parsing and the repair queue in extract_entities.
+
+1. Parses synthetic extraction replies (wiki character names) damaged the way
+   model output goes wrong: wrapped in fences and prose, trailing commas, a
+   section left out, cut off at a random point. Compares the old parser
+   (strip ```json, json.loads, else record an error) with json_repair: how many
+   replies come back complete, partial (only some sections re-asked) or lost.
+2. Runs mock extraction with a share of replies damaged and reports chunks
+   recorded, the parse-failure rate, repair requests and the tokens they re-spent.
+
+Usage (from the repo root):
+    python -m benchmarks.malformed_replies [--replies 2000] [--chunks 200] [--rate 0.2]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import tempfile
+
+import extract_entities
+from extract_entities import WIKI_DIR, load_json, parse_extraction
+from json_repair import EXTRACTION_SECTIONS
+from metrics import RUN
+
+
+def fenced(reply, rng):
+    return f"Here are the entities I found:\n```json\n{reply}\n```\nLet me know if you need more."
+
+
+def trailing_comma(reply, rng):
+    return re.sub(r"\}(\s*)\]", r"},\1]", reply, count=1)
+
+
+def dropped_section(reply, rng):
+    data = json.loads(reply)
+    data.pop(rng.choice(EXTRACTION_SECTIONS), None)
+    return json.dumps(data)
+
+
+def truncated(reply, rng):
+    return reply[:rng.randint(len(reply) // 3, len(reply) - 1)]
+
+
+DAMAGE = {
+    "clean": lambda reply, rng: reply,
+    "fenced": fenced,
+    "trailing_comma": trailing_comma,
+    "dropped_section": dropped_section,
+    "truncated": truncated,
+}
+
+
+def synthetic_reply(names, rng):
+    characters = [{"name": name, "type": rng.choice(("known", "new")), "confidence": round(rng.random(), 2),
+                   "context": f"Speaks with {rng.choice(names)}"} for name in rng.sample(names, rng.randint(1, 8))]
+    locations = [{"name": name} for name in rng.sample(("Liscor", "The Wandering Inn", "Celum", "Pallass"),
+                                                        rng.randint(1, 3))]
+    return json.dumps({"characters": characters, "locations": locations}, indent=2)
+
+
+def legacy_parse(content):
+    """The parser before json_repair: fences stripped, otherwise an error record."""
+    if "```json" in content:
+        content = content.replace("```json", "").replace("```", "")
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        return {"error": "Invalid JSON", "raw": content}
+
+
+def parser_comparison(replies, seed):
+    names = [c["title"] for c in load_json(os.path.join(WIKI_DIR, "characters.json"))] or ["Erin Solstice", "Relc"]
+    rng = random.Random(seed)
+    results = {}
+    for _ in range(replies):
+        kind = rng.choice(list(DAMAGE))
+        content = DAMAGE[kind](synthetic_reply(names, rng), rng)
+        legacy = legacy_parse(content)
+        extraction, missing = parse_extraction(content)
+        row = results.setdefault(kind, {"replies": 0, "legacy_ok": 0, "complete": 0, "partial": 0, "lost": 0})
+        row["replies"] += 1
+        row["legacy_ok"] += "error" not in legacy and all(section in legacy for section in EXTRACTION_SECTIONS)
+        row["complete"] += not missing
+        row["partial"] += bool(missing) and bool(extraction)
+        row["lost"] += bool(missing) and not extraction
+
+    print(f"{'damage':<16} {'replies':>7} {'old ok':>7} {'complete':>9} {'partial':>8} {'lost':>6}")
+    for kind, row in results.items():
+        n = row["replies"]
+        print(f"{kind:<16} {n:>7} {row['legacy_ok'] / n:>7.1%} {row['complete'] / n:>9.1%} "
+              f"{row['partial'] / n:>8.1%} {row['lost'] / n:>6.1%}")
+    return results
+
+
+def mock_extraction(volume, chunks, rate, seed):
+    rng = random.Random(seed)
+    clean_reply = extract_entities.mock_generate_content
+
+    def damaged_reply(chunk_text):
+        reply = clean_reply(chunk_text)
+        if rng.random() < rate:
+            return rng.choice((fenced, dropped_section, truncated))(reply, rng)
+        return reply
+
+    RUN.start("malformed_replies")
+    with tempfile.TemporaryDirectory() as tmp:
+        extract_entities.OUTPUT_DIR = tmp
+        extract_entities.mock_generate_content = damaged_reply
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                stats = extract_entities.run_extraction_batch(volume, force_mock=True, mock_latency=0,
+                                                              max_chunks=chunks, route="all")
+        finally:
+            extract_entities.mock_generate_content = clean_reply
+    total_tokens = sum(usage["total_tokens"] for usage in RUN.report()["tokens"].values())
+    print(f"Mock extraction, {rate:.0%} of replies damaged: {stats['processed']} chunks recorded, "
+          f"{stats['failed']} left unprocessed")
+    print(f"  parse failures {stats['parse_failure_rate']:.1%}, {stats['repaired']} repaired with "
+          f"{stats['repair_requests']} repair requests ({stats['repair_tokens']:,} of {total_tokens:,} tokens re-spent)")
+    return stats
+
+
+def run(replies=2000, volume="Vol_01", chunks=200, rate=0.2, seed=0):
+    return {"parser": parser_comparison(replies, seed), "extraction": mock_extraction(volume, chunks, rate, seed)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replies", type=int, default=2000, help="Synthetic replies to parse")
+    parser.add_argument("--volume", default="Vol_01")
+    parser.add_argument("--chunks", type=int, default=200, help="Chunks for the mock extraction run")
+    parser.add_argument("--rate", type=float, default=0.2, help="Share of mock replies damaged")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.replies, args.volume, args.chunks, args.rate, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Load test for query_server.py.
+
+Builds an entity graph from the spotter's mentions of every chunked volume (so
+entity endpoints have realistic data without an LLM run), starts the server in
+a subprocess and replays a mix of chapter, chunk, appearance, neighbour and
+co-occurrence requests from N client threads, each on its own keep-alive
+connection. Reports p50/p99 latency and requests/s per concurrency level:
+
+- cache off   (--cache-size 0): every request hits the corpus store / SQLite
+- cache on    repeated queries are served from the LRU cache
+- etag        clients revalidate with If-None-Match and get 304s
+
+Usage (from the repo root):
+    python -m benchmarks.query_load [--requests 2000] [--concurrency 1 4 16] [--paths 300]
+"""
+import argparse
+import contextlib
+import http.client
+import io
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+import numpy as np
+
+from chunk_chapters import PROCESSED_DIR
+from chapter_state import chunk_position
+from entity_spotter import load_mentions, spot_volume, spotter_extraction
+from graph_store import GraphStore
+from query_server import QueryAPI
+
+
+def build_graph(path, vol_names):
+    with contextlib.redirect_stdout(io.StringIO()):
+        for vol_name in vol_names:
+            spot_volume(vol_name)
+    with GraphStore(path) as graph:
+        for vol_name in vol_names:
+            records = [{"chunk_id": chunk_id, "chapter_order": record["chapter_order"],
+                        "scene_index": chunk_position(record)[0], "extraction": spotter_extraction(record)}
+                       for chunk_id, record in load_mentions(vol_name).items()]
+            graph.ingest_records(vol_name, records)
+        names = [name for (name,) in graph.conn.execute("""
+            SELECT e.name FROM entities e JOIN mentions m ON m.entity_id = e.id
+            GROUP BY e.id ORDER BY COUNT(*) DESC LIMIT 200
+        """)]
+        return names, graph.stats()
+
+
+def request_paths(api, names, count, rng):
+    """A mix of `count` distinct request targets."""
+    chunk_paths = []
+    chapter_paths = []
+    for vol_name in api.volume_names():
+        store = api.volume(vol_name)
+        for order, _ in store.chapter_titles():
+            chapter_paths.append(f"/volumes/{vol_name}/chapters/{order}")
+            for row in store.chapter_rows(order):
+                chunk_paths.append(f"/volumes/{vol_name}/chunks/{store.chunk(row)['chunk_id']}")
+    entity_paths = []
+    for name in names:
+        entity_paths.append(f"/entities/{quote(name)}/appearances")
+        entity_paths.append(f"/entities/{quote(name)}/neighbours?limit=10")
+    for _ in range(len(names)):
+        a, b = rng.sample(names, 2)
+        entity_paths.append(f"/cooccurrence?a={quote(a)}&b={quote(b)}")
+    paths = []
+    for pool, share in ((chunk_paths, 0.4), (chapter_paths, 0.2), (entity_paths, 0.4)):
+        paths += rng.sample(pool, min(len(pool), int(count * share)))
+    return paths
+
+
+def start_server(processed_dir, graph_path, cache_size):
+    process = subprocess.Popen(
+        [sys.executable, "-u", "query_server.py", "--port", "0", "--processed-dir", processed_dir,
+         "--graph", graph_path, "--cache-size", str(cache_size)],
+        stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    base_url = line.split(" at ")[1].split("/ ")[0]
+    return process, urlsplit(base_url)
+
+
+def load(address, paths, total, concurrency, etags=None, seed=0):
+    """Latencies of `total` requests spread over `concurrency` keep-alive clients, and the wall time."""
+    latencies = [[] for _ in range(concurrency)]
+    statuses = {}
+    lock = threading.Lock()
+
+    def client(i):
+        rng = random.Random(seed + i)
+        conn = http.client.HTTPConnection(address.hostname, address.port)
+        for _ in range(total // concurrency):
+            path = rng.choice(paths)
+            headers = {"If-None-Match": etags[path]} if etags and path in etags else {}
+            started = time.perf_counter()
+            conn.request("GET", path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            latencies[i].append(time.perf_counter() - started)
+            with lock:
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return np.concatenate([np.array(times) for times in latencies]) * 1000, time.perf_counter() - started, statuses
+
+
+def collect_etags(address, paths):
+    conn = http.client.HTTPConnection(address.hostname, address.port)
+    etags = {}
+    for path in paths:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        response.read()
+        if response.getheader("ETag"):
+            etags[path] = response.getheader("ETag")
+    conn.close()
+    return etags
+
+
+def run(total=2000, concurrency=(1, 4, 16), n_paths=300, processed_dir=None, seed=0):
+    processed_dir = processed_dir or PROCESSED_DIR
+    rng = random.Random(seed)
+    api = QueryAPI(processed_dir)
+    vol_names = api.volume_names()
+    if not vol_names:
+        print(f"No chunked volumes under {processed_dir}")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        graph_path = os.path.join(tmp, "entities.sqlite")
+        names, counts = build_graph(graph_path, vol_names)
+        paths = request_paths(api, names, n_paths, rng)
+        print(f"{len(vol_names)} volumes, graph with {counts['entities']} entities / {counts['mentions']} mentions; "
+              f"{len(paths)} distinct request paths, {total} requests per run")
+        print(f"{'mode':<10} {'clients':>7} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8}  statuses")
+        results = {}
+        for mode, cache_size in (("cache off", 0), ("cache on", 4096), ("etag", 4096)):
+            process, address = start_server(processed_dir, graph_path, cache_size)
+            try:
+                etags = collect_etags(address, paths) if mode != "cache off" else None  # Also warms the cache
+                for clients in concurrency:
+                    times, elapsed, statuses = load(address, paths, total, clients,
+                                                    etags if mode == "etag" else None, seed)
+                    p50, p99 = np.percentile(times, 50), np.percentile(times, 99)
+                    print(f"{mode:<10} {clients:>7} {p50:>8.2f} {p99:>8.2f} {len(times) / elapsed:>8.0f}  "
+                          + ", ".join(f"{status}: {n}" for status, n in sorted(statuses.items())))
+                    results[f"{mode}/{clients}"] = {"p50_ms": float(p50), "p99_ms": float(p99),
+                                                    "rps": len(times) / elapsed}
+            finally:
+                process.terminate()
+                process.wait()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--paths", type=int, default=300, help="Distinct request paths in the mix")
+    parser.add_argument("--processed-dir", default=PROCESSED_DIR)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.requests, args.concurrency, args.paths, args.processed_dir, args.seed)
+
+
+if __name__ == "__main__":
+    main()
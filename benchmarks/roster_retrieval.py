@@ -0,0 +1,88 @@
+"""
+Offline benchmark for per-chunk roster retrieval.
+
+For every chunk of a volume, compares the prompt size with the full wiki roster
+against the retrieved candidate roster, and measures recall: how many of the
+known characters the LLM extracted for that chunk (extracted_entities.json)
+were among the retrieved candidates.
+
+Usage (from the repo root):
+    python -m benchmarks.roster_retrieval [--volume Vol_01] [--no-fuzzy]
+"""
+import argparse
+import os
+import time
+
+from chunk_chapters import load_chunks
+from extract_entities import (DATA_DIR, OUTPUT_DIR, WIKI_DIR, construct_prompt, estimate_tokens,
+                              get_chunk_roster, get_known_characters_list, load_json)
+from gazetteer import Gazetteer, normalize_name
+
+
+def run(volume="Vol_01", fuzzy=True):
+    chunks = load_chunks(volume, DATA_DIR)
+    extracted = load_json(os.path.join(OUTPUT_DIR, volume, "extracted_entities.json"))
+    known_chars = load_json(os.path.join(WIKI_DIR, "characters.json"))
+    full_roster = get_known_characters_list(known_chars)
+
+    started = time.perf_counter()
+    gazetteer = Gazetteer.from_wiki(WIKI_DIR, fuzzy=fuzzy)
+    build_time = time.perf_counter() - started
+
+    # Wiki titles by lookup form, to map LLM output names back to canonical entries
+    canonical_by_norm = {normalize_name(c["title"]): c["title"] for c in known_chars if "title" in c}
+    for title in list(canonical_by_norm.values()):
+        canonical_by_norm.setdefault(normalize_name(title.split(" (")[0]), title)
+
+    full_tokens = 0
+    retrieval_tokens = 0
+    retrieval_time = 0.0
+    candidates_by_chunk = {}
+    for chunk in chunks:
+        full_tokens += estimate_tokens(construct_prompt(chunk["text"], full_roster))
+        t0 = time.perf_counter()
+        roster = get_chunk_roster(chunk["text"], gazetteer)
+        retrieval_time += time.perf_counter() - t0
+        retrieval_tokens += estimate_tokens(construct_prompt(chunk["text"], roster))
+        candidates_by_chunk[chunk["chunk_id"]] = set(gazetteer.candidates(chunk["text"]))
+
+    hits = 0
+    total = 0
+    misses = {}
+    for record in extracted:
+        candidates = candidates_by_chunk.get(record["chunk_id"])
+        if candidates is None:
+            continue
+        for character in record.get("extraction", {}).get("characters", []):
+            canonical = canonical_by_norm.get(normalize_name(character.get("name", "")))
+            if not canonical:
+                continue  # Not a wiki character; retrieval cannot help or hurt
+            total += 1
+            if canonical in candidates:
+                hits += 1
+            else:
+                misses[canonical] = misses.get(canonical, 0) + 1
+
+    print(f"Volume: {volume} ({len(chunks)} chunks), gazetteer built in {build_time * 1000:.0f} ms")
+    print(f"Prompt tokens, full roster:      {full_tokens:>12,}")
+    print(f"Prompt tokens, retrieved roster: {retrieval_tokens:>12,}")
+    if full_tokens:
+        print(f"Reduction:                       {1 - retrieval_tokens / full_tokens:>12.1%}")
+    print(f"Retrieval time: {retrieval_time * 1000 / max(1, len(chunks)):.2f} ms/chunk")
+    if total:
+        print(f"Recall of extracted wiki characters: {hits}/{total} = {hits / total:.1%}")
+    if misses:
+        worst = sorted(misses.items(), key=lambda kv: -kv[1])[:10]
+        print("Most missed: " + ", ".join(f"{name} ({n})" for name, n in worst))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--volume", default="Vol_01")
+    parser.add_argument("--no-fuzzy", action="store_true")
+    args = parser.parse_args()
+    run(args.volume, fuzzy=not args.no_fuzzy)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Micro-benchmark: single-pass span segmenter vs split_into_scenes + chunk_text.
+
+Runs both over every chapter file under data/raw, checks that they produce
+identical chunks and reports throughput.
+
+Usage (from the repo root):
+    python -m benchmarks.scene_splitter [--repeat 3]
+"""
+import argparse
+import glob
+import os
+import time
+
+from chunk_chapters import MAX_CHARS, RAW_DIR, chunk_text, load_chapter, split_into_scenes
+from segmenter import segment_chapter
+
+
+def legacy_chunks(text):
+    return [chunk for scene in split_into_scenes(text) for chunk in chunk_text(scene, MAX_CHARS)]
+
+
+def span_chunks(text):
+    return [text[start:end] for _, _, start, end in segment_chapter(text, MAX_CHARS)]
+
+
+def run(repeat=3):
+    paths = sorted(glob.glob(os.path.join(RAW_DIR, "Vol_*", "*.txt")))
+    texts = [load_chapter(path) for path in paths]
+    total_bytes = sum(len(text.encode("utf-8")) for text in texts)
+    print(f"Corpus: {len(texts)} chapters, {total_bytes / 1024 / 1024:.1f} MB")
+
+    mismatches = [path for path, text in zip(paths, texts) if legacy_chunks(text) != span_chunks(text)]
+    if mismatches:
+        print(f"MISMATCH in {len(mismatches)} chapters, e.g. {mismatches[:3]}")
+    else:
+        print("Outputs identical for every chapter.")
+
+    results = {}
+    for name, fn in (("legacy", legacy_chunks), ("spans", span_chunks)):
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for text in texts:
+                fn(text)
+            best = min(best, time.perf_counter() - started)
+        results[name] = best
+        print(f"{name:>7}: {best:6.3f}s  ({total_bytes / 1024 / 1024 / best:6.1f} MB/s)")
+    print(f"Speedup: {results['legacy'] / results['spans']:.2f}x")
+    return not mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
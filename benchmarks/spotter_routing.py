@@ -0,0 +1,69 @@
+"""
+Mock-mode benchmark for entity_spotter routing.
+
+Runs `run_extraction_batch` twice against scratch output directories, once
+sending every chunk to the (mock) API and once routing through the spotter,
+and reports how many API calls the spotter avoided, plus the spotter's own
+cost and the score distribution.
+
+Usage (from the repo root):
+    python -m benchmarks.spotter_routing [--volume Vol_01] [--chunks 200] [--min-score 1]
+"""
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+
+import extract_entities
+from entity_spotter import build_spotter, load_mentions, spot_volume
+
+
+def run(volume="Vol_01", chunks=200, latency=0.01, min_score=1):
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        spot_volume(volume, build_spotter(extract_entities.WIKI_DIR), force=True,
+                    processed_dir=extract_entities.DATA_DIR, wiki_dir=extract_entities.WIKI_DIR)
+    spot_time = time.perf_counter() - started
+    mentions = load_mentions(volume, extract_entities.DATA_DIR)
+    print(f"Spotted {len(mentions)} chunks of {volume} in {spot_time:.2f}s")
+
+    buckets = {}
+    for record in mentions.values():
+        bucket = min(record["score"], 5)
+        buckets[bucket] = buckets.get(bucket, 0) + 1
+    print("Unresolved-name score: " + ", ".join(
+        f"{'5+' if score == 5 else score}: {n}" for score, n in sorted(buckets.items())))
+
+    results = {}
+    for route in ("all", "spotter"):
+        with tempfile.TemporaryDirectory() as tmp:
+            extract_entities.OUTPUT_DIR = tmp
+            with contextlib.redirect_stdout(io.StringIO()):
+                stats = extract_entities.run_extraction_batch(
+                    volume, force_mock=True, mock_latency=latency, chapter_prefix=None,
+                    max_chunks=chunks, route=route, route_min_score=min_score
+                )
+        results[route] = stats
+        print(f"route={route:<8} chunks={stats['processed']:>4}  api_calls={stats['api_chunks']:>4}  "
+              f"local={stats['routed_local']:>4}  elapsed={stats['elapsed']:6.2f}s")
+
+    baseline = results["all"]["api_chunks"]
+    avoided = baseline - results["spotter"]["api_chunks"]
+    if baseline:
+        print(f"API calls avoided: {avoided}/{baseline} = {avoided / baseline:.1%}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--volume", default="Vol_01")
+    parser.add_argument("--chunks", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.01, help="Simulated seconds per request")
+    parser.add_argument("--min-score", type=int, default=1, help="Unresolved names needed to call the API")
+    args = parser.parse_args()
+    run(args.volume, args.chunks, args.latency, args.min_score)
+
+
+if __name__ == "__main__":
+    main()
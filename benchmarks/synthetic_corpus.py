@@ -0,0 +1,221 @@
+"""
+Synthetic TWI-shaped corpus for the benchmarks.
+
+Writes volumes in the scraper's layout (data/raw/Vol_XX/index.json plus one
+text file per chapter) and, optionally, the same chapters as a site that
+fixture_server.py can serve (a table of contents and one page per chapter), so
+the scraper, the chunker and everything downstream can run at any size.
+
+Chapters are 1-5 scenes between scene-break lines ("——" as html_extract writes
+for <hr>, sometimes "* * *"), about 45% dialogue paragraphs, and name mentions
+drawn from data/wiki/characters.json (and locations.json) with a Zipf-like skew,
+so a few characters are everywhere and most turn up once. The raw text is what
+the scraper extracts from the generated pages, so a scrape of the site can be
+checked against it. Output is deterministic for a given seed.
+
+Usage (from the repo root):
+    python -m benchmarks.synthetic_corpus /tmp/synthetic [--chapters 100] [--words 6000] [--site]
+"""
+import argparse
+import html
+import json
+import math
+import os
+import random
+
+from extract_entities import WIKI_DIR, load_json
+from html_extract import SCENE_BREAK
+from scrape_chapters import clean_filename
+
+VOLUME_CHAPTERS = 100     # Chapters per volume; larger corpora get more volumes
+CHAPTER_WORDS = 6000      # Mean words per chapter (Vol_01 averages ~6,700)
+DIALOGUE_SHARE = 0.45     # Share of paragraphs that are dialogue
+SITE_URL = "https://wanderinginn.com"
+
+WORDS = """
+the a an and but or so then as at by for from in into of on to with without over under about after before
+was were is had has could would should might must will did not never just still even only again already
+she he they it her him them his their its we you i me my our
+said asked looked turned walked stood sat ran laughed sighed nodded frowned smiled shouted whispered paused
+grabbed held raised lowered opened closed waited watched listened stared wondered thought knew felt saw heard
+inn door table kitchen room floor wall window street gate city road hill field plain sky rain snow wind fire
+light night morning day evening hour moment time year world level class skill spell sword blade shield armor
+coin gold silver bread soup pasta drink mug plate chair bed book map letter message guard soldier adventurer
+team party monster goblin drake gnoll antinium human half-elf dragon undead shield spider rock crab
+old young tall small quiet loud tired hungry angry afraid careful strange heavy bright dark cold warm
+good bad long short little great first last next other same every few many much more most some any
+here there now soon later away back down up out off around through across toward behind between
+""".split()
+BEATS = ["nodded", "frowned", "sighed", "laughed", "hesitated", "shrugged", "looked away", "said nothing"]
+SPEECH = ["said", "asked", "muttered", "replied", "shouted", "whispered", "snapped", "called out"]
+INTERLUDE_EVERY = 9       # Every n-th chapter is an "Interlude – Name"
+
+
+def pick(names, rng, skew=1.2):
+    """A Pareto-distributed index: the first few names come up far more often than the rest."""
+    return names[min(len(names) - 1, int(rng.paretovariate(skew)) - 1)]
+
+
+def sentence(rng, subject=None, low=5, high=18):
+    words = rng.choices(WORDS, k=rng.randint(low, high))
+    if subject:
+        words[0] = subject
+    else:
+        words[0] = words[0].capitalize()
+    return " ".join(words) + rng.choice(".....?!")
+
+
+def paragraph(rng, cast, locations):
+    """One paragraph: dialogue (with or without a speech tag), a short beat or narration."""
+    roll = rng.random()
+    if roll < DIALOGUE_SHARE:
+        speech = " ".join(sentence(rng, low=3, high=14) for _ in range(rng.randint(1, 3)))
+        if rng.random() < 0.5:
+            return f"“{speech}”"
+        speaker = rng.choice(cast)
+        name = speaker if rng.random() < 0.5 else speaker.split()[0]
+        return f"“{speech}” {name} {rng.choice(SPEECH)}."
+    if roll < DIALOGUE_SHARE + 0.1:
+        return f"{rng.choice(cast).split()[0]} {rng.choice(BEATS)}."
+    sentences = []
+    for _ in range(rng.randint(2, 5)):
+        subject = None
+        if rng.random() < 0.3:
+            subject = rng.choice(cast)
+            subject = subject if rng.random() < 0.4 else subject.split()[0]
+        text = sentence(rng, subject)
+        if locations and rng.random() < 0.05:
+            text = text[:-1] + f" in {pick(locations, rng)}."
+        sentences.append(text)
+    return " ".join(sentences)
+
+
+def chapter_text(rng, characters, locations, words=CHAPTER_WORDS):
+    """Paragraph lines of one chapter, scenes separated by break lines."""
+    cast = sorted({pick(characters, rng) for _ in range(rng.randint(3, 9))})
+    target = max(200, int(rng.gauss(words, words * 0.3)))
+    scenes = rng.randint(1, 5)
+    lines = []
+    count = 0
+    for scene in range(scenes):
+        if scene:
+            lines.append(SCENE_BREAK if rng.random() < 0.8 else "* * *")
+            if rng.random() < 0.5:  # A scene often follows someone else
+                cast = sorted(set(cast) | {pick(characters, rng)})
+        while count < target * (scene + 1) / scenes:
+            line = paragraph(rng, cast, locations)
+            lines.append(line)
+            count += line.count(" ") + 1
+    return "\n".join(lines)
+
+
+def chapter_page(title, text, rng):
+    """The chapter as a WordPress-style page; a few words in <em>, like the real site."""
+    paragraphs = []
+    for line in text.split("\n"):
+        if line == SCENE_BREAK:
+            paragraphs.append("<hr>")
+            continue
+        words = html.escape(line, quote=False).split(" ")
+        if len(words) > 3 and rng.random() < 0.15:
+            i = rng.randrange(1, len(words) - 1)
+            words[i] = f"<em>{words[i]}</em>"
+        paragraphs.append(f"<p>{' '.join(words)}</p>")
+    body = "\n".join(paragraphs)
+    return (f"<!DOCTYPE html>\n<html>\n<head><meta charset=\"utf-8\"><title>{html.escape(title)} | The Wandering Inn"
+            f"</title>\n<script>var tracking = {{\"page\": \"chapter\"}};</script>\n</head>\n<body>\n"
+            f"<nav class=\"site-nav\"><a href=\"/\">Home</a> <a href=\"/table-of-contents/\">Table of Contents</a></nav>\n"
+            f"<article class=\"twi-article\">\n<h1 class=\"entry-title\">{html.escape(title)}</h1>\n"
+            f"<div id=\"reader-content\" class=\"entry-content\">\n{body}\n</div>\n"
+            f"<div class=\"nav-links\"><a href=\"#\">Previous Chapter</a> <a href=\"#\">Next Chapter</a></div>\n"
+            f"</article>\n<footer><p>Comments are closed.</p></footer>\n</body>\n</html>\n")
+
+
+def toc_page(volumes):
+    """Table of contents in the layout scrape_chapters.parse_toc reads."""
+    parts = ["<!DOCTYPE html>\n<html>\n<head><meta charset=\"utf-8\"><title>Table of Contents | The Wandering Inn"
+             "</title></head>\n<body>\n<div id=\"table-of-contents\">"]
+    for number, chapters in volumes:
+        parts.append(f"<div class=\"book-wrapper\" data-book-number=\"{number}\">\n"
+                     f"  <h2 class=\"book-title\">Volume {number}</h2>")
+        for entry, path in chapters:
+            parts.append(f"  <div class=\"chapter-entry\">\n"
+                         f"    <div class=\"body-web\"><a href=\"{path}\">{html.escape(entry['title'])}</a></div>\n"
+                         f"    <div class=\"body-audio\"><a href=\"/audio{path}\">Audio</a></div>\n  </div>")
+        parts.append("</div>")
+    parts.append("</div>\n</body>\n</html>\n")
+    return "\n".join(parts)
+
+
+def write_file(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def generate(out_dir, chapters=VOLUME_CHAPTERS, words=CHAPTER_WORDS, site=False, seed=0, wiki_dir=WIKI_DIR):
+    """
+    Writes `chapters` chapters, VOLUME_CHAPTERS per volume, to `out_dir`/raw (and
+    `out_dir`/site with `site`). Returns {"volumes", "chapters", "words", "bytes"}.
+    """
+    rng = random.Random(seed)
+    characters = [c["title"] for c in load_json(os.path.join(wiki_dir, "characters.json"))]
+    locations = [c["title"] for c in load_json(os.path.join(wiki_dir, "locations.json"))]
+    if not characters:
+        raise ValueError(f"No characters in {wiki_dir}/characters.json")
+    rng.shuffle(characters)  # Which names are the common ones
+    rng.shuffle(locations)
+
+    totals = {"volumes": 0, "chapters": 0, "words": 0, "bytes": 0}
+    toc = []
+    for number in range(1, math.ceil(chapters / VOLUME_CHAPTERS) + 1):
+        vol_name = f"Vol_{number:02d}"
+        count = min(VOLUME_CHAPTERS, chapters - (number - 1) * VOLUME_CHAPTERS)
+        index = []
+        links = []
+        titles = set()
+        for order in range(1, count + 1):
+            if order % INTERLUDE_EVERY == 0:
+                title = base = f"Interlude – {pick(characters, rng).split()[0]}"
+                part = 1
+                while title in titles:
+                    part += 1
+                    title = f"{base} (Pt. {part})"
+            else:
+                title = f"{number}.{order - 1 - (order // INTERLUDE_EVERY):02d}"
+            titles.add(title)
+            path = f"/synthetic/{number}-{order:03d}/"
+            entry = {"order": order, "title": title, "filename": clean_filename(title) + ".txt",
+                     "url": SITE_URL + path}
+            text = chapter_text(rng, characters, locations, words)
+            write_file(os.path.join(out_dir, "raw", vol_name, entry["filename"]), text)
+            if site:
+                write_file(os.path.join(out_dir, "site", path.strip("/"), "index.html"), chapter_page(title, text, rng))
+            index.append(entry)
+            links.append((entry, path))
+            totals["words"] += len(text.split())
+            totals["bytes"] += len(text.encode("utf-8"))
+        write_file(os.path.join(out_dir, "raw", vol_name, "index.json"), json.dumps(index, indent=2, ensure_ascii=False))
+        toc.append((number, links))
+        totals["volumes"] += 1
+        totals["chapters"] += count
+    if site:
+        write_file(os.path.join(out_dir, "site", "table-of-contents", "index.html"), toc_page(toc))
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out_dir", help="Writes <out_dir>/raw (and <out_dir>/site)")
+    parser.add_argument("--chapters", type=int, default=VOLUME_CHAPTERS, help="Total chapters")
+    parser.add_argument("--words", type=int, default=CHAPTER_WORDS, help="Mean words per chapter")
+    parser.add_argument("--site", action="store_true", help="Also write pages for fixture_server.py --root <out_dir>/site")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    totals = generate(args.out_dir, args.chapters, args.words, args.site, args.seed)
+    print(f"Wrote {totals['volumes']} volumes, {totals['chapters']} chapters, {totals['words']:,} words "
+          f"({totals['bytes'] / 1e6:.1f} MB) to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
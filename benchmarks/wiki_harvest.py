@@ -0,0 +1,141 @@
+"""
+Benchmark for the scrape_wiki harvester against a synthetic MediaWiki stand-in.
+
+Builds a wiki from data/wiki/characters.json titles spread over a nested
+category tree (most pages only in subcategories), each with an infobox and a
+few redirects, serves it through fixture_server with a per-request latency,
+and compares:
+
+- legacy: the old approach, top-level category titles only, one request per
+  500 titles, then one request per page for its content
+- harvester: recursive walk, 50 titles per content request, N workers
+- resumed: the harvester stopped by API errors halfway, then rerun
+
+reporting API requests, wall time, pages found and whether the resumed output
+matches the uninterrupted one.
+
+Usage (from the repo root):
+    python -m benchmarks.wiki_harvest [--subcats 40] [--latency 0.02] [--workers 2]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+
+import requests
+
+import scrape_wiki
+from extract_entities import WIKI_DIR, load_json
+from fixture_server import FakeMediaWiki, serve
+
+
+def synthetic_wiki(titles, subcats, rng):
+    categories = {"Category:Characters": {"pages": [], "subcats": []}}
+    names = [f"Category:Group {i}" for i in range(subcats)]
+    for i, name in enumerate(names):
+        # Half hang off the top category, the rest nest one or two levels below
+        parent = "Category:Characters" if i < subcats // 2 else rng.choice(names[:i])
+        categories[name] = {"pages": [], "subcats": []}
+        categories[parent]["subcats"].append(name)
+    pages = {}
+    for title in titles:
+        home = "Category:Characters" if rng.random() < 0.2 else rng.choice(names)
+        categories[home]["pages"].append(title)
+        first = title.split()[0]
+        pages[title] = {
+            "content": f"{{{{Infobox Character\n| name = {title}\n| aliases = {first} the Bold<br>[[{first}]]\n}}}}\n"
+                       f"'''{title}''' is a character.",
+            "redirects": [first, title.upper()][:rng.randint(0, 2)],
+        }
+    return {"categories": categories, "pages": pages}
+
+
+def legacy_harvest(api_url, session):
+    """Titles of Category:Characters itself (no subcategories), then each page's content one by one."""
+    requests_made = 0
+    titles = []
+    params = {"action": "query", "list": "categorymembers", "cmtitle": "Category:Characters",
+              "cmlimit": "500", "cmtype": "page", "format": "json"}
+    while True:
+        data = session.get(api_url, params=params).json()
+        requests_made += 1
+        titles += [member["title"] for member in data["query"]["categorymembers"]]
+        if "continue" not in data:
+            break
+        params["cmcontinue"] = data["continue"]["cmcontinue"]
+    for title in titles:
+        session.get(api_url, params={"action": "query", "prop": "revisions", "rvprop": "content",
+                                     "titles": title, "format": "json"}).json()
+        requests_made += 1
+    return titles, requests_made
+
+
+def _outputs(data_dir):
+    return {name: load_json(os.path.join(data_dir, name))
+            for name in ("characters.json", scrape_wiki.ALIASES_FILENAME)}
+
+
+def run(subcats=40, latency=0.02, workers=2, seed=0):
+    titles = [c["title"] for c in load_json(os.path.join(WIKI_DIR, "characters.json"))]
+    if not titles:
+        print("Needs data/wiki/characters.json")
+        return
+    wiki = synthetic_wiki(titles, subcats, random.Random(seed))
+    server, base_url = serve(wiki=FakeMediaWiki(wiki))
+    server.api_latency = latency
+    api_url = base_url + "/api.php"
+    print(f"Synthetic wiki: {len(titles)} pages in {subcats + 1} categories, {latency * 1000:.0f} ms per request")
+
+    results = {}
+    try:
+        started = time.perf_counter()
+        found, count = legacy_harvest(api_url, requests.Session())
+        results["legacy"] = (count, time.perf_counter() - started, len(found))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            full_dir = os.path.join(tmp, "full")
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                stats = scrape_wiki.harvest(("characters",), api_url, full_dir, workers, min_interval=0)
+            results["harvester"] = (stats["requests"], time.perf_counter() - started, stats["members"]["characters"])
+
+            # Plain session (no retries) so the injected 503s fail fast
+            resumed_dir = os.path.join(tmp, "resumed")
+            server.fail_api_after = server.stats["api_requests"] + stats["requests"] // 2
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                try:
+                    scrape_wiki.harvest(("characters",), api_url, resumed_dir, workers, min_interval=0,
+                                        session=requests.Session())
+                except requests.HTTPError:
+                    pass
+                server.fail_api_after = None
+                resumed = scrape_wiki.harvest(("characters",), api_url, resumed_dir, workers, min_interval=0)
+            total = stats["requests"] // 2 + resumed["requests"]
+            results["resumed"] = (total, time.perf_counter() - started, resumed["members"]["characters"])
+            identical = _outputs(full_dir) == _outputs(resumed_dir)
+    finally:
+        server.shutdown()
+
+    print(f"{'run':<10} {'requests':>9} {'seconds':>8} {'pages':>6}")
+    for name, (count, elapsed, pages) in results.items():
+        print(f"{name:<10} {count:>9} {elapsed:>8.2f} {pages:>6}")
+    print(f"Resumed output identical to uninterrupted run: {identical}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subcats", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated seconds per API request")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.subcats, args.latency, args.workers, args.seed)
+
+
+if __name__ == "__main__":
+    main()
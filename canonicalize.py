@@ -0,0 +1,240 @@
+"""
+Canonicalization index: maps extracted names to canonical wiki titles.
+
+Built once from data/wiki/characters.json (and aliases.json, which
+scrape_wiki.py writes from redirects and infobox alias fields). Names are
+compared in lookup form (gazetteer.normalize_name: apostrophes/diacritics
+folded, qualifiers dropped, case-folded). Resolution tries, in order:
+
+    exact    full wiki title
+    alias    aliases.json entry ("The Necromancer" -> "Az'kerash")
+    token    a unique first/last name ("Pisces" -> "Pisces Jealnet")
+    prefix   a unique name token the input abbreviates ("Pisc" -> "Pisces Jealnet")
+    fuzzy    nearest key under edit distance via a symmetric-delete index (typos)
+
+and returns (canonical, method), or (None, "ambiguous" / "unresolved").
+When several titles match, the one the spotter has counted far more often in
+the corpus (mentions.jsonl, see entity_spotter.py) wins ("Pisc" -> Pisces
+Jealnet rather than Pisca). Results are memoized per lookup form.
+
+    python canonicalize.py "Pisc" "the necromancer" "Erin Soltice"
+"""
+import argparse
+import bisect
+import json
+import os
+from functools import lru_cache
+
+from chunk_chapters import PROCESSED_DIR
+from entity_spotter import COMMON_CAPITALIZED, MENTIONS_FILENAME
+from gazetteer import WIKI_DIR, load_aliases, load_wiki_titles, name_variants, normalize_name
+
+RESOLVE_CACHE_SIZE = 65536
+MIN_PREFIX_LEN = 4
+MAX_PREFIX_GAP = 3  # "Pisc" abbreviates "Pisces"; "Dragon" does not abbreviate "Dragonbane"
+STRIP_PREFIXES = ("the ",)
+POPULARITY_MARGIN = 5  # A tie is broken only if one title is this many times more frequent
+# Species and role words that surname tokens collide with ("Goblin Chieftain")
+COMMON_TOKENS = {word.casefold() for word in COMMON_CAPITALIZED}
+
+
+def lookup_form(name):
+    return normalize_name(name).casefold()
+
+
+def max_distance(key):
+    """Edit distance tolerated for a key of this length."""
+    if len(key) < 5:
+        return 0
+    return 1 if len(key) < 9 else 2
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance, or limit + 1 as soon as it must exceed `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        row_min = i
+        for j, cb in enumerate(b, 1):
+            cost = previous[j - 1] + (ca != cb)
+            cost = min(cost, previous[j] + 1, current[j - 1] + 1)
+            current.append(cost)
+            row_min = min(row_min, cost)
+        if row_min > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def mention_counts(processed_dir=PROCESSED_DIR):
+    """{canonical: mentions} summed over every spotted volume's mentions.jsonl."""
+    counts = {}
+    if not os.path.isdir(processed_dir):
+        return counts
+    for vol_name in sorted(os.listdir(processed_dir)):
+        path = os.path.join(processed_dir, vol_name, MENTIONS_FILENAME)
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for record in map(json.loads, f):
+                for mention in record["mentions"]:
+                    counts[mention["name"]] = counts.get(mention["name"], 0) + 1
+    return counts
+
+
+def deletes(word, depth):
+    """Every string reachable from `word` by deleting up to `depth` characters (including `word`)."""
+    found = {word}
+    frontier = {word}
+    for _ in range(depth):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        found |= frontier
+    return found
+
+
+class DeletionIndex:
+    """
+    Symmetric-delete index for approximate lookup (as in SymSpell).
+    Two strings within edit distance d share a string reachable from both by at
+    most d deletions, so a query only generates its own deletes and verifies
+    the few keys they point to, instead of scanning every key.
+    """
+
+    def __init__(self, words=(), depth=2):
+        self.depth = depth
+        self.index = {}
+        self.size = 0
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        self.size += 1
+        for variant in deletes(word, self.depth):
+            self.index.setdefault(variant, set()).add(word)
+
+    def search(self, word, limit):
+        """[(distance, key)] for keys within `limit` (<= depth) edits of `word`, nearest first."""
+        candidates = set()
+        for variant in deletes(word, min(limit, self.depth)):
+            candidates |= self.index.get(variant, set())
+        found = []
+        for key in candidates:
+            distance = edit_distance(word, key, limit)
+            if distance <= limit:
+                found.append((distance, key))
+        return sorted(found)
+
+
+class Canonicalizer:
+    """Precomputed name -> canonical wiki title index (see module docstring)."""
+
+    def __init__(self, titles, aliases=None, popularity=None):
+        self.popularity = popularity or {}
+        self.exact = {}    # lookup form -> canonicals
+        self.aliases = {}
+        self.tokens = {}   # single-token variant -> canonicals
+        for title in titles:
+            self.exact.setdefault(lookup_form(title), set()).add(title)
+            for variant in name_variants(title):
+                if " " not in variant and variant.casefold() not in COMMON_TOKENS:
+                    self.tokens.setdefault(variant.casefold(), set()).add(title)
+        titles = set(titles)
+        for canonical, names in (aliases or {}).items():
+            if canonical not in titles:
+                continue
+            for alias in names:
+                key = lookup_form(alias)
+                if key:
+                    self.aliases.setdefault(key, set()).add(canonical)
+
+        self.sorted_tokens = sorted(self.tokens)
+        self.fuzzy_keys = {}
+        for table in (self.exact, self.aliases, self.tokens):
+            for key, canonicals in table.items():
+                self.fuzzy_keys.setdefault(key, set()).update(canonicals)
+        self.tree = DeletionIndex(sorted(self.fuzzy_keys))
+        self._resolve = lru_cache(maxsize=RESOLVE_CACHE_SIZE)(self._resolve_uncached)
+
+    @classmethod
+    def from_wiki(cls, wiki_dir=WIKI_DIR, kinds=("characters",), processed_dir=PROCESSED_DIR):
+        titles = []
+        for kind in kinds:
+            titles.extend(load_wiki_titles(f"{kind}.json", wiki_dir))
+        return cls(titles, load_aliases(wiki_dir), mention_counts(processed_dir))
+
+    def _single(self, canonicals):
+        """The one canonical, or the clearly most mentioned of several, else None."""
+        if len(canonicals) == 1:
+            return next(iter(canonicals))
+        ranked = sorted(canonicals, key=lambda name: -self.popularity.get(name, 0))
+        first, second = (self.popularity.get(name, 0) for name in ranked[:2])
+        return ranked[0] if first and first >= POPULARITY_MARGIN * second else None
+
+    def _lookup(self, key):
+        """Exact/alias/token/prefix resolution of one lookup form. Returns (canonicals, method) or None."""
+        for table, method in ((self.exact, "exact"), (self.aliases, "alias"), (self.tokens, "token")):
+            if key in table:
+                return table[key], method
+        if " " not in key and len(key) >= MIN_PREFIX_LEN:
+            start = bisect.bisect_left(self.sorted_tokens, key)
+            found = set()
+            for token in self.sorted_tokens[start:]:
+                if not token.startswith(key):
+                    break
+                if len(token) - len(key) <= MAX_PREFIX_GAP:
+                    found |= self.tokens[token]
+            if found:
+                return found, "prefix"
+        return None
+
+    def _resolve_uncached(self, key):
+        if not key:
+            return None, "unresolved"
+        candidates = [key] + [key[len(p):] for p in STRIP_PREFIXES if key.startswith(p)]
+        for candidate in candidates:
+            hit = self._lookup(candidate)
+            if hit:
+                canonicals, method = hit
+                single = self._single(canonicals)
+                return (single, method) if single else (None, "ambiguous")
+
+        limit = max_distance(key)
+        if limit:
+            matches = self.tree.search(key, limit)
+            if matches:
+                best = matches[0][0]
+                canonicals = set()
+                for distance, match in matches:
+                    # A plural of a name ("Goblins") is a group, not that person
+                    if distance == best and key not in (match + "s", match + "es"):
+                        canonicals |= self.fuzzy_keys[match]
+                if canonicals:
+                    single = self._single(canonicals)
+                    return (single, "fuzzy") if single else (None, "ambiguous")
+        return None, "unresolved"
+
+    def resolve(self, name):
+        """(canonical title or None, method) for an extracted name."""
+        return self._resolve(lookup_form(name))
+
+    def canonical(self, name):
+        return self.resolve(name)[0]
+
+    def cache_info(self):
+        return self._resolve.cache_info()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resolve names to canonical wiki titles.")
+    parser.add_argument("names", nargs="+")
+    args = parser.parse_args()
+    canonicalizer = Canonicalizer.from_wiki()
+    for name in args.names:
+        canonical, method = canonicalizer.resolve(name)
+        print(f"{name!r:<30} -> {canonical or '-':<30} ({method})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Rolling per-chapter entity state for extraction prompts.
+
+Scenes of a chapter keep coming back to the same people, so a chunk sent in
+isolation makes the model work out again who "she" or "the [Innkeeper]" is.
+ChapterState keeps, per chapter, what the chapter's earlier chunks resolved:
+each character and location with its type, how many chunks named it, how long
+ago, and its latest context note ("mentioned as The Necromancer"). A prompt
+gets a bounded slice of that, ranked by relevance to its chunk (named in the
+text, seen recently, seen often): the entities the chunk names, plus the few
+characters of the last chunks it may refer to without naming them. The slice
+is the prompt's roster: the wiki candidates it does not cover are added to it.
+
+The state is a fold over the volume's result log (checkpoint_store.ResultLog):
+a resumed run rebuilds it from the records already on disk, without API calls.
+A chunk only sees records of chunks before it in its chapter, whatever order
+they were extracted in, so a retried chunk gets the same context as before.
+"""
+import math
+
+from gazetteer import TOKEN_RE, fold_text
+
+STATE_MAX_ENTRIES = 15     # Entities per prompt slice
+STATE_MAX_UNNAMED = 4      # Of which not named in the chunk (recent characters, for pronouns and titles)
+STATE_RECENT_CHUNKS = 2    # How far back an unnamed character still counts as recent
+STATE_CONTEXT_CHARS = 60   # Context note kept per entity
+MIN_NAME_TOKEN = 3         # Shorter name tokens do not count as "named in the chunk"
+
+
+def chunk_position(chunk):
+    """(scene_index, sub_chunk_index) of a chunk or record within its chapter, from its "order_scene_sub" id."""
+    parts = str(chunk["chunk_id"]).split("_")
+    try:
+        return int(parts[1]), int(parts[2])
+    except (IndexError, ValueError):
+        return chunk.get("scene_index", 0), chunk.get("sub_chunk_index", 0)
+
+
+def text_tokens(text):
+    return set(TOKEN_RE.findall(fold_text(text)))
+
+
+class ChapterState:
+    """Resolved entities per chapter of one volume, folded from extraction records."""
+
+    def __init__(self):
+        self.chapters = {}  # chapter_order -> {position: extraction}
+
+    @classmethod
+    def from_records(cls, records):
+        state = cls()
+        for record in records:
+            state.add(record)
+        return state
+
+    def add(self, record):
+        """Adds (or replaces) one chunk's record; error records are ignored."""
+        extraction = record.get("extraction") or {}
+        if "error" in extraction:
+            return
+        self.chapters.setdefault(record["chapter_order"], {})[chunk_position(record)] = extraction
+
+    def entities_before(self, chapter_order, position):
+        """{name: entry} resolved by the chapter's chunks before `position`."""
+        earlier = sorted(item for item in self.chapters.get(chapter_order, {}).items() if item[0] < position)
+        entities = {}
+        for seen, (_, extraction) in enumerate(earlier):
+            for kind in ("characters", "locations"):
+                for entity in extraction.get(kind) or []:
+                    name = entity.get("name") if isinstance(entity, dict) else None
+                    if not name:
+                        continue
+                    entry = entities.setdefault(name, {"name": name, "kind": kind[:-1], "type": None,
+                                                       "chunks": 0, "context": None})
+                    entry["chunks"] += 1
+                    entry["age"] = len(earlier) - 1 - seen  # Chunks since it was last named
+                    entry["type"] = entity.get("type") or entry["type"]
+                    if entity.get("context"):
+                        entry["context"] = str(entity["context"])[:STATE_CONTEXT_CHARS]
+        return entities
+
+    def slice(self, chunks, max_entries=STATE_MAX_ENTRIES):
+        """
+        The entities resolved before the first of `chunks` (consecutive chunks of one
+        chapter), most relevant to their text first, at most `max_entries`.
+        """
+        first = chunks[0]
+        entities = self.entities_before(first["chapter_order"], chunk_position(first))
+        if not entities:
+            return []
+        tokens = set().union(*(text_tokens(chunk["text"]) for chunk in chunks))
+
+        def named(entry):
+            return any(len(token) >= MIN_NAME_TOKEN and token in tokens
+                       for token in TOKEN_RE.findall(fold_text(entry["name"])))
+
+        def score(entry):
+            return 4.0 * entry["named"] + 2.0 / (1 + entry["age"]) + math.log1p(entry["chunks"])
+
+        relevant = []
+        for entry in entities.values():
+            entry["named"] = named(entry)
+            # Unnamed characters from the previous chunks may still be "she"; the rest is noise
+            if entry["named"] or (entry["kind"] == "character" and entry["age"] < STATE_RECENT_CHUNKS):
+                relevant.append(entry)
+        ranked = sorted(relevant, key=lambda entry: (-score(entry), entry["name"]))
+        unnamed = [entry for entry in ranked if not entry["named"]][STATE_MAX_UNNAMED:]
+        return [entry for entry in ranked if entry not in unnamed][:max_entries]
+
+
+def entry_label(entry, note=False):
+    """'Erin Solstice', 'Liscor (location)'; with `note`, 'Lyonette (x3, runs the inn)'."""
+    parts = []
+    if entry["kind"] != "character" or entry["type"] not in (None, "known"):
+        parts.append(f"{entry['type']} {entry['kind']}" if entry["type"] else entry["kind"])
+    if note:
+        parts.append(f"x{entry['chunks']}")
+        if entry["context"]:
+            parts.append(entry["context"])
+    return f"{entry['name']} ({', '.join(parts)})" if parts else entry["name"]
+
+
+def render_slice(entries, candidates=()):
+    """
+    The prompt roster for a state slice: the entries the chunk names and the wiki
+    `candidates` not among them on one line, then the chapter's recent characters
+    the chunk does not name, with how often they came up and their latest context.
+    """
+    in_slice = {entry["name"] for entry in entries}
+    named = [entry_label(entry) for entry in entries if entry.get("named")]
+    named += [name for name in candidates if name not in in_slice]
+    text = ", ".join(named) if named else "(none matched)"
+    unnamed = [entry_label(entry, note=True) for entry in entries if not entry.get("named")]
+    if unnamed:
+        text += ('\n    Not named here but in the last scenes (use these names for "she", "the [Innkeeper]", etc.): '
+                 + "; ".join(unnamed))
+    return text
@@ -0,0 +1,312 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+
+OUTPUT_DIR = "data/processed"
+LOG_FILENAME = "extracted_entities.jsonl"
+INDEX_FILENAME = "extracted_entities.done"
+EXPORT_FILENAME = "extracted_entities.json"
+
+
+def text_sha256(text):
+    """Hash of a chunk's text, kept in its record so re-chunked text is noticed on resume."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def truncate_torn_tail(path, validate_json=False):
+    """
+    Drops a partially written last line of an append-only file (crash mid-append).
+    A line only counts once its trailing newline is on disk; with `validate_json`
+    a complete but unparseable last line is dropped as well.
+    Returns the number of bytes removed.
+    """
+    if not os.path.exists(path):
+        return 0
+
+    size = os.path.getsize(path)
+    if size == 0:
+        return 0
+
+    with open(path, "rb+") as f:
+        # Scan backwards in blocks for the last newline
+        keep = 0
+        pos = size
+        block = 65536
+        while pos > 0:
+            start = max(0, pos - block)
+            f.seek(start)
+            data = f.read(pos - start)
+            idx = data.rfind(b"\n")
+            if idx != -1:
+                keep = start + idx + 1
+                break
+            pos = start
+
+        if validate_json and keep > 0:
+            # Find the start of the last complete line and make sure it parses
+            prev = 0
+            pos = keep - 1
+            while pos > 0:
+                start = max(0, pos - block)
+                f.seek(start)
+                data = f.read(pos - start)
+                idx = data.rfind(b"\n")
+                if idx != -1:
+                    prev = start + idx + 1
+                    break
+                pos = start
+            f.seek(prev)
+            try:
+                json.loads(f.read(keep - prev))
+            except ValueError:
+                keep = prev
+
+        if keep < size:
+            f.truncate(keep)
+            f.flush()
+            os.fsync(f.fileno())
+    return size - keep
+
+
+class ResultLog:
+    """
+    Append-only, fsync-safe JSONL log of extraction records for one volume.
+
+    Each record is written as one line to `extracted_entities.jsonl`; once the line
+    is durable its chunk_id, the record's `text_sha256` and whether it is an error
+    record ("chunk_id\tsha\tok|error") are appended to the `extracted_entities.done`
+    sidecar, so startup only reads the small index. Records present in the log but missing
+    from the index (crash between the two writes) are simply redone; export keeps
+    the last record per chunk_id.
+    """
+
+    def __init__(self, volume_dir, fsync=True):
+        self.volume_dir = volume_dir
+        self.log_path = os.path.join(volume_dir, LOG_FILENAME)
+        self.index_path = os.path.join(volume_dir, INDEX_FILENAME)
+        self.export_path = os.path.join(volume_dir, EXPORT_FILENAME)
+        self.fsync = fsync
+        self.lock = threading.Lock()
+        self._log = None
+        self._index = None
+        self._done = None
+        self._errors = None
+
+    @classmethod
+    def for_volume(cls, volume_name, output_dir=OUTPUT_DIR, fsync=True):
+        return cls(os.path.join(output_dir, volume_name), fsync=fsync)
+
+    # --- Lifecycle ---
+
+    def open(self):
+        """Recovers torn tails, migrates a legacy JSON export if needed and opens for appending."""
+        os.makedirs(self.volume_dir, exist_ok=True)
+
+        if not os.path.exists(self.log_path) and os.path.exists(self.export_path):
+            self._import_export()
+
+        dropped = truncate_torn_tail(self.log_path, validate_json=True)
+        if dropped:
+            print(f"  [RECOVER] Dropped {dropped} bytes of torn record from {self.log_path}")
+        truncate_torn_tail(self.index_path)
+
+        if os.path.exists(self.log_path) and not os.path.exists(self.index_path):
+            self.rebuild_index()
+
+        self._done, self._errors, legacy = self._read_index()
+        if legacy:
+            # Written before the index kept each record's status: one pass over the log adds it
+            self.rebuild_index()
+            print(f"  [MIGRATE] Rebuilt {self.index_path} with record status")
+        self._log = open(self.log_path, "ab")
+        self._index = open(self.index_path, "ab")
+        return self
+
+    def close(self):
+        for handle in (self._log, self._index):
+            if handle:
+                handle.close()
+        self._log = self._index = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- Reads ---
+
+    def _read_index(self):
+        """
+        ({chunk_id: text sha256, or None for records written without one}, error chunk_ids,
+        whether some line has no status field); the last line per id wins.
+        """
+        done = {}
+        errors = set()
+        legacy = False
+        if not os.path.exists(self.index_path):
+            return done, errors, legacy
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    chunk_id, sha, status = (line.rstrip("\n").split("\t") + ["", ""])[:3]
+                    done[chunk_id] = sha or None
+                    legacy = legacy or not status
+                    if status == "error":
+                        errors.add(chunk_id)
+                    else:
+                        errors.discard(chunk_id)
+        return done, errors, legacy
+
+    def _load_index(self):
+        if self._done is None:
+            truncate_torn_tail(self.index_path)
+            self._done, self._errors, _ = self._read_index()
+
+    def processed_ids(self):
+        """Set of chunk_ids with a durable record."""
+        return set(self.processed_hashes())
+
+    def processed_hashes(self):
+        """{chunk_id: text sha256 of its latest durable record (None if not recorded)}."""
+        self._load_index()
+        return dict(self._done)
+
+    def error_ids(self):
+        """chunk_ids whose latest record is an extraction error (e.g. an old unparseable reply), from the index."""
+        self._load_index()
+        return set(self._errors)
+
+    def records(self):
+        """Yields every record in the log in append order (including superseded ones)."""
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def latest_records(self):
+        """Last record per chunk_id, in first-seen order."""
+        latest = {}
+        for record in self.records():
+            latest[record["chunk_id"]] = record
+        return list(latest.values())
+
+    # --- Writes ---
+
+    def append(self, record):
+        """Durably appends one record, then marks its chunk_id done."""
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self.lock:
+            self._log.write(line)
+            self._log.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+
+            self._index.write((_index_line(record) + "\n").encode("utf-8"))
+            self._index.flush()
+            if self.fsync:
+                os.fsync(self._index.fileno())
+            self._done[record["chunk_id"]] = record.get("text_sha256")
+            if _is_error(record):
+                self._errors.add(record["chunk_id"])
+            else:
+                self._errors.discard(record["chunk_id"])
+
+    def rebuild_index(self):
+        """Regenerates the sidecar index from the log."""
+        records = self.latest_records()
+        _atomic_write_lines(self.index_path, [_index_line(r) for r in records])
+        self._done = {r["chunk_id"]: r.get("text_sha256") for r in records}
+        self._errors = {r["chunk_id"] for r in records if _is_error(r)}
+
+    def _import_export(self):
+        """One-time migration from a legacy extracted_entities.json list."""
+        with open(self.export_path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        _atomic_write_lines(self.log_path, [json.dumps(r, ensure_ascii=False) for r in records])
+        _atomic_write_lines(self.index_path, [_index_line(r) for r in records])
+        print(f"  [MIGRATE] Imported {len(records)} records from {self.export_path}")
+
+    # --- Compaction / export ---
+
+    def compact(self):
+        """Rewrites the log with one record per chunk_id and rebuilds the index."""
+        records = self.latest_records()
+        reopen = self._log is not None
+        self.close()
+        _atomic_write_lines(self.log_path, [json.dumps(r, ensure_ascii=False) for r in records])
+        _atomic_write_lines(self.index_path, [_index_line(r) for r in records])
+        self._done = {r["chunk_id"]: r.get("text_sha256") for r in records}
+        self._errors = {r["chunk_id"] for r in records if _is_error(r)}
+        if reopen:
+            self.open()
+        return len(records)
+
+    def export_json(self, output_path=None, order=None):
+        """
+        Writes the downstream `extracted_entities.json` (indented list, one record per chunk).
+        `order` maps chunk_id -> position; records default to chapter/scene order.
+        """
+        output_path = output_path or self.export_path
+        records = self.latest_records()
+        if order is not None:
+            records.sort(key=lambda r: order.get(r["chunk_id"], len(order)))
+        else:
+            records.sort(key=_chunk_sort_key)
+
+        tmp_path = output_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(records, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, output_path)
+        return len(records)
+
+
+def _is_error(record):
+    return "error" in (record.get("extraction") or {})
+
+
+def _index_line(record):
+    status = "error" if _is_error(record) else "ok"
+    return f"{record['chunk_id']}\t{record.get('text_sha256') or ''}\t{status}"
+
+
+def _chunk_sort_key(record):
+    try:
+        return tuple(int(part) for part in record["chunk_id"].split("_"))
+    except ValueError:
+        return (float("inf"), record["chunk_id"])
+
+
+def _atomic_write_lines(path, lines):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(line + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ("export", "compact"):
+        print("Usage: python checkpoint_store.py export|compact Vol_XX [Vol_YY ...]")
+        return
+
+    command = sys.argv[1]
+    for volume_name in sys.argv[2:]:
+        with ResultLog.for_volume(volume_name) as store:
+            if command == "compact":
+                count = store.compact()
+                print(f"Compacted {volume_name}: {count} records")
+            count = store.export_json()
+            print(f"Exported {count} records to {store.export_path}")
+
+
+if __name__ == "__main__":
+    main()
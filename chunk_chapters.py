@@ -1,13 +1,42 @@
+import argparse
+import hashlib
 import json
 import os
 import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from corpus_store import CORPUS_VERSION, load_corpus_meta, write_chunks_json, write_corpus
+from metrics import RUN, add_arguments
+from segmenter import pack_chapter, segment_chapter
+from token_count import calibrate, get_counter
 
 # Configuration
 RAW_DIR = "data/raw"
 PROCESSED_DIR = "data/processed"
-MAX_TOKENS_PER_CHUNK = 4000  # Rough estimate (~4 chars per token)
-CHARS_PER_TOKEN = 4
+MAX_TOKENS_PER_CHUNK = 4000  # Token budget per chunk
+CHARS_PER_TOKEN = 4          # Legacy "chars" sizing only
 MAX_CHARS = MAX_TOKENS_PER_CHUNK * CHARS_PER_TOKEN
+TOKENIZER = "auto"           # See token_count.get_counter; "chars" reproduces the old len // 4 sizing
+OVERLAP_TOKENS = 0           # Trailing paragraphs repeated at the start of the next sub-chunk
+
+CHUNKS_FILENAME = "chunks.jsonl"
+LEGACY_CHUNKS_FILENAME = "chunks.json"
+SHARD_DIR = "chunks"  # Per-chapter JSONL shards, concatenated into chunks.jsonl
+MANIFEST_FILENAME = "chunk_manifest.json"
+DUPLICATES_FILENAMES = {"chapters": "duplicate_chapters.json", "scenes": "duplicate_scenes.json"}  # dedup.py
+
+_COUNTERS = {}  # Per-process counter cache (keeps paragraph memo warm across chapters)
+
+def chunker_config(tokenizer, overlap_tokens):
+    """Anything that changes chunk output; a mismatch invalidates every chapter of a volume."""
+    return {"version": 2, "max_tokens": MAX_TOKENS_PER_CHUNK, "tokenizer": tokenizer, "overlap_tokens": overlap_tokens}
+
+def counter_for(tokenizer):
+    if tokenizer not in _COUNTERS:
+        _COUNTERS[tokenizer] = get_counter(tokenizer)
+    return _COUNTERS[tokenizer]
 
 def load_chapter(filepath):
     """Loads raw text from a chapter file."""
@@ -17,6 +46,8 @@ def load_chapter(filepath):
 def split_into_scenes(text):
     """
     Splits text into scenes based on TWI conventions.
+    Reference implementation; the chunker uses segmenter.scene_spans, which must
+    produce the same scenes (see benchmarks/scene_splitter.py).
     Separators: 
     - <hr> (if HTML was kept, but we have raw text)
     - *** or * * *
@@ -59,6 +90,7 @@ def chunk_text(text, max_chars=MAX_CHARS):
     """
     Further splits a long text (scene) into smaller chunks if it exceeds limits.
     Splits by paragraphs.
+    Reference implementation; the chunker uses segmenter.chunk_spans.
     """
     if len(text) <= max_chars:
         return [text]
@@ -94,77 +126,359 @@ def chunk_text(text, max_chars=MAX_CHARS):
         
     return chunks
 
-def process_volume(vol_name):
+def chapter_spans(raw_text, counter=None, overlap_tokens=0):
+    """
+    Yields (scene_index, sub_chunk_index, start, end, tokens) for one chapter.
+    The legacy "chars" counter without overlap keeps the exact old MAX_CHARS packing.
+    """
+    if counter is None or (counter.name == "chars" and not overlap_tokens):
+        for scene_idx, sub_idx, start, end in segment_chapter(raw_text, MAX_CHARS):
+            yield scene_idx, sub_idx, start, end, (end - start) // CHARS_PER_TOKEN
+    else:
+        yield from pack_chapter(raw_text, counter.count, MAX_TOKENS_PER_CHUNK, overlap_tokens)
+
+def build_chapter_chunks(raw_text, chapter_meta, counter=None, overlap_tokens=0):
+    """Yields the chunk records for one chapter."""
+    # Scenes, then paragraph-packed chunks, as (start, end) spans into the chapter text
+    for scene_idx, sub_idx, start, end, tokens in chapter_spans(raw_text, counter, overlap_tokens):
+        chunk_content = raw_text[start:end]
+        yield {
+            "chunk_id": f"{chapter_meta['order']}_{scene_idx}_{sub_idx}",
+            "chapter_order": chapter_meta["order"],
+            "chapter_title": chapter_meta["title"],
+            "scene_index": scene_idx,
+            "sub_chunk_index": sub_idx,
+            "text": chunk_content,
+            "token_estimate": tokens
+        }
+
+def chunk_chapter_to_shard(filepath, chapter_meta, shard_path, tokenizer="chars", overlap_tokens=0):
+    """
+    Process-pool worker: chunks one chapter and streams its records to a JSONL shard.
+    `tokenizer` is a resolved token_count spec. Returns (filename, chunk_count, seconds).
+    """
+    started = time.perf_counter()
+    raw_text = load_chapter(filepath)
+    counter = counter_for(tokenizer)
+    count = 0
+    tmp_path = shard_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for chunk in build_chapter_chunks(raw_text, chapter_meta, counter, overlap_tokens):
+            f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+            count += 1
+    os.replace(tmp_path, shard_path)
+    return chapter_meta["filename"], count, time.perf_counter() - started
+
+# --- Manifest / incremental planning ---
+
+def file_sha256(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def shard_path_for(processed_vol_dir, chapter_meta):
+    return os.path.join(processed_vol_dir, SHARD_DIR, f"{chapter_meta['order']:04d}.jsonl")
+
+def load_manifest(processed_vol_dir):
+    path = os.path.join(processed_vol_dir, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return {"config": None, "chapters": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def load_duplicates(processed_vol_dir, kind):
+    """A volume's dedup.py results for "chapters" ({filename: {...}}) or "scenes" ({chunk_id: {...}})."""
+    path = os.path.join(processed_vol_dir, DUPLICATES_FILENAMES[kind])
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(processed_vol_dir, manifest):
+    path = os.path.join(processed_vol_dir, MANIFEST_FILENAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def plan_volume(vol_name, config, force=False, skip_duplicates=True):
+    """
+    Works out which chapters of a volume need re-chunking.
+    A chapter is fresh when its order/title and chunker config are unchanged, its
+    shard exists, and its raw file has the same mtime+size (or, if only the mtime
+    moved, the same sha256). With `skip_duplicates`, chapters dedup.py found to
+    duplicate another volume's are left out. Returns None if the volume has no index.
+    """
     vol_path = os.path.join(RAW_DIR, vol_name)
     index_path = os.path.join(vol_path, "index.json")
-    
     if not os.path.exists(index_path):
         print(f"No index.json found for {vol_name}. Skipping.")
-        return
+        return None
 
-    print(f"Processing {vol_name}...")
-    
-    # Load index
     with open(index_path, "r", encoding="utf-8") as f:
         chapter_index = json.load(f)
-        
+
     processed_vol_dir = os.path.join(PROCESSED_DIR, vol_name)
-    os.makedirs(processed_vol_dir, exist_ok=True)
-    
-    all_chunks = []
-    
+    manifest = load_manifest(processed_vol_dir)
+    if manifest.get("config") != config:
+        force = True
+    old_entries = manifest.get("chapters", {})
+    duplicates = load_duplicates(processed_vol_dir, "chapters") if skip_duplicates else {}
+
+    chapters = []
+    skipped = []
+    stale = []
+    entries = {}
     for chapter_meta in chapter_index:
         filename = chapter_meta.get("filename")
         if not filename: continue
-        
+
         filepath = os.path.join(vol_path, filename)
         if not os.path.exists(filepath):
             print(f"  [WARN] File not found: {filename}")
             continue
-            
-        raw_text = load_chapter(filepath)
-        
-        # 1. Split into Scenes
-        scenes = split_into_scenes(raw_text)
-        
-        # 2. Chunk Scenes if too large
-        chapter_chunks = []
-        for scene_idx, scene_text in enumerate(scenes):
-            sub_chunks = chunk_text(scene_text)
-            
-            for sub_idx, chunk_content in enumerate(sub_chunks):
-                chunk_id = f"{chapter_meta['order']}_{scene_idx}_{sub_idx}"
-                
-                chunk_data = {
-                    "chunk_id": chunk_id,
-                    "chapter_order": chapter_meta["order"],
-                    "chapter_title": chapter_meta["title"],
-                    "scene_index": scene_idx,
-                    "sub_chunk_index": sub_idx,
-                    "text": chunk_content,
-                    "token_estimate": len(chunk_content) // CHARS_PER_TOKEN
-                }
-                chapter_chunks.append(chunk_data)
-                all_chunks.append(chunk_data)
-        
-        print(f"  Processed {chapter_meta['title']}: {len(chapter_chunks)} chunks")
+        if filename in duplicates:
+            skipped.append(filename)
+            continue
 
-    # Save all chunks for this volume
-    output_path = os.path.join(processed_vol_dir, "chunks.json")
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(all_chunks, f, indent=2, ensure_ascii=False)
-        
-    print(f"Saved {len(all_chunks)} chunks to {output_path}")
+        stat = os.stat(filepath)
+        entry = {
+            "order": chapter_meta["order"],
+            "title": chapter_meta["title"],
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+        }
+        old = old_entries.get(filename)
+        fresh = (
+            not force and old is not None
+            and old["order"] == entry["order"] and old["title"] == entry["title"]
+            and old["size"] == entry["size"]
+            and os.path.exists(shard_path_for(processed_vol_dir, chapter_meta))
+        )
+        if fresh and old["mtime"] != entry["mtime"]:
+            entry["sha256"] = file_sha256(filepath)
+            fresh = entry["sha256"] == old.get("sha256")
+        if fresh:
+            entry["sha256"] = old.get("sha256")
+            entry["chunks"] = old.get("chunks")
+        else:
+            entry["sha256"] = entry.get("sha256") or file_sha256(filepath)
+            stale.append((filepath, chapter_meta))
+
+        entries[filename] = entry
+        chapters.append(chapter_meta)
+
+    up_to_date = (
+        not stale and set(entries) == set(old_entries)
+        and os.path.exists(os.path.join(processed_vol_dir, CHUNKS_FILENAME))
+    )
+    return {
+        "vol_name": vol_name,
+        "processed_vol_dir": processed_vol_dir,
+        "chapters": chapters,
+        "stale": stale,
+        "up_to_date": up_to_date,
+        "skipped": skipped,
+        "manifest": {"config": config, "chapters": entries},
+    }
+
+def assemble_volume(plan):
+    """Concatenates chapter shards in index order into chunks.jsonl and drops orphan shards."""
+    processed_vol_dir = plan["processed_vol_dir"]
+    output_path = os.path.join(processed_vol_dir, CHUNKS_FILENAME)
+    tmp_path = output_path + ".tmp"
+    wanted = set()
+    with RUN.stage("assemble") as add, open(tmp_path, "wb") as out:
+        for chapter_meta in plan["chapters"]:
+            shard_path = shard_path_for(processed_vol_dir, chapter_meta)
+            wanted.add(os.path.basename(shard_path))
+            with open(shard_path, "rb") as shard:
+                shutil.copyfileobj(shard, out)
+        add(items=len(plan["chapters"]), nbytes=out.tell())
+    os.replace(tmp_path, output_path)
+
+    shard_dir = os.path.join(processed_vol_dir, SHARD_DIR)
+    for name in os.listdir(shard_dir):
+        if name not in wanted:
+            os.remove(os.path.join(shard_dir, name))
+
+    save_manifest(processed_vol_dir, plan["manifest"])
+    total = sum(entry["chunks"] or 0 for entry in plan["manifest"]["chapters"].values())
+    print(f"Saved {total} chunks to {output_path}")
+
+def process_volumes(vol_names, workers=None, force=False, export_json=False,
+                    tokenizer=TOKENIZER, overlap_tokens=OVERLAP_TOKENS, skip_duplicates=True):
+    """
+    Chunks several volumes on one process pool.
+    Only stale chapters are re-chunked; each volume is assembled as soon as its
+    last chapter finishes. Duplicate chapters (dedup.py) are skipped unless
+    `skip_duplicates` is False.
+    """
+    # Resolve "auto" etc. once so every worker uses the same counter
+    tokenizer = counter_for(tokenizer).name
+    config = chunker_config(tokenizer, overlap_tokens)
+    print(f"Token counter: {tokenizer}, budget {MAX_TOKENS_PER_CHUNK} tokens, overlap {overlap_tokens}")
+
+    plans = {}
+    for vol_name in vol_names:
+        with RUN.stage("plan") as add:
+            plan = plan_volume(vol_name, config, force=force, skip_duplicates=skip_duplicates)
+            if plan is not None:
+                add(items=len(plan["chapters"]))
+        if plan is None:
+            continue
+        os.makedirs(os.path.join(plan["processed_vol_dir"], SHARD_DIR), exist_ok=True)
+        fresh = len(plan["chapters"]) - len(plan["stale"])
+        print(f"Processing {vol_name}: {len(plan['stale'])} chapters to chunk, {fresh} unchanged"
+              + (f", {len(plan['skipped'])} duplicates skipped" if plan["skipped"] else ""))
+        plans[vol_name] = plan
+
+    remaining = {vol_name: len(plan["stale"]) for vol_name, plan in plans.items()}
+    for vol_name, plan in plans.items():
+        if remaining[vol_name] == 0:
+            finish_volume(plan, export_json)
+
+    # Wall time of the parallel phase (including volumes assembled as they finish);
+    # per-chapter worker time goes to the chunk.chapter histogram
+    with RUN.stage("chunk") as add, ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for vol_name, plan in plans.items():
+            for filepath, chapter_meta in plan["stale"]:
+                shard_path = shard_path_for(plan["processed_vol_dir"], chapter_meta)
+                future = pool.submit(chunk_chapter_to_shard, filepath, chapter_meta, shard_path,
+                                     tokenizer, overlap_tokens)
+                futures[future] = (vol_name, chapter_meta)
+
+        for future in as_completed(futures):
+            vol_name, chapter_meta = futures[future]
+            plan = plans[vol_name]
+            filename, count, seconds = future.result()
+            plan["manifest"]["chapters"][filename]["chunks"] = count
+            add(items=1, nbytes=plan["manifest"]["chapters"][filename]["size"])
+            RUN.observe("chunk.chapter", seconds)
+            RUN.count("chunks", count)
+            print(f"  Processed {vol_name} {chapter_meta['title']}: {count} chunks")
+
+            remaining[vol_name] -= 1
+            if remaining[vol_name] == 0:
+                finish_volume(plan, export_json)
+
+def finish_volume(plan, export_json=False):
+    if plan["up_to_date"]:
+        print(f"{plan['vol_name']} is up to date.")
+    else:
+        assemble_volume(plan)
+    with RUN.stage("corpus"):
+        sync_corpus(plan["vol_name"])
+    if export_json:
+        with RUN.stage("export_json"):
+            export_chunks_json(plan["vol_name"])
+
+def process_volume(vol_name, workers=None, force=False, export_json=False,
+                   tokenizer=TOKENIZER, overlap_tokens=OVERLAP_TOKENS, skip_duplicates=True):
+    process_volumes([vol_name], workers=workers, force=force, export_json=export_json,
+                    tokenizer=tokenizer, overlap_tokens=overlap_tokens, skip_duplicates=skip_duplicates)
+
+# --- Reading chunk output ---
+
+def iter_chunks(vol_name, processed_dir=None):
+    """Yields a volume's chunk records, streaming chunks.jsonl (falls back to a legacy chunks.json)."""
+    vol_dir = os.path.join(processed_dir or PROCESSED_DIR, vol_name)
+    jsonl_path = os.path.join(vol_dir, CHUNKS_FILENAME)
+    if os.path.exists(jsonl_path):
+        with open(jsonl_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+
+    legacy_path = os.path.join(vol_dir, LEGACY_CHUNKS_FILENAME)
+    if os.path.exists(legacy_path):
+        with open(legacy_path, "r", encoding="utf-8") as f:
+            yield from json.load(f)
+
+def load_chunks(vol_name, processed_dir=None):
+    return list(iter_chunks(vol_name, processed_dir))
+
+def chunks_path(vol_name, processed_dir=None):
+    """Path of a volume's chunks file (chunks.jsonl, else the legacy chunks.json), or None."""
+    vol_dir = os.path.join(processed_dir or PROCESSED_DIR, vol_name)
+    for name in (CHUNKS_FILENAME, LEGACY_CHUNKS_FILENAME):
+        path = os.path.join(vol_dir, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+def has_chunks(vol_name, processed_dir=None):
+    vol_dir = os.path.join(processed_dir or PROCESSED_DIR, vol_name)
+    return any(os.path.exists(os.path.join(vol_dir, name)) for name in (CHUNKS_FILENAME, LEGACY_CHUNKS_FILENAME))
+
+def export_chunks_json(vol_name):
+    """Writes the legacy indented chunks.json from chunks.jsonl, one record at a time."""
+    vol_dir = os.path.join(PROCESSED_DIR, vol_name)
+    output_path = os.path.join(vol_dir, LEGACY_CHUNKS_FILENAME)
+    count = write_chunks_json(iter_chunks(vol_name), output_path)
+    print(f"Exported {count} chunks to {output_path}")
+
+def sync_corpus(vol_name, processed_dir=None, force=False):
+    """Rebuilds the volume's columnar corpus store if its chunks file changed since the last build."""
+    source_path = chunks_path(vol_name, processed_dir)
+    if source_path is None:
+        return None
+    stat = os.stat(source_path)
+    source = {"file": os.path.basename(source_path), "size": stat.st_size, "mtime": stat.st_mtime}
+    meta = load_corpus_meta(vol_name, processed_dir)
+    if not force and meta and meta.get("version") == CORPUS_VERSION and meta.get("source") == source:
+        return "fresh"
+    count = write_corpus(vol_name, iter_chunks(vol_name, processed_dir), source, processed_dir)
+    print(f"Wrote corpus store for {vol_name} ({count} chunks)")
+    return "built"
+
+def list_volumes():
+    return [
+        item for item in sorted(os.listdir(RAW_DIR))
+        if item.startswith("Vol_") and os.path.isdir(os.path.join(RAW_DIR, item))
+    ]
 
 def main():
+    parser = argparse.ArgumentParser(description="Chunk raw chapters into scenes (incremental, parallel).")
+    parser.add_argument("volumes", nargs="*", help="Volumes to chunk (default: all)")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Re-chunk every chapter")
+    parser.add_argument("--export-json", action="store_true", help="Also write the legacy chunks.json")
+    parser.add_argument("--tokenizer", default=TOKENIZER,
+                        help="auto | tiktoken | regex | calibrated | chars (legacy len // 4)")
+    parser.add_argument("--overlap", type=int, default=OVERLAP_TOKENS, help="Overlap tokens between sub-chunks")
+    parser.add_argument("--keep-duplicates", action="store_true", help="Also chunk chapters dedup.py flagged")
+    parser.add_argument("--calibrate", action="store_true",
+                        help="Fit chars-per-token on the raw corpus against the best local tokenizer and exit")
+    add_arguments(parser)
+    args = parser.parse_args()
+
     # Iterate over all raw volumes
     if not os.path.exists(RAW_DIR):
         print("Raw data directory not found.")
         return
-        
-    for item in sorted(os.listdir(RAW_DIR)):
-        if item.startswith("Vol_") and os.path.isdir(os.path.join(RAW_DIR, item)):
-            process_volume(item)
+
+    if args.calibrate:
+        paths = [
+            os.path.join(RAW_DIR, vol_name, name)
+            for vol_name in (args.volumes or list_volumes())
+            for name in sorted(os.listdir(os.path.join(RAW_DIR, vol_name))) if name.endswith(".txt")
+        ]
+        calibration = calibrate(load_chapter(path) for path in paths)
+        print(f"Calibrated against {calibration['reference']}: {calibration['chars_per_token']:.3f} chars/token "
+              f"over {calibration['tokens']:,} tokens")
+        return
+
+    RUN.start("chunk_chapters", profile=args.profile)
+    process_volumes(args.volumes or list_volumes(), workers=args.workers,
+                    force=args.force, export_json=args.export_json,
+                    tokenizer=args.tokenizer, overlap_tokens=args.overlap,
+                    skip_duplicates=not args.keep_duplicates)
+    RUN.write_report(args.report)
 
 if __name__ == "__main__":
     main()
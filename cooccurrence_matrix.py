@@ -0,0 +1,412 @@
+"""
+Sparse co-occurrence and timeline matrices over entity mentions.
+
+Mentions (from the graph store, or the spotter's mentions.jsonl) become a
+binary chunk x entity incidence matrix X (scipy.sparse CSR). Everything else
+is matrix algebra on X:
+
+    cooccurrence   X.T @ X                    entities sharing a chunk (diagonal = chunks per entity)
+    timeline       G @ X                      chapter x entity: chunks of the chapter naming the entity
+                                              (G: chapter x chunk indicator)
+    windowed       Q.T @ Q, Q = (S @ P) > 0   windows of N consecutive chapters both entities appear in
+                                              (P: chapter presence, S: window x chapter band)
+
+Windows follow the real chapter order (volume, then chapter_order), so
+chapters without any mentions still count towards a window's N chapters.
+
+Matrices are cached in data/graph/cooccurrence_<source>.npz together with a
+hash of the mention source (per-volume export hash and ingest time for the
+graph), so they (and the JSON exports) are rebuilt only when the mentions change.
+
+    python cooccurrence_matrix.py [--source graph|spotter] [--window 5] [--min-weight 2] [--force]
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+from chunk_chapters import PROCESSED_DIR, file_sha256
+from entity_spotter import MENTIONS_FILENAME
+from graph_store import GRAPH_PATH, GraphStore
+
+GRAPH_DIR = "data/graph"
+CACHE_TEMPLATE = "cooccurrence_{source}.npz"
+RELATIONSHIPS_FILENAME = "relationships_{source}.json"
+TIMELINES_FILENAME = "timelines_{source}.json"
+CACHE_VERSION = 2
+WINDOW_CHAPTERS = 5
+MIN_EDGE_WEIGHT = 2
+SOURCES = ("graph", "spotter")
+
+
+# --- Mention sources ---
+# Loaders return (chunks, entities, last_orders): chunks is an ordered list of
+# ((volume, chapter_order, chapter_title), set of entity indexes), entities is [(name, kind)]
+# and last_orders is {volume: last chapter_order}, mentioned or not.
+
+def _open_graph(path):
+    """Read-only handle on the graph; never creates an empty database as a side effect."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No entity graph at {path}; run: python graph_store.py ingest")
+    return GraphStore(path, read_only=True)
+
+
+def _graph_source_hash(path):
+    # ingested_at changes on every ingest, so `ingest --force` after a wiki or alias change
+    # (same exports, new canonical names) also invalidates the cache
+    with _open_graph(path) as graph:
+        rows = graph.conn.execute("SELECT volume, sha256, ingested_at FROM volumes ORDER BY volume").fetchall()
+    return hashlib.sha256(json.dumps(rows).encode("utf-8")).hexdigest()
+
+
+def _load_graph(path):
+    with _open_graph(path) as graph:
+        entity_rows = graph.conn.execute("SELECT id, name, kind FROM entities ORDER BY id").fetchall()
+        mention_rows = graph.conn.execute("""
+            SELECT m.volume, m.chapter_order, c.chapter_title, m.chunk_id, m.entity_id
+            FROM mentions m
+            LEFT JOIN chapters c ON c.volume = m.volume AND c.chapter_order = m.chapter_order
+            ORDER BY m.volume, m.chapter_order, m.scene_index, m.chunk_id
+        """).fetchall()
+        last_orders = dict(graph.conn.execute("SELECT volume, MAX(chapter_order) FROM chapters GROUP BY volume"))
+    column = {entity_id: i for i, (entity_id, _, _) in enumerate(entity_rows)}
+    entities = [(name, kind) for _, name, kind in entity_rows]
+    chunks = {}
+    for volume, order, title, chunk_id, entity_id in mention_rows:
+        chunks.setdefault((volume, chunk_id), ((volume, order, title), set()))[1].add(column[entity_id])
+    return list(chunks.values()), entities, last_orders
+
+
+def _mention_files(processed_dir):
+    if not os.path.isdir(processed_dir):
+        return []
+    return [
+        (name, os.path.join(processed_dir, name, MENTIONS_FILENAME)) for name in sorted(os.listdir(processed_dir))
+        if name.startswith("Vol_") and os.path.exists(os.path.join(processed_dir, name, MENTIONS_FILENAME))
+    ]
+
+
+def _spotter_source_hash(processed_dir):
+    files = [(name, file_sha256(path)) for name, path in _mention_files(processed_dir)]
+    return hashlib.sha256(json.dumps(files).encode("utf-8")).hexdigest()
+
+
+def _load_spotter(processed_dir):
+    """Unambiguous gazetteer mentions from every volume's mentions.jsonl."""
+    column = {}
+    chunks = []
+    last_orders = {}
+    for volume, path in _mention_files(processed_dir):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                members = set()
+                for kind, names in record["entities"].items():
+                    for name in names:
+                        members.add(column.setdefault((name, kind), len(column)))
+                chunks.append(((volume, record["chapter_order"], record["chapter_title"]), members))
+                last_orders[volume] = max(last_orders.get(volume, 0), record["chapter_order"])
+    return chunks, list(column), last_orders
+
+
+def source_hash(source, graph_path=None, processed_dir=None):
+    if source == "graph":
+        return _graph_source_hash(graph_path or GRAPH_PATH)
+    return _spotter_source_hash(processed_dir or PROCESSED_DIR)
+
+
+def load_mentions(source, graph_path=None, processed_dir=None):
+    if source == "graph":
+        return _load_graph(graph_path or GRAPH_PATH)
+    return _load_spotter(processed_dir or PROCESSED_DIR)
+
+
+# --- Matrix construction ---
+
+def incidence_matrix(chunks, n_entities):
+    """
+    Binary chunk x entity CSR matrix plus the chapter of each chunk.
+    Returns (X, chunk_chapter, chapters) where chapters is [(volume, order, title)] in reading order.
+    """
+    chapters = []
+    chapter_index = {}
+    chunk_chapter = np.empty(len(chunks), dtype=np.int32)
+    lengths = np.empty(len(chunks), dtype=np.int64)
+    cols = []
+    for row, (chapter, members) in enumerate(chunks):
+        key = chapter[:2]
+        if key not in chapter_index:
+            chapter_index[key] = len(chapters)
+            chapters.append(chapter)
+        chunk_chapter[row] = chapter_index[key]
+        lengths[row] = len(members)
+        cols.extend(sorted(members))
+
+    indptr = np.zeros(len(chunks) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    indices = np.asarray(cols, dtype=np.int32)
+    X = sp.csr_matrix((np.ones(len(indices), dtype=np.int32), indices, indptr), shape=(len(chunks), n_entities))
+    return X, chunk_chapter, chapters
+
+
+def chapter_indicator(chunk_chapter, n_chapters):
+    """G: chapter x chunk 0/1 matrix (row i selects the chunks of chapter i)."""
+    n_chunks = len(chunk_chapter)
+    return sp.csr_matrix(
+        (np.ones(n_chunks, dtype=np.int32), (chunk_chapter, np.arange(n_chunks))), shape=(n_chapters, n_chunks)
+    )
+
+
+def window_band(n_chapters, window):
+    """S: (n_chapters - window + 1) x n_chapters band; window k covers chapters k .. k+window-1."""
+    window = max(1, min(window, n_chapters))
+    n_windows = max(0, n_chapters - window + 1)
+    rows = np.repeat(np.arange(n_windows), window)
+    cols = (np.arange(n_windows)[:, None] + np.arange(window)[None, :]).ravel()
+    return sp.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(n_windows, n_chapters))
+
+
+def chapter_positions(chapters, last_orders=None):
+    """
+    (reading position of each of `chapters`, number of positions), counting chapters
+    without mentions: volumes follow each other, each spanning its chapter orders
+    from 1 (or its first, if lower) to `last_orders[volume]` (or its last here).
+    """
+    first = {}
+    last = dict(last_orders or {})
+    for volume, order, _ in chapters:
+        first[volume] = min(first.get(volume, 1), order)
+        last[volume] = max(last.get(volume, order), order)
+    offsets = {}
+    total = 0
+    for volume in first:  # `chapters` is in reading order
+        offsets[volume] = total - first[volume]
+        total += last[volume] - first[volume] + 1
+    return np.asarray([offsets[volume] + order for volume, order, _ in chapters], dtype=np.int64), total
+
+
+def compute_matrices(X, chunk_chapter, n_chapters, window=WINDOW_CHAPTERS, positions=None, n_positions=None):
+    """
+    Co-occurrence, chapter timeline and windowed co-occurrence from the incidence matrix.
+    Windows run over `positions` (see chapter_positions); by default the chapters are consecutive.
+    """
+    if positions is None:
+        positions, n_positions = np.arange(n_chapters), n_chapters
+    cooccurrence = (X.T @ X).tocsr()
+    timeline = (chapter_indicator(chunk_chapter, n_chapters) @ X).tocsr()
+    presence = timeline.copy()
+    presence.data[:] = 1
+    windows = (window_band(n_positions, window)[:, positions] @ presence).tocsr()
+    windows.data[:] = 1
+    windowed = (windows.T @ windows).tocsr()
+    return {"cooccurrence": cooccurrence, "timeline": timeline, "windowed": windowed}
+
+
+# --- Cache ---
+
+def _pack(arrays, prefix, matrix):
+    matrix = matrix.tocsr()
+    arrays[f"{prefix}_data"] = matrix.data
+    arrays[f"{prefix}_indices"] = matrix.indices
+    arrays[f"{prefix}_indptr"] = matrix.indptr
+    arrays[f"{prefix}_shape"] = np.asarray(matrix.shape, dtype=np.int64)
+
+
+def _unpack(arrays, prefix):
+    return sp.csr_matrix(
+        (arrays[f"{prefix}_data"], arrays[f"{prefix}_indices"], arrays[f"{prefix}_indptr"]),
+        shape=tuple(arrays[f"{prefix}_shape"])
+    )
+
+
+def cache_path(source, graph_dir=GRAPH_DIR):
+    return os.path.join(graph_dir, CACHE_TEMPLATE.format(source=source))
+
+
+def save_cache(path, result):
+    arrays = {
+        "version": np.asarray(CACHE_VERSION),
+        "source_hash": np.asarray(result["source_hash"]),
+        "window": np.asarray(result["window"]),
+        "chunk_chapter": result["chunk_chapter"],
+        "entity_names": np.asarray([name for name, _ in result["entities"]], dtype=str),
+        "entity_kinds": np.asarray([kind for _, kind in result["entities"]], dtype=str),
+        "chapter_volumes": np.asarray([c[0] for c in result["chapters"]], dtype=str),
+        "chapter_orders": np.asarray([c[1] for c in result["chapters"]], dtype=np.int32),
+        "chapter_titles": np.asarray([c[2] or "" for c in result["chapters"]], dtype=str),
+    }
+    for name in ("incidence", "cooccurrence", "timeline", "windowed"):
+        _pack(arrays, name, result[name])
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp.npz"
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_cache(path):
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as arrays:
+        if int(arrays["version"]) != CACHE_VERSION:
+            return None
+        result = {
+            "source_hash": str(arrays["source_hash"]),
+            "window": int(arrays["window"]),
+            "chunk_chapter": arrays["chunk_chapter"],
+            "entities": list(zip(arrays["entity_names"].tolist(), arrays["entity_kinds"].tolist())),
+            "chapters": list(zip(arrays["chapter_volumes"].tolist(), arrays["chapter_orders"].tolist(),
+                                 arrays["chapter_titles"].tolist())),
+        }
+        for name in ("incidence", "cooccurrence", "timeline", "windowed"):
+            result[name] = _unpack(arrays, name)
+    return result
+
+
+def build(source="graph", window=WINDOW_CHAPTERS, force=False, graph_path=None,
+          processed_dir=None, graph_dir=GRAPH_DIR):
+    """
+    Returns the matrices for `source`, from the .npz cache when the mentions
+    and window are unchanged. result["rebuilt"] says whether they were recomputed.
+    """
+    if source not in SOURCES:
+        raise ValueError(f"Unknown mention source: {source}")
+    path = cache_path(source, graph_dir)
+    current_hash = source_hash(source, graph_path, processed_dir)
+    if not force:
+        cached = load_cache(path)
+        if cached and cached["source_hash"] == current_hash and cached["window"] == window:
+            cached["rebuilt"] = False
+            return cached
+
+    chunks, entities, last_orders = load_mentions(source, graph_path, processed_dir)
+    X, chunk_chapter, chapters = incidence_matrix(chunks, len(entities))
+    positions, n_positions = chapter_positions(chapters, last_orders)
+    result = compute_matrices(X, chunk_chapter, len(chapters), window, positions, n_positions)
+    result.update({
+        "source_hash": current_hash,
+        "window": window,
+        "incidence": X,
+        "chunk_chapter": chunk_chapter,
+        "entities": entities,
+        "chapters": chapters,
+    })
+    save_cache(path, result)
+    result["rebuilt"] = True
+    return result
+
+
+# --- Exports ---
+
+def export_relationships(result, path, min_weight=MIN_EDGE_WEIGHT):
+    """Nodes with chunk/chapter counts and first chapter; edges with shared-chunk and windowed weights."""
+    X = result["incidence"]
+    timeline = result["timeline"]
+    chunk_counts = np.asarray(X.sum(axis=0)).ravel()
+    presence = timeline.copy()
+    presence.data[:] = 1
+    chapter_counts = np.asarray(presence.sum(axis=0)).ravel()
+    # First chapter per entity: smallest row index in each column of the timeline
+    first = np.full(len(result["entities"]), -1, dtype=np.int64)
+    csc = timeline.tocsc()
+    for j in np.flatnonzero(np.diff(csc.indptr)):
+        first[j] = csc.indices[csc.indptr[j]:csc.indptr[j + 1]].min()
+
+    nodes = []
+    for j, (name, kind) in enumerate(result["entities"]):
+        if chunk_counts[j] == 0:
+            continue
+        volume, order, title = result["chapters"][first[j]]
+        nodes.append({"id": j, "name": name, "kind": kind, "chunks": int(chunk_counts[j]),
+                      "chapters": int(chapter_counts[j]),
+                      "first_chapter": {"volume": volume, "order": int(order), "title": title}})
+
+    upper = sp.triu(result["cooccurrence"], k=1).tocoo()
+    keep = upper.data >= min_weight
+    rows, cols, weights = upper.row[keep], upper.col[keep], upper.data[keep]
+    windowed = result["windowed"].tocsr()
+    window_weights = np.asarray(windowed[rows, cols]).ravel() if len(rows) else np.array([], dtype=np.int64)
+    order = np.lexsort((cols, rows, -weights))
+    edges = [
+        {"source": int(rows[i]), "target": int(cols[i]), "weight": int(weights[i]),
+         "window_weight": int(window_weights[i])}
+        for i in order
+    ]
+
+    _write_json(path, {"source_hash": result["source_hash"], "window": result["window"],
+                       "min_weight": min_weight, "nodes": nodes, "edges": edges})
+    return len(nodes), len(edges)
+
+
+def export_timelines(result, path):
+    """{entity name: [[volume, chapter_order, chunks naming it], ...]} in reading order."""
+    csc = result["timeline"].tocsc()
+    timelines = {}
+    for j, (name, kind) in enumerate(result["entities"]):
+        start, end = csc.indptr[j], csc.indptr[j + 1]
+        if start == end:
+            continue
+        rows = csc.indices[start:end]
+        counts = csc.data[start:end]
+        ordering = np.argsort(rows)
+        timelines[f"{name} ({kind})"] = [
+            [result["chapters"][rows[i]][0], int(result["chapters"][rows[i]][1]), int(counts[i])]
+            for i in ordering
+        ]
+    _write_json(path, timelines)
+    return len(timelines)
+
+
+def exports_current(result, relationships_path, timelines_path, min_weight):
+    """True if both exports exist and were written from these matrices with this edge threshold."""
+    if not (os.path.exists(relationships_path) and os.path.exists(timelines_path)):
+        return False
+    if os.path.getmtime(timelines_path) < os.path.getmtime(relationships_path):
+        return False  # Interrupted between the two writes
+    with open(relationships_path, "r", encoding="utf-8") as f:
+        exported = json.load(f)
+    return (exported.get("source_hash") == result["source_hash"] and exported.get("window") == result["window"]
+            and exported.get("min_weight") == min_weight)
+
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build co-occurrence / timeline matrices and graph exports.")
+    parser.add_argument("--source", choices=SOURCES, default="graph",
+                        help="graph: ingested LLM extractions; spotter: gazetteer mentions.jsonl")
+    parser.add_argument("--window", type=int, default=WINDOW_CHAPTERS, help="Chapters per co-occurrence window")
+    parser.add_argument("--min-weight", type=int, default=MIN_EDGE_WEIGHT, help="Shared chunks needed for an edge")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the mentions are unchanged")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    result = build(args.source, args.window, args.force)
+    X = result["incidence"]
+    print(f"{'Built' if result['rebuilt'] else 'Loaded cached'} matrices: {X.shape[0]} chunks x "
+          f"{X.shape[1]} entities, {len(result['chapters'])} chapters, {X.nnz} entity-chunk pairs "
+          f"({time.perf_counter() - started:.2f}s)")
+
+    relationships_path = os.path.join(GRAPH_DIR, RELATIONSHIPS_FILENAME.format(source=args.source))
+    timelines_path = os.path.join(GRAPH_DIR, TIMELINES_FILENAME.format(source=args.source))
+    if result["rebuilt"] or not exports_current(result, relationships_path, timelines_path, args.min_weight):
+        nodes, edges = export_relationships(result, relationships_path, args.min_weight)
+        entities = export_timelines(result, timelines_path)
+        print(f"Wrote {relationships_path} ({nodes} nodes, {edges} edges) and {timelines_path} ({entities} timelines)")
+    else:
+        print("Exports are up to date.")
+
+
+if __name__ == "__main__":
+    main()
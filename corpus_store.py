@@ -0,0 +1,242 @@
+"""
+Compact columnar corpus store for chunked volumes.
+
+Per volume, data/processed/Vol_XX/corpus/ holds:
+- text.bin            every chunk's UTF-8 text, back to back
+- offsets.bin         uint64 byte offsets into text.bin (n + 1 entries)
+- chapter_order.bin, scene_index.bin, sub_chunk_index.bin, token_estimate.bin
+                      uint32 columns, one entry per chunk
+- corpus.json         chapter table [[order, title, first_row, end_row], ...],
+                      row count and the source chunks file it was built from
+
+The binary files are memory-mapped on open, so reading one chunk decodes just
+that chunk, and a chapter's chunks are one contiguous row range (O(1) lookup).
+chunk_id is "{chapter_order}_{scene_index}_{sub_chunk_index}" and is derived,
+not stored. chunk_chapters.py keeps the store in step with chunks.jsonl.
+
+    python corpus_store.py info Vol_01
+    python corpus_store.py export Vol_01 [--output chunks.json]
+"""
+import argparse
+import json
+import mmap
+import os
+from array import array
+
+PROCESSED_DIR = "data/processed"
+CORPUS_DIR = "corpus"
+CORPUS_VERSION = 1
+TEXT_FILENAME = "text.bin"
+OFFSETS_FILENAME = "offsets.bin"
+META_FILENAME = "corpus.json"
+INT_COLUMNS = ("chapter_order", "scene_index", "sub_chunk_index", "token_estimate")
+
+
+def corpus_dir(vol_name, processed_dir=None):
+    return os.path.join(processed_dir or PROCESSED_DIR, vol_name, CORPUS_DIR)
+
+
+def load_corpus_meta(vol_name, processed_dir=None):
+    path = os.path.join(corpus_dir(vol_name, processed_dir), META_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_corpus(vol_name, records, source=None, processed_dir=None):
+    """
+    Writes a volume's store from chunk records (in corpus order). `source` is a
+    dict describing the file they came from, kept in corpus.json for freshness checks.
+    Returns the number of chunks written.
+    """
+    out_dir = corpus_dir(vol_name, processed_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    meta_path = os.path.join(out_dir, META_FILENAME)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)  # Written last; its absence marks an incomplete store
+
+    offsets = array("Q", [0])
+    columns = {name: array("I") for name in INT_COLUMNS}
+    chapters = []
+    with open(os.path.join(out_dir, TEXT_FILENAME + ".tmp"), "wb") as text_file:
+        for row, record in enumerate(records):
+            expected_id = f"{record['chapter_order']}_{record['scene_index']}_{record['sub_chunk_index']}"
+            if record["chunk_id"] != expected_id:
+                raise ValueError(f"chunk_id {record['chunk_id']!r} does not match its columns ({expected_id})")
+            data = record["text"].encode("utf-8")
+            text_file.write(data)
+            offsets.append(offsets[-1] + len(data))
+            for name in INT_COLUMNS:
+                columns[name].append(record[name])
+
+            if not chapters or chapters[-1][0] != record["chapter_order"]:
+                chapters.append([record["chapter_order"], record["chapter_title"], row, row])
+            elif chapters[-1][3] != row:
+                raise ValueError(f"Chapter {record['chapter_order']} rows are not contiguous")
+            chapters[-1][3] = row + 1
+
+    os.replace(os.path.join(out_dir, TEXT_FILENAME + ".tmp"), os.path.join(out_dir, TEXT_FILENAME))
+    for name, values in [("offsets", offsets)] + list(columns.items()):
+        path = os.path.join(out_dir, f"{name}.bin")
+        with open(path + ".tmp", "wb") as f:
+            values.tofile(f)
+        os.replace(path + ".tmp", path)
+
+    with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({
+            "version": CORPUS_VERSION,
+            "rows": len(offsets) - 1,
+            "chapters": chapters,
+            "source": source,
+        }, f, ensure_ascii=False)
+    os.replace(meta_path + ".tmp", meta_path)
+    return len(offsets) - 1
+
+
+def write_chunks_json(chunks, output_path):
+    """Streams chunk records to the legacy indented chunks.json layout. Returns the number written."""
+    tmp_path = output_path + ".tmp"
+    count = 0
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for chunk in chunks:
+            body = json.dumps(chunk, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+            f.write(("," if count else "") + "\n  " + body)
+            count += 1
+        f.write("\n]" if count else "]")
+    os.replace(tmp_path, output_path)
+    return count
+
+
+def _map_array(path, typecode):
+    """(file, mmap, memoryview cast to `typecode`) for a binary column; empty files get a plain array."""
+    f = open(path, "rb")
+    if os.fstat(f.fileno()).st_size == 0:
+        return f, None, memoryview(array(typecode))
+    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return f, mapped, memoryview(mapped).cast(typecode)
+
+
+class CorpusStore:
+    """Read-only, memory-mapped view of one volume's store."""
+
+    def __init__(self, vol_name, processed_dir=None):
+        self.vol_name = vol_name
+        self.meta = load_corpus_meta(vol_name, processed_dir)
+        if self.meta is None:
+            raise FileNotFoundError(f"No corpus store for {vol_name}; run chunk_chapters.py {vol_name}")
+        base = corpus_dir(vol_name, processed_dir)
+        self._handles = []
+        self.text = self._open(os.path.join(base, TEXT_FILENAME), "B")
+        self.offsets = self._open(os.path.join(base, OFFSETS_FILENAME), "Q")
+        self.columns = {name: self._open(os.path.join(base, f"{name}.bin"), "I") for name in INT_COLUMNS}
+        self.chapters = {order: (title, first, end) for order, title, first, end in self.meta["chapters"]}
+
+    def _open(self, path, typecode):
+        handle = _map_array(path, typecode)
+        self._handles.append(handle)
+        return handle[2]
+
+    def close(self):
+        for f, mapped, view in self._handles:
+            view.release()
+            if mapped is not None:
+                mapped.close()
+            f.close()
+        self._handles = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def chunk_text(self, row):
+        return bytes(self.text[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8")
+
+    def chunk_id(self, row):
+        columns = self.columns
+        return f"{columns['chapter_order'][row]}_{columns['scene_index'][row]}_{columns['sub_chunk_index'][row]}"
+
+    def chunk(self, row):
+        """The chunk record at `row`, in the same shape chunks.jsonl uses."""
+        order = self.columns["chapter_order"][row]
+        return {
+            "chunk_id": self.chunk_id(row),
+            "chapter_order": order,
+            "chapter_title": self.chapters[order][0],
+            "scene_index": self.columns["scene_index"][row],
+            "sub_chunk_index": self.columns["sub_chunk_index"][row],
+            "text": self.chunk_text(row),
+            "token_estimate": self.columns["token_estimate"][row],
+        }
+
+    def chapter_rows(self, order):
+        """Row range of one chapter (empty if it has no chunks)."""
+        _, first, end = self.chapters.get(order, (None, 0, 0))
+        return range(first, end)
+
+    def row_for(self, chunk_id):
+        """Row of a chunk_id, or None."""
+        try:
+            order, scene, sub = (int(part) for part in chunk_id.split("_"))
+        except ValueError:
+            return None
+        columns = self.columns
+        for row in self.chapter_rows(order):
+            if columns["scene_index"][row] == scene and columns["sub_chunk_index"][row] == sub:
+                return row
+        return None
+
+    def get(self, chunk_id):
+        row = self.row_for(chunk_id)
+        return None if row is None else self.chunk(row)
+
+    def iter_chunks(self, rows=None):
+        for row in (range(len(self)) if rows is None else rows):
+            yield self.chunk(row)
+
+    def chapter_titles(self):
+        """[(order, title)] in corpus order."""
+        return [(order, title) for order, title, _, _ in self.meta["chapters"]]
+
+    def export_json(self, output_path):
+        """Writes the legacy indented chunks.json layout, one record at a time."""
+        return write_chunks_json(self.iter_chunks(), output_path)
+
+
+def open_corpus(vol_name, processed_dir=None):
+    """The volume's CorpusStore, or None if it has not been built."""
+    if load_corpus_meta(vol_name, processed_dir) is None:
+        return None
+    return CorpusStore(vol_name, processed_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or export a volume's columnar corpus store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    info = sub.add_parser("info", help="Row/chapter counts and on-disk size")
+    info.add_argument("volume")
+    export = sub.add_parser("export", help="Write the legacy indented chunks.json")
+    export.add_argument("volume")
+    export.add_argument("--output", help="Default: data/processed/Vol_XX/chunks.json")
+    args = parser.parse_args()
+
+    with CorpusStore(args.volume) as store:
+        if args.command == "info":
+            base = corpus_dir(args.volume)
+            size = sum(os.path.getsize(os.path.join(base, name)) for name in os.listdir(base))
+            print(f"{args.volume}: {len(store)} chunks in {len(store.chapters)} chapters, "
+                  f"{size / 1024 / 1024:.2f} MB on disk")
+        else:
+            output_path = args.output or os.path.join(PROCESSED_DIR, args.volume, "chunks.json")
+            count = store.export_json(output_path)
+            print(f"Exported {count} chunks to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+Near-duplicate detection for chapters and scenes across volumes.
+
+Vol_Unknown re-holds chapters the numbered volumes already have, some as variants
+(`2.06_(Apr_1_version)`), and a scene can turn up in more than one chapter. Every
+chapter file, and after chunking every chunk, is shingled into word 5-grams and
+summarized by a 128-value MinHash signature (one-permutation MinHash: each
+shingle is hashed once into one of 128 bins, empty bins are filled by rotation
+from their neighbours). LSH banding (32 bands of 4 rows)
+proposes candidate pairs, which are duplicates when their estimated Jaccard
+similarity is at least SIMILARITY. In each cluster the canonical copy is the one
+in the lowest numbered volume (Vol_Unknown last, "version" variants after the
+originals); the others are its duplicates.
+
+Results go to data/processed/Vol_XX/duplicate_chapters.json and duplicate_scenes.json:
+
+    {filename: {"canonical": "Vol_07/7.19.txt", "similarity": 0.97}}
+    {chunk_id: {"canonical": "Vol_07/19_3_0", "similarity": 0.93}}
+
+chunk_chapters skips duplicate chapters and extract_entities duplicate scenes
+unless told to keep them. Signatures are cached per volume (dedup_chapters.npz,
+dedup_scenes.npz) and recomputed only for files whose size or mtime changed.
+
+    python dedup.py                       # chapters of every raw volume, scenes of every chunked one
+    python dedup.py --only chapters
+    python dedup.py --show Vol_Unknown    # list a volume's duplicates
+"""
+import argparse
+import json
+import os
+import re
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import chunk_chapters
+from chunk_chapters import DUPLICATES_FILENAMES, iter_chunks, list_volumes, load_duplicates
+from metrics import RUN, add_arguments
+
+SHINGLE_WORDS = 5
+NUM_PERM = 128
+BANDS = 32                      # NUM_PERM // BANDS rows per band
+SIMILARITY = 0.7                # Estimated Jaccard of shingle sets (3% of words edited ~ 0.75)
+MIN_SHINGLES = 50               # Shorter texts are never flagged (too little to compare)
+SEED = 20240401
+UNKNOWN_VOLUME = "Vol_Unknown"
+VARIANT_RE = re.compile(r"version|draft|alt\b", re.I)
+KINDS = ("chapters", "scenes")
+CACHE_FILENAMES = {"chapters": "dedup_chapters.npz", "scenes": "dedup_scenes.npz"}
+
+_WORD_RE = re.compile(r"\w+")
+SHINGLE_PRIME = np.uint64(1099511628211)
+BIN_SHIFT = np.uint64(64 - (NUM_PERM - 1).bit_length())  # Top bits pick the bin
+ROTATION = np.uint64(0x9E3779B97F4A7C15)
+EMPTY = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+
+_TOKEN_HASHES = {}  # Per-process token -> crc32
+
+
+def mix(hashes):
+    """splitmix64 finalizer, seeded: spreads shingle hashes over all 64 bits."""
+    x = hashes ^ np.uint64(SEED)
+    x ^= x >> np.uint64(30)
+    x *= np.uint64(0xBF58476D1CE4E5B9)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    return x
+
+
+def shingles(text):
+    """Sorted unique mixed 64-bit hashes of the text's word 5-grams (lowercased)."""
+    tokens = _WORD_RE.findall(text.lower())
+    if len(tokens) < SHINGLE_WORDS:
+        return np.empty(0, dtype=np.uint64)
+    cache = _TOKEN_HASHES
+    for token in set(tokens).difference(cache):
+        cache[token] = zlib.crc32(token.encode("utf-8"))
+    ids = np.fromiter(map(cache.__getitem__, tokens), dtype=np.uint64, count=len(tokens))
+    count = len(ids) - SHINGLE_WORDS + 1
+    hashes = ids[:count].copy()
+    for offset in range(1, SHINGLE_WORDS):
+        hashes = hashes * SHINGLE_PRIME + ids[offset:offset + count]  # Wraps mod 2**64
+    return np.unique(mix(hashes))
+
+
+def minhash(hashes):
+    """
+    NUM_PERM-value signature of a sorted shingle hash set: the smallest hash in
+    each bin (the first one, as the set is sorted and bins are the top bits).
+    An empty bin copies the next non-empty bin to its right, tagged with the distance.
+    """
+    if not len(hashes):
+        return EMPTY.copy()
+    bins = np.arange(NUM_PERM, dtype=np.uint64)
+    first = np.searchsorted(hashes, bins << BIN_SHIFT)
+    filled = np.flatnonzero((first < len(hashes)) & ((hashes[np.minimum(first, len(hashes) - 1)] >> BIN_SHIFT) == bins))
+    donor = filled[np.searchsorted(filled, np.arange(NUM_PERM)) % len(filled)]
+    distance = ((donor - np.arange(NUM_PERM)) % NUM_PERM).astype(np.uint64)
+    return hashes[first[donor]] ^ (distance * ROTATION)
+
+
+def text_signature(text):
+    """(signature, comparable): short texts get comparable=False and are never flagged."""
+    hashes = shingles(text)
+    return minhash(hashes), len(hashes) >= MIN_SHINGLES
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def candidate_pairs(signatures, bands=BANDS):
+    """Index pairs sharing at least one LSH band bucket."""
+    rows = NUM_PERM // bands
+    pairs = set()
+    for band in range(bands):
+        buckets = {}
+        for i, key in enumerate(map(bytes, signatures[:, band * rows:(band + 1) * rows])):
+            buckets.setdefault(key, []).append(i)
+        for members in buckets.values():
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    pairs.add((members[x], members[y]))
+    return pairs
+
+
+def find_duplicates(keys, ranks, signatures, threshold=SIMILARITY):
+    """
+    Clusters near-duplicate items. `ranks` order the copies (lowest is canonical).
+    Returns {duplicate key: (canonical key, similarity to it)}.
+    """
+    if len(keys) < 2:
+        return {}
+    signatures = np.asarray(signatures)
+    parent = list(range(len(keys)))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in candidate_pairs(signatures):
+        if similarity(signatures[i], signatures[j]) >= threshold:
+            parent[root(i)] = root(j)
+
+    clusters = {}
+    for i in range(len(keys)):
+        clusters.setdefault(root(i), []).append(i)
+    duplicates = {}
+    for members in clusters.values():
+        if len(members) < 2:
+            continue
+        canonical = min(members, key=lambda i: ranks[i])
+        for i in members:
+            if i != canonical:
+                duplicates[keys[i]] = (keys[canonical], similarity(signatures[i], signatures[canonical]))
+    return duplicates
+
+
+def volume_rank(vol_name):
+    return (vol_name == UNKNOWN_VOLUME, vol_name)
+
+
+# --- Signature cache ---
+
+def cache_path(vol_name, kind, processed_dir=None):
+    return os.path.join(processed_dir or chunk_chapters.PROCESSED_DIR, vol_name, CACHE_FILENAMES[kind])
+
+
+def load_cache(path):
+    """{key: (stamp, signature, comparable)} from a volume's signature cache."""
+    if not os.path.exists(path):
+        return {}
+    with np.load(path) as data:
+        if data["signatures"].shape[1:] != (NUM_PERM,) or int(data["seed"]) != SEED:
+            return {}
+        return {
+            str(key): (tuple(int(v) for v in stamp), signature, bool(comparable))
+            for key, stamp, signature, comparable in zip(data["keys"], data["stamps"], data["signatures"],
+                                                         data["comparable"])
+        }
+
+
+def save_cache(path, entries):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    keys = list(entries)
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, seed=np.int64(SEED), keys=np.array(keys, dtype=str),
+                 stamps=np.array([entries[key][0] for key in keys], dtype=np.int64).reshape(len(keys), 2),
+                 signatures=np.array([entries[key][1] for key in keys], dtype=np.uint64).reshape(len(keys), NUM_PERM),
+                 comparable=np.array([entries[key][2] for key in keys], dtype=bool))
+    os.replace(path + ".tmp", path)
+
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+# --- Workers ---
+
+def chapter_signature(path):
+    """Process-pool worker: signature of one raw chapter file."""
+    with open(path, "r", encoding="utf-8") as f:
+        return text_signature(f.read())
+
+
+def volume_scene_signatures(vol_name, processed_dir=None):
+    """Process-pool worker: {chunk_id: (signature, comparable)} for one chunked volume."""
+    return {chunk["chunk_id"]: text_signature(chunk["text"]) for chunk in iter_chunks(vol_name, processed_dir)}
+
+
+# --- Stages ---
+
+def _pool(workers, jobs):
+    # Worker processes only pay off with several jobs and CPUs
+    if workers == 1 or jobs < 2 or (os.cpu_count() or 1) < 2:
+        return None
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def chapter_signatures(vol_names, raw_dir, processed_dir, workers=None):
+    """[(vol_name, filename, rank, signature, comparable)] for every indexed chapter, via the cache."""
+    items = []
+    todo = []
+    caches = {}
+    for vol_name in vol_names:
+        index_path = os.path.join(raw_dir, vol_name, "index.json")
+        if not os.path.exists(index_path):
+            continue
+        with open(index_path, "r", encoding="utf-8") as f:
+            chapter_index = json.load(f)
+        cache = load_cache(cache_path(vol_name, "chapters", processed_dir))
+        entries = {}
+        changed = False
+        for chapter_meta in chapter_index:
+            filename = chapter_meta.get("filename")
+            path = os.path.join(raw_dir, vol_name, filename or "")
+            if not filename or not os.path.exists(path):
+                continue
+            stamp = file_stamp(path)
+            cached = cache.get(filename)
+            if cached is not None and cached[0] == stamp:
+                entries[filename] = cached
+            else:
+                entries[filename] = None
+                todo.append((vol_name, filename, path, stamp))
+                changed = True
+            rank = (volume_rank(vol_name), bool(VARIANT_RE.search(filename)), chapter_meta["order"])
+            items.append((vol_name, filename, rank))
+        caches[vol_name] = (entries, changed or set(entries) != set(cache))
+
+    with RUN.stage("dedup.signatures") as add:
+        pool = _pool(workers, len(todo))
+        try:
+            paths = [path for _, _, path, _ in todo]
+            results = pool.map(chapter_signature, paths, chunksize=4) if pool else map(chapter_signature, paths)
+            for (vol_name, filename, path, stamp), (signature, comparable) in zip(todo, results):
+                caches[vol_name][0][filename] = (stamp, signature, comparable)
+                add(items=1, nbytes=stamp[0])
+        finally:
+            if pool:
+                pool.shutdown()
+    for vol_name, (entries, changed) in caches.items():
+        if changed:
+            save_cache(cache_path(vol_name, "chapters", processed_dir), entries)
+    print(f"Chapter signatures: {len(items)} chapters, {len(todo)} (re)computed")
+    return [(vol_name, filename, rank) + caches[vol_name][0][filename][1:] for vol_name, filename, rank in items]
+
+
+def scene_signatures(vol_names, processed_dir, workers=None):
+    """[(vol_name, chunk_id, rank, signature, comparable)] for every chunk, via the cache."""
+    volumes = {}
+    todo = []
+    for vol_name in vol_names:
+        source = chunk_chapters.chunks_path(vol_name, processed_dir)
+        if source is None:
+            continue
+        stamp = file_stamp(source)
+        cache = load_cache(cache_path(vol_name, "scenes", processed_dir))
+        if cache and all(entry[0] == stamp for entry in cache.values()):
+            volumes[vol_name] = cache
+        else:
+            todo.append((vol_name, stamp))
+
+    with RUN.stage("dedup.signatures") as add:
+        pool = _pool(workers, len(todo))
+        try:
+            names = [vol_name for vol_name, _ in todo]
+            dirs = [processed_dir] * len(names)
+            results = pool.map(volume_scene_signatures, names, dirs) if pool else map(volume_scene_signatures, names, dirs)
+            for (vol_name, stamp), signatures in zip(todo, results):
+                entries = {chunk_id: (stamp, signature, comparable)
+                           for chunk_id, (signature, comparable) in signatures.items()}
+                save_cache(cache_path(vol_name, "scenes", processed_dir), entries)
+                volumes[vol_name] = entries
+                add(items=len(entries))
+        finally:
+            if pool:
+                pool.shutdown()
+    print(f"Scene signatures: {sum(len(entries) for entries in volumes.values())} chunks in {len(volumes)} volumes, "
+          f"{len(todo)} volumes (re)computed")
+
+    items = []
+    for vol_name in sorted(volumes, key=volume_rank):
+        for chunk_id, (_, signature, comparable) in volumes[vol_name].items():
+            # chunk_ids are "<chapter order>_<scene>_<sub chunk>"
+            rank = (volume_rank(vol_name),) + tuple(int(part) for part in chunk_id.split("_"))
+            items.append((vol_name, chunk_id, rank, signature, comparable))
+    return items
+
+
+def write_duplicates(kind, vol_names, duplicates, processed_dir):
+    """Writes each volume's duplicate_<kind>.json; files are rewritten only on change."""
+    by_volume = {vol_name: {} for vol_name in vol_names}
+    for (vol_name, key), ((canonical_vol, canonical_key), score) in sorted(duplicates.items()):
+        by_volume[vol_name][key] = {"canonical": f"{canonical_vol}/{canonical_key}", "similarity": round(score, 3)}
+    for vol_name, entries in by_volume.items():
+        vol_dir = os.path.join(processed_dir, vol_name)
+        path = os.path.join(vol_dir, DUPLICATES_FILENAMES[kind])
+        if os.path.exists(path) and load_duplicates(vol_dir, kind) == entries:
+            continue
+        os.makedirs(vol_dir, exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(entries, f, indent=2, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+    return by_volume
+
+
+def update(kind, vol_names=None, raw_dir=None, processed_dir=None, workers=None, threshold=SIMILARITY):
+    """
+    Recomputes the `kind` ("chapters" or "scenes") duplicates across `vol_names`
+    (default: every raw volume) and writes them to each volume's duplicate_<kind>.json.
+    Returns {vol_name: {key: {"canonical", "similarity"}}}.
+    """
+    raw_dir = raw_dir or chunk_chapters.RAW_DIR
+    processed_dir = processed_dir or chunk_chapters.PROCESSED_DIR
+    if vol_names is None:
+        vol_names = list_volumes() if os.path.isdir(raw_dir) else []
+    started = time.perf_counter()
+    if kind == "chapters":
+        items = chapter_signatures(vol_names, raw_dir, processed_dir, workers)
+    else:
+        items = scene_signatures(vol_names, processed_dir, workers)
+
+    with RUN.stage(f"dedup.{kind}") as add:
+        items = [item for item in items if item[4]]
+        found = find_duplicates([(vol_name, key) for vol_name, key, _, _, _ in items],
+                                [rank for _, _, rank, _, _ in items],
+                                [signature for _, _, _, signature, _ in items], threshold)
+        add(items=len(items))
+    RUN.count(f"dedup.{kind}_duplicates", len(found))
+    by_volume = write_duplicates(kind, vol_names, found, processed_dir)
+    counts = ", ".join(f"{vol_name} {len(entries)}" for vol_name, entries in by_volume.items() if entries)
+    print(f"Duplicate {kind}: {len(found)} of {len(items)} in {time.perf_counter() - started:.1f}s"
+          + (f" ({counts})" if counts else ""))
+    return by_volume
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("volumes", nargs="*", help="Volumes to compare (default: every raw volume)")
+    parser.add_argument("--only", choices=KINDS, help="Just chapters or just scenes")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY, help="Estimated Jaccard similarity")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count)")
+    parser.add_argument("--show", metavar="VOLUME", help="Print a volume's recorded duplicates and exit")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.show:
+        for kind in KINDS:
+            for key, entry in load_duplicates(os.path.join(chunk_chapters.PROCESSED_DIR, args.show), kind).items():
+                print(f"{kind[:-1]:<8} {key:<40} -> {entry['canonical']} ({entry['similarity']:.2f})")
+        return
+
+    RUN.start("dedup", profile=args.profile)
+    for kind in ([args.only] if args.only else KINDS):
+        update(kind, args.volumes or None, workers=args.workers, threshold=args.threshold)
+    RUN.write_report(args.report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,404 @@
+"""
+Local vector index over the chunker output, for "scenes like this one" and
+"scenes about X" queries. CPU only, no model download.
+
+Each chunk becomes a hashed TF-IDF vector: its terms (search_index.tokenize)
+weighted 1 + log(tf) times idf, feature-hashed with a random sign into DIM
+dimensions and L2-normalized, so cosine similarity is a dot product. Document
+frequencies are counted per hash bucket and frozen in model.npz on the first
+build; later volumes reuse them, so adding a volume never re-embeds the others
+(`build --refit` recounts them over every chunked volume and rebuilds all).
+
+One index per volume under data/vectors/Vol_XX/:
+- vectors.f32   float32 matrix, one row per chunk, memory-mapped at query time
+- docs.json     [[chunk_id, chapter_order, chapter_title], ...], row = list position
+- ivf.npz       IVF index: spherical k-means centroids, and the rows sorted by
+                nearest centroid with per-list offsets
+- meta.json     source chunks file stat/sha256, model id and counts; written last
+
+A query scores the centroids, scans the rows of the NPROBE best lists and keeps
+the top k across volumes. A volume is re-embedded only when its chunks file
+changed.
+
+    python embedding_index.py build [Vol_01 ...] [--force] [--refit]
+    python embedding_index.py query "goblins attack the inn" [--volume Vol_01] [--limit 10] [--entities]
+    python embedding_index.py similar 12_3_0 --in Vol_01
+"""
+import argparse
+import heapq
+import json
+import math
+import os
+import time
+import zlib
+
+import numpy as np
+
+from checkpoint_store import EXPORT_FILENAME, OUTPUT_DIR
+from chunk_chapters import PROCESSED_DIR, chunks_path, iter_chunks
+from search_index import index_is_fresh, load_meta, parse_range, tokenize, write_json
+
+VECTOR_DIR = "data/vectors"
+VECTOR_VERSION = 1
+MODEL_FILENAME = "model.npz"
+VECTORS_FILENAME = "vectors.f32"
+DOCS_FILENAME = "docs.json"
+IVF_FILENAME = "ivf.npz"
+META_FILENAME = "meta.json"
+
+DIM = 512                 # Vector width
+HASH_BUCKETS = 1 << 20    # Document-frequency buckets (term hash modulo this)
+BATCH_SIZE = 256          # Chunks vectorized per numpy batch
+KMEANS_ITERATIONS = 12
+NPROBE = 16               # IVF lists scanned per volume and query
+SEED = 7
+
+_TERM_HASHES = {}  # term -> crc32
+
+
+def term_hashes(terms):
+    cache = _TERM_HASHES
+    for term in set(terms).difference(cache):
+        cache[term] = zlib.crc32(term.encode("utf-8"))
+    return np.fromiter(map(cache.__getitem__, terms), dtype=np.uint64, count=len(terms))
+
+
+def _term_counts(texts):
+    """(doc, hash, tf) arrays for a batch of texts, one entry per distinct term per doc."""
+    hashes = []
+    docs = []
+    for doc, text in enumerate(texts):
+        terms = tokenize(text)
+        hashes.append(term_hashes(terms))
+        docs.append(np.full(len(terms), doc, dtype=np.uint64))
+    if not hashes:
+        empty = np.empty(0, dtype=np.uint64)
+        return empty, empty, empty
+    keys, counts = np.unique((np.concatenate(docs) << np.uint64(32)) | np.concatenate(hashes), return_counts=True)
+    return keys >> np.uint64(32), keys & np.uint64(0xFFFFFFFF), counts
+
+
+class HashedTfidf:
+    """Frozen idf over hash buckets; turns texts into L2-normalized DIM-wide float32 rows."""
+
+    def __init__(self, doc_freq, n_docs):
+        self.doc_freq = doc_freq
+        self.n_docs = n_docs
+        self.idf = (np.log((1.0 + n_docs) / (1.0 + doc_freq)) + 1.0).astype(np.float32)
+        self.model_id = f"{n_docs}-{zlib.crc32(doc_freq.tobytes()):08x}"
+
+    @classmethod
+    def fit(cls, texts):
+        doc_freq = np.zeros(HASH_BUCKETS, dtype=np.uint32)
+        n_docs = 0
+        batch = []
+        for text in texts:
+            batch.append(text)
+            if len(batch) == BATCH_SIZE:
+                n_docs += cls._count(doc_freq, batch)
+                batch = []
+        if batch:
+            n_docs += cls._count(doc_freq, batch)
+        return cls(doc_freq, n_docs)
+
+    @staticmethod
+    def _count(doc_freq, texts):
+        _, hashes, _ = _term_counts(texts)
+        doc_freq += np.bincount((hashes % HASH_BUCKETS).astype(np.int64), minlength=HASH_BUCKETS).astype(np.uint32)
+        return len(texts)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["doc_freq"], int(data["n_docs"]))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, doc_freq=self.doc_freq, n_docs=np.int64(self.n_docs))
+        os.replace(path + ".tmp", path)
+
+    def transform(self, texts):
+        """(len(texts), DIM) float32, rows L2-normalized (all-zero for texts with no terms)."""
+        docs, hashes, counts = _term_counts(texts)
+        weights = (1.0 + np.log(counts)) * self.idf[(hashes % HASH_BUCKETS).astype(np.int64)]
+        signs = np.where(hashes >> np.uint64(31), -1.0, 1.0)
+        cells = docs.astype(np.int64) * DIM + ((hashes >> np.uint64(11)) % DIM).astype(np.int64)
+        matrix = np.bincount(cells, weights=weights * signs, minlength=len(texts) * DIM)
+        matrix = matrix.reshape(len(texts), DIM).astype(np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+
+# --- IVF ---
+
+def train_ivf(vectors, nlist=None, iterations=KMEANS_ITERATIONS, seed=SEED):
+    """
+    Spherical k-means over the rows (nlist defaults to ~sqrt(rows)).
+    Returns (centroids, order, offsets): rows sorted by list, list i = order[offsets[i]:offsets[i + 1]].
+    """
+    n = len(vectors)
+    if n == 0:
+        return np.zeros((0, DIM), dtype=np.float32), np.zeros(0, dtype=np.int64), np.zeros(1, dtype=np.int64)
+    nlist = max(1, min(n, nlist or int(round(math.sqrt(n)))))
+    rng = np.random.default_rng(seed)
+    centroids = np.array(vectors[rng.choice(n, nlist, replace=False)])
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        empty = np.bincount(assign, minlength=nlist) == 0
+        sums[empty] = vectors[rng.choice(n, int(empty.sum()))]  # Re-seed empty lists
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    assign = np.argmax(vectors @ centroids.T, axis=1)
+    order = np.argsort(assign, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))])
+    return centroids.astype(np.float32), order, offsets
+
+
+# --- Build ---
+
+def model_path(vector_dir=VECTOR_DIR):
+    return os.path.join(vector_dir, MODEL_FILENAME)
+
+
+def chunked_volumes(processed_dir=None):
+    processed_dir = processed_dir or PROCESSED_DIR
+    if not os.path.isdir(processed_dir):
+        return []
+    return [name for name in sorted(os.listdir(processed_dir))
+            if name.startswith("Vol_") and chunks_path(name, processed_dir)]
+
+
+def load_model(vector_dir=VECTOR_DIR, processed_dir=None, refit=False):
+    """The frozen idf model; fitted over every chunked volume when missing (or `refit`)."""
+    path = model_path(vector_dir)
+    if os.path.exists(path) and not refit:
+        return HashedTfidf.load(path)
+    started = time.perf_counter()
+    model = HashedTfidf.fit(chunk["text"] for vol_name in chunked_volumes(processed_dir)
+                            for chunk in iter_chunks(vol_name, processed_dir))
+    model.save(path)
+    print(f"  [MODEL] idf over {model.n_docs} chunks in {time.perf_counter() - started:.2f}s")
+    return model
+
+
+def build_volume_vectors(vol_name, model, force=False, processed_dir=None, vector_dir=VECTOR_DIR):
+    """(Re)embeds one volume. Returns "built", "fresh" or None when the volume has no chunks."""
+    source = chunks_path(vol_name, processed_dir)
+    if source is None:
+        print(f"No chunks found for {vol_name}. Run chunk_chapters.py first.")
+        return None
+    fresh, source_entry = index_is_fresh(vol_name, source, vector_dir, VECTOR_VERSION)
+    vol_dir = os.path.join(vector_dir, vol_name)
+    if fresh and not force and (load_meta(vol_dir) or {}).get("model") == model.model_id:
+        print(f"  [FRESH] {vol_name}")
+        return "fresh"
+
+    started = time.perf_counter()
+    os.makedirs(vol_dir, exist_ok=True)
+    meta_path = os.path.join(vol_dir, META_FILENAME)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    docs = []
+    vectors_path = os.path.join(vol_dir, VECTORS_FILENAME)
+    with open(vectors_path + ".tmp", "wb") as f:
+        batch = []
+        for chunk in iter_chunks(vol_name, processed_dir):
+            docs.append([chunk["chunk_id"], chunk["chapter_order"], chunk["chapter_title"]])
+            batch.append(chunk["text"])
+            if len(batch) == BATCH_SIZE:
+                model.transform(batch).tofile(f)
+                batch = []
+        if batch:
+            model.transform(batch).tofile(f)
+    os.replace(vectors_path + ".tmp", vectors_path)
+
+    vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(len(docs), DIM)) if docs \
+        else np.zeros((0, DIM), dtype=np.float32)
+    centroids, order, offsets = train_ivf(vectors)
+    ivf_path = os.path.join(vol_dir, IVF_FILENAME)
+    with open(ivf_path + ".tmp", "wb") as f:
+        np.savez(f, centroids=centroids, order=order, offsets=offsets)
+    os.replace(ivf_path + ".tmp", ivf_path)
+    del vectors
+
+    write_json(os.path.join(vol_dir, DOCS_FILENAME), docs)
+    write_json(meta_path, {
+        "version": VECTOR_VERSION,
+        "source": source_entry,
+        "model": model.model_id,
+        "docs": len(docs),
+        "dim": DIM,
+        "lists": len(centroids),
+    })
+    print(f"  [BUILT] {vol_name}: {len(docs)} chunks, {len(centroids)} lists in {time.perf_counter() - started:.2f}s")
+    return "built"
+
+
+def build_indexes(vol_names=None, force=False, refit=False, processed_dir=None, vector_dir=VECTOR_DIR):
+    """
+    Embeds every stale volume (or just `vol_names`). A refit changes the model of every
+    volume, so it re-embeds all chunked volumes whatever `vol_names` says. Returns {vol_name: status}.
+    """
+    model = load_model(vector_dir, processed_dir, refit)
+    if vol_names is None or refit:
+        vol_names = list(dict.fromkeys(list(vol_names or []) + chunked_volumes(processed_dir)))
+    return {
+        vol_name: build_volume_vectors(vol_name, model, force or refit, processed_dir, vector_dir)
+        for vol_name in vol_names
+    }
+
+
+# --- Query ---
+
+class VolumeVectors:
+    """One volume's memory-mapped vectors and IVF lists."""
+
+    def __init__(self, vol_name, vector_dir=VECTOR_DIR, model_id=None):
+        self.vol_name = vol_name
+        vol_dir = os.path.join(vector_dir, vol_name)
+        self.meta = load_meta(vol_dir)
+        if self.meta is None:
+            raise FileNotFoundError(f"No vectors for {vol_name}; run: python embedding_index.py build {vol_name}")
+        if model_id is not None and self.meta.get("model") != model_id:
+            # Embedded with another idf model: its scores are not comparable with the query's
+            raise ValueError(f"Vectors of {vol_name} are from model {self.meta.get('model')}, not {model_id}; "
+                             f"run: python embedding_index.py build {vol_name}")
+        with open(os.path.join(vol_dir, DOCS_FILENAME), "r", encoding="utf-8") as f:
+            self.docs = json.load(f)
+        self.rows = {doc[0]: row for row, doc in enumerate(self.docs)}
+        self.vectors = np.memmap(os.path.join(vol_dir, VECTORS_FILENAME), dtype=np.float32, mode="r",
+                                 shape=(len(self.docs), DIM)) if self.docs else np.zeros((0, DIM), dtype=np.float32)
+        with np.load(os.path.join(vol_dir, IVF_FILENAME)) as ivf:
+            self.centroids = ivf["centroids"]
+            self.order = ivf["order"]
+            self.offsets = ivf["offsets"]
+
+    def search(self, query, k, nprobe=NPROBE, exact=False, chapters=None):
+        """[(score, row)] of the best k rows for a normalized query vector."""
+        if not len(self.docs):
+            return []
+        if exact or nprobe >= len(self.centroids):
+            rows = np.arange(len(self.docs))
+        else:
+            lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+            rows = np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in lists])
+        if chapters:
+            rows = np.array([row for row in rows if chapters[0] <= self.docs[row][1] <= chapters[1]], dtype=np.int64)
+            if not len(rows):
+                return []
+        rows = np.sort(rows)  # Sequential reads from the memmap
+        scores = self.vectors[rows] @ query
+        top = np.argpartition(-scores, min(k, len(rows)) - 1)[:k] if len(rows) > k else np.arange(len(rows))
+        return [(float(scores[i]), int(rows[i])) for i in top]
+
+
+class VectorIndex:
+    """All embedded volumes; volumes are opened lazily and kept open."""
+
+    def __init__(self, vector_dir=VECTOR_DIR):
+        self.vector_dir = vector_dir
+        self.volumes = {}
+        self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = HashedTfidf.load(model_path(self.vector_dir))
+        return self._model
+
+    def volume(self, vol_name):
+        if vol_name not in self.volumes:
+            self.volumes[vol_name] = VolumeVectors(vol_name, self.vector_dir, self.model.model_id)
+        return self.volumes[vol_name]
+
+    def embedded_volumes(self):
+        if not os.path.isdir(self.vector_dir):
+            return []
+        return [name for name in sorted(os.listdir(self.vector_dir))
+                if name.startswith("Vol_") and os.path.exists(os.path.join(self.vector_dir, name, META_FILENAME))]
+
+    def _top(self, query, k, volumes, nprobe, exact, chapters, exclude=None):
+        hits = []
+        for vol_name in volumes or self.embedded_volumes():
+            index = self.volume(vol_name)
+            for score, row in index.search(query, k + 1, nprobe, exact, chapters):
+                chunk_id, order, title = index.docs[row]
+                if (vol_name, chunk_id) != exclude:
+                    hits.append((score, vol_name, chunk_id, order, title))
+        return heapq.nlargest(k, hits)
+
+    def search(self, text, k=10, volumes=None, nprobe=NPROBE, exact=False, chapters=None):
+        """Scenes about `text`: [(score, vol_name, chunk_id, chapter_order, chapter_title)], best first."""
+        return self._top(self.model.transform([text])[0], k, volumes, nprobe, exact, chapters)
+
+    def similar(self, vol_name, chunk_id, k=10, volumes=None, nprobe=NPROBE, exact=False, chapters=None):
+        """Scenes like chunk `chunk_id` of `vol_name` (itself excluded)."""
+        index = self.volume(vol_name)
+        if chunk_id not in index.rows:
+            raise KeyError(f"{chunk_id} is not in {vol_name}")
+        query = np.array(index.vectors[index.rows[chunk_id]])
+        return self._top(query, k, volumes, nprobe, exact, chapters, exclude=(vol_name, chunk_id))
+
+
+def extracted_characters(vol_name, output_dir=OUTPUT_DIR):
+    """{chunk_id: [character names]} from a volume's extracted_entities.json (empty if not extracted)."""
+    path = os.path.join(output_dir, vol_name, EXPORT_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    return {
+        record["chunk_id"]: [entity["name"] for entity in (record.get("extraction") or {}).get("characters") or []
+                             if isinstance(entity, dict) and entity.get("name")]
+        for record in records
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query the per-volume vector index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Embed new or changed volumes")
+    build.add_argument("volumes", nargs="*", help="Volumes to embed (default: every chunked volume)")
+    build.add_argument("--force", action="store_true", help="Re-embed even if the chunks are unchanged")
+    build.add_argument("--refit", action="store_true", help="Recount document frequencies and re-embed everything")
+
+    for name, help_text in (("query", "Scenes about a text"), ("similar", "Scenes like a chunk")):
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument("text" if name == "query" else "chunk_id")
+        if name == "similar":
+            cmd.add_argument("--in", dest="source", required=True, help="Volume holding the chunk")
+        cmd.add_argument("--volume", action="append", dest="volumes", help="Restrict to a volume (repeatable)")
+        cmd.add_argument("--chapters", help="Chapter order range within each volume, e.g. 1-10")
+        cmd.add_argument("--limit", type=int, default=10)
+        cmd.add_argument("--exact", action="store_true", help="Scan every row instead of the IVF lists")
+        cmd.add_argument("--entities", action="store_true", help="Show the characters extracted from each hit")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_indexes(args.volumes or None, force=args.force, refit=args.refit)
+        return
+
+    index = VectorIndex()
+    started = time.perf_counter()
+    chapters = parse_range(args.chapters)
+    if args.command == "query":
+        hits = index.search(args.text, args.limit, args.volumes, exact=args.exact, chapters=chapters)
+    else:
+        hits = index.similar(args.source, args.chunk_id, args.limit, args.volumes, exact=args.exact,
+                             chapters=chapters)
+    print(f"{len(hits)} hits ({(time.perf_counter() - started) * 1000:.1f} ms)")
+    characters = {}
+    for score, vol_name, chunk_id, order, title in hits:
+        line = f"  {score:.3f} {vol_name} {title:<12} {chunk_id:<12}"
+        if args.entities:
+            if vol_name not in characters:
+                characters[vol_name] = extracted_characters(vol_name)
+            line += " " + ", ".join(characters[vol_name].get(chunk_id, [])[:8])
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Deterministic pre-LLM entity spotter.
+
+Tags every chunk of a volume with the wiki characters, locations and classes it
+mentions (gazetteer.py: full names, first/last names, aliases) and scores how
+likely it is to hold entities the wiki does not know yet: the number of
+distinct capitalized names that match nothing in the gazetteer (mid-sentence,
+or sentence-initial and never written in lowercase anywhere in the volume),
+plus the gazetteer hits that fit several wiki entries. Results go to
+data/processed/Vol_XX/mentions.jsonl, one line per chunk:
+
+    {"chunk_id", "chapter_order", "chapter_title", "mentions": [{name, kind, surface, start, end}],
+     "entities": {"character": [...], "location": [...], "class": [...]},
+     "unresolved": {"Name": count}, "ambiguous": {"surface": [names]}, "score": n}
+
+The extractor uses the score to send only chunks with unresolved names to the
+LLM (see extract_entities.ROUTE_MODE).
+
+    python entity_spotter.py [Vol_01 ...] [--force]
+"""
+import argparse
+import json
+import os
+import re
+import time
+
+from chunk_chapters import PROCESSED_DIR, chunks_path, file_sha256, iter_chunks
+from gazetteer import (
+    KIND_NAMES, STOP_VARIANTS, TOKEN_RE, WIKI_DIR, Gazetteer, fold_text, load_aliases, load_wiki_titles,
+)
+
+SPOTTER_KINDS = ("characters", "locations", "classes")
+MENTIONS_FILENAME = "mentions.jsonl"
+MENTIONS_META_FILENAME = "mentions_meta.json"
+SPOTTER_VERSION = 2
+
+# Wiki list pages and namespaced titles are not entities
+SKIP_TITLE_RE = re.compile(r"^(?:List of |Category:)|:")
+# Capitalized words that are not names even mid-sentence
+COMMON_CAPITALIZED = STOP_VARIANTS | {
+    "Mister", "Miss", "Ms", "Dr", "Master", "Mistress", "Human", "Humans", "Gnoll", "Gnolls",
+    "Drake", "Drakes", "Goblin", "Goblins", "Antinium", "Half-Elf", "Half-Elves", "Dwarf", "Dwarves",
+    "Minotaur", "Minotaurs", "Lizardfolk", "Selphid", "Garuda", "Dullahan", "Level", "Skill", "Skills",
+    "Class", "Classes", "God", "Gods", "Dead", "Ancestors", "Monday", "Tuesday", "Wednesday",
+    "Thursday", "Friday", "Saturday", "Sunday", "English", "Earth", "OK", "Okay",
+    # Roles, ranks and institutions the series capitalizes
+    "Chapter", "Guild", "Guildmaster", "Watch", "Guardsman", "Senior", "Council", "City", "Street",
+    "House", "Market", "Tier", "Runner", "Runners", "Courier", "Couriers", "Worker", "Workers",
+    "Soldier", "Soldiers", "Adventurer", "Adventurers", "Captains", "Lords", "Merchant", "Innkeeper",
+}
+RANK_SUFFIX = "-rank"
+# A token directly after one of these (ignoring spaces/quotes) starts a sentence
+SENTENCE_END = ".!?…:;—–-\n"
+OPENING_PUNCT = "\"'“”‘’*([ "
+
+
+def build_spotter(wiki_dir=WIKI_DIR, kinds=SPOTTER_KINDS):
+    """Exact-match gazetteer over the wiki lists (no fuzzy matching: spotted names must be certain)."""
+    entities = {}
+    for kind in kinds:
+        for title in load_wiki_titles(f"{kind}.json", wiki_dir):
+            if not SKIP_TITLE_RE.search(title):
+                entities.setdefault(title, KIND_NAMES.get(kind, kind))
+    return Gazetteer(entities, aliases=load_aliases(wiki_dir), fuzzy=False)
+
+
+def _sentence_initial(text, start):
+    i = start - 1
+    while i >= 0 and text[i] in OPENING_PUNCT:
+        i -= 1
+    return i < 0 or text[i] in SENTENCE_END
+
+
+def volume_vocabulary(chunks):
+    """Tokens written in lowercase anywhere in `chunks`: capitalized only at a sentence start, they are not names."""
+    vocabulary = set()
+    for chunk in chunks:
+        vocabulary.update(token for token in TOKEN_RE.findall(fold_text(chunk["text"])) if token.islower())
+    return vocabulary
+
+
+def spot_chunk(chunk, spotter, volume_vocabulary=None):
+    """
+    Mention record (see module docstring) for one chunk. Sentence-initial names only
+    count as unresolved given the `volume_vocabulary` (without it they are skipped).
+    """
+    text = chunk["text"]
+    mentions = []
+    entities = {}
+    ambiguous = {}
+    covered = []
+    for start, end, surface, canonicals, _ in spotter.find(text):
+        covered.append((start, end))
+        for name in sorted(canonicals):
+            kind = spotter.kinds[name]
+            mentions.append({"name": name, "kind": kind, "surface": surface, "start": start, "end": end})
+            if len(canonicals) == 1:
+                entities.setdefault(kind, {})[name] = None
+        if len(canonicals) > 1:
+            ambiguous[surface] = sorted(canonicals)
+
+    # Words that also occur in lowercase here are ordinary vocabulary, not names
+    folded = fold_text(text)
+    vocabulary = {token for token in TOKEN_RE.findall(folded) if token.islower()}
+    unresolved = {}
+    span_index = 0
+    in_brackets = False
+    last = 0
+    for match in TOKEN_RE.finditer(folded):
+        start, end = match.span()
+        # [Classes] and [Skills] are bracketed; the extractor only wants characters/locations
+        gap = folded[last:start]
+        if "[" in gap:
+            in_brackets = True
+        if "]" in gap:
+            in_brackets = "[" in gap[gap.rindex("]"):]
+        last = end
+        while span_index < len(covered) and covered[span_index][1] <= start:
+            span_index += 1
+        if span_index < len(covered) and covered[span_index][0] <= start:
+            continue
+        token = match.group().split("'")[0]  # Possessives and contractions (I'm, Erin's)
+        if (in_brackets or not token[:1].isupper() or len(token) < 2 or token.isupper()
+                or token in COMMON_CAPITALIZED or token.endswith(RANK_SUFFIX)
+                or token.lower() in vocabulary):
+            continue
+        if _sentence_initial(folded, start) and (volume_vocabulary is None or token.lower() in volume_vocabulary):
+            continue
+        unresolved[token] = unresolved.get(token, 0) + 1
+
+    return {
+        "chunk_id": chunk["chunk_id"],
+        "chapter_order": chunk["chapter_order"],
+        "chapter_title": chunk["chapter_title"],
+        "mentions": mentions,
+        "entities": {kind: list(names) for kind, names in sorted(entities.items())},
+        "unresolved": dict(sorted(unresolved.items(), key=lambda kv: (-kv[1], kv[0]))),
+        "ambiguous": dict(sorted(ambiguous.items())),
+        "score": len(unresolved) + len(ambiguous),
+    }
+
+
+def _wiki_signature(wiki_dir=WIKI_DIR):
+    signature = {}
+    for name in [f"{kind}.json" for kind in SPOTTER_KINDS] + ["aliases.json"]:
+        path = os.path.join(wiki_dir, name)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            signature[name] = [stat.st_size, stat.st_mtime]
+    return signature
+
+
+def mentions_path(vol_name, processed_dir=None):
+    return os.path.join(processed_dir or PROCESSED_DIR, vol_name, MENTIONS_FILENAME)
+
+
+def spot_volume(vol_name, spotter=None, force=False, processed_dir=None, wiki_dir=WIKI_DIR):
+    """
+    Writes a volume's mentions.jsonl unless it is already up to date with the
+    chunks and wiki lists. Returns "built", "fresh" or None (no chunks).
+    """
+    processed_dir = processed_dir or PROCESSED_DIR
+    source = chunks_path(vol_name, processed_dir)
+    if source is None:
+        print(f"No chunks found for {vol_name}. Run chunk_chapters.py first.")
+        return None
+
+    output_path = mentions_path(vol_name, processed_dir)
+    meta_path = os.path.join(processed_dir, vol_name, MENTIONS_META_FILENAME)
+    meta = {
+        "version": SPOTTER_VERSION,
+        "source_sha256": file_sha256(source),
+        "wiki": _wiki_signature(wiki_dir),
+    }
+    if not force and os.path.exists(output_path) and os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            if json.load(f) == meta:
+                print(f"  [FRESH] {vol_name}")
+                return "fresh"
+
+    started = time.perf_counter()
+    spotter = spotter or build_spotter(wiki_dir)
+    vocabulary = volume_vocabulary(iter_chunks(vol_name, processed_dir))
+    count = 0
+    routed = 0
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for chunk in iter_chunks(vol_name, processed_dir):
+            record = spot_chunk(chunk, spotter, vocabulary)
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+            routed += record["score"] > 0
+    os.replace(tmp_path, output_path)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    print(f"  [SPOTTED] {vol_name}: {count} chunks, {routed} with unresolved names "
+          f"in {time.perf_counter() - started:.2f}s")
+    return "built"
+
+
+def load_mentions(vol_name, processed_dir=None):
+    """{chunk_id: mention record} for a volume, or {} if it has not been spotted."""
+    path = mentions_path(vol_name, processed_dir)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return {record["chunk_id"]: record for record in map(json.loads, f) if record}
+
+
+def known_entities(records):
+    """
+    {name token: (name, kind, entity)} for the characters and locations of extraction
+    result records ("Horns of Hammerad" -> Horns, Hammerad); `entity` is the latest
+    extracted dict for that name. Tokens shared by several names are left out: they
+    do not say which entity a chunk means.
+    """
+    names = {}
+    latest = {}
+    for record in records:
+        extraction = record.get("extraction") or {}
+        for kind in ("characters", "locations"):
+            for entity in extraction.get(kind) or []:
+                if not isinstance(entity, dict) or not entity.get("name"):
+                    continue
+                latest[(entity["name"], kind)] = entity
+                for token in TOKEN_RE.findall(fold_text(entity["name"])):
+                    token = token.split("'")[0]
+                    if token[:1].isupper():
+                        names.setdefault(token, set()).add((entity["name"], kind))
+    return {token: (name, kind, latest[name, kind])
+            for token, found in names.items() if len(found) == 1 for name, kind in found}
+
+
+def unresolved_after(mention_record, known):
+    """Unresolved names of a chunk that earlier extractions (`known_entities`) do not account for."""
+    return [name for name in mention_record["unresolved"] if name not in known]
+
+
+def can_route_locally(mention_record, known, min_score=1):
+    """
+    True if a chunk's record can be built without the LLM: no ambiguous gazetteer hits
+    and fewer than `min_score` unresolved names left after `known`. With a
+    `min_score` above 1 the remaining unresolved names are not recorded.
+    """
+    return not mention_record.get("ambiguous") and len(unresolved_after(mention_record, known)) < min_score
+
+
+def spotter_extraction(mention_record, known=None):
+    """
+    Extraction-shaped result built from unambiguous gazetteer mentions, plus the
+    unresolved names that `known` (see known_entities) maps to an earlier extraction;
+    those keep the type and confidence that extraction gave them.
+    """
+    entities = mention_record["entities"]
+    characters = {
+        name: {"name": name, "type": "known", "confidence": 1.0, "context": "wiki name match"}
+        for name in entities.get("character", [])
+    }
+    locations = {name: {"name": name} for name in entities.get("location", [])}
+    for token in mention_record["unresolved"]:
+        if token not in (known or {}):
+            continue
+        name, kind, entity = known[token]
+        carried = {"name": name, **{key: entity[key] for key in ("type", "confidence") if key in entity}}
+        if kind == "characters":
+            characters.setdefault(name, dict(carried, context="extracted earlier in this volume"))
+        elif kind == "locations":
+            locations.setdefault(name, carried)
+    return {"characters": list(characters.values()), "locations": list(locations.values())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tag chunks with known wiki entities and score unresolved names.")
+    parser.add_argument("volumes", nargs="*", help="Volumes to spot (default: every chunked volume)")
+    parser.add_argument("--force", action="store_true", help="Re-spot even if chunks and wiki are unchanged")
+    args = parser.parse_args()
+
+    vol_names = args.volumes or [
+        name for name in sorted(os.listdir(PROCESSED_DIR)) if name.startswith("Vol_") and chunks_path(name)
+    ]
+    spotter = build_spotter()
+    for vol_name in vol_names:
+        spot_volume(vol_name, spotter, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,25 @@
+import argparse
 import json
 import os
+import threading
 import time
-import random
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from zhipuai import ZhipuAI
 from typing import List, Dict, Any
 from dotenv import load_dotenv
 
+from chapter_state import ChapterState, render_slice
+from checkpoint_store import ResultLog, text_sha256
+from chunk_chapters import has_chunks, load_chunks, load_duplicates
+from corpus_store import open_corpus
+from entity_spotter import can_route_locally, known_entities, load_mentions, spot_volume, spotter_extraction
+from gazetteer import Gazetteer
+from json_repair import EXTRACTION_SECTIONS, JSONRepairError, parse_json, validate_extraction
+from llm_cache import CacheMiss, ResponseCache, cache_key, MODES, MODE_OFF, MODE_READWRITE, MODE_REPLAY
+from metrics import RUN, add_arguments
+from rate_limit import RateLimiter, backoff_delay
+from search_index import parse_range
+
 # Explicitly load from current directory to be safe
 env_path = os.path.join(os.path.dirname(__file__), '.env')
 load_dotenv(env_path)
@@ -38,16 +52,85 @@ def mock_generate_content(chunk_text: str):
         "locations": [{"name": "The Wandering Inn"}]
     })
 
-# Configure Client
+def mock_generate_repair(chunk_text: str, sections: List[str]):
+    """Mock reply to a repair prompt: only the requested sections."""
+    data = json.loads(mock_generate_content(chunk_text))
+    return json.dumps({section: data[section] for section in sections})
+
+def mock_generate_batch_content(chunks: List[Dict]):
+    """Mock reply to a batched prompt: per-chunk mock results keyed by chunk_id."""
+    return json.dumps({
+        "results": {chunk["chunk_id"]: json.loads(mock_generate_content(chunk["text"])) for chunk in chunks}
+    })
+
+# Configure Client (built on the first live request, so mock and replay runs never need it)
 if not API_KEY:
-    print("WARNING: GLM_API_KEY not found. Defaulting to MOCK MODE.")
+    print("WARNING: GLM_API_KEY not found. Defaulting to MOCK MODE (--cache replay still serves recorded replies).")
     USE_MOCK = True
-    client = None
 else:
-    client = ZhipuAI(api_key=API_KEY)
     USE_MOCK = False # Can force this to True for debugging
+client = None
+client_lock = threading.Lock()
+
+def get_client():
+    global client
+    with client_lock:
+        if client is None:
+            if not API_KEY:
+                raise RuntimeError("GLM_API_KEY is not set")
+            client = ZhipuAI(api_key=API_KEY)
+    return client
 
 MODEL_NAME = "glm-4.6" 
+MAX_OUTPUT_TOKENS = 2000
+SAMPLING_PARAMS = {"top_p": 0.7, "temperature": 0.1, "max_tokens": MAX_OUTPUT_TOKENS}
+
+# --- CONCURRENCY / RATE LIMITS ---
+MAX_CONCURRENCY = 4          # Parallel in-flight requests
+REQUESTS_PER_MINUTE = 60     # Live mode only; mock mode is unlimited unless overridden
+TOKENS_PER_MINUTE = 400000   # Prompt estimate + MAX_OUTPUT_TOKENS per request
+MAX_RETRIES = 5              # Per-chunk retries before giving up (chunk stays unprocessed)
+BACKOFF_BASE = 2.0           # Seconds; doubles per attempt, full jitter
+BACKOFF_CAP = 60.0
+MOCK_LATENCY = 0.1           # Simulated request latency in mock mode
+CHARS_PER_TOKEN = 4
+
+# --- PROMPT ROSTER ---
+# "retrieval": only wiki names spotted in the chunk (exact/first/last name, aliases, fuzzy)
+# "full": the whole comma-joined wiki roster, as before (CONTEXT_MODE "roster" only)
+ROSTER_MODE = "retrieval"
+
+# --- BATCHING ---
+# Consecutive small chunks are packed into one request while their combined text
+# stays within BATCH_TOKEN_BUDGET (0 disables packing). Chunks at or above the
+# budget always go alone with the single-scene prompt.
+BATCH_TOKEN_BUDGET = 0       # e.g. 3000
+BATCH_MAX_CHUNKS = 6
+BATCH_MAX_OUTPUT_TOKENS = 8000
+
+# --- ROUTING ---
+# "spotter": chunks whose entity_spotter mentions hold no ambiguous wiki matches and
+#            fewer than ROUTE_MIN_SCORE unresolved names (ignoring names already
+#            extracted, which are recorded) are answered from the mentions and never
+#            reach the API. Above 1, the remaining unresolved names are lost
+# "all": every chunk goes to the LLM, as before
+ROUTE_MODE = "spotter"
+ROUTE_MIN_SCORE = 1
+
+# --- CHAPTER STATE ---
+# "state": each prompt's roster is a relevance-ranked slice of the entities the chapter's
+#          earlier chunks resolved (chapter_state.py) plus the retrieval candidates not
+#          already in it, whatever ROSTER_MODE says. A chapter's chunks go out one
+#          batch at a time, in order; chapters run in parallel
+# "roster": every chunk is sent in isolation with the roster alone, as before
+CONTEXT_MODE = "state"
+
+# --- REPAIR ---
+# Replies are parsed tolerantly (fences, prose, trailing commas, truncation) and
+# validated. A chunk whose characters/locations are missing or cut off is not
+# recorded; only the missing sections are asked for again with the short repair
+# prompt, up to REPAIR_ROUNDS times. Chunks still incomplete stay unprocessed.
+REPAIR_ROUNDS = 2
 
 # --- UTILS ---
 
@@ -66,6 +149,11 @@ def get_known_characters_list(char_data: List[Dict]) -> str:
     names = [c["title"] for c in char_data if "title" in c]
     return ", ".join(names)
 
+def get_chunk_roster(chunk_text: str, gazetteer: Gazetteer) -> str:
+    """Known characters plausibly relevant to one chunk, for the prompt reference list."""
+    names = gazetteer.candidates(chunk_text)
+    return ", ".join(names) if names else "(none matched)"
+
 def construct_prompt(chunk_text: str, known_characters: str) -> str:
     return f"""
     You are an expert Data Historian constructing a Knowledge Graph for "The Wandering Inn".
@@ -81,7 +169,7 @@ def construct_prompt(chunk_text: str, known_characters: str) -> str:
     
     KNOWN CHARACTERS (Reference):
     {known_characters[:100000]} 
-    (List truncated if needed, GLM-4 has 128k context)
+    (Wiki names that appear to be mentioned in this scene; other known characters may still be present)
 
     SCENE TEXT:
     {chunk_text}
@@ -99,103 +187,699 @@ def construct_prompt(chunk_text: str, known_characters: str) -> str:
     If no entities are found, return empty lists.
     """
 
-def run_extraction_batch(volume_name, force_mock=False):
-    is_mock = USE_MOCK or force_mock
-    print(f"Starting extraction for {volume_name} (Mode: {'MOCK' if is_mock else MODEL_NAME})...")
+def construct_repair_prompt(chunk_text: str, known_characters: str, sections: List[str]) -> str:
+    """Short follow-up prompt asking only for the `sections` a previous reply lacked."""
+    formats = {
+        "characters": '"characters": [{ "name": "Canonical Name", "type": "known|new", "confidence": 0.95, "context": "Brief reason" }]',
+        "locations": '"locations": [{ "name": "Location Name" }]',
+    }
+    known = f"\n    KNOWN CHARACTERS (use these spellings): {known_characters[:100000]}\n" if "characters" in sections else ""
+    return f"""
+    List the {" and ".join(sections)} in this scene from "The Wandering Inn".
+    Reply with complete JSON only, no prose: {{ {", ".join(formats[section] for section in sections)} }}
+    {known}
+    SCENE TEXT:
+    {chunk_text}
+    """
+
+def construct_batch_prompt(chunks: List[Dict], known_characters: str) -> str:
+    """One prompt for several scenes; the model answers per chunk_id."""
+    scenes = "\n\n".join(
+        f"=== SCENE {chunk['chunk_id']} ===\n{chunk['text']}" for chunk in chunks
+    )
+    ids = ", ".join(f'"{chunk["chunk_id"]}"' for chunk in chunks)
+    return f"""
+    You are an expert Data Historian constructing a Knowledge Graph for "The Wandering Inn".
+    
+    TASK:
+    Below are {len(chunks)} separate story snippets (SCENES), each headed by its id.
+    Analyze EACH scene on its own and extract all Characters present or mentioned in it.
+    
+    CONTEXT:
+    We have a database of "KNOWN CHARACTERS" from the Wiki. 
+    - If you find a name from this list, use the exact spelling.
+    - If you find a NEW character not in the list, extract them but mark as "new".
+    - Be careful with aliases (e.g., "The Necromancer" might be "Az’kerash"). Use the canonical name if clearly implied, or list the alias.
+    
+    KNOWN CHARACTERS (Reference):
+    {known_characters[:100000]} 
+    (Wiki names that appear to be mentioned in these scenes; other known characters may still be present)
+
+    SCENES:
+    {scenes}
+
+    OUTPUT FORMAT (JSON ONLY), with one entry for every scene id ({ids}):
+    {{
+      "results": {{
+        "<scene id>": {{
+          "characters": [
+            {{ "name": "Canonical Name", "type": "known|new", "confidence": 0.95, "context": "Brief reason (e.g. 'mentioned as The Necromancer')" }}
+          ],
+          "locations": [
+            {{ "name": "Location Name" }}
+          ]
+        }}
+      }}
+    }}
+    
+    If a scene has no entities, return empty lists for it.
+    """
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+def call_model(prompt: str, is_mock: bool, mock_reply, mock_latency: float = MOCK_LATENCY,
+               params: Dict = None, purpose: str = None, tally: "ReplyTally" = None) -> str:
+    """
+    Sends one prompt to the model (or returns `mock_reply()`) and returns the raw text reply.
+    Token usage goes to metrics.RUN: the response's `usage` live, a chars/token estimate in mock mode,
+    under "<model>/<purpose>" when a purpose (e.g. "repair") is given; repair tokens also go to `tally`.
+    """
+    if is_mock:
+        time.sleep(mock_latency)
+        content = mock_reply()
+        tokens = RUN.add_usage(f"mock/{purpose}" if purpose else "mock",
+                               {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": estimate_tokens(content)},
+                               estimated=True)
+        if tally is not None and purpose == "repair":
+            tally.add(repair_tokens=tokens)
+        return content
+
+    response = get_client().chat.completions.create(
+        model=MODEL_NAME,
+        messages=[
+            {"role": "user", "content": prompt}
+        ],
+        **(params or SAMPLING_PARAMS)
+    )
+    if response.usage is not None:
+        tokens = RUN.add_usage(f"{MODEL_NAME}/{purpose}" if purpose else MODEL_NAME, response.usage)
+        if tally is not None and purpose == "repair":
+            tally.add(repair_tokens=tokens)
+    return response.choices[0].message.content
+
+class IncompleteExtraction(Exception):
+    """A reply that left sections missing; `extraction` holds the sections that did parse."""
+
+    def __init__(self, chunk: Dict, extraction: Dict[str, Any], missing: List[str]):
+        super().__init__(f"missing {', '.join(missing)}")
+        self.chunk = chunk
+        self.extraction = extraction
+        self.missing = missing
+
+class ReplyTally:
+    """
+    Parse outcomes and repair tokens of one run_extraction_batch call. metrics.RUN is
+    process-wide and shared by volumes extracted in parallel, so per-volume stats come from here.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.replies = 0
+        self.parse_failures = 0
+        self.repair_tokens = 0
+
+    def add(self, replies=0, parse_failures=0, repair_tokens=0):
+        with self.lock:
+            self.replies += replies
+            self.parse_failures += parse_failures
+            self.repair_tokens += repair_tokens
+
+def count_reply(repairs: List[str], missing: List[str], tally: ReplyTally = None):
+    """Parse outcome of one chunk's reply, for the run report's (and `tally`'s) parse-failure rate."""
+    RUN.count("llm.replies")
+    if missing:
+        RUN.count("llm.parse_failures")
+    elif repairs:
+        RUN.count("llm.parse_repaired")
+    if tally is not None:
+        tally.add(replies=1, parse_failures=1 if missing else 0)
+
+def parse_extraction(content: str, sections: List[str] = EXTRACTION_SECTIONS, count: bool = True,
+                     tally: ReplyTally = None):
+    """
+    Tolerantly parses and validates one chunk's reply.
+    Returns (extraction, missing): the valid sections and the names of those in
+    `sections` that are absent, malformed or were cut off.
+    With `count`, the outcome goes to the run report's parse counters (and `tally`).
+    """
+    try:
+        parsed = parse_json(content)
+    except JSONRepairError:
+        if count:
+            count_reply([], list(sections), tally)
+        return {}, list(sections)
+    extraction, missing, _ = validate_extraction(parsed.value, incomplete=parsed.open_path[:1])
+    missing = [section for section in missing if section in sections]
+    if count:
+        count_reply(parsed.repairs, missing, tally)
+    return extraction, missing
+
+def reply_is_complete(content: str, sections: List[str] = EXTRACTION_SECTIONS) -> bool:
+    """True if a single-chunk reply has every one of `sections`; only such replies are cached."""
+    return not parse_extraction(content, sections, count=False)[1]
+
+def complete(prompt: str, label: str, mock_reply, is_mock: bool, limiter: RateLimiter,
+             max_retries: int = MAX_RETRIES, mock_latency: float = MOCK_LATENCY,
+             cache: ResponseCache = None, params: Dict = None, purpose: str = None, validate=None,
+             tally: ReplyTally = None) -> str:
+    """
+    Returns the model's reply to `prompt`.
+    Cached replies are served without touching the limiter. Failures are retried
+    with exponential backoff + jitter; only this request waits, other workers keep
+    going. Raises after `max_retries`.
+    Only replies that pass `validate(content)` are cached; a cached reply that fails
+    it (stored by an older run) is dropped and asked for again.
+    """
+    params = params or SAMPLING_PARAMS
+    model = "mock" if is_mock else MODEL_NAME
+
+    key = None
+    content = None
+    if cache is not None and cache.enabled:
+        key = cache_key(model, params, prompt)
+        content = cache.get(key)  # Raises CacheMiss in replay mode
+        if content is not None and validate is not None and not validate(content) and not cache.replay:
+            cache.delete(key)
+            RUN.count("llm.cache_invalid")
+            content = None
+        if content is not None:
+            RUN.count("llm.cache_hits")
+
+    if content is None:
+        cost = estimate_tokens(prompt) + params["max_tokens"]
+        for attempt in range(max_retries + 1):
+            RUN.observe("llm.limiter_wait", limiter.acquire(cost))
+            started = time.perf_counter()
+            try:
+                content = call_model(prompt, is_mock, mock_reply, mock_latency, params, purpose, tally)
+                RUN.observe("llm.latency", time.perf_counter() - started)
+                RUN.count("llm.requests")
+                break
+            except Exception as e:
+                RUN.count("llm.errors")
+                if attempt == max_retries:
+                    raise
+                RUN.count("llm.retries")
+                delay = backoff_delay(attempt, BACKOFF_BASE, BACKOFF_CAP)
+                print(f"  [RETRY] {label} attempt {attempt + 1} failed: {e}. Retrying in {delay:.1f}s...")
+                time.sleep(delay)
+
+        if key is not None and (validate is None or validate(content)):
+            cache.put(key, model, content)
+    return content
+
+def chunk_record(chunk: Dict, extraction: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "chunk_id": chunk["chunk_id"],
+        "chapter_order": chunk["chapter_order"],
+        "scene_index": chunk["scene_index"],
+        "text_sha256": text_sha256(chunk["text"]),
+        "extraction": extraction
+    }
+
+def extract_chunk(chunk: Dict, roster: str, is_mock: bool, limiter: RateLimiter,
+                  max_retries: int = MAX_RETRIES, mock_latency: float = MOCK_LATENCY,
+                  cache: ResponseCache = None, tally: ReplyTally = None) -> Dict[str, Any]:
+    """
+    Extracts entities from a single chunk.
+    Raises after `max_retries` failed requests so the chunk stays unprocessed,
+    and IncompleteExtraction when the reply lacks valid characters/locations.
+    """
+    prompt = construct_prompt(chunk["text"], roster)
+    content = complete(prompt, f"Chunk {chunk['chunk_id']}", lambda: mock_generate_content(chunk["text"]),
+                       is_mock, limiter, max_retries, mock_latency, cache, validate=reply_is_complete)
+    extraction, missing = parse_extraction(content, tally=tally)
+    if missing:
+        raise IncompleteExtraction(chunk, extraction, missing)
+    return chunk_record(chunk, extraction)
+
+def repair_chunk(error: IncompleteExtraction, roster: str, is_mock: bool, limiter: RateLimiter,
+                 max_retries: int = MAX_RETRIES, mock_latency: float = MOCK_LATENCY,
+                 cache: ResponseCache = None, tally: ReplyTally = None) -> Dict[str, Any]:
+    """
+    Asks again for only the sections `error` is missing and merges them into its
+    partial extraction. Raises IncompleteExtraction if some are still missing.
+    A failed repair reply is not cached, so the next round (or run) asks the model again.
+    """
+    chunk = error.chunk
+    prompt = construct_repair_prompt(chunk["text"], roster, error.missing)
+    content = complete(prompt, f"Repair {chunk['chunk_id']}",
+                       lambda: mock_generate_repair(chunk["text"], error.missing),
+                       is_mock, limiter, max_retries, mock_latency, cache, purpose="repair",
+                       validate=lambda reply: reply_is_complete(reply, error.missing), tally=tally)
+    extraction, missing = parse_extraction(content, error.missing, tally=tally)
+    merged = dict(error.extraction)
+    merged.update({section: extraction[section] for section in error.missing if section not in missing})
+    if missing:
+        raise IncompleteExtraction(chunk, merged, missing)
+    return chunk_record(chunk, merged)
+
+def split_batch_reply(content: str, chunks: List[Dict], count: bool = True, tally: ReplyTally = None):
+    """
+    Per-chunk extractions from a batched reply, keyed by chunk_id.
+    Returns (answered, partial): complete extractions, and (extraction, missing)
+    for scenes whose entry lacks or cut off a section. Scenes with no entry at
+    all are in neither, so the caller can retry them one by one.
+    With `count`, each entry goes to the run report's parse counters (and `tally`).
+    """
+    wanted = {chunk["chunk_id"] for chunk in chunks}
+    try:
+        parsed = parse_json(content)
+    except JSONRepairError:
+        return {}, {}
+    results = parsed.value.get("results")
+    if not isinstance(results, dict):
+        return {}, {}
+    answered = {}
+    partial = {}
+    for chunk_id, entry in results.items():
+        if chunk_id not in wanted or not isinstance(entry, dict):
+            continue
+        open_path = parsed.open_path[2:3] if parsed.open_path[:2] == ["results", chunk_id] else []
+        extraction, missing, _ = validate_extraction(entry, incomplete=open_path)
+        if count:
+            count_reply(parsed.repairs, missing, tally)
+        if missing:
+            partial[chunk_id] = (extraction, missing)
+        else:
+            answered[chunk_id] = extraction
+    return answered, partial
+
+def extract_batch(chunks: List[Dict], roster: str, is_mock: bool, limiter: RateLimiter,
+                  max_retries: int = MAX_RETRIES, mock_latency: float = MOCK_LATENCY,
+                  cache: ResponseCache = None, single_rosters: Dict[str, str] = None, tally: ReplyTally = None):
+    """
+    Extracts several small chunks with one request.
+    Chunks the reply does not answer at all fall back to single-chunk calls
+    (with their own roster from `single_rosters`); chunks answered only in part
+    come back as IncompleteExtraction failures, for the repair queue.
+    Returns (records, failures, requests) where failures is [(chunk, exception)].
+    """
+    prompt = construct_batch_prompt(chunks, roster)
+    params = dict(SAMPLING_PARAMS, max_tokens=min(BATCH_MAX_OUTPUT_TOKENS, MAX_OUTPUT_TOKENS * len(chunks)))
+    label = f"Batch {chunks[0]['chunk_id']}..{chunks[-1]['chunk_id']}"
+    requests = 1
+    try:
+        content = complete(prompt, label, lambda: mock_generate_batch_content(chunks),
+                           is_mock, limiter, max_retries, mock_latency, cache, params,
+                           validate=lambda reply: len(split_batch_reply(reply, chunks, count=False)[0]) == len(chunks))
+        answered, partial = split_batch_reply(content, chunks, tally=tally)
+    except CacheMiss:
+        answered, partial = {}, {}  # Replay: the batch was never cached; single replies may be
+    except Exception as e:
+        print(f"  [BATCH] {label} failed: {e}. Falling back to single-chunk calls.")
+        answered, partial = {}, {}
+
+    records = []
+    failures = []
+    for chunk in chunks:
+        if chunk["chunk_id"] in partial:
+            extraction, sections = partial[chunk["chunk_id"]]
+            failures.append((chunk, IncompleteExtraction(chunk, extraction, sections)))
+    missing = [chunk for chunk in chunks if chunk["chunk_id"] not in answered and chunk["chunk_id"] not in partial]
+    if missing and len(missing) < len(chunks):
+        print(f"  [BATCH] {label}: {len(missing)} of {len(chunks)} scenes missing from reply. Retrying them singly.")
+    elif missing:
+        print(f"  [BATCH] {label}: malformed reply. Retrying {len(missing)} scenes singly.")
+    for chunk in chunks:
+        if chunk["chunk_id"] in answered:
+            records.append(chunk_record(chunk, answered[chunk["chunk_id"]]))
+    for chunk in missing:
+        requests += 1
+        try:
+            records.append(extract_chunk(chunk, (single_rosters or {}).get(chunk["chunk_id"], roster), is_mock,
+                                         limiter, max_retries, mock_latency, cache, tally))
+        except Exception as e:
+            failures.append((chunk, e))
+    return records, failures, requests
+
+def pack_batches(chunks: List[Dict], budget: int = BATCH_TOKEN_BUDGET, max_chunks: int = BATCH_MAX_CHUNKS):
+    """Groups consecutive chunks while their text fits in `budget` tokens; budget 0 = one chunk each."""
+    batches = []
+    current = []
+    used = 0
+    for chunk in chunks:
+        tokens = estimate_tokens(chunk["text"])
+        if current and (used + tokens > budget or len(current) >= max_chunks):
+            batches.append(current)
+            current = []
+            used = 0
+        current.append(chunk)
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def run_extraction_batch(volume_name, force_mock=False, concurrency=MAX_CONCURRENCY,
+                         requests_per_minute=None, tokens_per_minute=None,
+                         mock_latency=MOCK_LATENCY, chapter_prefix=None, max_chunks=None,
+                         cache_mode=None, roster_mode=ROSTER_MODE, route=ROUTE_MODE,
+                         route_min_score=ROUTE_MIN_SCORE, batch_budget=None, chapters=None, limiter=None,
+                         skip_duplicates=True, context_mode=CONTEXT_MODE):
+    """
+    Extracts entities for every pending chunk of a volume on a bounded thread pool.
+
+    Rate limits default to REQUESTS_PER_MINUTE / TOKENS_PER_MINUTE in live mode and
+    to unlimited in mock mode; pass `limiter` to share one RateLimiter between
+    volumes extracted in parallel. `chapters` is an inclusive (first, last) range of
+    chapter orders and `chapter_prefix` a chapter title prefix (None = all chapters);
+    `max_chunks` caps the number of new chunks.
+    `cache_mode` is one of llm_cache.MODES; it defaults to "readwrite" in live mode
+    and "off" in mock mode. "replay" serves only cached replies, keyed on MODEL_NAME
+    unless `force_mock`, and never builds the API client (no GLM_API_KEY needed).
+    `roster_mode` is "retrieval" (per-chunk candidate names) or "full" (whole wiki roster,
+    context mode "roster" only).
+    `route` is "spotter" (skip the API for chunks with nothing unresolved, see
+    ROUTE_MODE) or "all". Names count as known once an earlier run extracted them.
+    `batch_budget` packs small chunks into shared requests (default BATCH_TOKEN_BUDGET).
+    With `skip_duplicates`, scenes dedup.py found duplicated elsewhere are left out.
+    `context_mode` is "state" (chapter state slice in each prompt, chunks of a chapter
+    in order, see CONTEXT_MODE) or "roster".
+    Returns a stats dict.
+    """
+    # Replay serves recorded live replies, so it keys on MODEL_NAME even without an API key
+    is_mock = force_mock or (USE_MOCK and cache_mode != MODE_REPLAY)
+    print(f"Starting extraction for {volume_name} (Mode: {'MOCK' if is_mock else MODEL_NAME}, Workers: {concurrency})...")
     
     # 1. Load Data
-    chunks_path = os.path.join(DATA_DIR, volume_name, "chunks.json")
-    if not os.path.exists(chunks_path):
+    if not has_chunks(volume_name, DATA_DIR):
         print(f"Chunks not found for {volume_name}")
         return
 
-    chunks = load_json(chunks_path)
-    
     chars_path = os.path.join(WIKI_DIR, "characters.json")
     known_chars_data = load_json(chars_path)
     known_chars_str = get_known_characters_list(known_chars_data)
+    # The chapter state slice replaces the roster, so state mode always uses the retrieval candidates
+    gazetteer = Gazetteer.from_wiki(WIKI_DIR) if roster_mode == "retrieval" or context_mode == "state" else None
     
-    output_path = os.path.join(OUTPUT_DIR, volume_name, "extracted_entities.json")
-    
-    # Load existing to resume if needed
-    extracted_data = load_json(output_path)
-    processed_ids = set(item["chunk_id"] for item in extracted_data)
-    
-    count = 0
-    
-    for chunk in chunks:
-        # Chapter 1 filter
-        if chunk.get("chapter_title") != "1.00" and not str(chunk.get("chapter_title")).startswith("1.00"):
-                 continue
+    # Append-only result log; resume from its sidecar index of finished chunk_ids
+    store = ResultLog.for_volume(volume_name, OUTPUT_DIR).open()
+    done = store.processed_hashes()
+    # Chunks recorded with an unparseable reply by older runs are extracted again (the index keeps their status)
+    error_ids = store.error_ids()
+    processed_ids = set(done) - error_ids
+    if error_ids:
+        print(f"Retrying {len(error_ids)} chunks recorded with invalid JSON.")
+    duplicate_ids = set()
+    if skip_duplicates:
+        duplicate_ids = set(load_duplicates(os.path.join(DATA_DIR, volume_name), "scenes"))
+        duplicate_ids -= processed_ids
+        if duplicate_ids:
+            print(f"Skipping {len(duplicate_ids)} duplicate scenes (see dedup.py).")
 
-        # Resume check
-        if chunk["chunk_id"] in processed_ids:
-            continue
-            
-        print(f"Processing Chunk {chunk['chunk_id']} ({chunk['chapter_title']})...")
-        
-        prompt = construct_prompt(chunk["text"], known_chars_str)
-        
-        try:
-            content = ""
-            if is_mock:
-                content = mock_generate_content(chunk["text"])
-                time.sleep(0.1) # Fast!
+    def wanted(order, title):
+        # Chapter filter
+        if chapters and not chapters[0] <= order <= chapters[1]:
+            return False
+        return not chapter_prefix or str(title).startswith(chapter_prefix)
+
+    changed = []  # Recorded chunks whose text changed since (re-chunked with other sizing): pending again
+
+    def pending_chunks(rows):
+        """The chunks of (chunk_id, load) rows that still need extracting; only those are loaded."""
+        for chunk_id, load in rows:
+            if chunk_id in duplicate_ids:
+                continue
+            if chunk_id in processed_ids:
+                if done[chunk_id] is None:
+                    continue  # Recorded before text hashes were kept
+                chunk = load()
+                if text_sha256(chunk["text"]) == done[chunk_id]:
+                    continue
+                changed.append(chunk_id)
+                yield chunk
             else:
-                # Generate with GLM-4
-                response = client.chat.completions.create(
-                    model=MODEL_NAME, 
-                    messages=[
-                        {"role": "user", "content": prompt}
-                    ],
-                    top_p=0.7,
-                    temperature=0.1,
-                    max_tokens=2000
-                )
-                content = response.choices[0].message.content
-            
-            # Basic cleanup if code blocks are returned
-            if "```json" in content:
-                content = content.replace("```json", "").replace("```", "")
-            
-            # Parse result
-            try:
-                result_json = json.loads(content)
-            except json.JSONDecodeError:
-                print("  [ERROR] Invalid JSON from LLM. Skipping.")
-                result_json = {"error": "Invalid JSON", "raw": content}
-                
-            # Combine with metadata
-            combined_record = {
-                "chunk_id": chunk["chunk_id"],
-                "chapter_order": chunk["chapter_order"],
-                "scene_index": chunk["scene_index"],
-                "extraction": result_json
-            }
-            
-            extracted_data.append(combined_record)
-            
-            # Save incrementally (every 5 chunks)
-            if len(extracted_data) % 5 == 0:
-                save_json(extracted_data, output_path)
-                print(f"  Saved progress ({len(extracted_data)} chunks).")
-                
-            # Rate limiting
-            if not is_mock:
-                time.sleep(1) 
-            
+                yield load()
+
+    corpus = open_corpus(volume_name, DATA_DIR)
+    if corpus is not None:
+        # Columnar store: chapters are filtered by title and only the chunks that need it are decoded
+        chunk_ids = [corpus.chunk_id(row) for row in range(len(corpus))]
+        candidates = pending_chunks(
+            (chunk_ids[row], lambda row=row: corpus.chunk(row))
+            for order, title in corpus.chapter_titles() if wanted(order, title)
+            for row in corpus.chapter_rows(order)
+        )
+    else:
+        chunks = load_chunks(volume_name, DATA_DIR)
+        chunk_ids = [chunk["chunk_id"] for chunk in chunks]
+        candidates = pending_chunks(
+            (chunk["chunk_id"], lambda chunk=chunk: chunk)
+            for chunk in chunks if wanted(chunk["chapter_order"], chunk.get("chapter_title"))
+        )
+
+    pending = []
+    with RUN.stage("load") as add:
+        for chunk in candidates:
+            pending.append(chunk)
+            add(items=1, nbytes=len(chunk["text"].encode("utf-8")))
+            if max_chunks and len(pending) >= max_chunks:
+                break
+    if corpus is not None:
+        corpus.close()
+    if changed:
+        print(f"Re-extracting {len(changed)} chunks whose text changed since they were recorded.")
+
+    # The log itself is only read when spotter routing or the chapter state needs earlier records
+    needs_log = context_mode == "state" or (route == "spotter" and pending)
+    latest = store.latest_records() if needs_log else []
+
+    # Route: chunks with no unresolved names are answered from the spotter's mentions
+    routed_local = []
+    known = {}
+    if route == "spotter" and pending:
+        with RUN.stage("route") as add:
+            spot_volume(volume_name, processed_dir=DATA_DIR, wiki_dir=WIKI_DIR)
+            mentions = load_mentions(volume_name, DATA_DIR)
+            known = known_entities(latest)
+            to_llm = []
+            for chunk in pending:
+                mention_record = mentions.get(chunk["chunk_id"])
+                if mention_record is not None and can_route_locally(mention_record, known, route_min_score):
+                    routed_local.append((chunk, mention_record))
+                else:
+                    to_llm.append(chunk)
+            add(items=len(pending))
+            pending = to_llm
+
+    if limiter is None:
+        if not is_mock:
+            requests_per_minute = requests_per_minute or REQUESTS_PER_MINUTE
+            tokens_per_minute = tokens_per_minute or TOKENS_PER_MINUTE
+        limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+
+    if cache_mode is None:
+        cache_mode = MODE_OFF if is_mock else MODE_READWRITE
+    cache = ResponseCache(mode=cache_mode)
+
+    # Rebuilt from the records on disk, so a resumed run starts with the same context
+    state = ChapterState.from_records(latest) if context_mode == "state" else None
+
+    def slice_for(chunks):
+        """The chapter state slice for consecutive chunks of one chapter (None without state)."""
+        if state is None:
+            return None
+        entries = state.slice(chunks)
+        state_entries.append(len(entries))
+        return entries
+
+    def roster_for(chunks, entries=None):
+        """The prompt roster for `chunks`; in state mode, their slice plus the wiki names it does not cover."""
+        if not gazetteer:
+            return known_chars_str
+        names = list(dict.fromkeys(name for chunk in chunks for name in gazetteer.candidates(chunk["text"])))
+        if entries is not None:
+            return render_slice(entries, names)
+        return ", ".join(names) if names else "(none matched)"
+
+    def submit(pool, batch):
+        entries = slice_for(batch)
+        rosters = {chunk["chunk_id"]: roster_for([chunk], entries) for chunk in batch}
+        if len(batch) == 1:
+            return pool.submit(extract_chunk, batch[0], rosters[batch[0]["chunk_id"]], is_mock, limiter,
+                               MAX_RETRIES, mock_latency, cache, tally)
+        return pool.submit(extract_batch, batch, roster_for(batch, entries), is_mock, limiter,
+                           MAX_RETRIES, mock_latency, cache, rosters, tally)
+
+    count = 0
+    failed = 0
+    requests = 0    # Prompts sent (batched, single, fallback and repair; cache hits included)
+    api_count = 0   # Chunks answered by those prompts
+    repairs = []    # IncompleteExtraction errors queued for a repair prompt
+    repaired = 0
+    repair_requests = 0
+    state_entries = []  # Slice size per prompt (state mode)
+    tally = ReplyTally()  # This volume's parse outcomes; RUN also counts other volumes running in parallel
+    started = time.monotonic()
+
+    try:
+        for chunk, mention_record in routed_local:
+            record = dict(chunk_record(chunk, spotter_extraction(mention_record, known)), source="spotter")
+            store.append(record)
+            if state is not None:
+                state.add(record)
             count += 1
+        if routed_local:
+            print(f"Routed {len(routed_local)} chunks with nothing unresolved to the spotter (no API call).")
 
-        except Exception as e:
-            print(f"  [ERROR] API Failure: {e}")
-            if not is_mock:
-                print("  Sleeping for 60s...")
-                time.sleep(60)
-            
-    # Final save
-    save_json(extracted_data, output_path)
-    print("Done.")
+        budget = BATCH_TOKEN_BUDGET if batch_budget is None else batch_budget
+        if state is not None:
+            # One lane per chapter: its next batch is sent once the previous one is recorded
+            by_chapter = {}
+            for chunk in pending:
+                by_chapter.setdefault(chunk["chapter_order"], []).append(chunk)
+            lanes = [pack_batches(chapter_chunks, budget) for chapter_chunks in by_chapter.values()]
+        else:
+            lanes = [[batch] for batch in pack_batches(pending, budget)]
+        with RUN.stage("extract") as add, ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            futures = {}
+            for lane in lanes:
+                batch = lane.pop(0)
+                futures[submit(pool, batch)] = (batch, lane)
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch, lane = futures.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = ([], [(chunk, e) for chunk in batch], 1)
+                    if len(batch) == 1 and isinstance(result, dict):
+                        result = ([result], [], 1)
+                    records, failures, batch_requests = result
+                    requests += batch_requests
+                    add(items=len(records), nbytes=sum(len(chunk["text"].encode("utf-8")) for chunk in batch))
+
+                    for chunk, e in failures:
+                        if isinstance(e, IncompleteExtraction):
+                            repairs.append(e)
+                            continue
+                        if isinstance(e, CacheMiss):
+                            print(f"  [REPLAY] No cached response for {chunk['chunk_id']}. Skipping.")
+                        else:
+                            print(f"  [ERROR] API Failure on {chunk['chunk_id']} after {MAX_RETRIES} retries: {e}")
+                        failed += 1
+
+                    titles = {chunk["chunk_id"]: chunk["chapter_title"] for chunk in batch}
+                    for combined_record in records:
+                        print(f"Processed Chunk {combined_record['chunk_id']} ({titles[combined_record['chunk_id']]})")
+                        # Durable per record; no periodic full rewrite needed
+                        store.append(combined_record)
+                        if state is not None:
+                            state.add(combined_record)
+                        count += 1
+                        api_count += 1
+
+                    if lane:
+                        batch = lane.pop(0)
+                        futures[submit(pool, batch)] = (batch, lane)
+
+            # Repair queue: re-ask only for the missing sections, on the same pool
+            for _ in range(REPAIR_ROUNDS):
+                if not repairs:
+                    break
+                print(f"Repairing {len(repairs)} incomplete replies...")
+                futures = {}
+                for e in repairs:
+                    roster = roster_for([e.chunk], slice_for([e.chunk]))
+                    futures[pool.submit(repair_chunk, e, roster, is_mock, limiter,
+                                        MAX_RETRIES, mock_latency, cache, tally)] = e
+                repairs = []
+                for future in as_completed(futures):
+                    chunk = futures[future].chunk
+                    requests += 1
+                    repair_requests += 1
+                    try:
+                        record = future.result()
+                    except IncompleteExtraction as e:
+                        repairs.append(e)
+                        continue
+                    except Exception as e:
+                        print(f"  [ERROR] Repair of {chunk['chunk_id']} failed: {e}")
+                        failed += 1
+                        continue
+                    print(f"Repaired Chunk {chunk['chunk_id']} ({chunk['chapter_title']})")
+                    add(items=1)
+                    store.append(record)
+                    if state is not None:
+                        state.add(record)
+                    count += 1
+                    api_count += 1
+                    repaired += 1
+            for e in repairs:
+                print(f"  [ERROR] {e.chunk['chunk_id']} still {e} after {REPAIR_ROUNDS} repair prompts. Left unprocessed.")
+                failed += 1
+    finally:
+        store.close()
+        cache_stats = cache.stats()
+        cache.close()
+
+    elapsed = time.monotonic() - started
+
+    # Export the compact log to the downstream JSON format, in corpus order
+    position = {chunk_id: i for i, chunk_id in enumerate(chunk_ids)}
+    with RUN.stage("export") as add:
+        exported = store.export_json(order=position)
+        add(items=exported)
+    print(f"Done. {count} chunks in {elapsed:.1f}s ({failed} failed). Exported {exported} records.")
+    if requests:
+        print(f"Requests: {requests} for {api_count} chunks ({api_count / requests:.2f} chunks/request).")
+    if cache_mode != MODE_OFF:
+        print(f"Cache ({cache_mode}): {cache_stats['hits']} hits, {cache_stats['misses']} misses.")
+    replies, parse_failures, repair_tokens = tally.replies, tally.parse_failures, tally.repair_tokens
+    if state_entries:
+        print(f"Chapter context: {sum(state_entries) / len(state_entries):.1f} entities per prompt "
+              f"({sum(1 for n in state_entries if n)} of {len(state_entries)} prompts had one).")
+    if parse_failures:
+        print(f"Parse failures: {parse_failures} of {replies} replies; {repaired} chunks repaired "
+              f"with {repair_requests} requests ({repair_tokens:,} tokens).")
+
+    return {
+        "processed": count,
+        "failed": failed,
+        "elapsed": elapsed,
+        "chunks_per_sec": count / elapsed if elapsed > 0 else 0.0,
+        "api_chunks": len(pending),
+        "routed_local": len(routed_local),
+        "duplicates_skipped": len(duplicate_ids),
+        "requests": requests,
+        "chunks_per_request": api_count / requests if requests else 0.0,
+        "cache": cache_stats,
+        "parse_failures": parse_failures,
+        "parse_failure_rate": parse_failures / replies if replies else 0.0,
+        "repaired": repaired,
+        "repair_requests": repair_requests,
+        "repair_tokens": repair_tokens,
+        "context_mode": context_mode,
+        "state_entries": sum(state_entries) / len(state_entries) if state_entries else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract characters and locations from chunked volumes.")
+    parser.add_argument("volumes", nargs="*", default=["Vol_01"], help="Volumes to extract (default: Vol_01)")
+    parser.add_argument("--chapters", help="Chapter order range, e.g. 1-10 (default: every chapter)")
+    parser.add_argument("--chapter-prefix", help="Only chapters whose title starts with this, e.g. 1.00")
+    parser.add_argument("--mock", action="store_true", help="Use mock replies even if GLM_API_KEY is set")
+    parser.add_argument("--workers", type=int, default=MAX_CONCURRENCY, help="Parallel in-flight requests")
+    parser.add_argument("--max-chunks", type=int, help="Cap on new chunks per volume")
+    parser.add_argument("--cache", choices=MODES, help="LLM cache mode (default: readwrite live, off in mock)")
+    parser.add_argument("--route", choices=("spotter", "all"), default=ROUTE_MODE)
+    parser.add_argument("--batch-budget", type=int, help=f"Pack small chunks per request (default {BATCH_TOKEN_BUDGET})")
+    parser.add_argument("--keep-duplicates", action="store_true", help="Also extract scenes dedup.py flagged")
+    parser.add_argument("--context", choices=("state", "roster"), default=CONTEXT_MODE,
+                        help="Chapter state in each prompt (chunks of a chapter in order), or the roster alone")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    RUN.start("extract_entities", profile=args.profile)
+    for volume_name in args.volumes:
+        run_extraction_batch(volume_name, force_mock=args.mock, concurrency=args.workers,
+                             chapter_prefix=args.chapter_prefix, chapters=parse_range(args.chapters),
+                             max_chunks=args.max_chunks, cache_mode=args.cache, route=args.route,
+                             batch_budget=args.batch_budget, skip_duplicates=not args.keep_duplicates,
+                             context_mode=args.context)
+    RUN.write_report(args.report)
 
 if __name__ == "__main__":
-    # You can force mock with a flag if needed, but for now defaulting logic:
-    run_extraction_batch("Vol_01", force_mock=True)
+    main()
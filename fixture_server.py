@@ -0,0 +1,238 @@
+"""
+Local HTTP stand-in for wanderinginn.com, serving the saved pages in fixtures/site.
+
+Supports ETag / Last-Modified validators and 304 responses, and counts requests,
+so scrapers can be exercised offline:
+
+    python fixture_server.py --port 8000
+    python scrape_chapters.py --base-url http://127.0.0.1:8000/table-of-contents/ --data-dir /tmp/raw
+
+/api.php answers the subset of the MediaWiki API that scrape_wiki.py uses
+(categorymembers, revisions + redirects, continuation), from fixtures/wiki/api.json:
+
+    python scrape_wiki.py --api-url http://127.0.0.1:8000/api.php --data-dir /tmp/wiki
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURE_DIR = "fixtures/site"
+WIKI_FIXTURE = "fixtures/wiki/api.json"
+API_PATH = "/api.php"
+
+
+class FakeMediaWiki:
+    """
+    MediaWiki API stand-in over a fixture of the form
+    {"categories": {category: {"pages": [title], "subcats": [category]}},
+     "pages": {title: {"content": wikitext, "redirects": [title]}}}.
+    Continuation tokens are offsets; like the real API, more than MAX_TITLES
+    titles per request is an error.
+    """
+
+    MAX_TITLES = 50
+    MAX_LIMIT = 500
+
+    def __init__(self, data):
+        self.categories = data.get("categories", {})
+        self.pages = data.get("pages", {})
+        self.ids = {}
+        for title in list(self.pages) + list(self.categories):
+            self.ids.setdefault(title, len(self.ids) + 1)
+
+    @classmethod
+    def load(cls, path=WIKI_FIXTURE):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _limit(self, value, default):
+        if value == "max":
+            return self.MAX_LIMIT
+        return min(int(value or default), self.MAX_LIMIT)
+
+    def _category_members(self, params):
+        category = self.categories.get(params.get("cmtitle"), {})
+        types = set(params.get("cmtype", "page|subcat").replace(",", "|").split("|"))
+        members = []
+        if "page" in types:
+            members += [{"pageid": self.ids.get(t, 0), "ns": 0, "title": t} for t in category.get("pages", [])]
+        if "subcat" in types:
+            members += [{"pageid": self.ids.get(t, 0), "ns": 14, "title": t} for t in category.get("subcats", [])]
+        start = int(params.get("cmcontinue") or 0)
+        end = start + self._limit(params.get("cmlimit"), 10)
+        reply = {"query": {"categorymembers": members[start:end]}}
+        if end < len(members):
+            reply["continue"] = {"cmcontinue": str(end), "continue": "-||"}
+        else:
+            reply["batchcomplete"] = True
+        return reply
+
+    def _pages(self, params):
+        titles = params.get("titles", "").split("|")
+        if len(titles) > self.MAX_TITLES:
+            return {"error": {"code": "toomanyvalues",
+                              "info": f"Too many values supplied for parameter \"titles\". The limit is {self.MAX_TITLES}."}}
+        props = set(params.get("prop", "").split("|"))
+        continuing = "rdcontinue" in params
+        # Redirects are paged across the whole batch, rdlimit at a time
+        start = int(params.get("rdcontinue") or 0)
+        limit = self._limit(params.get("rdlimit"), 10)
+        position = 0
+        more = False
+        pages = []
+        for title in titles:
+            if title not in self.pages:
+                pages.append({"ns": 0, "title": title, "missing": True})
+                continue
+            page = {"pageid": self.ids[title], "ns": 0, "title": title}
+            if "revisions" in props and not continuing:
+                page["revisions"] = [{"slots": {"main": {"content": self.pages[title].get("content", "")}}}]
+            if "redirects" in props:
+                redirects = []
+                for redirect in self.pages[title].get("redirects", []):
+                    if start <= position < start + limit:
+                        redirects.append({"pageid": self.ids.get(redirect, 0), "ns": 0, "title": redirect})
+                    more = more or position >= start + limit
+                    position += 1
+                if redirects:
+                    page["redirects"] = redirects
+            pages.append(page)
+        reply = {"query": {"pages": pages}}
+        if more:
+            reply["continue"] = {"rdcontinue": str(start + limit), "continue": "||revisions"}
+        else:
+            reply["batchcomplete"] = True
+        return reply
+
+    def handle(self, params):
+        """JSON reply for one API request (params: {name: value})."""
+        if params.get("action") != "query":
+            return {"error": {"code": "badvalue", "info": "Only action=query is supported."}}
+        if params.get("list") == "categorymembers":
+            return self._category_members(params)
+        if "titles" in params:
+            return self._pages(params)
+        return {"error": {"code": "badvalue", "info": "Unsupported query."}}
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so connection pooling is observable
+    disable_nagle_algorithm = True  # Headers and body are separate writes; Nagle would hold the body ~40 ms
+
+    def log_message(self, format, *args):
+        pass  # Quiet; see server.stats instead
+
+    def do_GET(self):
+        stats = self.server.stats
+        with self.server.lock:
+            stats["requests"] += 1
+            stats["paths"].append(self.path)
+
+        path = urlsplit(self.path).path
+        if path == API_PATH:
+            self._api()
+            return
+        filepath = os.path.normpath(os.path.join(self.server.root, path.lstrip("/"), "index.html"))
+        if not filepath.startswith(os.path.abspath(self.server.root)) or not os.path.isfile(filepath):
+            self._send(404, b"Not Found", {"Content-Type": "text/plain"})
+            return
+
+        with open(filepath, "rb") as f:
+            body = f.read()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        mtime = int(os.path.getmtime(filepath))
+        headers = {
+            "Content-Type": "text/html; charset=utf-8",
+            "ETag": etag,
+            "Last-Modified": formatdate(mtime, usegmt=True),
+        }
+
+        if self._not_modified(etag, mtime):
+            with self.server.lock:
+                stats["not_modified"] += 1
+            self._send(304, b"", headers)
+            return
+        self._send(200, body, headers)
+
+    def _api(self):
+        wiki = self.server.wiki
+        with self.server.lock:
+            self.server.stats["api_requests"] += 1
+            failing = self.server.fail_api_after is not None and \
+                self.server.stats["api_requests"] > self.server.fail_api_after
+        if wiki is None or failing:
+            self._send(503 if failing else 404, b"Unavailable", {"Content-Type": "text/plain"})
+            return
+        if self.server.api_latency:
+            time.sleep(self.server.api_latency)
+        params = {name: values[-1] for name, values in parse_qs(urlsplit(self.path).query).items()}
+        body = json.dumps(wiki.handle(params)).encode("utf-8")
+        self._send(200, body, {"Content-Type": "application/json; charset=utf-8"})
+
+    def _not_modified(self, etag, mtime):
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return etag in [tag.strip() for tag in if_none_match.split(",")]
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                return mtime <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _send(self, status, body, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+
+def serve(root=FIXTURE_DIR, host="127.0.0.1", port=0, handler=FixtureHandler, wiki=None):
+    """
+    Starts the stand-in on a background thread. Returns (server, base_url);
+    call server.shutdown() when done. `port=0` picks a free port.
+    `wiki` is a FakeMediaWiki (default: loaded from WIKI_FIXTURE if present).
+    Set server.fail_api_after = n to answer 503 to every API request after the n-th,
+    and server.api_latency to delay each API reply by that many seconds.
+    """
+    if wiki is None and os.path.exists(WIKI_FIXTURE):
+        wiki = FakeMediaWiki.load()
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.root = os.path.abspath(root)
+    server.lock = threading.Lock()
+    server.wiki = wiki
+    server.fail_api_after = None
+    server.api_latency = 0.0
+    server.stats = {"requests": 0, "not_modified": 0, "api_requests": 0, "paths": []}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default=FIXTURE_DIR)
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    server, base_url = serve(args.root, port=args.port)
+    print(f"Serving {args.root} at {base_url}/ (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import difflib
+import json
+import os
+import re
+import unicodedata
+from functools import lru_cache
+
+WIKI_DIR = "data/wiki"
+ALIASES_FILE = "aliases.json"  # Optional {canonical: [alias, ...]}
+KIND_NAMES = {"characters": "character", "locations": "location", "classes": "class"}
+
+# Variants that would fire on ordinary prose
+STOP_VARIANTS = {
+    "A", "An", "The", "Of", "Du", "De", "Del", "Der", "Van", "Von", "Ve", "Mr", "Mrs", "Miss",
+    "Lord", "Lady", "Sir", "King", "Queen", "Prince", "Princess", "General", "Captain",
+    "He", "She", "It", "They", "We", "You", "I", "Yes", "No", "Oh", "And", "But",
+}
+MIN_VARIANT_LEN = 3
+FUZZY_MIN_LEN = 5
+FUZZY_CUTOFF = 0.85
+
+TOKEN_RE = re.compile(r"\w+(?:['\-]\w+)*")
+PAREN_RE = re.compile(r"\s*\([^)]*\)")
+
+# Length-preserving fold: typographic apostrophes -> "'", accented Latin -> base letter
+_FOLD_TABLE = {ord(c): "'" for c in "’‘`´ʼ"}
+for _code in range(0xC0, 0x250):
+    _decomposed = unicodedata.normalize("NFKD", chr(_code))
+    if len(_decomposed) > 1 and _decomposed[0].isascii() and _decomposed[0].isalpha():
+        _FOLD_TABLE[_code] = _decomposed[0]
+
+
+def fold_text(text):
+    """Folds apostrophes and diacritics without changing string length, so offsets still line up."""
+    return text.translate(_FOLD_TABLE)
+
+
+def normalize_name(name):
+    """Lookup form of a name: folded, parenthetical qualifiers removed, whitespace collapsed."""
+    return " ".join(fold_text(PAREN_RE.sub("", name)).split())
+
+
+def name_variants(title):
+    """
+    Surface forms a wiki title is likely to appear as in the text:
+    full name (without qualifier), first name and last name.
+    """
+    base = normalize_name(title)
+    tokens = TOKEN_RE.findall(base)
+    variants = {base}
+    if len(tokens) > 1:
+        for token in (tokens[0], tokens[-1]):
+            if len(token) >= MIN_VARIANT_LEN and token not in STOP_VARIANTS:
+                variants.add(token)
+    return {v for v in variants if v and v not in STOP_VARIANTS}
+
+
+def load_wiki_titles(filename, wiki_dir=WIKI_DIR):
+    path = os.path.join(wiki_dir, filename)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [entry["title"] for entry in json.load(f) if "title" in entry]
+
+
+def load_aliases(wiki_dir=WIKI_DIR):
+    path = os.path.join(wiki_dir, ALIASES_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class Gazetteer:
+    """
+    Token-level trie over entity name variants.
+
+    Text is tokenized once and every token position is walked down the trie
+    (longest match wins), so matching is linear in the text and respects word
+    boundaries. Unmatched capitalized tokens can fall back to fuzzy matching
+    against single-token variants (typos, partial names like "Pisc").
+    """
+
+    def __init__(self, entities, aliases=None, fuzzy=True):
+        """`entities` maps canonical name -> kind (e.g. "character")."""
+        self.kinds = dict(entities)
+        self.trie = {}
+        self.single = {}  # single-token variant -> canonicals, for fuzzy lookup
+        self.fuzzy = fuzzy
+
+        for canonical in entities:
+            for variant in name_variants(canonical):
+                self._add(variant, canonical)
+        for canonical, names in (aliases or {}).items():
+            if canonical not in self.kinds:
+                continue
+            for alias in names:
+                alias = normalize_name(alias)
+                if alias and alias not in STOP_VARIANTS:
+                    self._add(alias, canonical)
+
+        # Fuzzy candidates are bucketed by first letter to keep difflib scans short
+        self._single_keys = {}
+        for key in sorted(self.single):
+            self._single_keys.setdefault(key[0], []).append(key)
+        self._fuzzy_lookup = lru_cache(maxsize=65536)(self._fuzzy_uncached)
+
+    @classmethod
+    def from_wiki(cls, wiki_dir=WIKI_DIR, kinds=("characters",), fuzzy=True):
+        """Builds from the scraped wiki lists; `kinds` picks characters / locations / classes."""
+        entities = {}
+        for kind in kinds:
+            for title in load_wiki_titles(f"{kind}.json", wiki_dir):
+                entities.setdefault(title, KIND_NAMES.get(kind, kind))
+        return cls(entities, aliases=load_aliases(wiki_dir), fuzzy=fuzzy)
+
+    def _add(self, variant, canonical):
+        tokens = TOKEN_RE.findall(variant)
+        if not tokens:
+            return
+        node = self.trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        node.setdefault(None, set()).add(canonical)
+        if len(tokens) == 1:
+            self.single.setdefault(tokens[0], set()).add(canonical)
+
+    def _fuzzy_uncached(self, token):
+        keys = [k for k in self._single_keys.get(token[0], ()) if abs(len(k) - len(token)) <= 2]
+        close = difflib.get_close_matches(token, keys, n=3, cutoff=FUZZY_CUTOFF)
+        found = set()
+        for key in close:
+            found |= self.single[key]
+        return frozenset(found)
+
+    def find(self, text):
+        """
+        Yields (start, end, surface, canonicals, fuzzy) for every name mention in `text`.
+        Offsets index into the original string.
+        """
+        folded = fold_text(text)
+        matches = list(TOKEN_RE.finditer(folded))
+        i = 0
+        n = len(matches)
+        while i < n:
+            node = self.trie
+            best = None
+            j = i
+            while j < n:
+                token = matches[j].group()
+                nxt = node.get(token)
+                if nxt is None and token.endswith("'s"):
+                    nxt = node.get(token[:-2])  # Possessive on the last token
+                if nxt is None:
+                    break
+                node = nxt
+                if None in node:
+                    best = (j, node[None])
+                j += 1
+
+            if best is not None:
+                end_idx, canonicals = best
+                start, end = matches[i].start(), matches[end_idx].end()
+                yield start, end, text[start:end], canonicals, False
+                i = end_idx + 1
+                continue
+
+            token = matches[i].group()
+            if (self.fuzzy and len(token) >= FUZZY_MIN_LEN and token[0].isupper()
+                    and token not in STOP_VARIANTS):
+                canonicals = self._fuzzy_lookup(token)
+                if canonicals:
+                    yield matches[i].start(), matches[i].end(), text[matches[i].start():matches[i].end()], canonicals, True
+            i += 1
+
+    def candidates(self, text):
+        """Canonical names plausibly mentioned in `text`, in order of first mention."""
+        seen = {}
+        for _, _, _, canonicals, _ in self.find(text):
+            for name in sorted(canonicals):
+                seen.setdefault(name, None)
+        return list(seen)
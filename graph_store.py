@@ -0,0 +1,407 @@
+"""
+SQLite knowledge-graph store for extraction results.
+
+`ingest` normalizes each volume's extracted_entities.json into indexed tables:
+
+    entities     (id, name, name_key, kind)              one row per (name_key, kind)
+    mentions     (entity_id, volume, chapter_order, chunk_id, scene_index, type, confidence, context, surface)
+    cooccurrence (volume, a, b, weight)                  a < b, entities sharing a chunk
+    chapters     (volume, chapter_order, chapter_title)
+    volumes      (volume, source stat/sha256, record count)
+
+Extracted names are resolved to canonical wiki titles (canonicalize.py), so
+"Pisc" and "Pisces" become one entity; the name as extracted is kept as the
+mention's `surface`. Aliases ("The Necromancer") need data/wiki/aliases.json
+from scrape_wiki.py; ingest again with --force after it changes.
+
+Volumes are ingested in one transaction each and only when their export
+changed. Queries (appearances, neighbours, first appearance) hit indexes only.
+
+    python graph_store.py ingest [Vol_01 ...] [--force]
+    python graph_store.py appearances "Relc"
+    python graph_store.py neighbours "Erin Solstice" [--limit 10]
+    python graph_store.py first "Klbkch"
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+from checkpoint_store import EXPORT_FILENAME, OUTPUT_DIR
+from canonicalize import Canonicalizer
+from chunk_chapters import file_sha256, iter_chunks
+from corpus_store import open_corpus
+from gazetteer import WIKI_DIR, normalize_name
+
+GRAPH_PATH = "data/graph/entities.sqlite"
+ENTITY_KINDS = {"characters": "character", "locations": "location"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS volumes (
+    volume TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    records INTEGER NOT NULL,
+    ingested_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entities (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    UNIQUE (name_key, kind)
+);
+CREATE TABLE IF NOT EXISTS chapters (
+    volume TEXT NOT NULL,
+    chapter_order INTEGER NOT NULL,
+    chapter_title TEXT,
+    PRIMARY KEY (volume, chapter_order)
+);
+CREATE TABLE IF NOT EXISTS mentions (
+    entity_id INTEGER NOT NULL REFERENCES entities(id),
+    volume TEXT NOT NULL,
+    chapter_order INTEGER NOT NULL,
+    chunk_id TEXT NOT NULL,
+    scene_index INTEGER,
+    type TEXT,
+    confidence REAL,
+    context TEXT,
+    surface TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_mentions_entity ON mentions(entity_id, volume, chapter_order);
+CREATE INDEX IF NOT EXISTS idx_mentions_volume ON mentions(volume);
+CREATE TABLE IF NOT EXISTS cooccurrence (
+    volume TEXT NOT NULL,
+    a INTEGER NOT NULL,
+    b INTEGER NOT NULL,
+    weight INTEGER NOT NULL,
+    PRIMARY KEY (volume, a, b)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_cooccurrence_a ON cooccurrence(a, b);
+CREATE INDEX IF NOT EXISTS idx_cooccurrence_b ON cooccurrence(b, a);
+"""
+
+
+def name_key(name):
+    """Lookup form of an entity name: normalized and case-folded."""
+    return normalize_name(name).casefold()
+
+
+def chapter_titles(vol_name, processed_dir=None):
+    """{chapter_order: title} from the corpus store (or chunks), for display; {} if unavailable."""
+    corpus = open_corpus(vol_name, processed_dir)
+    if corpus is not None:
+        with corpus:
+            return dict(corpus.chapter_titles())
+    titles = {}
+    for chunk in iter_chunks(vol_name, processed_dir):
+        titles.setdefault(chunk["chapter_order"], chunk["chapter_title"])
+    return titles
+
+
+class GraphStore:
+    """Entity/mention/co-occurrence tables in one SQLite file."""
+
+    def __init__(self, path=None, read_only=False, wiki_dir=None):
+        self.path = path or GRAPH_PATH
+        self.wiki_dir = wiki_dir or WIKI_DIR
+        self._canonicalizers = None
+        if read_only:
+            # Query-only handle (query_server.py): no schema writes, fails if the file is missing
+            self.conn = sqlite3.connect(f"file:{os.path.abspath(self.path)}?mode=ro", uri=True)
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        if "surface" not in {row[1] for row in self.conn.execute("PRAGMA table_info(mentions)")}:
+            # Graph from before canonicalization: its entities are raw names, so everything is
+            # dropped and every volume is ingested again
+            self.conn.execute("ALTER TABLE mentions ADD COLUMN surface TEXT")
+            for table in ("volumes", "mentions", "cooccurrence", "chapters", "entities"):
+                self.conn.execute(f"DELETE FROM {table}")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- Ingestion ---
+
+    def volume_is_fresh(self, vol_name, path):
+        """True if `path` matches what was last ingested for the volume (stat, then sha256)."""
+        row = self.conn.execute("SELECT sha256, size, mtime FROM volumes WHERE volume = ?", (vol_name,)).fetchone()
+        if row is None:
+            return False
+        stat = os.stat(path)
+        if row[1] != stat.st_size:
+            return False
+        return row[2] == stat.st_mtime or row[0] == file_sha256(path)
+
+    def canonical_name(self, name, kind):
+        """The wiki title `name` resolves to, else the name itself (normalized)."""
+        if self._canonicalizers is None:
+            self._canonicalizers = {kind: Canonicalizer.from_wiki(self.wiki_dir, (field,))
+                                    for field, kind in ENTITY_KINDS.items()}
+        return self._canonicalizers[kind].canonical(name) or normalize_name(name)
+
+    def _entity_ids(self, keys):
+        """Ids for {(name_key, kind): display name}, inserting new entities."""
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO entities (name, name_key, kind) VALUES (?, ?, ?)",
+            [(name, key, kind) for (key, kind), name in keys.items()]
+        )
+        ids = {}
+        for key, kind, entity_id in self.conn.execute("SELECT name_key, kind, id FROM entities"):
+            if (key, kind) in keys:
+                ids[(key, kind)] = entity_id
+        return ids
+
+    def ingest_records(self, vol_name, records, titles=None, source=None):
+        """
+        Replaces a volume's mentions, co-occurrence edges and chapter rows with
+        those from `records`, in one transaction; names are canonicalized.
+        Returns the number of mentions.
+        """
+        titles = titles or {}
+        keys = {}
+        rows = []     # (key, kind, chapter_order, chunk_id, scene_index, type, confidence, context, surface)
+        chunks = {}   # chunk_id -> set of (key, kind)
+        chapters = set()
+        for record in records:
+            extraction = record.get("extraction") or {}
+            if "error" in extraction:
+                continue
+            chunk_id = record["chunk_id"]
+            chapters.add(record["chapter_order"])
+            for field, kind in ENTITY_KINDS.items():
+                for entity in extraction.get(field) or []:
+                    if not isinstance(entity, dict) or not entity.get("name"):
+                        continue
+                    canonical = self.canonical_name(entity["name"], kind)
+                    key = name_key(canonical)
+                    if not key:
+                        continue
+                    keys.setdefault((key, kind), canonical)
+                    chunks.setdefault(chunk_id, set()).add((key, kind))
+                    confidence = entity.get("confidence")
+                    rows.append((key, kind, record["chapter_order"], chunk_id, record.get("scene_index"),
+                                 entity.get("type"), confidence if isinstance(confidence, (int, float)) else None,
+                                 entity.get("context"), entity["name"]))
+
+        with self.conn:  # One transaction per volume
+            self.conn.execute("DELETE FROM mentions WHERE volume = ?", (vol_name,))
+            self.conn.execute("DELETE FROM cooccurrence WHERE volume = ?", (vol_name,))
+            self.conn.execute("DELETE FROM chapters WHERE volume = ?", (vol_name,))
+            ids = self._entity_ids(keys)
+
+            self.conn.executemany(
+                "INSERT INTO mentions (entity_id, volume, chapter_order, chunk_id, scene_index, type, confidence, "
+                "context, surface) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(ids[(key, kind)], vol_name) + tuple(rest) for key, kind, *rest in rows]
+            )
+
+            edges = {}
+            for members in chunks.values():
+                member_ids = sorted({ids[member] for member in members})
+                for i, a in enumerate(member_ids):
+                    for b in member_ids[i + 1:]:
+                        edges[(a, b)] = edges.get((a, b), 0) + 1
+            self.conn.executemany(
+                "INSERT INTO cooccurrence (volume, a, b, weight) VALUES (?, ?, ?, ?)",
+                [(vol_name, a, b, weight) for (a, b), weight in edges.items()]
+            )
+            self.conn.executemany(
+                "INSERT INTO chapters (volume, chapter_order, chapter_title) VALUES (?, ?, ?)",
+                [(vol_name, order, titles.get(order)) for order in sorted(chapters)]
+            )
+            self.conn.execute("DELETE FROM entities WHERE id NOT IN (SELECT DISTINCT entity_id FROM mentions)")
+
+            source = source or {"sha256": "", "size": 0, "mtime": 0.0}
+            self.conn.execute(
+                "INSERT OR REPLACE INTO volumes (volume, sha256, size, mtime, records, ingested_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (vol_name, source["sha256"], source["size"], source["mtime"], len(chunks), time.time())
+            )
+        return len(rows)
+
+    def ingest_volume(self, vol_name, output_dir=None, force=False):
+        """Ingests one volume's export if it changed. Returns "ingested", "fresh" or None (no export)."""
+        path = os.path.join(output_dir or OUTPUT_DIR, vol_name, EXPORT_FILENAME)
+        if not os.path.exists(path):
+            return None
+        if not force and self.volume_is_fresh(vol_name, path):
+            print(f"  [FRESH] {vol_name}")
+            return "fresh"
+
+        started = time.perf_counter()
+        stat = os.stat(path)
+        source = {"sha256": file_sha256(path), "size": stat.st_size, "mtime": stat.st_mtime}
+        with open(path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        count = self.ingest_records(vol_name, records, chapter_titles(vol_name), source)
+        print(f"  [INGESTED] {vol_name}: {len(records)} chunks, {count} mentions "
+              f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return "ingested"
+
+    def ingest(self, vol_names=None, output_dir=None, force=False):
+        """Ingests every volume with an export (or just `vol_names`). Drops volumes whose export is gone."""
+        output_dir = output_dir or OUTPUT_DIR
+        if vol_names is None:
+            vol_names = [
+                name for name in sorted(os.listdir(output_dir))
+                if name.startswith("Vol_") and os.path.exists(os.path.join(output_dir, name, EXPORT_FILENAME))
+            ] if os.path.isdir(output_dir) else []
+            for (stale,) in self.conn.execute("SELECT volume FROM volumes").fetchall():
+                if stale not in vol_names:
+                    self.ingest_records(stale, [])
+                    self.conn.execute("DELETE FROM volumes WHERE volume = ?", (stale,))
+                    self.conn.commit()
+        return {vol_name: self.ingest_volume(vol_name, output_dir, force) for vol_name in vol_names}
+
+    # --- Queries ---
+
+    def find_entities(self, name, kind=None):
+        """
+        [(id, name, kind)] for a name (any kind unless `kind` is given). The name is
+        canonicalized as on ingest ("Pisc" -> Pisces Jealnet); if that finds nothing
+        for a kind, the name as given is looked up.
+        """
+        found = []
+        for entity_kind in [kind] if kind else ENTITY_KINDS.values():
+            for key in dict.fromkeys((name_key(self.canonical_name(name, entity_kind)), name_key(name))):
+                rows = self.conn.execute("SELECT id, name, kind FROM entities WHERE name_key = ? AND kind = ?",
+                                         (key, entity_kind)).fetchall()
+                if rows:
+                    found.extend(rows)
+                    break
+        return found
+
+    def appearances(self, name, kind=None):
+        """[(volume, chapter_order, chapter_title, mentions)] in reading order."""
+        ids = [row[0] for row in self.find_entities(name, kind)]
+        if not ids:
+            return []
+        marks = ",".join("?" * len(ids))
+        return self.conn.execute(f"""
+            SELECT m.volume, m.chapter_order, c.chapter_title, COUNT(*)
+            FROM mentions m
+            LEFT JOIN chapters c ON c.volume = m.volume AND c.chapter_order = m.chapter_order
+            WHERE m.entity_id IN ({marks})
+            GROUP BY m.volume, m.chapter_order
+            ORDER BY m.volume, m.chapter_order
+        """, ids).fetchall()
+
+    def first_appearance(self, name, kind=None):
+        """(volume, chapter_order, chapter_title, chunk_id) of the earliest mention, or None."""
+        ids = [row[0] for row in self.find_entities(name, kind)]
+        if not ids:
+            return None
+        marks = ",".join("?" * len(ids))
+        return self.conn.execute(f"""
+            SELECT m.volume, m.chapter_order, c.chapter_title, m.chunk_id
+            FROM mentions m
+            LEFT JOIN chapters c ON c.volume = m.volume AND c.chapter_order = m.chapter_order
+            WHERE m.entity_id IN ({marks})
+            ORDER BY m.volume, m.chapter_order, m.scene_index
+            LIMIT 1
+        """, ids).fetchone()
+
+    def neighbours(self, name, kind=None, limit=20, volume=None):
+        """[(name, kind, shared_chunks)] of entities co-occurring with `name`, strongest first."""
+        ids = [row[0] for row in self.find_entities(name, kind)]
+        if not ids:
+            return []
+        marks = ",".join("?" * len(ids))
+        volume_filter = "AND volume = ?" if volume else ""
+        params = ids + ([volume] if volume else []) + ids + ([volume] if volume else []) + [limit]
+        return self.conn.execute(f"""
+            SELECT e.name, e.kind, SUM(edges.weight) AS weight
+            FROM (
+                SELECT b AS other, weight FROM cooccurrence WHERE a IN ({marks}) {volume_filter}
+                UNION ALL
+                SELECT a AS other, weight FROM cooccurrence WHERE b IN ({marks}) {volume_filter}
+            ) edges
+            JOIN entities e ON e.id = edges.other
+            GROUP BY edges.other
+            ORDER BY weight DESC, e.name
+            LIMIT ?
+        """, params).fetchall()
+
+    def cooccurrence(self, name_a, name_b):
+        """[(volume, shared_chunks)] for two entities, per volume."""
+        ids_a = [row[0] for row in self.find_entities(name_a)]
+        ids_b = [row[0] for row in self.find_entities(name_b)]
+        if not ids_a or not ids_b:
+            return []
+        pairs = [(min(a, b), max(a, b)) for a in ids_a for b in ids_b if a != b]
+        if not pairs:
+            return []
+        where = " OR ".join("(a = ? AND b = ?)" for _ in pairs)
+        return self.conn.execute(f"""
+            SELECT volume, SUM(weight) FROM cooccurrence WHERE {where}
+            GROUP BY volume ORDER BY volume
+        """, [value for pair in pairs for value in pair]).fetchall()
+
+    def stats(self):
+        counts = {}
+        for table in ("volumes", "entities", "mentions", "cooccurrence"):
+            counts[table] = self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest extraction results into the entity graph and query it.")
+    parser.add_argument("--path", default=GRAPH_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    ingest = sub.add_parser("ingest", help="Load changed extracted_entities.json exports")
+    ingest.add_argument("volumes", nargs="*", help="Volumes to ingest (default: all with an export)")
+    ingest.add_argument("--force", action="store_true")
+    for name in ("appearances", "neighbours", "first"):
+        cmd = sub.add_parser(name)
+        cmd.add_argument("name")
+        cmd.add_argument("--kind", choices=sorted(ENTITY_KINDS.values()))
+        if name == "neighbours":
+            cmd.add_argument("--limit", type=int, default=20)
+            cmd.add_argument("--volume")
+    args = parser.parse_args()
+
+    with GraphStore(args.path) as graph:
+        if args.command == "ingest":
+            graph.ingest(args.volumes or None, force=args.force)
+            print(", ".join(f"{n} {table}" for table, n in graph.stats().items()))
+            return
+
+        started = time.perf_counter()
+        if args.command == "appearances":
+            rows = graph.appearances(args.name, args.kind)
+            elapsed = time.perf_counter() - started
+            print(f"{args.name}: {len(rows)} chapters ({elapsed * 1000:.2f} ms)")
+            for volume, order, title, count in rows:
+                print(f"  {volume} #{order:<4} {title or '':<12} {count}")
+        elif args.command == "neighbours":
+            rows = graph.neighbours(args.name, args.kind, args.limit, args.volume)
+            elapsed = time.perf_counter() - started
+            print(f"{args.name}: {len(rows)} neighbours ({elapsed * 1000:.2f} ms)")
+            for name, kind, weight in rows:
+                print(f"  {name:<30} {kind:<10} {weight}")
+        else:
+            row = graph.first_appearance(args.name, args.kind)
+            elapsed = time.perf_counter() - started
+            if row is None:
+                print(f"{args.name}: not found ({elapsed * 1000:.2f} ms)")
+            else:
+                volume, order, title, chunk_id = row
+                print(f"{args.name}: first in {volume} #{order} {title or ''} (chunk {chunk_id}, {elapsed * 1000:.2f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Fast chapter-text extraction from wanderinginn.com pages.
+
+Finds the chapter body (#reader-content, else div.entry-content, else
+article.twi-article, same priority as the original BeautifulSoup lookup) and
+returns its text with one line per block element, so inline markup such as
+<em> no longer breaks a paragraph into several lines. <hr> becomes a "——"
+line that the scene splitter recognises.
+
+Backends:
+- "lxml":   C parser + XPath, used when lxml is installed.
+- "stream": stdlib HTMLParser that builds no tree and only buffers text inside
+            the candidate containers.
+"""
+from html.parser import HTMLParser
+
+try:
+    import lxml.html
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+SCENE_BREAK = "——"
+
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "figcaption",
+    "figure", "footer", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main",
+    "nav", "ol", "p", "pre", "section", "table", "td", "th", "tr", "ul",
+}
+SKIP_TAGS = {"script", "style", "noscript", "template"}
+
+# (tag, attribute, value) in priority order
+CONTENT_SELECTORS = [
+    ("div", "id", "reader-content"),
+    ("div", "class", "entry-content"),
+    ("article", "class", "twi-article"),
+]
+
+
+def _matches(tag, attrs, selector):
+    sel_tag, attr, value = selector
+    if attr == "id":
+        return attrs.get("id") == value  # Any tag may carry the id
+    return tag == sel_tag and value in (attrs.get(attr) or "").split()
+
+
+def _clean_line(pieces):
+    return " ".join("".join(pieces).split())
+
+
+class _StreamExtractor(HTMLParser):
+    """
+    Single pass over the page. Lines are appended once to a shared list while
+    inside any candidate container; each candidate just records its
+    [start, end) slice of that list.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines = []
+        self.pieces = []
+        self.open = []       # [selector_index, tag, depth, start_line]
+        self.spans = {}      # selector_index -> (start_line, end_line), first match wins
+        self.skip_depth = 0
+
+    def _flush(self):
+        if self.pieces:
+            line = _clean_line(self.pieces)
+            self.pieces = []
+            if line:
+                self.lines.append(line)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+            return
+        attrs = dict(attrs)
+        for entry in self.open:
+            if entry[1] == tag:
+                entry[2] += 1
+
+        if self.open and tag in BLOCK_TAGS:
+            self._flush()
+            if tag == "hr":
+                self.lines.append(SCENE_BREAK)
+
+        for index, selector in enumerate(CONTENT_SELECTORS):
+            if index not in self.spans and not any(e[0] == index for e in self.open) and _matches(tag, attrs, selector):
+                self._flush()
+                self.open.append([index, tag, 1, len(self.lines)])
+
+    def handle_startendtag(self, tag, attrs):
+        if self.open and tag in BLOCK_TAGS:
+            self._flush()
+            if tag == "hr":
+                self.lines.append(SCENE_BREAK)
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+            return
+        if not self.open:
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+        for entry in list(self.open):
+            if entry[1] == tag:
+                entry[2] -= 1
+                if entry[2] == 0:
+                    self._flush()
+                    self.spans[entry[0]] = (entry[3], len(self.lines))
+                    self.open.remove(entry)
+
+    def handle_data(self, data):
+        if self.open and not self.skip_depth:
+            self.pieces.append(data)
+
+    def result(self):
+        self._flush()
+        for entry in self.open:  # Unclosed containers run to end of document
+            self.spans.setdefault(entry[0], (entry[3], len(self.lines)))
+        for index in range(len(CONTENT_SELECTORS)):
+            if index in self.spans:
+                start, end = self.spans[index]
+                return "\n".join(self.lines[start:end])
+        return None
+
+
+def _extract_stream(html):
+    if isinstance(html, bytes):
+        html = html.decode("utf-8", errors="replace")
+    parser = _StreamExtractor()
+    parser.feed(html)
+    parser.close()
+    return parser.result()
+
+
+def _lxml_lines(element, lines, pieces):
+    """Walks an lxml subtree, appending one line per block element."""
+    for child in element:
+        tag = child.tag if isinstance(child.tag, str) else None
+        if tag in SKIP_TAGS or tag is None:
+            if child.tail:
+                pieces.append(child.tail)
+            continue
+        if tag in BLOCK_TAGS:
+            _flush_lxml(lines, pieces)
+            if tag == "hr":
+                lines.append(SCENE_BREAK)
+        if child.text:
+            pieces.append(child.text)
+        _lxml_lines(child, lines, pieces)
+        if tag in BLOCK_TAGS:
+            _flush_lxml(lines, pieces)
+        if child.tail:
+            pieces.append(child.tail)
+
+
+def _flush_lxml(lines, pieces):
+    if pieces:
+        line = _clean_line(pieces)
+        pieces.clear()
+        if line:
+            lines.append(line)
+
+
+def _extract_lxml(html):
+    root = lxml.html.fromstring(html)
+    for tag, attr, value in CONTENT_SELECTORS:
+        if attr == "id":
+            found = root.xpath(f'//*[@id="{value}"]')
+        else:
+            found = root.xpath(f'//{tag}[contains(concat(" ", normalize-space(@{attr}), " "), " {value} ")]')
+        if found:
+            lines = []
+            pieces = [found[0].text] if found[0].text else []
+            _lxml_lines(found[0], lines, pieces)
+            _flush_lxml(lines, pieces)
+            return "\n".join(lines)
+    return None
+
+
+def extract_chapter_text(html, backend="auto"):
+    """
+    Returns the chapter body text of a page (str or bytes), or None if no content
+    container is found. `backend` is "auto", "lxml" or "stream".
+    """
+    if backend == "auto":
+        backend = "lxml" if HAS_LXML else "stream"
+    if backend == "lxml":
+        return _extract_lxml(html)
+    if backend == "stream":
+        return _extract_stream(html)
+    raise ValueError(f"Unknown backend: {backend}")
@@ -0,0 +1,244 @@
+"""
+Tolerant parsing and schema checks for model replies.
+
+`parse_json` recovers the JSON object in a reply the strict parser rejects:
+markdown fences and prose around it, trailing commas, raw newlines inside
+strings, and output cut off mid-way (max_tokens). A truncated reply is cut
+back to the last complete value and its open strings/arrays/objects closed;
+`open_path` says which keys were still open, so the caller knows which parts
+are incomplete.
+
+    >>> parse_json('```json\\n{"characters": [{"name": "Erin"}, {"name": "Rel')
+    Parsed(value={'characters': [{'name': 'Erin'}]}, repairs=['fence', 'truncated'], open_path=['characters'])
+
+`validate_extraction` checks one chunk's {"characters", "locations"} against
+the extraction schema, drops malformed entries and reports the sections that
+still have to be asked for again.
+"""
+import json
+import re
+from collections import namedtuple
+
+EXTRACTION_SECTIONS = ("characters", "locations")
+CHARACTER_TYPES = ("known", "new")
+
+Parsed = namedtuple("Parsed", "value repairs open_path")
+
+_LITERAL_RE = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null")
+_WHITESPACE = " \t\r\n"
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class JSONRepairError(ValueError):
+    """The reply holds no recoverable JSON object."""
+
+
+def _string_end(text, start):
+    """Index just past the string literal opening at `start`, or None if it never closes."""
+    i = start + 1
+    while True:
+        quote = text.find('"', i)
+        if quote == -1:
+            return None
+        backslashes = 0
+        while text[quote - 1 - backslashes] == "\\":
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return quote + 1
+        i = quote + 1
+
+
+def _scan(text, start):
+    """
+    Walks one JSON value from `start`, re-emitting it without trailing commas.
+    Returns (json_text, complete, open_path, trailing_commas, end). For an
+    incomplete value json_text ends at the last complete member, with its
+    containers closed.
+    """
+    out = []
+    stack = []  # [opener, expecting, key] per open container
+    cut = None  # (len(out), closers, open_path) after the last complete member
+    trailing_commas = 0
+    i = start
+    n = len(text)
+
+    def completed(end_out):
+        # The innermost container's member is done; outer keys are still open
+        stack[-1][1] = "comma"
+        stack[-1][2] = None
+        return (end_out, "".join(_CLOSERS[frame[0]] for frame in reversed(stack)),
+                [frame[2] for frame in stack if frame[2] is not None])
+
+    while i < n:
+        c = text[i]
+        top = stack[-1] if stack else None
+        if c in _WHITESPACE:
+            i += 1
+            continue
+        if c == '"':
+            end = _string_end(text, i)
+            if end is None or top is None or top[1] not in ("key", "value", "first"):
+                break
+            out.append(text[i:end])
+            i = end
+            if top is not None and top[0] == "{" and top[1] == "key":
+                top[1] = "colon"
+                top[2] = json.loads(out[-1], strict=False)
+            else:
+                cut = completed(len(out))
+        elif c in "{[":
+            if top is not None and top[1] not in ("value", "first"):
+                break
+            out.append(c)
+            stack.append([c, "first" if c == "[" else "key", None])
+            if c == "[" or len(stack) == 1:
+                # Keep an open list (or the root) even if empty. A nested object is only kept once a
+                # member is complete, closed after its last complete member: '{"name":"Erin","confid'
+                # becomes {"name":"Erin"}; one cut inside its first member is dropped
+                cut = (len(out), "".join(_CLOSERS[frame[0]] for frame in reversed(stack)),
+                       [frame[2] for frame in stack if frame[2] is not None])
+            i += 1
+        elif c in "}]":
+            if top is None or _CLOSERS[top[0]] != c:
+                break
+            if out and out[-1] == ",":
+                out.pop()
+                trailing_commas += 1
+            out.append(c)
+            stack.pop()
+            i += 1
+            if not stack:
+                return "".join(out), True, [], trailing_commas, i
+            cut = completed(len(out))
+        elif c == ":" and top is not None and top[1] == "colon":
+            out.append(c)
+            top[1] = "value"
+            i += 1
+        elif c == "," and top is not None and top[1] == "comma":
+            out.append(c)
+            top[1] = "key" if top[0] == "{" else "value"
+            if top[0] == "{":
+                top[2] = None
+            i += 1
+        else:
+            match = _LITERAL_RE.match(text, i)
+            if (match is None or top is None or top[1] not in ("value", "first")
+                    or match.end() == n or text[match.end()] not in _WHITESPACE + ",}]"):
+                break  # Garbage, or a literal that may have been cut short
+            out.append(match.group())
+            i = match.end()
+            cut = completed(len(out))
+
+    if cut is None:
+        return None, False, [], trailing_commas, i
+    length, closers, open_path = cut
+    body = out[:length]
+    while body and body[-1] == ",":
+        body.pop()
+    return "".join(body) + closers, False, open_path, trailing_commas, i
+
+
+def parse_json(text):
+    """
+    Parses the first JSON object in `text`, repairing it if needed.
+    Returns Parsed(value, repairs, open_path); `repairs` lists what was fixed
+    ("fence", "prose", "trailing_comma", "truncated") and is empty for clean
+    JSON. Raises JSONRepairError when no object can be recovered.
+    """
+    if not isinstance(text, str):
+        raise JSONRepairError(f"Expected text, got {type(text).__name__}")
+    try:
+        value = json.loads(text)
+        if isinstance(value, dict):
+            return Parsed(value, [], [])
+    except json.JSONDecodeError:
+        pass
+
+    repairs = []
+    start = text.find("{")
+    if start == -1:
+        raise JSONRepairError("No JSON object in reply")
+    body, complete, open_path, trailing_commas, end = _scan(text, start)
+    if body is None:
+        raise JSONRepairError("Reply cut off before the first complete value")
+    around = text[:start] + (text[end:] if complete else "")
+    if "```" in around:
+        repairs.append("fence")
+    if re.sub(r"```(?:json)?", "", around).strip():
+        repairs.append("prose")
+    if trailing_commas:
+        repairs.append("trailing_comma")
+    if not complete:
+        repairs.append("truncated")
+    try:
+        value = json.loads(body, strict=False)
+    except json.JSONDecodeError as e:
+        raise JSONRepairError(f"Unrecoverable JSON: {e}") from e
+    return Parsed(value, repairs, open_path)
+
+
+def _clean_character(entry):
+    if not isinstance(entry, dict):
+        return None
+    name = entry.get("name")
+    if not isinstance(name, str) or not name.strip():
+        return None
+    cleaned = dict(entry, name=name.strip())
+    kind = str(entry.get("type", "")).strip().lower()
+    cleaned["type"] = kind if kind in CHARACTER_TYPES else "new"
+    confidence = entry.get("confidence")
+    if isinstance(confidence, str):
+        try:
+            confidence = float(confidence)
+        except ValueError:
+            confidence = None
+    if isinstance(confidence, (int, float)) and not isinstance(confidence, bool):
+        cleaned["confidence"] = min(1.0, max(0.0, float(confidence)))
+    else:
+        cleaned.pop("confidence", None)
+    if not isinstance(cleaned.get("context", ""), str):
+        cleaned["context"] = str(cleaned["context"])
+    return cleaned
+
+
+def _clean_location(entry):
+    if isinstance(entry, str):
+        entry = {"name": entry}
+    if not isinstance(entry, dict):
+        return None
+    name = entry.get("name")
+    if not isinstance(name, str) or not name.strip():
+        return None
+    return dict(entry, name=name.strip())
+
+
+_CLEANERS = {"characters": _clean_character, "locations": _clean_location}
+
+
+def validate_extraction(data, incomplete=()):
+    """
+    Checks one chunk's extraction against the schema:
+        {"characters": [{"name", "type": known|new, "confidence": 0..1, "context"}],
+         "locations":  [{"name"}]}
+    Entries without a name are dropped, bare location strings are wrapped,
+    types and confidences normalized. Sections that are absent, not lists, or
+    named in `incomplete` (still open when the reply was cut off) are missing.
+    Returns (extraction, missing, dropped): the cleaned sections that passed,
+    the missing section names, and the number of entries dropped.
+    """
+    extraction = {}
+    missing = []
+    dropped = 0
+    if not isinstance(data, dict):
+        return {}, list(EXTRACTION_SECTIONS), 0
+    for section in EXTRACTION_SECTIONS:
+        entries = data.get(section)
+        if not isinstance(entries, list):
+            missing.append(section)
+            continue
+        cleaned = [_CLEANERS[section](entry) for entry in entries]
+        dropped += sum(entry is None for entry in cleaned)
+        extraction[section] = [entry for entry in cleaned if entry is not None]
+        if section in incomplete:
+            missing.append(section)
+    return extraction, missing, dropped
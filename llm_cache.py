@@ -0,0 +1,193 @@
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_PATH = "data/cache/llm_responses.sqlite"
+
+MODE_READWRITE = "readwrite"  # Serve hits, store misses
+MODE_REPLAY = "replay"        # Serve hits only; a miss raises CacheMiss (no network)
+MODE_OFF = "off"
+MODES = (MODE_READWRITE, MODE_REPLAY, MODE_OFF)
+
+
+class CacheMiss(KeyError):
+    """Raised in replay mode when a prompt has no cached response."""
+
+
+def cache_key(model, params, prompt):
+    """Content address of one request: sha256 over model, sampling params and the full prompt."""
+    payload = json.dumps({"model": model, "params": params, "prompt": prompt},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent SQLite cache of raw LLM replies, keyed by `cache_key`.
+    Safe to share between worker threads.
+    """
+
+    def __init__(self, path=None, mode=MODE_READWRITE):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cache mode: {mode}")
+        path = path or CACHE_PATH
+        self.path = path
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = None
+
+        if mode == MODE_OFF:
+            return
+
+        if mode == MODE_REPLAY:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Replay mode needs an existing cache at {path}")
+            self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    usage TEXT,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+            self.conn.commit()
+
+    @property
+    def enabled(self):
+        return self.conn is not None
+
+    @property
+    def replay(self):
+        return self.mode == MODE_REPLAY
+
+    def get(self, key):
+        """Returns the cached reply text, or None. Raises CacheMiss on a replay-mode miss."""
+        if not self.enabled:
+            return None
+        with self.lock:
+            row = self.conn.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                if not self.replay:
+                    self.conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+                    self.conn.commit()
+        if row is None:
+            if self.replay:
+                raise CacheMiss(key)
+            return None
+        return row[0]
+
+    def put(self, key, model, content, usage=None):
+        if not self.enabled or self.replay:
+            return
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, content, usage, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, content, json.dumps(usage) if usage else None,
+                 len(content.encode("utf-8")), now, now)
+            )
+            self.conn.commit()
+
+    def delete(self, key):
+        """Drops one entry (e.g. a reply that turned out to be unusable). Returns True if it existed."""
+        if not self.enabled or self.replay:
+            return False
+        with self.lock:
+            removed = self.conn.execute("DELETE FROM responses WHERE key = ?", (key,)).rowcount
+            self.conn.commit()
+        return bool(removed)
+
+    def evict(self, max_bytes=None, max_age_days=None):
+        """
+        Drops entries older than `max_age_days` (by creation), then least recently
+        used entries until the total payload fits in `max_bytes`. Returns rows removed.
+        """
+        if not self.enabled or self.replay:
+            return 0
+        removed = 0
+        with self.lock:
+            if max_age_days is not None:
+                cutoff = time.time() - max_age_days * 86400
+                removed += self.conn.execute("DELETE FROM responses WHERE created_at < ?", (cutoff,)).rowcount
+
+            if max_bytes is not None:
+                total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                if total > max_bytes:
+                    doomed = []
+                    for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+                        if total <= max_bytes:
+                            break
+                        doomed.append((key,))
+                        total -= size
+                    self.conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+                    removed += len(doomed)
+            self.conn.commit()
+        if removed:
+            self.conn.execute("VACUUM")
+        return removed
+
+    def stats(self):
+        entries, total = 0, 0
+        if self.enabled:
+            with self.lock:
+                entries, total = self.conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": total,
+        }
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or evict the LLM response cache.")
+    parser.add_argument("command", choices=["stats", "evict"])
+    parser.add_argument("--path", default=CACHE_PATH)
+    parser.add_argument("--max-mb", type=float, help="Evict LRU entries above this size")
+    parser.add_argument("--max-age-days", type=float, help="Evict entries older than this")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"No cache at {args.path}")
+        return
+
+    cache = ResponseCache(args.path)
+    if args.command == "evict":
+        max_bytes = int(args.max_mb * 1024 * 1024) if args.max_mb is not None else None
+        removed = cache.evict(max_bytes=max_bytes, max_age_days=args.max_age_days)
+        print(f"Evicted {removed} entries.")
+    stats = cache.stats()
+    print(f"{stats['entries']} entries, {stats['bytes'] / 1024 / 1024:.1f} MB")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Run metrics shared by the pipeline scripts.
+
+`RUN` is the process-wide collector. Scripts wrap their phases in
+`RUN.stage(name)` (wall time, items, bytes), bump counters with `RUN.count`
+(requests, retries, errors, ...), record latencies into histograms with
+`RUN.observe` and add LLM token usage with `RUN.add_usage`. At the end of a
+run `RUN.write_report()` saves it all as JSON, by default to
+data/metrics/<script>-<timestamp>.json:
+
+    {"run", "started", "elapsed",
+     "stages":     {name: {seconds, calls, items, bytes, items_per_sec, bytes_per_sec}},
+     "counters":   {name: n},
+     "rates":      {name: numerator / denominator}   (see RATES)
+     "histograms": {name: {count, mean, min, max, p50, p90, p99, buckets}},
+     "tokens":     {model: {requests, prompt_tokens, completion_tokens, total_tokens, estimated}},
+     "profiles":   {stage: {file, top: [...]}}}
+
+Stages named with a script's --profile option run under cProfile (calling
+thread only). Their stats are dumped next to the report as <report>.<stage>.prof,
+and the top functions by cumulative time are listed in the report.
+
+    python metrics.py data/metrics/extract_entities-20250101-120000.json   # print a report
+"""
+import argparse
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+REPORT_DIR = "data/metrics"
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+PROFILE_TOP = 25
+# Derived ratios in the report: name -> (numerator counter, denominator counter)
+RATES = {
+    "llm.parse_failure_rate": ("llm.parse_failures", "llm.replies"),
+}
+
+
+class Histogram:
+    """Fixed-bucket histogram; percentiles are bucket upper bounds (clamped to the max seen)."""
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.bounds) and value > self.bounds[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, q):
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= target and n:
+                bound = self.bounds[index] if index < len(self.bounds) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        labels = [f"<={bound:g}" for bound in self.bounds] + [f">{self.bounds[-1]:g}"]
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "buckets": {label: n for label, n in zip(labels, self.counts) if n},
+        }
+
+
+def _usage_value(usage, name):
+    value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+    return int(value or 0)
+
+
+class Metrics:
+    """Thread-safe collector for one run (see module docstring)."""
+
+    def __init__(self, name="run"):
+        self.lock = threading.Lock()
+        self.start(name)
+
+    def start(self, name, profile=()):
+        """Clears everything and starts timing run `name`; `profile` lists stages to cProfile."""
+        with self.lock:
+            self.name = name
+            self.started = time.time()
+            self.clock = time.perf_counter()
+            self.stages = {}
+            self.counters = {}
+            self.histograms = {}
+            self.tokens = {}
+            self.profile_stages = set(profile or ())
+            self.profilers = {}
+        return self
+
+    @contextmanager
+    def stage(self, name):
+        """Times a block as stage `name` (repeat entries accumulate). Yields add(items=0, nbytes=0)."""
+        profiler = None
+        if name in self.profile_stages:
+            with self.lock:
+                profiler = self.profilers.setdefault(name, cProfile.Profile())
+            profiler.enable()
+        started = time.perf_counter()
+        try:
+            yield lambda items=0, nbytes=0: self.add(name, items, nbytes)
+        finally:
+            elapsed = time.perf_counter() - started
+            if profiler is not None:
+                profiler.disable()
+            with self.lock:
+                stage = self._stage(name)
+                stage["seconds"] += elapsed
+                stage["calls"] += 1
+
+    def _stage(self, name):
+        return self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "items": 0, "bytes": 0})
+
+    def add(self, stage, items=0, nbytes=0):
+        """Credits items/bytes to a stage (callable from worker threads)."""
+        with self.lock:
+            entry = self._stage(stage)
+            entry["items"] += items
+            entry["bytes"] += nbytes
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        """Observes the block's wall time in histogram `name`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def add_usage(self, model, usage, estimated=False):
+        """
+        Adds one response's token usage (an API `usage` object or dict with
+        prompt_tokens / completion_tokens / total_tokens). `estimated` marks
+        figures computed locally (mock mode) rather than reported by the API.
+        Returns the total tokens added.
+        """
+        prompt = _usage_value(usage, "prompt_tokens")
+        completion = _usage_value(usage, "completion_tokens")
+        total = _usage_value(usage, "total_tokens") or prompt + completion
+        with self.lock:
+            entry = self.tokens.setdefault(model, {
+                "requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "estimated": estimated,
+            })
+            entry["requests"] += 1
+            entry["prompt_tokens"] += prompt
+            entry["completion_tokens"] += completion
+            entry["total_tokens"] += total
+            entry["estimated"] = entry["estimated"] or estimated
+        return total
+
+    def report(self):
+        with self.lock:
+            stages = {}
+            for name, stage in self.stages.items():
+                seconds = stage["seconds"]
+                stages[name] = dict(stage,
+                                    items_per_sec=stage["items"] / seconds if seconds else 0.0,
+                                    bytes_per_sec=stage["bytes"] / seconds if seconds else 0.0)
+            return {
+                "run": self.name,
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+                "elapsed": time.perf_counter() - self.clock,
+                "stages": stages,
+                "counters": dict(sorted(self.counters.items())),
+                "rates": {name: self.counters.get(numerator, 0) / self.counters[denominator]
+                          for name, (numerator, denominator) in RATES.items() if self.counters.get(denominator)},
+                "histograms": {name: h.summary() for name, h in sorted(self.histograms.items())},
+                "tokens": {model: dict(entry) for model, entry in self.tokens.items()},
+            }
+
+    def write_report(self, path=None, report_dir=REPORT_DIR):
+        """Writes the JSON report (plus .prof files for profiled stages) and prints a summary. Returns the path."""
+        report = self.report()
+        if path is None:
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))
+            path = os.path.join(report_dir, f"{self.name}-{stamp}.json")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        report["profiles"] = {}
+        for stage, profiler in self.profilers.items():
+            prof_path = f"{os.path.splitext(path)[0]}.{stage}.prof"
+            profiler.dump_stats(prof_path)
+            text = io.StringIO()
+            pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            report["profiles"][stage] = {"file": prof_path, "top": text.getvalue().strip().splitlines()}
+
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        os.replace(path + ".tmp", path)
+        print(format_report(report))
+        print(f"Run report: {path}")
+        return path
+
+
+def format_report(report):
+    """Short human-readable summary of a report dict."""
+    lines = [f"[{report['run']}] {report['elapsed']:.2f}s"]
+    for name, stage in report["stages"].items():
+        line = f"  {name:<16} {stage['seconds']:8.2f}s"
+        if stage["items"]:
+            line += f"  {stage['items']:>8} items ({stage['items_per_sec']:.1f}/s)"
+        if stage["bytes"]:
+            line += f"  {stage['bytes'] / 1024 / 1024:8.2f} MB ({stage['bytes_per_sec'] / 1024 / 1024:.2f} MB/s)"
+        lines.append(line)
+    for name, h in report["histograms"].items():
+        lines.append(f"  {name:<16} n={h['count']} mean={h['mean'] * 1000:.1f}ms "
+                     f"p50<={h['p50'] * 1000:.1f}ms p99<={h['p99'] * 1000:.1f}ms max={h['max'] * 1000:.1f}ms")
+    if report["counters"]:
+        lines.append("  " + ", ".join(f"{name}={n}" for name, n in report["counters"].items()))
+    if report.get("rates"):
+        lines.append("  " + ", ".join(f"{name}={rate:.1%}" for name, rate in report["rates"].items()))
+    for model, usage in report["tokens"].items():
+        lines.append(f"  tokens[{model}]{' (estimated)' if usage['estimated'] else ''}: "
+                     f"{usage['prompt_tokens']:,} prompt + {usage['completion_tokens']:,} completion "
+                     f"over {usage['requests']} requests")
+    return "\n".join(lines)
+
+
+def add_arguments(parser):
+    """Adds the shared --report / --profile options to a script's parser."""
+    parser.add_argument("--report", help=f"Run report path (default: {REPORT_DIR}/<script>-<time>.json)")
+    parser.add_argument("--profile", action="append", default=[], metavar="STAGE",
+                        help="Run a stage under cProfile (repeatable)")
+
+
+RUN = Metrics()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print a saved run report.")
+    parser.add_argument("report")
+    args = parser.parse_args()
+    with open(args.report, "r", encoding="utf-8") as f:
+        print(format_report(json.load(f)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+"""
+Single entry point for the whole pipeline, run as a dependency graph:
+
+    scrape -> chunk -> embed -> spot -> extract -> ingest
+
+Before chunk and extract, dedup.py refreshes the cross-volume duplicate
+chapters/scenes (cached signatures, so this is cheap when nothing changed);
+each volume's duplicate_chapters.json / duplicate_scenes.json is an input of
+the stage it feeds.
+
+Each stage declares, per volume, the files it reads and writes. When a stage
+succeeds for a volume, the sha256 of those files and the stage's parameters are
+recorded in data/pipeline_state.json. On the next run that (stage, volume) is
+skipped while all of them still match, so editing one chapter re-chunks,
+re-spots, re-extracts and re-ingests only its own volume. Hashes are memoized by
+(size, mtime), so unchanged files are not re-read.
+
+Stages run in dependency order. Within a stage, its stale volumes run in
+parallel (--workers STAGE=N). scrape goes to the network, so it only runs for
+volumes with no raw index.json, or when forced; one TOC pass fetches every
+volume.
+
+    python pipeline.py                                   # every raw volume, every stage
+    python pipeline.py Vol_01 Vol_02 --chapters 1-10 --until extract
+    python pipeline.py --only spot extract --force extract --workers extract=2 --mock
+    python pipeline.py --dry-run                         # list stale stages and stop
+"""
+import argparse
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import chunk_chapters
+import dedup
+import embedding_index
+import extract_entities
+import scrape_chapters
+from checkpoint_store import EXPORT_FILENAME
+from entity_spotter import SPOTTER_KINDS, mentions_path, spot_volume
+from graph_store import GRAPH_PATH, GraphStore
+from metrics import RUN, add_arguments
+from rate_limit import RateLimiter
+from search_index import parse_range
+
+STATE_PATH = "data/pipeline_state.json"
+STATE_VERSION = 1
+STAGE_ORDER = ("scrape", "chunk", "embed", "spot", "extract", "ingest")
+# Volumes processed side by side per stage (chunk: chapter processes shared by all volumes)
+WORKERS = {"scrape": scrape_chapters.MAX_WORKERS, "chunk": None, "embed": 1, "spot": 2, "extract": 2, "ingest": 1}
+# dedup.update kind refreshed before a stage (unless keep_duplicates)
+DEDUP_BEFORE = {"chunk": "chapters", "extract": "scenes"}
+
+
+class PipelineState:
+    """Recorded input/output hashes per (stage, volume), plus the file hash memo."""
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {"version": STATE_VERSION, "hashes": {}, "stages": {}}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == STATE_VERSION:
+                self.data = data
+
+    def file_hash(self, path):
+        """sha256 of a file (None if missing), reusing the memo while size and mtime are unchanged."""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        with self.lock:
+            memo = self.data["hashes"].get(path)
+        if memo and memo[0] == stat.st_size and memo[1] == stat.st_mtime_ns:
+            return memo[2]
+        digest = chunk_chapters.file_sha256(path)
+        with self.lock:
+            self.data["hashes"][path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def hashes(self, paths):
+        return {path: self.file_hash(path) for path in sorted(paths)}
+
+    def recorded(self, stage, vol_name):
+        with self.lock:
+            return self.data["stages"].get(stage, {}).get(vol_name)
+
+    def record(self, stage, vol_name, entry):
+        with self.lock:
+            self.data["stages"].setdefault(stage, {})[vol_name] = entry
+            self._save()
+
+    def forget(self, stage, vol_name):
+        with self.lock:
+            self.data["stages"].get(stage, {}).pop(vol_name, None)
+            self._save()
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=1)
+        os.replace(self.path + ".tmp", self.path)
+
+
+# --- Declared inputs / outputs per stage and volume ---
+
+def raw_index_path(vol_name):
+    return os.path.join(chunk_chapters.RAW_DIR, vol_name, "index.json")
+
+
+def chunk_inputs(vol_name):
+    """The volume's raw index.json and every chapter file it lists."""
+    index_path = raw_index_path(vol_name)
+    paths = [index_path]
+    for entry in scrape_chapters.load_index(os.path.dirname(index_path)):
+        if entry.get("filename"):
+            paths.append(os.path.join(chunk_chapters.RAW_DIR, vol_name, entry["filename"]))
+    return paths
+
+
+def chunks_file(vol_name):
+    return os.path.join(chunk_chapters.PROCESSED_DIR, vol_name, chunk_chapters.CHUNKS_FILENAME)
+
+
+def duplicates_file(vol_name, kind):
+    return os.path.join(chunk_chapters.PROCESSED_DIR, vol_name, chunk_chapters.DUPLICATES_FILENAMES[kind])
+
+
+def vectors_files(vol_name):
+    vol_dir = os.path.join(embedding_index.VECTOR_DIR, vol_name)
+    return [os.path.join(vol_dir, embedding_index.VECTORS_FILENAME), os.path.join(vol_dir, embedding_index.META_FILENAME)]
+
+
+def wiki_files(names):
+    return [os.path.join(extract_entities.WIKI_DIR, name) for name in names]
+
+
+def stage_files(stage, vol_name, options):
+    """(inputs, outputs) paths of a stage for one volume."""
+    if stage == "scrape":
+        return [], [raw_index_path(vol_name)]
+    if stage == "chunk":
+        inputs = chunk_inputs(vol_name)
+        if not options["keep_duplicates"]:
+            inputs.append(duplicates_file(vol_name, "chapters"))
+        return inputs, [chunks_file(vol_name)]
+    if stage == "embed":
+        # The frozen idf model: a --refit makes every volume stale
+        return [chunks_file(vol_name), embedding_index.model_path()], vectors_files(vol_name)
+    if stage == "spot":
+        lists = wiki_files([f"{kind}.json" for kind in SPOTTER_KINDS] + ["aliases.json"])
+        return [chunks_file(vol_name)] + lists, [mentions_path(vol_name, extract_entities.DATA_DIR)]
+    if stage == "extract":
+        inputs = [chunks_file(vol_name)] + wiki_files(["characters.json", "aliases.json"])
+        if options["route"] == "spotter":
+            inputs.append(mentions_path(vol_name, extract_entities.DATA_DIR))
+        if not options["keep_duplicates"]:
+            inputs.append(duplicates_file(vol_name, "scenes"))
+        return inputs, [os.path.join(extract_entities.OUTPUT_DIR, vol_name, EXPORT_FILENAME)]
+    if stage == "ingest":
+        return [os.path.join(extract_entities.OUTPUT_DIR, vol_name, EXPORT_FILENAME)], []
+    raise ValueError(stage)
+
+
+def stage_params(stage, options):
+    """Parameters whose change makes a stage stale."""
+    if stage == "chunk":
+        return {"tokenizer": options["tokenizer"], "overlap": options["overlap"],
+                "max_tokens": chunk_chapters.MAX_TOKENS_PER_CHUNK, "keep_duplicates": options["keep_duplicates"]}
+    if stage == "extract":
+        params = {key: options[key] for key in ("chapter_prefix", "mock", "route", "batch_budget", "keep_duplicates",
+                                                "context")}
+        params["chapters"] = list(options["chapters"]) if options["chapters"] else None
+        return params
+    if stage == "ingest":
+        return {"graph": options["graph_path"]}
+    return {}
+
+
+def is_fresh(state, stage, vol_name, options):
+    inputs, outputs = stage_files(stage, vol_name, options)
+    if stage == "scrape":
+        return os.path.exists(outputs[0])  # The site is not hashed; an existing index is enough
+    recorded = state.recorded(stage, vol_name)
+    if recorded is None or recorded.get("params") != stage_params(stage, options):
+        return False
+    if stage == "ingest" and not os.path.exists(options["graph_path"]):
+        return False
+    # A missing optional input (aliases.json) hashes to None and only matters if that changes
+    if state.hashes(inputs) != recorded["inputs"]:
+        return False
+    return state.hashes(outputs) == recorded["outputs"]
+
+
+def record_success(state, stage, vol_name, options):
+    inputs, outputs = stage_files(stage, vol_name, options)
+    state.record(stage, vol_name, {
+        "inputs": state.hashes(inputs),
+        "outputs": state.hashes(outputs),
+        "params": stage_params(stage, options),
+    })
+
+
+# --- Stage runners: each takes the stale volumes and returns the ones that succeeded ---
+
+def run_scrape(vol_names, options, workers):
+    scrape_chapters.scrape(data_dir=chunk_chapters.RAW_DIR, workers=workers or scrape_chapters.MAX_WORKERS)
+    return [vol_name for vol_name in vol_names if os.path.exists(raw_index_path(vol_name))]
+
+
+def run_chunk(vol_names, options, workers):
+    # One process pool across all stale volumes; each is assembled as soon as its chapters finish
+    chunk_chapters.process_volumes(vol_names, workers=workers, tokenizer=options["tokenizer"],
+                                   overlap_tokens=options["overlap"], skip_duplicates=not options["keep_duplicates"])
+    return [vol_name for vol_name in vol_names if os.path.exists(chunks_file(vol_name))]
+
+
+def run_embed(vol_names, options, workers):
+    results = embedding_index.build_indexes(vol_names)
+    return [vol_name for vol_name, status in results.items() if status]
+
+
+def run_spot(vol_names, options, workers):
+    with ProcessPoolExecutor(max_workers=max(1, workers or 1)) as pool:
+        results = pool.map(spot_volume, vol_names, [None] * len(vol_names), [True] * len(vol_names),
+                           [extract_entities.DATA_DIR] * len(vol_names), [extract_entities.WIKI_DIR] * len(vol_names))
+        return [vol_name for vol_name, result in zip(vol_names, results) if result]
+
+
+def run_extract(vol_names, options, workers):
+    is_mock = extract_entities.USE_MOCK or options["mock"]
+    # One limiter for every volume, so parallel volumes share the API rate limits
+    limiter = RateLimiter(None if is_mock else extract_entities.REQUESTS_PER_MINUTE,
+                          None if is_mock else extract_entities.TOKENS_PER_MINUTE)
+
+    def extract(vol_name):
+        stats = extract_entities.run_extraction_batch(
+            vol_name, force_mock=options["mock"], chapters=options["chapters"],
+            chapter_prefix=options["chapter_prefix"], max_chunks=options["max_chunks"], route=options["route"],
+            batch_budget=options["batch_budget"], limiter=limiter, skip_duplicates=not options["keep_duplicates"],
+            context_mode=options["context"],
+        )
+        # Failed chunks (or a max_chunks cap) leave work behind: rerun next time
+        return bool(stats) and stats["failed"] == 0 and not options["max_chunks"]
+
+    with ThreadPoolExecutor(max_workers=max(1, workers or 1)) as pool:
+        return [vol_name for vol_name, ok in zip(vol_names, pool.map(extract, vol_names)) if ok]
+
+
+def run_ingest(vol_names, options, workers):
+    # SQLite has one writer; volumes are ingested one after another
+    done = []
+    with GraphStore(options["graph_path"]) as store:
+        for vol_name in vol_names:
+            if store.ingest_volume(vol_name, extract_entities.OUTPUT_DIR):
+                done.append(vol_name)
+    return done
+
+
+RUNNERS = {"scrape": run_scrape, "chunk": run_chunk, "embed": run_embed, "spot": run_spot, "extract": run_extract,
+           "ingest": run_ingest}
+
+
+def selected_stages(only=None, until=None):
+    stages = list(only) if only else list(STAGE_ORDER)
+    if until:
+        stages = [stage for stage in stages if STAGE_ORDER.index(stage) <= STAGE_ORDER.index(until)]
+    return [stage for stage in STAGE_ORDER if stage in stages]
+
+
+def run_pipeline(vol_names=None, stages=STAGE_ORDER, force=(), workers=None, options=None,
+                 state_path=STATE_PATH, dry_run=False):
+    """
+    Runs the selected stages over `vol_names` (default: every raw volume), skipping
+    fresh (stage, volume) pairs. `force` lists stages to rerun regardless ("all" for
+    every stage). Returns {stage: {"ran": [...], "fresh": [...], "failed": [...]}}.
+    """
+    options = dict(DEFAULT_OPTIONS, **(options or {}))
+    workers = dict(WORKERS, **(workers or {}))
+    state = PipelineState(state_path)
+    force = set(STAGE_ORDER) if "all" in force else set(force)
+    if vol_names is None:
+        if not os.path.isdir(chunk_chapters.RAW_DIR) and "scrape" in stages and not dry_run:
+            run_scrape([], options, workers["scrape"])  # Nothing scraped yet: discover the volumes
+        vol_names = chunk_chapters.list_volumes() if os.path.isdir(chunk_chapters.RAW_DIR) else []
+
+    summary = {}
+    blocked = set()  # Volumes whose upstream stage failed in this run
+    would_run = set()  # Dry run: volumes an earlier stage would rebuild
+    for stage in stages:
+        if stage in DEDUP_BEFORE and not dry_run and not options["keep_duplicates"]:
+            # Across every volume, not just the selected ones: canonical copies may live elsewhere
+            with RUN.stage(f"pipeline.dedup_{DEDUP_BEFORE[stage]}"):
+                dedup.update(DEDUP_BEFORE[stage], workers=workers.get("chunk"))
+        candidates = [vol_name for vol_name in vol_names if vol_name not in blocked]
+        stale = [vol_name for vol_name in candidates
+                 if stage in force or vol_name in would_run or not is_fresh(state, stage, vol_name, options)]
+        fresh = [vol_name for vol_name in candidates if vol_name not in stale]
+        summary[stage] = {"ran": [], "fresh": fresh, "failed": []}
+        print(f"[{stage}] {len(stale)} stale, {len(fresh)} fresh"
+              + (f": {', '.join(stale)}" if stale else ""))
+        if dry_run:
+            would_run.update(stale)
+            continue
+        if not stale:
+            continue
+
+        with RUN.stage(f"pipeline.{stage}") as add:
+            try:
+                done = set(RUNNERS[stage](stale, options, workers.get(stage)))
+            except Exception as e:
+                print(f"[{stage}] failed: {e}")
+                done = set()
+            add(items=len(done))
+        for vol_name in stale:
+            if vol_name in done:
+                record_success(state, stage, vol_name, options)
+                summary[stage]["ran"].append(vol_name)
+            else:
+                state.forget(stage, vol_name)
+                summary[stage]["failed"].append(vol_name)
+                blocked.add(vol_name)
+        if summary[stage]["failed"]:
+            print(f"[{stage}] not completed for {', '.join(summary[stage]['failed'])}; "
+                  f"their later stages are skipped")
+    state.save()
+    return summary
+
+
+DEFAULT_OPTIONS = {
+    "chapters": None,
+    "chapter_prefix": None,
+    "mock": False,
+    "route": extract_entities.ROUTE_MODE,
+    "batch_budget": None,
+    "max_chunks": None,
+    "tokenizer": chunk_chapters.TOKENIZER,
+    "overlap": chunk_chapters.OVERLAP_TOKENS,
+    "graph_path": GRAPH_PATH,
+    "keep_duplicates": False,
+    "context": extract_entities.CONTEXT_MODE,
+}
+
+
+def parse_workers(values):
+    """["extract=2", "spot=4"] -> {"extract": 2, "spot": 4}."""
+    workers = {}
+    for value in values:
+        stage, _, count = value.partition("=")
+        if stage not in STAGE_ORDER or not count.isdigit():
+            raise argparse.ArgumentTypeError(f"--workers expects STAGE=N, got {value!r}")
+        workers[stage] = int(count)
+    return workers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("volumes", nargs="*", help="Volumes to process (default: every raw volume)")
+    parser.add_argument("--only", nargs="+", choices=STAGE_ORDER, help="Run just these stages")
+    parser.add_argument("--until", choices=STAGE_ORDER, help="Stop after this stage")
+    parser.add_argument("--force", nargs="+", default=[], choices=STAGE_ORDER + ("all",),
+                        help="Rerun these stages even if fresh")
+    parser.add_argument("--workers", action="append", default=[], metavar="STAGE=N",
+                        help="Volumes run in parallel by a stage (chunk: chapter processes)")
+    parser.add_argument("--chapters", help="Chapter order range to extract, e.g. 1-10 (default: all)")
+    parser.add_argument("--chapter-prefix", help="Only extract chapters whose title starts with this")
+    parser.add_argument("--mock", action="store_true", help="Mock LLM replies")
+    parser.add_argument("--route", choices=("spotter", "all"), default=extract_entities.ROUTE_MODE)
+    parser.add_argument("--batch-budget", type=int)
+    parser.add_argument("--context", choices=("state", "roster"), default=extract_entities.CONTEXT_MODE,
+                        help="Extraction prompt context (see extract_entities.CONTEXT_MODE)")
+    parser.add_argument("--max-chunks", type=int, help="Cap on new chunks extracted per volume")
+    parser.add_argument("--tokenizer", default=chunk_chapters.TOKENIZER)
+    parser.add_argument("--overlap", type=int, default=chunk_chapters.OVERLAP_TOKENS)
+    parser.add_argument("--keep-duplicates", action="store_true",
+                        help="Chunk and extract chapters/scenes dedup.py flags as duplicates")
+    parser.add_argument("--graph", default=GRAPH_PATH)
+    parser.add_argument("--state", default=STATE_PATH)
+    parser.add_argument("--dry-run", action="store_true", help="Only report which stages are stale")
+    add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        workers = parse_workers(args.workers)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    options = {
+        "chapters": parse_range(args.chapters),
+        "chapter_prefix": args.chapter_prefix,
+        "mock": args.mock,
+        "route": args.route,
+        "batch_budget": args.batch_budget,
+        "max_chunks": args.max_chunks,
+        "tokenizer": args.tokenizer,
+        "overlap": args.overlap,
+        "graph_path": args.graph,
+        "keep_duplicates": args.keep_duplicates,
+        "context": args.context,
+    }
+    RUN.start("pipeline", profile=args.profile)
+    summary = run_pipeline(args.volumes or None, selected_stages(args.only, args.until), args.force, workers,
+                           options, args.state, args.dry_run)
+    if not args.dry_run:
+        RUN.write_report(args.report)
+    if any(result["failed"] for result in summary.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
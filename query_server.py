@@ -0,0 +1,401 @@
+"""
+Read-only HTTP API over the processed corpus and the entity graph.
+
+Chunks and chapters are served from each volume's memory-mapped corpus store
+(corpus_store.py), or from a line-offset index over chunks.jsonl when a volume
+has none; volumes are opened on first use and shared by all request threads.
+Entity queries go to the SQLite graph (graph_store.py, one read-only
+connection per thread). Nothing is re-read per request.
+
+    GET /volumes                                   volumes with chunk/chapter counts
+    GET /volumes/Vol_01/chapters                   [{order, title, chunks}]
+    GET /volumes/Vol_01/chapters/12[?text=1]       a chapter's chunks (with their text)
+    GET /volumes/Vol_01/chunks/12_3_0              one chunk record
+    GET /entities/Relc/appearances                 [{volume, chapter_order, chapter_title, mentions}]
+    GET /entities/Klbkch/first                     earliest mention
+    GET /entities/Erin%20Solstice/neighbours?limit=10[&volume=Vol_01]
+    GET /cooccurrence?a=Erin%20Solstice&b=Relc     shared chunks per volume
+    GET /stats                                     request / cache counters
+
+Responses are JSON with a strong ETag (If-None-Match gets a 304) and are kept
+in an LRU cache of CACHE_SIZE entries. Once a second at most, the data files'
+stat is checked; when a corpus store, chunks file or the graph changes, the
+cache is dropped and volumes are reopened.
+
+    python query_server.py [--port 8080] [--graph data/graph/entities.sqlite] [--cache-size 4096]
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from chunk_chapters import CHUNKS_FILENAME, PROCESSED_DIR
+from corpus_store import META_FILENAME, corpus_dir, open_corpus
+from graph_store import GRAPH_PATH, GraphStore
+
+DEFAULT_PORT = 8080
+CACHE_SIZE = 4096     # Cached responses (LRU); 0 disables the cache
+RELOAD_CHECK = 1.0    # Seconds between checks for changed data files
+MAX_LIMIT = 500       # Cap on ?limit=
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class JsonlChunks:
+    """
+    Chunk access for a volume without a corpus store: chunks.jsonl is
+    memory-mapped and indexed by line offset once; a chunk is parsed when asked for.
+    """
+
+    def __init__(self, vol_name, processed_dir=None):
+        path = os.path.join(processed_dir or PROCESSED_DIR, vol_name, CHUNKS_FILENAME)
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if os.fstat(self._file.fileno()).st_size else b""
+        self.spans = []  # (start, end) per row
+        self.ids = {}
+        self.chapters = {}  # order -> (title, first_row, end_row)
+        start = 0
+        for line in iter(self._map.readline, b"") if self._map else ():
+            end = start + len(line)
+            if line.strip():
+                record = json.loads(line)
+                row = len(self.spans)
+                self.spans.append((start, end))
+                self.ids[record["chunk_id"]] = row
+                title, first, _ = self.chapters.get(record["chapter_order"], (record["chapter_title"], row, row))
+                self.chapters[record["chapter_order"]] = (title, first, row + 1)
+            start = end
+
+    def __len__(self):
+        return len(self.spans)
+
+    def chunk(self, row):
+        start, end = self.spans[row]
+        return json.loads(self._map[start:end])
+
+    def chapter_rows(self, order):
+        _, first, end = self.chapters.get(order, (None, 0, 0))
+        return range(first, end)
+
+    def chapter_titles(self):
+        return [(order, title) for order, (title, _, _) in self.chapters.items()]
+
+    def get(self, chunk_id):
+        row = self.ids.get(chunk_id)
+        return None if row is None else self.chunk(row)
+
+    def close(self):
+        if self._map:
+            self._map.close()
+        self._file.close()
+
+
+def open_volume(vol_name, processed_dir=None):
+    """The volume's CorpusStore, else a JsonlChunks view, else None."""
+    corpus = open_corpus(vol_name, processed_dir)
+    if corpus is not None:
+        return corpus
+    if os.path.exists(os.path.join(processed_dir or PROCESSED_DIR, vol_name, CHUNKS_FILENAME)):
+        return JsonlChunks(vol_name, processed_dir)
+    return None
+
+
+class QueryAPI:
+    """Routes, data handles and the response cache; shared by every handler thread."""
+
+    def __init__(self, processed_dir=None, graph_path=None, cache_size=CACHE_SIZE):
+        self.processed_dir = processed_dir or PROCESSED_DIR
+        self.graph_path = graph_path or GRAPH_PATH
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()  # path -> (body, etag)
+        self.volumes = {}
+        self.local = threading.local()
+        self.generation = 0
+        self.stamp = self._data_stamp()
+        self.checked = time.monotonic()
+        self.stats = {"requests": 0, "cache_hits": 0, "cache_misses": 0, "not_modified": 0, "errors": 0,
+                      "reloads": 0}
+        self.routes = [
+            (re.compile(r"/volumes"), self.list_volumes),
+            (re.compile(r"/volumes/(?P<vol_name>[^/]+)/chapters"), self.list_chapters),
+            (re.compile(r"/volumes/(?P<vol_name>[^/]+)/chapters/(?P<order>\d+)"), self.chapter),
+            (re.compile(r"/volumes/(?P<vol_name>[^/]+)/chunks/(?P<chunk_id>[^/]+)"), self.chunk),
+            (re.compile(r"/entities/(?P<name>[^/]+)/appearances"), self.appearances),
+            (re.compile(r"/entities/(?P<name>[^/]+)/first"), self.first_appearance),
+            (re.compile(r"/entities/(?P<name>[^/]+)/neighbours"), self.neighbours),
+            (re.compile(r"/cooccurrence"), self.cooccurrence),
+        ]
+
+    # --- Data handles ---
+
+    def volume_names(self):
+        if not os.path.isdir(self.processed_dir):
+            return []
+        return [
+            name for name in sorted(os.listdir(self.processed_dir))
+            if name.startswith("Vol_") and (
+                os.path.exists(os.path.join(corpus_dir(name, self.processed_dir), META_FILENAME))
+                or os.path.exists(os.path.join(self.processed_dir, name, CHUNKS_FILENAME)))
+        ]
+
+    def _data_stamp(self):
+        paths = [self.graph_path]
+        for name in self.volume_names():
+            paths.append(os.path.join(corpus_dir(name, self.processed_dir), META_FILENAME))
+            paths.append(os.path.join(self.processed_dir, name, CHUNKS_FILENAME))
+        stamp = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                stamp.append((path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamp.append((path, None, None))
+        return stamp
+
+    def check_reload(self):
+        """Drops the cache and open volumes when a data file changed (checked every RELOAD_CHECK s)."""
+        now = time.monotonic()
+        if now - self.checked < RELOAD_CHECK:
+            return
+        with self.lock:
+            if now - self.checked < RELOAD_CHECK:
+                return
+            self.checked = now
+            stamp = self._data_stamp()
+            if stamp == self.stamp:
+                return
+            self.stamp = stamp
+            self.cache.clear()
+            # Threads may still be reading the old handles; they are closed when dropped
+            self.volumes = {}
+            self.generation += 1
+            self.stats["reloads"] += 1
+
+    def volume(self, vol_name):
+        volumes = self.volumes
+        if vol_name not in volumes:
+            with self.lock:
+                if vol_name not in self.volumes:
+                    if not re.fullmatch(r"Vol_\w+", vol_name):
+                        raise HTTPError(404, f"Unknown volume {vol_name}")
+                    self.volumes[vol_name] = open_volume(vol_name, self.processed_dir)
+                volumes = self.volumes
+        if volumes[vol_name] is None:
+            raise HTTPError(404, f"No chunks for {vol_name}")
+        return volumes[vol_name]
+
+    def graph(self):
+        """This thread's read-only graph connection (reopened after a reload)."""
+        local = self.local
+        if getattr(local, "generation", None) != self.generation:
+            if getattr(local, "graph", None) is not None:
+                local.graph.close()
+            local.graph = None
+            local.generation = self.generation
+        if local.graph is None:
+            if not os.path.exists(self.graph_path):
+                raise HTTPError(503, f"No entity graph at {self.graph_path}; run: python graph_store.py ingest")
+            local.graph = GraphStore(self.graph_path, read_only=True)
+        return local.graph
+
+    # --- Endpoints: each returns a JSON-serializable value ---
+
+    def list_volumes(self, params):
+        result = []
+        for vol_name in self.volume_names():
+            store = self.volume(vol_name)
+            result.append({"volume": vol_name, "chunks": len(store), "chapters": len(store.chapters)})
+        return result
+
+    def list_chapters(self, params, vol_name):
+        store = self.volume(vol_name)
+        return [{"order": order, "title": title, "chunks": len(store.chapter_rows(order))}
+                for order, title in store.chapter_titles()]
+
+    def chapter(self, params, vol_name, order):
+        store = self.volume(vol_name)
+        order = int(order)
+        rows = store.chapter_rows(order)
+        if not rows:
+            raise HTTPError(404, f"No chapter {order} in {vol_name}")
+        with_text = params.get("text") in ("1", "true")
+        chunks = []
+        for row in rows:
+            chunk = store.chunk(row)
+            if not with_text:
+                chunk.pop("text", None)
+            chunks.append(chunk)
+        return {"volume": vol_name, "order": order, "title": store.chapters[order][0], "chunks": chunks}
+
+    def chunk(self, params, vol_name, chunk_id):
+        chunk = self.volume(vol_name).get(chunk_id)
+        if chunk is None:
+            raise HTTPError(404, f"No chunk {chunk_id} in {vol_name}")
+        return dict(chunk, volume=vol_name)
+
+    def appearances(self, params, name):
+        rows = self.graph().appearances(name, params.get("kind"))
+        if not rows:
+            raise HTTPError(404, f"No entity {name!r}")
+        return [{"volume": volume, "chapter_order": order, "chapter_title": title, "mentions": count}
+                for volume, order, title, count in rows]
+
+    def first_appearance(self, params, name):
+        row = self.graph().first_appearance(name, params.get("kind"))
+        if row is None:
+            raise HTTPError(404, f"No entity {name!r}")
+        volume, order, title, chunk_id = row
+        return {"volume": volume, "chapter_order": order, "chapter_title": title, "chunk_id": chunk_id}
+
+    def neighbours(self, params, name):
+        graph = self.graph()
+        if not graph.find_entities(name, params.get("kind")):
+            raise HTTPError(404, f"No entity {name!r}")
+        rows = graph.neighbours(name, params.get("kind"), limit_param(params), params.get("volume"))
+        return [{"name": other, "kind": kind, "shared_chunks": weight} for other, kind, weight in rows]
+
+    def cooccurrence(self, params):
+        if not params.get("a") or not params.get("b"):
+            raise HTTPError(400, "Expected ?a=<name>&b=<name>")
+        rows = self.graph().cooccurrence(params["a"], params["b"])
+        return {"a": params["a"], "b": params["b"], "shared_chunks": sum(weight for _, weight in rows),
+                "volumes": [{"volume": volume, "shared_chunks": weight} for volume, weight in rows]}
+
+    # --- Dispatch ---
+
+    def respond(self, target):
+        """(status, body, etag) for a request target; 200 bodies are cached."""
+        self.check_reload()
+        parts = urlsplit(target)
+        with self.lock:
+            self.stats["requests"] += 1
+        if parts.path == "/stats":
+            with self.lock:
+                stats = dict(self.stats, cached=len(self.cache), generation=self.generation)
+            return 200, json.dumps(stats).encode("utf-8"), None
+
+        key = parts.path + ("?" + "&".join(sorted(parts.query.split("&"))) if parts.query else "")
+        if self.cache_size:
+            with self.lock:
+                hit = self.cache.get(key)
+                if hit is not None:
+                    self.cache.move_to_end(key)
+                    self.stats["cache_hits"] += 1
+                    return (200,) + hit
+                self.stats["cache_misses"] += 1
+
+        try:
+            value = self.dispatch(parts)
+        except HTTPError as e:
+            with self.lock:
+                self.stats["errors"] += 1
+            return e.status, json.dumps({"error": str(e)}).encode("utf-8"), None
+        except Exception as e:
+            # A bug or a broken store must not drop the connection without a reply
+            print(f"  [ERROR] {target}: {e!r}")
+            with self.lock:
+                self.stats["errors"] += 1
+            return 500, json.dumps({"error": "internal server error"}).encode("utf-8"), None
+        body = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.cache_size:
+            with self.lock:
+                self.cache[key] = (body, etag)
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return 200, body, etag
+
+    def dispatch(self, parts):
+        params = {name: values[-1] for name, values in parse_qs(parts.query).items()}
+        for pattern, endpoint in self.routes:
+            match = pattern.fullmatch(parts.path)
+            if match:
+                return endpoint(params, **{name: unquote(value) for name, value in match.groupdict().items()})
+        raise HTTPError(404, f"No endpoint {parts.path}")
+
+
+def limit_param(params, default=20):
+    try:
+        return max(1, min(MAX_LIMIT, int(params.get("limit", default))))
+    except ValueError:
+        raise HTTPError(400, "limit must be an integer")
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive
+    disable_nagle_algorithm = True  # Headers and body are separate writes; Nagle would hold the body ~40 ms
+
+    def log_message(self, format, *args):
+        pass  # Quiet; see /stats instead
+
+    def do_GET(self):
+        api = self.server.api
+        status, body, etag = api.respond(self.path)
+        headers = {"Content-Type": "application/json; charset=utf-8"}
+        if etag:
+            headers["ETag"] = etag
+            headers["Cache-Control"] = "no-cache"  # Clients revalidate; unchanged data costs a 304
+            if_none_match = self.headers.get("If-None-Match")
+            if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+                with api.lock:
+                    api.stats["not_modified"] += 1
+                self._send(304, b"", headers)
+                return
+        self._send(status, body, headers)
+
+    def _send(self, status, body, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+
+def serve(host="127.0.0.1", port=0, processed_dir=None, graph_path=None, cache_size=CACHE_SIZE):
+    """
+    Starts the server on a background thread. Returns (server, base_url);
+    call server.shutdown() when done. `port=0` picks a free port.
+    """
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.daemon_threads = True
+    server.api = QueryAPI(processed_dir, graph_path, cache_size)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--processed-dir", default=PROCESSED_DIR)
+    parser.add_argument("--graph", default=GRAPH_PATH)
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="Cached responses (0 disables)")
+    args = parser.parse_args()
+
+    server, base_url = serve(args.host, args.port, args.processed_dir, args.graph, args.cache_size)
+    volumes = server.api.volume_names()
+    print(f"Serving {len(volumes)} volumes and {args.graph} at {base_url}/ (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+    Holds up to `capacity` tokens and refills continuously at `refill_per_sec`.
+    """
+
+    def __init__(self, capacity, refill_per_sec):
+        self.capacity = float(capacity)
+        self.refill_per_sec = float(refill_per_sec)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_sec)
+            self.updated = now
+
+    def reserve(self, amount=1):
+        """
+        Takes `amount` tokens (going into debt if needed) and returns how long
+        the caller must wait before the reservation is honoured.
+        Requests larger than the bucket are clamped so they can still go through.
+        """
+        amount = min(float(amount), self.capacity)
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.refill_per_sec
+
+    def acquire(self, amount=1):
+        """Blocks until `amount` tokens are available."""
+        wait = self.reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class RateLimiter:
+    """
+    Combined requests-per-minute / tokens-per-minute limiter.
+    Either limit can be None to disable it.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0) if tokens_per_minute else None
+
+    def acquire(self, tokens=0):
+        """Blocks until one request costing `tokens` tokens may be sent. Returns seconds waited."""
+        wait = 0.0
+        if self.requests:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    """Exponential backoff with full jitter: uniform(0, min(cap, base * 2^attempt))."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class HostLimiter:
+    """
+    Per-host politeness limiter: at most one request every `min_interval` seconds
+    to each host, plus up to `jitter` seconds of random delay.
+    """
+
+    def __init__(self, min_interval=1.0, jitter=0.0):
+        self.min_interval = min_interval
+        self.jitter = jitter
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, url):
+        """Blocks until a request to `url`'s host is allowed. Returns seconds waited."""
+        wait = 0.0
+        if self.min_interval > 0:
+            host = urlsplit(url).netloc
+            with self.lock:
+                bucket = self.buckets.get(host)
+                if bucket is None:
+                    bucket = self.buckets[host] = TokenBucket(1, 1.0 / self.min_interval)
+            wait = bucket.reserve(1)
+        if self.jitter:
+            wait += random.uniform(0, self.jitter)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
@@ -1,136 +1,247 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup, SoupStrainer
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin
+import argparse
 import os
-import time
-import random
 import re
 import json
+import time
+
+from html_extract import HAS_LXML, extract_chapter_text
+from metrics import RUN, add_arguments
+from rate_limit import HostLimiter
 
 BASE_URL = "https://wanderinginn.com/table-of-contents/"
 DATA_DIR = "data/raw"
+USER_AGENT = "TWI-Scraper-Bot/1.0"
+
+MAX_WORKERS = 3           # Concurrent chapter downloads
+MIN_HOST_INTERVAL = 1.0   # Seconds between requests to the same host
+HOST_JITTER = 1.0         # Extra random delay per request (politeness)
+REQUEST_TIMEOUT = 30
+SOUP_PARSER = "lxml" if HAS_LXML else "html.parser"
 
 def clean_filename(title):
     # Remove invalid characters and replace spaces with underscores
     clean = re.sub(r'[<>:"/\\|?*]', '', title)
     return clean.replace(" ", "_").strip()
 
-def get_soup(url):
+def make_session(pool_size=MAX_WORKERS):
+    """Shared keep-alive session: pooled connections plus retries on transient errors."""
+    session = requests.Session()
+    session.headers["User-Agent"] = USER_AGENT
+    retry = Retry(total=3, backoff_factor=2.0, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=("GET",), respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, pool_size), max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def fetch(session, url, limiter=None, etag=None, last_modified=None):
+    """
+    GETs `url` through the shared session, honouring the per-host limiter.
+    Sends If-None-Match / If-Modified-Since when validators are known.
+    Returns the response (status 200 or 304) or None on error.
+    Records latency, limiter wait, status, bytes and adapter retries in metrics.RUN.
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    if limiter:
+        RUN.observe("http.limiter_wait", limiter.acquire(url))
+    started = time.perf_counter()
     try:
-        response = requests.get(url, headers={'User-Agent': 'TWI-Scraper-Bot/1.0'})
-        response.raise_for_status()
-        return BeautifulSoup(response.content, 'html.parser')
+        response = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        RUN.observe("http.latency", time.perf_counter() - started)
+        RUN.count("http.requests")
+        RUN.count(f"http.status_{response.status_code}")
+        RUN.count("http.bytes", len(response.content))
+        retries = getattr(response.raw, "retries", None)
+        if retries is not None and retries.history:
+            RUN.count("http.retries", len(retries.history))
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
     except Exception as e:
+        RUN.count("http.errors")
         print(f"Error fetching {url}: {e}")
         return None
 
-def scrape_chapter(url, volume_dir, chapter_title):
+def get_soup(url, session=None, limiter=None, parse_only=None):
+    """Fetches and parses a page; `parse_only` (a SoupStrainer) limits the tree to matching elements."""
+    response = fetch(session or make_session(), url, limiter)
+    if response is None:
+        return None
+    return BeautifulSoup(response.content, SOUP_PARSER, parse_only=parse_only)
+
+def write_text_atomic(filepath, text):
+    tmp_path = filepath + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, filepath)
+
+def scrape_chapter(url, volume_dir, chapter_title, session, limiter=None, validators=None, refresh=False):
+    """
+    Downloads one chapter unless the server says it has not changed.
+    `validators` holds the chapter's stored etag / last_modified. Without them an
+    existing file is kept as-is unless `refresh` is set (one full fetch seeds them).
+    Returns (status, validators) where status is new / updated / not_modified / skipped / error.
+    """
     filename = clean_filename(chapter_title) + ".txt"
     filepath = os.path.join(volume_dir, filename)
+    validators = dict(validators or {})
+    exists = os.path.exists(filepath)
+    conditional = exists and (validators.get("etag") or validators.get("last_modified"))
 
-    if os.path.exists(filepath):
+    if exists and not conditional and not refresh:
         print(f"  [SKIP] Exists: {filename}")
-        return
-
-    print(f"  [DOWNLOADING] {chapter_title}...")
-    soup = get_soup(url)
-    if not soup:
-        return
-
-    # TWI content is usually in #reader-content or .entry-content
-    content_div = soup.find(id="reader-content")
-    if not content_div:
-        content_div = soup.find("div", class_="entry-content")
-        
-    if not content_div:
-        # Try generic article
-        content_div = soup.find("article", class_="twi-article")
-
-    if not content_div:
+        return "skipped", validators
+
+    response = fetch(
+        session, url, limiter,
+        etag=validators.get("etag") if conditional else None,
+        last_modified=validators.get("last_modified") if conditional else None,
+    )
+    if response is None:
+        return "error", validators
+
+    if response.status_code == 304:
+        print(f"  [UNCHANGED] {chapter_title}")
+        return "not_modified", validators
+
+    print(f"  [DOWNLOADED] {chapter_title}")
+    # Streaming/lxml extraction of the content container only, one line per paragraph
+    with RUN.timer("html.extract"):
+        text = extract_chapter_text(response.content)
+    if text is None:
         print(f"  [ERROR] No content found for {url}. Dumping to debug_chapter.html")
-        with open("debug_chapter.html", "w", encoding="utf-8") as f:
-            f.write(soup.prettify())
-        return
-
-    # Get text
-    text = content_div.get_text(separator="\n", strip=True)
-    
-    with open(filepath, "w", encoding="utf-8") as f:
-        f.write(text)
-    
-    # Be polite
-    time.sleep(random.uniform(1.0, 3.0))
-
-def main():
-    print("Starting TWI Scraper...")
-    soup = get_soup(BASE_URL)
-    if not soup:
-        return
-
-    # The TOC structure is a bit messy, but generally headings denote volumes
-    # This is a naive heuristic: find header, then find next sibling paragraph with links
-    
-    # Actually, TWI TOC usually has Volume headers and then a list of links.
-    # Let's try to iterate through the main content area.
-    
+        with open("debug_chapter.html", "wb") as f:
+            f.write(response.content)
+        return "error", validators
+
+    write_text_atomic(filepath, text)
+    new_validators = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    return ("updated" if exists else "new"), {k: v for k, v in new_validators.items() if v}
+
+def load_index(vol_dir):
+    index_path = os.path.join(vol_dir, "index.json")
+    if not os.path.exists(index_path):
+        return []
+    with open(index_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def parse_toc(soup, base_url):
+    """Returns [(vol_name, [chapter_info, ...]), ...] from the table of contents."""
+    volumes = []
     # Directly find book wrappers in the global soup
-    book_wrappers = soup.find_all("div", class_="book-wrapper")
-    if not book_wrappers:
-        print("Could not find any book wrappers. HTML structure might have changed.")
-        return
-
-    for book in book_wrappers:
+    for book in soup.find_all("div", class_="book-wrapper"):
         book_num = book.get("data-book-number", "Unknown")
-        
-        # User requested extraction of ALL volumes
-        # if book_num != "1":
-        #    continue
-
         vol_name = f"Vol_{book_num.zfill(2)}"
-        
-        print(f"Processing {vol_name}...")
-        
-        # Create directory
-        vol_dir = os.path.join(DATA_DIR, vol_name)
-        os.makedirs(vol_dir, exist_ok=True)
-        
-        # Track chapter metadata for index
+
         chapter_metadata = []
-        
-        # Find chapters
         chapters = book.find_all("div", class_="chapter-entry")
         for i, chapter in enumerate(chapters, 1):
             web_cell = chapter.find("div", class_="body-web")
-            if not web_cell: 
+            if not web_cell:
                 continue
-                
+
             link = web_cell.find("a")
             if not link:
                 continue
-                
-            href = link.get('href')
+
             title = link.get_text().strip()
-            filename = clean_filename(title) + ".txt"
-            
-            # Save metadata
-            chapter_info = {
+            chapter_metadata.append({
                 "order": i,
                 "title": title,
-                "filename": filename,
-                "url": href
-            }
-            chapter_metadata.append(chapter_info)
-            
-            scrape_chapter(href, vol_dir, title)
-            
-            # Optional: Simple restart capability
-            # If file exists, scrape_chapter already skips it.
-
-        # Save index.json for this volume
-        index_path = os.path.join(vol_dir, "index.json")
+                "filename": clean_filename(title) + ".txt",
+                "url": urljoin(base_url, link.get('href'))
+            })
+        volumes.append((vol_name, chapter_metadata))
+    return volumes
+
+def scrape(base_url=BASE_URL, data_dir=DATA_DIR, workers=MAX_WORKERS, refresh=False,
+           min_interval=MIN_HOST_INTERVAL, jitter=HOST_JITTER):
+    """Scrapes every volume in the TOC at `base_url`. Returns counts per chapter status."""
+    print("Starting TWI Scraper...")
+    session = make_session(workers)
+    limiter = HostLimiter(min_interval, jitter)
+
+    # Only the book wrappers are needed from the (large) TOC page
+    with RUN.stage("toc"):
+        soup = get_soup(base_url, session, limiter, parse_only=SoupStrainer("div", class_="book-wrapper"))
+        if not soup:
+            return
+        volumes = parse_toc(soup, base_url)
+    if not volumes:
+        print("Could not find any book wrappers. HTML structure might have changed.")
+        return
+
+    counts = {}
+    with RUN.stage("chapters") as add, ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {}
+        for vol_name, chapter_metadata in volumes:
+            vol_dir = os.path.join(data_dir, vol_name)
+            os.makedirs(vol_dir, exist_ok=True)
+            print(f"Queueing {vol_name}: {len(chapter_metadata)} chapters")
+
+            # Carry stored validators over from the previous index
+            previous = {entry.get("url"): entry for entry in load_index(vol_dir)}
+            for chapter_info in chapter_metadata:
+                old = previous.get(chapter_info["url"], {})
+                validators = {k: old[k] for k in ("etag", "last_modified") if old.get(k)}
+                future = pool.submit(scrape_chapter, chapter_info["url"], vol_dir, chapter_info["title"],
+                                     session, limiter, validators, refresh)
+                futures[future] = (chapter_info, validators)
+
+        for future in as_completed(futures):
+            chapter_info, old_validators = futures[future]
+            try:
+                status, validators = future.result()
+            except Exception as e:
+                # One chapter failing (e.g. an OSError writing its file) must not lose the volume index
+                print(f"  [ERROR] {chapter_info['title']}: {e}")
+                status, validators = "error", {}
+            chapter_info.update(validators if status != "error" else old_validators)
+            counts[status] = counts.get(status, 0) + 1
+            RUN.count(f"chapters.{status}")
+            add(items=1)
+
+    # Save index.json per volume (with validators for the next conditional run)
+    for vol_name, chapter_metadata in volumes:
+        index_path = os.path.join(data_dir, vol_name, "index.json")
         with open(index_path, "w", encoding="utf-8") as f:
             json.dump(chapter_metadata, f, indent=2, ensure_ascii=False)
         print(f"Saved volume index to {index_path}")
 
+    print("Done: " + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download chapters listed in the TWI table of contents.")
+    parser.add_argument("--base-url", default=BASE_URL, help="Table of contents URL (e.g. a local fixture_server)")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--refresh", action="store_true",
+                        help="Re-download chapters that have no stored ETag/Last-Modified yet")
+    parser.add_argument("--min-interval", type=float, default=MIN_HOST_INTERVAL,
+                        help="Seconds between requests to the same host")
+    parser.add_argument("--jitter", type=float, default=HOST_JITTER, help="Max extra random delay per request")
+    add_arguments(parser)
+    args = parser.parse_args()
+    RUN.start("scrape_chapters", profile=args.profile)
+    scrape(args.base_url, args.data_dir, args.workers, args.refresh, args.min_interval, args.jitter)
+    RUN.write_report(args.report)
+
 
 if __name__ == "__main__":
     main()
@@ -1,81 +1,408 @@
-import requests
+"""
+Resumable MediaWiki harvester for the TWI wiki's character, location and class lists.
+
+For each list it walks the category and its subcategories (breadth first, up to
+MAX_DEPTH levels, cycles ignored), then fetches page wikitext and redirects for
+BATCH_SIZE titles per API request. All requests share one pooled session, a
+small worker pool and a per-host limiter. Outputs in data/wiki/:
+
+- characters.json, locations.json, classes.json   [{pageid, title, url, category}]
+- pages/<list>.jsonl     one {pageid, title, redirects, infobox, aliases, wikitext} per page
+- aliases.json           {title: [alias, ...]} from redirects and infobox alias fields
+
+Category continuation tokens and members are checkpointed to harvest_state.json
+after every API response, and fetched pages are appended to pages/<list>.jsonl as
+each batch lands, so an interrupted run resumes where it stopped (--restart to
+start over). API errors abort the run rather than saving partial lists.
+
+    python scrape_wiki.py [characters locations classes] [--workers 2] [--restart]
+    python scrape_wiki.py --api-url http://127.0.0.1:8000/api.php --data-dir /tmp/wiki   # fixture_server
+"""
+import argparse
 import json
 import os
+import re
+import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+from checkpoint_store import truncate_torn_tail
+from metrics import RUN, add_arguments
+from rate_limit import HostLimiter
+from scrape_chapters import REQUEST_TIMEOUT, make_session
 
 WIKI_API_URL = "https://wiki.wanderinginn.com/api.php"
+WIKI_PAGE_URL = "https://wiki.wanderinginn.com/"
 DATA_DIR = "data/wiki"
+PAGES_DIR = "pages"
+STATE_FILENAME = "harvest_state.json"
+ALIASES_FILENAME = "aliases.json"
+STATE_VERSION = 1
 
-def fetch_category_members(category_name):
-    """
-    Fetches all members of a given category from the MediaWiki API.
-    Handles pagination via 'cmcontinue'.
-    """
-    members = []
-    params = {
-        "action": "query",
-        "list": "categorymembers",
-        "cmtitle": category_name,
-        "cmlimit": "500",  # Max limit for standard users
-        "format": "json",
-        "cmtype": "page"   # Only fetch pages, not subcategories or files
-    }
-
-    print(f"Fetching members for {category_name}...")
-    
-    while True:
-        try:
-            response = requests.get(WIKI_API_URL, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            if "query" in data and "categorymembers" in data["query"]:
-                for member in data["query"]["categorymembers"]:
-                    members.append({
-                        "pageid": member["pageid"],
-                        "title": member["title"],
-                        # Construct a full URL for convenience
-                        "url": f"https://wiki.wanderinginn.com/{member['title'].replace(' ', '_')}"
-                    })
-            
-            # Check for continuation
-            if "continue" in data:
-                params["cmcontinue"] = data["continue"]["cmcontinue"]
-                print(f"  ...fetched {len(members)} items so far. Continuing...")
-                time.sleep(0.5) # Be polite
-            else:
+LISTS = {
+    "characters": "Category:Characters",
+    "locations": "Category:Locations",
+    "classes": "Category:Classes",
+}
+MAX_DEPTH = 4            # Subcategory levels below each list's category
+MEMBER_LIMIT = 500       # Category members per request (API max for normal users)
+BATCH_SIZE = 50          # Titles per content request (API max for normal users)
+MAX_WORKERS = 2          # Concurrent API requests
+MIN_HOST_INTERVAL = 0.5  # Seconds between requests to the wiki
+
+# Infobox fields holding other names for the page's subject
+ALIAS_FIELDS = ("aliases", "alias", "nicknames", "nickname", "aka", "also known as")
+ALIAS_SPLIT_RE = re.compile(r"<br\s*/?>|[,;\n]", re.IGNORECASE)
+LINK_RE = re.compile(r"\[\[(?:[^\]|]*\|)?([^\]]*)\]\]")
+MARKUP_RE = re.compile(r"'{2,}|<ref[^>]*>.*?</ref>|<ref[^>]*/>|<[^>]+>|\{\{[^}]*\}\}", re.DOTALL)
+
+
+class WikiApiError(RuntimeError):
+    pass
+
+
+def page_url(title):
+    return WIKI_PAGE_URL + title.replace(" ", "_")
+
+
+def api_get(session, limiter, api_url, params):
+    """One API request (JSON, formatversion 2). Raises WikiApiError / requests errors on failure."""
+    RUN.observe("wiki.limiter_wait", limiter.acquire(api_url))
+    started = time.perf_counter()
+    try:
+        response = session.get(api_url, params={**params, "format": "json", "formatversion": "2"},
+                               timeout=REQUEST_TIMEOUT)
+    except Exception:
+        RUN.count("wiki.errors")
+        raise
+    RUN.observe("wiki.latency", time.perf_counter() - started)
+    RUN.count("wiki.requests")
+    RUN.count("wiki.bytes", len(response.content))
+    retries = getattr(response.raw, "retries", None)
+    if retries is not None and retries.history:
+        RUN.count("wiki.retries", len(retries.history))
+    if not response.ok:
+        RUN.count("wiki.errors")
+    response.raise_for_status()
+    data = response.json()
+    if "error" in data:
+        RUN.count("wiki.errors")
+        raise WikiApiError(f"{data['error'].get('code')}: {data['error'].get('info')}")
+    return data
+
+
+def _split_fields(body):
+    """Top-level `| name = value` fields of a template body (nested {{ }} and [[ ]] kept intact)."""
+    fields = []
+    depth = 0
+    start = 0
+    i = 0
+    while i < len(body):
+        pair = body[i:i + 2]
+        if pair in ("{{", "[["):
+            depth += 1
+            i += 2
+            continue
+        if pair in ("}}", "]]"):
+            depth -= 1
+            i += 2
+            continue
+        if body[i] == "|" and depth == 0:
+            fields.append(body[start:i])
+            start = i + 1
+        i += 1
+    fields.append(body[start:])
+    return fields
+
+
+def parse_infobox(wikitext):
+    """{field: value} of the page's first {{Infobox ...}} template (lowercased field names)."""
+    start = wikitext.find("{{Infobox")
+    if start == -1:
+        return {}
+    depth = 0
+    end = start
+    while end < len(wikitext):
+        pair = wikitext[end:end + 2]
+        if pair == "{{":
+            depth += 1
+            end += 2
+        elif pair == "}}":
+            depth -= 1
+            end += 2
+            if depth == 0:
                 break
-                
-        except Exception as e:
-            print(f"Error fetching data: {e}")
-            break
-            
-    print(f"Total members found for {category_name}: {len(members)}")
-    return members
-
-def save_json(data, filename):
-    os.makedirs(DATA_DIR, exist_ok=True)
-    filepath = os.path.join(DATA_DIR, filename)
-    with open(filepath, "w", encoding="utf-8") as f:
+        else:
+            end += 1
+    infobox = {}
+    for field in _split_fields(wikitext[start + 2:end - 2])[1:]:
+        name, sep, value = field.partition("=")
+        if sep and value.strip():
+            infobox[name.strip().lower()] = value.strip()
+    return infobox
+
+
+def infobox_aliases(infobox):
+    """Plain-text names listed in the infobox's alias fields."""
+    aliases = []
+    for field in ALIAS_FIELDS:
+        value = LINK_RE.sub(r"\1", infobox.get(field, ""))
+        for part in ALIAS_SPLIT_RE.split(value):
+            part = MARKUP_RE.sub("", part).strip(" \t'\"")
+            if part:
+                aliases.append(part)
+    return aliases
+
+
+class Harvester:
+    """One harvest run; `state` is the checkpoint (see module docstring)."""
+
+    def __init__(self, api_url=WIKI_API_URL, data_dir=DATA_DIR, workers=MAX_WORKERS, batch_size=BATCH_SIZE,
+                 max_depth=MAX_DEPTH, min_interval=MIN_HOST_INTERVAL, session=None):
+        self.api_url = api_url
+        self.data_dir = data_dir
+        self.workers = max(1, workers)
+        self.batch_size = min(batch_size, BATCH_SIZE)
+        self.max_depth = max_depth
+        self.session = session or make_session(self.workers)
+        self.limiter = HostLimiter(min_interval)
+        self.lock = threading.Lock()
+        self.state_path = os.path.join(data_dir, STATE_FILENAME)
+        self.state = None
+        self.requests = 0
+
+    def _get(self, params):
+        data = api_get(self.session, self.limiter, self.api_url, params)
+        with self.lock:
+            self.requests += 1
+        return data
+
+    def _save_state(self):
+        """Atomically rewrites the checkpoint; call with self.lock held."""
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+    def pages_path(self, name):
+        return os.path.join(self.data_dir, PAGES_DIR, f"{name}.jsonl")
+
+    def load_state(self, names, restart=False):
+        """Resumes the checkpoint if it matches this run; otherwise starts fresh. Returns True on resume."""
+        os.makedirs(os.path.join(self.data_dir, PAGES_DIR), exist_ok=True)
+        if not restart and os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("version") == STATE_VERSION and state.get("api_url") == self.api_url \
+                    and sorted(state["lists"]) == sorted(names):
+                self.state = state
+                for name in names:
+                    truncate_torn_tail(self.pages_path(name), validate_json=True)
+                return True
+            print("Checkpoint is for a different run; starting over.")
+
+        self.state = {"version": STATE_VERSION, "api_url": self.api_url, "lists": {}}
+        for name in names:
+            self.state["lists"][name] = {
+                "queue": [[LISTS[name], 0, None]],  # [category, depth, cmcontinue] still to page through
+                "seen": [LISTS[name]],
+                "members": {},
+            }
+            if os.path.exists(self.pages_path(name)):
+                os.remove(self.pages_path(name))
+        with self.lock:
+            self._save_state()
+        return False
+
+    def _walk_category(self, name, entry):
+        """Pages through one category, checkpointing after each response."""
+        progress = self.state["lists"][name]
+        category, depth, token = entry
+        params = {"action": "query", "list": "categorymembers", "cmtitle": category,
+                  "cmtype": "page|subcat", "cmlimit": str(MEMBER_LIMIT)}
+        while True:
+            data = self._get({**params, "cmcontinue": token} if token else params)
+            token = data.get("continue", {}).get("cmcontinue")
+            with self.lock:
+                for member in data.get("query", {}).get("categorymembers", []):
+                    title = member["title"]
+                    if member.get("ns") == 14:
+                        if depth < self.max_depth and title not in progress["seen"]:
+                            progress["seen"].append(title)
+                            progress["queue"].append([title, depth + 1, None])
+                    elif title not in progress["members"]:
+                        progress["members"][title] = {
+                            "pageid": member["pageid"], "title": title,
+                            "url": page_url(title), "category": category,
+                        }
+                if token:
+                    entry[2] = token
+                else:
+                    progress["queue"].remove(entry)
+                self._save_state()
+            if not token:
+                return
+
+    def walk(self, name, pool):
+        """Collects a list's members from its category tree, one BFS level at a time."""
+        progress = self.state["lists"][name]
+        while progress["queue"]:
+            level = list(progress["queue"])
+            list(pool.map(lambda entry: self._walk_category(name, entry), level))
+        return progress["members"]
+
+    def _fetch_batch(self, titles):
+        """Page records for up to batch_size titles, following redirect continuation."""
+        params = {"action": "query", "prop": "revisions|redirects", "rvprop": "content", "rvslots": "main",
+                  "rdlimit": "max", "titles": "|".join(titles)}
+        pages = {}
+        extra = {}
+        while True:
+            data = self._get({**params, **extra})
+            for page in data.get("query", {}).get("pages", []):
+                if page.get("missing") or page.get("invalid"):
+                    continue
+                record = pages.setdefault(page["title"], {"pageid": page["pageid"], "title": page["title"],
+                                                          "redirects": [], "wikitext": ""})
+                for revision in page.get("revisions", []):
+                    record["wikitext"] = revision["slots"]["main"].get("content", "")
+                record["redirects"] += [redirect["title"] for redirect in page.get("redirects", [])]
+            if "continue" not in data:
+                break
+            extra = data["continue"]
+
+        for record in pages.values():
+            infobox = parse_infobox(record["wikitext"])
+            names = record["redirects"] + infobox_aliases(infobox)
+            record["infobox"] = infobox
+            record["aliases"] = sorted({alias for alias in names if alias != record["title"]})
+        return [pages[title] for title in titles if title in pages]
+
+    def fetch_pages(self, name, pool):
+        """Fetches content for every member not already in pages/<name>.jsonl. Returns pages written."""
+        path = self.pages_path(name)
+        done = {record["title"] for record in load_pages(path)}
+        titles = sorted(set(self.state["lists"][name]["members"]) - done)
+        batches = [titles[i:i + self.batch_size] for i in range(0, len(titles), self.batch_size)]
+        written = 0
+        with open(path, "a", encoding="utf-8") as f:
+            def fetch_and_append(batch):
+                nonlocal written
+                records = self._fetch_batch(batch)
+                with self.lock:
+                    for record in records:
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    f.flush()
+                    written += len(records)
+            list(pool.map(fetch_and_append, batches))
+        return written
+
+    def finish(self, name):
+        """Writes the list's <name>.json (sorted by title)."""
+        members = sorted(self.state["lists"][name]["members"].values(), key=lambda m: m["title"])
+        save_json(members, f"{name}.json", self.data_dir)
+        return members
+
+
+def load_pages(path):
+    """Page records from a pages/<list>.jsonl file (last record per title wins)."""
+    if not os.path.exists(path):
+        return []
+    records = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                records[record["title"]] = record
+    return list(records.values())
+
+
+def build_aliases(data_dir=DATA_DIR):
+    """{title: [aliases]} over every harvested pages/<list>.jsonl."""
+    aliases = {}
+    pages_dir = os.path.join(data_dir, PAGES_DIR)
+    for filename in sorted(os.listdir(pages_dir)) if os.path.isdir(pages_dir) else []:
+        if filename.endswith(".jsonl"):
+            for record in load_pages(os.path.join(pages_dir, filename)):
+                if record["aliases"]:
+                    aliases.setdefault(record["title"], set()).update(record["aliases"])
+    return {title: sorted(names) for title, names in sorted(aliases.items())}
+
+
+def save_json(data, filename, data_dir=DATA_DIR):
+    os.makedirs(data_dir, exist_ok=True)
+    filepath = os.path.join(data_dir, filename)
+    with open(filepath + ".tmp", "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(filepath + ".tmp", filepath)
     print(f"Saved {len(data)} items to {filepath}")
 
+
+def harvest(names=tuple(LISTS), api_url=WIKI_API_URL, data_dir=DATA_DIR, workers=MAX_WORKERS,
+            batch_size=BATCH_SIZE, max_depth=MAX_DEPTH, min_interval=MIN_HOST_INTERVAL, content=True,
+            restart=False, session=None):
+    """
+    Harvests the given lists (see LISTS). Returns {"requests", "members": {list: n}, "pages": {list: n}}.
+    Errors propagate with the checkpoint intact; call again to resume.
+    """
+    harvester = Harvester(api_url, data_dir, workers, batch_size, max_depth, min_interval, session)
+    if harvester.load_state(names, restart):
+        print(f"Resuming harvest from {harvester.state_path}")
+    stats = {"requests": 0, "members": {}, "pages": {}}
+    with ThreadPoolExecutor(max_workers=harvester.workers) as pool:
+        try:
+            for name in names:
+                with RUN.stage("categories") as add:
+                    members = harvester.walk(name, pool)
+                    add(items=len(members))
+                print(f"{name}: {len(members)} pages in {len(harvester.state['lists'][name]['seen'])} categories")
+                stats["members"][name] = len(members)
+                if content:
+                    with RUN.stage("pages") as add:
+                        stats["pages"][name] = harvester.fetch_pages(name, pool)
+                        add(items=stats["pages"][name])
+                    print(f"  fetched {stats['pages'][name]} pages")
+        finally:
+            stats["requests"] = harvester.requests
+
+    for name in names:
+        harvester.finish(name)
+    if content:
+        save_json(build_aliases(data_dir), ALIASES_FILENAME, data_dir)
+    os.remove(harvester.state_path)
+    print(f"Harvest complete: {stats['requests']} API requests")
+    return stats
+
+
 def main():
-    # 1. Characters
-    # "Category:Characters" is the main category, but it might contain subcategories.
-    # For now, let's grab "Category:Characters" and potentially "Category:Named_Characters" if it exists,
-    # or rely on the fact that TWI wiki usually puts chars in the top category or we might need recursion later.
-    # Let's start simple with "Category:Characters".
-    characters = fetch_category_members("Category:Characters")
-    save_json(characters, "characters.json")
-
-    # 2. Locations
-    locations = fetch_category_members("Category:Locations")
-    save_json(locations, "locations.json")
-    
-    # 3. Classes (Optional but good for entity extraction context)
-    classes = fetch_category_members("Category:Classes")
-    save_json(classes, "classes.json")
+    parser = argparse.ArgumentParser(description="Harvest wiki character/location/class lists, pages and aliases.")
+    parser.add_argument("lists", nargs="*", help=f"Default: all of {', '.join(LISTS)}")
+    parser.add_argument("--api-url", default=WIKI_API_URL, help="MediaWiki api.php (e.g. a local fixture_server)")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Titles per content request (max 50)")
+    parser.add_argument("--max-depth", type=int, default=MAX_DEPTH, help="Subcategory levels to descend")
+    parser.add_argument("--min-interval", type=float, default=MIN_HOST_INTERVAL,
+                        help="Seconds between requests to the wiki")
+    parser.add_argument("--no-content", action="store_true", help="Titles only; skip pages and aliases")
+    parser.add_argument("--restart", action="store_true", help="Discard an interrupted run's checkpoint")
+    add_arguments(parser)
+    args = parser.parse_args()
+    unknown = set(args.lists) - set(LISTS)
+    if unknown:
+        parser.error(f"unknown list(s): {', '.join(sorted(unknown))}")
+
+    RUN.start("scrape_wiki", profile=args.profile)
+    try:
+        harvest(args.lists or tuple(LISTS), args.api_url, args.data_dir, args.workers, args.batch_size,
+                args.max_depth, args.min_interval, not args.no_content, args.restart)
+    except Exception as e:
+        print(f"Harvest interrupted: {e}. Progress is checkpointed; rerun to resume.")
+        RUN.write_report(args.report)
+        sys.exit(1)
+    RUN.write_report(args.report)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,371 @@
+"""
+Positional inverted index over the chunker output (data/processed/Vol_XX/chunks.jsonl).
+
+One index per volume under data/index/Vol_XX/:
+- postings.bin  uint32 array; per term, per chunk: [doc_id, n, pos_1 .. pos_n]
+- lexicon.json  {term: [offset, length, doc_freq]} into postings.bin (in uint32 units)
+- docs.json     [[chunk_id, chapter_order, chapter_title], ...], doc_id = list position
+- meta.json     source chunks file stat/sha256 and counts; written last, so its
+                presence marks a complete index
+
+postings.bin is memory-mapped at query time, so opening an index only loads the
+lexicon and docs table. A volume is rebuilt only when its chunks file changed.
+
+    python search_index.py build [Vol_01 ...] [--force]
+    python search_index.py query "Erin Solstice" [--volume Vol_01] [--chapters 1-10]
+    python search_index.py entity "Erin Solstice" --chapters 1-30 [--variants]
+"""
+import argparse
+import json
+import mmap
+import os
+import re
+import time
+from array import array
+
+from chunk_chapters import PROCESSED_DIR, chunks_path, file_sha256, iter_chunks
+from gazetteer import fold_text, load_aliases, name_variants, normalize_name
+
+INDEX_DIR = "data/index"
+INDEX_VERSION = 1
+POSTINGS_FILENAME = "postings.bin"
+LEXICON_FILENAME = "lexicon.json"
+DOCS_FILENAME = "docs.json"
+META_FILENAME = "meta.json"
+
+# Alphanumeric runs; "Erin's" indexes as "erin", "s" so a query for "Erin" still hits it
+WORD_RE = re.compile(r"[^\W_]+")
+
+
+def tokenize(text):
+    """Lowercased, folded index terms of `text` in order."""
+    return WORD_RE.findall(fold_text(text).lower())
+
+
+def list_indexed_volumes(index_dir=INDEX_DIR):
+    if not os.path.isdir(index_dir):
+        return []
+    return [
+        name for name in sorted(os.listdir(index_dir))
+        if name.startswith("Vol_") and os.path.exists(os.path.join(index_dir, name, META_FILENAME))
+    ]
+
+
+# --- Build ---
+
+def load_meta(vol_index_dir):
+    """A volume index's meta.json (also embedding_index.py's), or None if it has none."""
+    path = os.path.join(vol_index_dir, META_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_json(path, data):
+    """Compact JSON, written to a temp file and renamed into place."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def index_is_fresh(vol_name, source, index_dir=INDEX_DIR, version=INDEX_VERSION):
+    """
+    (fresh, source_entry): fresh if the volume's index (format `version`) was built
+    from the current chunks file (same mtime+size, or, if only the mtime moved, the
+    same sha256); source_entry describes the file now, for the index's meta.json.
+    """
+    stat = os.stat(source)
+    entry = {"path": source, "mtime": stat.st_mtime, "size": stat.st_size}
+    meta = load_meta(os.path.join(index_dir, vol_name))
+    old = (meta or {}).get("source")
+    if not meta or meta.get("version") != version or not old or old.get("path") != source \
+            or old.get("size") != entry["size"]:
+        entry["sha256"] = file_sha256(source)
+        return False, entry
+    if old.get("mtime") == entry["mtime"]:
+        entry["sha256"] = old.get("sha256")
+        return True, entry
+    entry["sha256"] = file_sha256(source)
+    return entry["sha256"] == old.get("sha256"), entry
+
+
+def build_volume_index(vol_name, force=False, processed_dir=None, index_dir=INDEX_DIR):
+    """
+    (Re)builds one volume's index from its chunks. Returns "built", "fresh" or
+    None when the volume has no chunks.
+    """
+    source = chunks_path(vol_name, processed_dir)
+    if source is None:
+        print(f"No chunks found for {vol_name}. Run chunk_chapters.py first.")
+        return None
+
+    fresh, source_entry = index_is_fresh(vol_name, source, index_dir)
+    vol_index_dir = os.path.join(index_dir, vol_name)
+    if fresh and not force:
+        print(f"  [FRESH] {vol_name}")
+        return "fresh"
+
+    started = time.perf_counter()
+    docs = []
+    terms = {}  # term -> {doc_id: [positions]}
+    token_total = 0
+    for doc_id, chunk in enumerate(iter_chunks(vol_name, processed_dir)):
+        docs.append([chunk["chunk_id"], chunk["chapter_order"], chunk["chapter_title"]])
+        tokens = tokenize(chunk["text"])
+        token_total += len(tokens)
+        for position, term in enumerate(tokens):
+            by_doc = terms.get(term)
+            if by_doc is None:
+                by_doc = terms[term] = {}
+            positions = by_doc.get(doc_id)
+            if positions is None:
+                by_doc[doc_id] = [position]
+            else:
+                positions.append(position)
+
+    postings = array("I")
+    lexicon = {}
+    for term in sorted(terms):
+        offset = len(postings)
+        by_doc = terms[term]
+        for doc_id, positions in by_doc.items():  # Insertion order == ascending doc_id
+            postings.append(doc_id)
+            postings.append(len(positions))
+            postings.extend(positions)
+        lexicon[term] = [offset, len(postings) - offset, len(by_doc)]
+
+    # meta.json goes last and is removed first, so a crash never leaves a half-new index marked complete
+    os.makedirs(vol_index_dir, exist_ok=True)
+    meta_path = os.path.join(vol_index_dir, META_FILENAME)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    postings_path = os.path.join(vol_index_dir, POSTINGS_FILENAME)
+    with open(postings_path + ".tmp", "wb") as f:
+        postings.tofile(f)
+    os.replace(postings_path + ".tmp", postings_path)
+    write_json(os.path.join(vol_index_dir, LEXICON_FILENAME), lexicon)
+    write_json(os.path.join(vol_index_dir, DOCS_FILENAME), docs)
+    write_json(meta_path, {
+        "version": INDEX_VERSION,
+        "source": source_entry,
+        "docs": len(docs),
+        "terms": len(lexicon),
+        "tokens": token_total,
+        "itemsize": postings.itemsize,
+    })
+    print(f"  [BUILT] {vol_name}: {len(docs)} chunks, {len(lexicon):,} terms, "
+          f"{token_total:,} tokens in {time.perf_counter() - started:.2f}s")
+    return "built"
+
+
+def build_indexes(vol_names=None, force=False, processed_dir=None, index_dir=INDEX_DIR):
+    """Builds every stale volume index. Returns {vol_name: status}."""
+    processed_dir = processed_dir or PROCESSED_DIR
+    if vol_names is None:
+        vol_names = [
+            name for name in sorted(os.listdir(processed_dir))
+            if name.startswith("Vol_") and chunks_path(name, processed_dir)
+        ] if os.path.isdir(processed_dir) else []
+    return {
+        vol_name: build_volume_index(vol_name, force, processed_dir, index_dir)
+        for vol_name in vol_names
+    }
+
+
+# --- Query ---
+
+class VolumeIndex:
+    """Read-only view of one volume's index; postings stay on disk behind an mmap."""
+
+    def __init__(self, vol_name, index_dir=INDEX_DIR):
+        self.vol_name = vol_name
+        vol_index_dir = os.path.join(index_dir, vol_name)
+        self.meta = load_meta(vol_index_dir)
+        if self.meta is None:
+            raise FileNotFoundError(f"No index for {vol_name}; run: python search_index.py build {vol_name}")
+        with open(os.path.join(vol_index_dir, LEXICON_FILENAME), "r", encoding="utf-8") as f:
+            self.lexicon = json.load(f)
+        with open(os.path.join(vol_index_dir, DOCS_FILENAME), "r", encoding="utf-8") as f:
+            self.docs = json.load(f)
+
+        self._file = open(os.path.join(vol_index_dir, POSTINGS_FILENAME), "rb")
+        if os.fstat(self._file.fileno()).st_size:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._words = memoryview(self._mmap).cast(array("I").typecode)
+        else:
+            self._mmap = None
+            self._words = memoryview(array("I"))
+
+    def close(self):
+        self._words.release()
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def postings(self, term):
+        """{doc_id: [positions]} for one (already tokenized) term."""
+        entry = self.lexicon.get(term)
+        if entry is None:
+            return {}
+        offset, length, _ = entry
+        words = self._words[offset:offset + length]
+        result = {}
+        i = 0
+        while i < length:
+            doc_id, count = words[i], words[i + 1]
+            result[doc_id] = words[i + 2:i + 2 + count].tolist()
+            i += 2 + count
+        return result
+
+    def doc_frequency(self, term):
+        entry = self.lexicon.get(term)
+        return entry[2] if entry else 0
+
+    def phrase(self, terms, chapters=None):
+        """
+        Yields (doc_id, start_position) for every occurrence of the term sequence.
+        `chapters` is an optional inclusive (first, last) chapter_order range.
+        """
+        if not terms or any(term not in self.lexicon for term in terms):
+            return
+        # Intersect on the rarest term first
+        order = sorted(range(len(terms)), key=lambda i: self.doc_frequency(terms[i]))
+        lists = {}
+        candidates = None
+        for i in order:
+            postings = self.postings(terms[i])
+            lists[i] = postings
+            candidates = set(postings) if candidates is None else candidates & postings.keys()
+            if not candidates:
+                return
+
+        for doc_id in sorted(candidates):
+            if chapters and not chapters[0] <= self.docs[doc_id][1] <= chapters[1]:
+                continue
+            starts = set(lists[0][doc_id])
+            for i in range(1, len(terms)):
+                starts &= {position - i for position in lists[i][doc_id]}
+                if not starts:
+                    break
+            for start in sorted(starts):
+                yield doc_id, start
+
+    def search(self, query, chapters=None):
+        """Phrase search for `query`. Returns [(chunk_id, chapter_order, chapter_title, hits)]."""
+        counts = {}
+        for doc_id, _ in self.phrase(tokenize(query), chapters):
+            counts[doc_id] = counts.get(doc_id, 0) + 1
+        return [tuple(self.docs[doc_id]) + (hits,) for doc_id, hits in sorted(counts.items())]
+
+
+class SearchIndex:
+    """All indexed volumes; volume indexes are opened lazily and kept open."""
+
+    def __init__(self, index_dir=INDEX_DIR):
+        self.index_dir = index_dir
+        self.volumes = {}
+
+    def volume(self, vol_name):
+        if vol_name not in self.volumes:
+            self.volumes[vol_name] = VolumeIndex(vol_name, self.index_dir)
+        return self.volumes[vol_name]
+
+    def close(self):
+        for index in self.volumes.values():
+            index.close()
+        self.volumes = {}
+
+    def search(self, query, volumes=None, chapters=None):
+        """Phrase search across volumes. Returns [(vol_name, chunk_id, chapter_order, chapter_title, hits)]."""
+        results = []
+        for vol_name in volumes or list_indexed_volumes(self.index_dir):
+            results.extend((vol_name,) + hit for hit in self.volume(vol_name).search(query, chapters))
+        return results
+
+    def entity_mentions(self, name, volumes=None, chapters=None, variants=False, aliases=None):
+        """
+        Where an entity is mentioned: its name plus any aliases.json aliases
+        (and, with `variants`, first/last-name variants). Returns
+        {(vol_name, chapter_order, chapter_title): hits} in reading order.
+        """
+        aliases = load_aliases() if aliases is None else aliases
+        surfaces = {normalize_name(name)} | {normalize_name(alias) for alias in aliases.get(name, [])}
+        if variants:
+            surfaces |= name_variants(name)
+
+        phrases = {tuple(tokenize(surface)) for surface in surfaces}
+        phrases.discard(())
+        mentions = {}
+        for vol_name in volumes or list_indexed_volumes(self.index_dir):
+            index = self.volume(vol_name)
+            # Distinct (doc, position) so overlapping surfaces ("Erin Solstice" / "Erin") count once
+            hits = set()
+            for phrase in phrases:
+                hits.update(index.phrase(list(phrase), chapters))
+            for doc_id, _ in hits:
+                _, order, title = index.docs[doc_id]
+                key = (vol_name, order, title)
+                mentions[key] = mentions.get(key, 0) + 1
+        return dict(sorted(mentions.items()))
+
+
+def parse_range(value):
+    """"3-10" -> (3, 10); "7" -> (7, 7)."""
+    if not value:
+        return None
+    first, _, last = value.partition("-")
+    return int(first), int(last or first)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query the per-volume full-text index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Build/refresh volume indexes from chunks")
+    build.add_argument("volumes", nargs="*", help="Volumes to index (default: every chunked volume)")
+    build.add_argument("--force", action="store_true", help="Rebuild even if the chunks are unchanged")
+
+    for name, help_text in (("query", "Phrase search"), ("entity", "Chapters mentioning an entity")):
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument("text")
+        cmd.add_argument("--volume", action="append", dest="volumes", help="Restrict to a volume (repeatable)")
+        cmd.add_argument("--chapters", help="Chapter order range within each volume, e.g. 1-10")
+        if name == "query":
+            cmd.add_argument("--limit", type=int, default=20)
+        else:
+            cmd.add_argument("--variants", action="store_true", help="Also match first/last-name variants")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_indexes(args.volumes or None, force=args.force)
+        return
+
+    index = SearchIndex()
+    started = time.perf_counter()
+    chapters = parse_range(args.chapters)
+    if args.command == "query":
+        results = index.search(args.text, args.volumes, chapters)
+        elapsed = time.perf_counter() - started
+        total = sum(hit[-1] for hit in results)
+        print(f"{total} hits in {len(results)} chunks ({elapsed * 1000:.1f} ms)")
+        for vol_name, chunk_id, order, title, hits in results[:args.limit]:
+            print(f"  {vol_name} {title:<12} {chunk_id:<12} {hits}")
+    else:
+        mentions = index.entity_mentions(args.text, args.volumes, chapters, variants=args.variants)
+        elapsed = time.perf_counter() - started
+        print(f"{args.text}: {sum(mentions.values())} mentions in {len(mentions)} chapters ({elapsed * 1000:.1f} ms)")
+        for (vol_name, order, title), hits in mentions.items():
+            print(f"  {vol_name} #{order:<4} {title:<12} {hits}")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import re
+
+# Same separators as chunk_chapters.split_into_scenes, compiled once.
+# A separator line (*** / * * * / ——— / –– / _hv_) with its surrounding newlines.
+SEPARATOR_RE = re.compile(r"\n\s*(\*[\s\*]*\*|—+|–+|_hv_)\s*\n")
+# A scene that consists of nothing but separator characters is dropped.
+SEPARATOR_ONLY_RE = re.compile(r"\*[\s\*]*\*|—+|–+|_hv_")
+
+
+def strip_span(text, start, end):
+    """Shrinks (start, end) past leading/trailing whitespace, like str.strip() without copying."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def scene_spans(text):
+    """
+    Yields (start, end) offsets of each scene in `text`.
+    Equivalent to split_into_scenes(text), but scans once with a compiled pattern
+    and never copies scene text.
+    """
+    pos = 0
+    for match in SEPARATOR_RE.finditer(text):
+        span = _scene_span(text, pos, match.start())
+        if span:
+            yield span
+        pos = match.end()
+    span = _scene_span(text, pos, len(text))
+    if span:
+        yield span
+
+
+def _scene_span(text, start, end):
+    start, end = strip_span(text, start, end)
+    if start == end:
+        return None
+    if SEPARATOR_ONLY_RE.fullmatch(text, start, end):
+        return None
+    return start, end
+
+
+def chunk_spans(text, start, end, max_chars):
+    """
+    Yields (start, end) offsets of the chunks of the scene text[start:end].
+    Paragraphs ("\\n"-separated) are packed greedily up to `max_chars`, exactly
+    like chunk_text. Packed paragraphs are contiguous, so a chunk that fits ends at
+    the last newline within `max_chars` of its start: one rfind per chunk instead of
+    one step per paragraph.
+    """
+    if end - start <= max_chars:
+        yield start, end
+        return
+
+    pos = start
+    while True:
+        # A chunk of paragraphs ending at offset p costs (p - pos + 1) characters
+        limit = pos + max_chars - 1
+        if end <= limit:
+            yield pos, end
+            return
+
+        newline = text.rfind("\n", pos, limit + 1)
+        if newline == -1:
+            # Oversized paragraph becomes its own chunk
+            newline = text.find("\n", pos, end)
+            if newline == -1:
+                yield pos, end
+                return
+        yield pos, newline
+        pos = newline + 1
+
+
+def segment_chapter(text, max_chars):
+    """Yields (scene_index, sub_chunk_index, start, end) for every chunk of a chapter."""
+    for scene_idx, (scene_start, scene_end) in enumerate(scene_spans(text)):
+        for sub_idx, (start, end) in enumerate(chunk_spans(text, scene_start, scene_end, max_chars)):
+            yield scene_idx, sub_idx, start, end
+
+
+def paragraph_spans(text, start, end):
+    """Yields (start, end) of each "\\n"-separated paragraph in text[start:end]."""
+    pos = start
+    while True:
+        newline = text.find("\n", pos, end)
+        if newline == -1:
+            yield pos, end
+            return
+        yield pos, newline
+        pos = newline + 1
+
+
+def pack_spans(text, start, end, count_tokens, budget, overlap_tokens=0):
+    """
+    Yields (start, end, tokens) chunks of the scene text[start:end], packing whole
+    paragraphs up to `budget` tokens as measured by `count_tokens` (each joining
+    newline counts as one token). With `overlap_tokens`, each chunk after the first
+    starts with the trailing paragraphs of the previous chunk that fit in that
+    allowance. Oversized paragraphs become their own chunk.
+    """
+    paragraphs = []
+    total = -1
+    for para_start, para_end in paragraph_spans(text, start, end):
+        tokens = count_tokens(text[para_start:para_end])
+        paragraphs.append((para_start, para_end, tokens))
+        total += tokens + 1
+
+    if total <= budget:
+        yield start, end, total
+        return
+
+    first = 0  # Index of the first paragraph of the current chunk
+    n = len(paragraphs)
+    while first < n:
+        used = paragraphs[first][2]
+        last = first
+        while last + 1 < n and used + 1 + paragraphs[last + 1][2] <= budget:
+            last += 1
+            used += 1 + paragraphs[last][2]
+        yield paragraphs[first][0], paragraphs[last][1], used
+
+        if last + 1 >= n:
+            return
+
+        # Step back over trailing paragraphs for overlap, always making progress
+        nxt = last + 1
+        if overlap_tokens:
+            carried = 0
+            back = last
+            while back > first:
+                cost = paragraphs[back][2] + 1
+                if carried + cost > overlap_tokens or carried + cost + paragraphs[last + 1][2] > budget:
+                    break
+                carried += cost
+                back -= 1
+            nxt = back + 1
+        first = nxt
+
+
+def pack_chapter(text, count_tokens, budget, overlap_tokens=0):
+    """Yields (scene_index, sub_chunk_index, start, end, tokens) using token-budget packing."""
+    for scene_idx, (scene_start, scene_end) in enumerate(scene_spans(text)):
+        spans = pack_spans(text, scene_start, scene_end, count_tokens, budget, overlap_tokens)
+        for sub_idx, (start, end, tokens) in enumerate(spans):
+            yield scene_idx, sub_idx, start, end, tokens
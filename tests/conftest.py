@@ -0,0 +1,40 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def wiki_dir(tmp_path):
+    """A small data/wiki: characters.json and locations.json with a handful of titles."""
+    path = tmp_path / "wiki"
+    path.mkdir()
+    characters = ["Erin Solstice", "Relc Grasstongue", "Pisces Jealnet", "Klbkch", "Lyonette du Marquin",
+                  "Ceria Springwalker", "Yvlon Byres", "Ksmvr", "Zel Shivertail", "Selys Shivertail"]
+    locations = ["Liscor", "Celum", "Floodplains", "Blood Fields"]
+    (path / "characters.json").write_text(json.dumps([{"title": title} for title in characters]), encoding="utf-8")
+    (path / "locations.json").write_text(json.dumps([{"title": title} for title in locations]), encoding="utf-8")
+    return path
+
+
+CHUNKS = [
+    (1, "1.00", "Erin Solstice found an empty inn on a hill near Liscor."),
+    (1, "1.00", "Relc Grasstongue walked in and asked Erin Solstice for food."),
+    (2, "1.01", "Pisces Jealnet stole the pasta while Klbkch watched the door."),
+    (3, "1.02", "Erin cooked for the goblins and Relc complained about the goblins."),
+]
+
+
+@pytest.fixture
+def processed_dir(tmp_path):
+    """A small data/processed with one chunked volume (Vol_01/chunks.jsonl, one chunk per scene)."""
+    path = tmp_path / "processed"
+    vol_dir = path / "Vol_01"
+    vol_dir.mkdir(parents=True)
+    scenes = {}
+    with open(vol_dir / "chunks.jsonl", "w", encoding="utf-8") as f:
+        for order, title, text in CHUNKS:
+            scene = scenes[order] = scenes.get(order, -1) + 1
+            chunk = {"chunk_id": f"{order}_{scene}_0", "chapter_order": order, "chapter_title": title,
+                     "scene_index": scene, "sub_chunk_index": 0, "text": text, "token_estimate": len(text) // 4}
+            f.write(json.dumps(chunk) + "\n")
+    return path
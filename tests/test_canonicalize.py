@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from canonicalize import Canonicalizer
+
+TITLES = ["Erin Solstice", "Pisces Jealnet", "Pisca", "Relc Grasstongue", "Zel Shivertail", "Selys Shivertail",
+          "Az'kerash"]
+
+
+@pytest.fixture
+def canonicalizer():
+    return Canonicalizer(TITLES, {"Az'kerash": ["The Necromancer"]}, {"Pisces Jealnet": 500, "Pisca": 3})
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("Erin Solstice", ("Erin Solstice", "exact")),
+    ("erin solstice", ("Erin Solstice", "exact")),
+    ("Erin", ("Erin Solstice", "token")),
+    ("Relc", ("Relc Grasstongue", "token")),
+    ("the Necromancer", ("Az'kerash", "alias")),
+    ("Pisc", ("Pisces Jealnet", "prefix")),
+    ("Erin Soltice", ("Erin Solstice", "fuzzy")),
+    ("Shivertail", (None, "ambiguous")),
+    ("Zorbulax", (None, "unresolved")),
+])
+def test_resolve(canonicalizer, name, expected):
+    assert canonicalizer.resolve(name) == expected
+
+
+def test_repeated_names_hit_the_cache(canonicalizer):
+    for _ in range(3):
+        canonicalizer.canonical("Erin")
+    assert canonicalizer.cache_info().hits >= 2
+
+
+def test_from_wiki_reads_titles_and_aliases(wiki_dir):
+    (wiki_dir / "aliases.json").write_text(json.dumps({"Pisces Jealnet": ["The Necromancer's Apprentice"]}),
+                                           encoding="utf-8")
+    canonicalizer = Canonicalizer.from_wiki(str(wiki_dir), processed_dir=str(wiki_dir / "none"))
+    assert canonicalizer.canonical("Klbkch") == "Klbkch"
+    assert canonicalizer.canonical("the necromancer's apprentice") == "Pisces Jealnet"
+    assert canonicalizer.canonical("Liscor") is None  # A location; only characters were loaded
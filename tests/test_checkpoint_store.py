@@ -0,0 +1,80 @@
+import json
+
+from checkpoint_store import ResultLog, text_sha256
+
+
+def record(chunk_id, text="Erin Solstice runs the inn."):
+    return {"chunk_id": chunk_id, "chapter_order": 1, "scene_index": 0, "text_sha256": text_sha256(text),
+            "extraction": {"characters": [{"name": "Erin Solstice"}], "locations": []}}
+
+
+def write_log(tmp_path, chunk_ids):
+    with ResultLog.for_volume("Vol_01", str(tmp_path), fsync=False) as store:
+        for chunk_id in chunk_ids:
+            store.append(record(chunk_id))
+    return ResultLog.for_volume("Vol_01", str(tmp_path), fsync=False)
+
+
+def test_torn_log_line_is_dropped_on_open(tmp_path):
+    store = write_log(tmp_path, ["1_0_0", "1_1_0"])
+    with open(store.log_path, "a", encoding="utf-8") as f:
+        f.write('{"chunk_id": "1_2_0", "extraction": {"charac')  # Crash mid-append
+
+    with store:
+        assert [r["chunk_id"] for r in store.records()] == ["1_0_0", "1_1_0"]
+        assert store.processed_ids() == {"1_0_0", "1_1_0"}
+        store.append(record("1_2_0"))
+    with open(store.log_path, "r", encoding="utf-8") as f:
+        assert [json.loads(line)["chunk_id"] for line in f] == ["1_0_0", "1_1_0", "1_2_0"]
+
+
+def test_complete_but_unparseable_last_line_is_dropped(tmp_path):
+    store = write_log(tmp_path, ["1_0_0"])
+    with open(store.log_path, "a", encoding="utf-8") as f:
+        f.write('{"chunk_id": "1_1_0", \n')
+    with store:
+        assert [r["chunk_id"] for r in store.records()] == ["1_0_0"]
+
+
+def test_torn_index_line_is_dropped(tmp_path):
+    store = write_log(tmp_path, ["1_0_0", "1_1_0"])
+    with open(store.index_path, "a", encoding="utf-8") as f:
+        f.write("1_2")
+    with store:
+        assert store.processed_hashes() == {"1_0_0": text_sha256("Erin Solstice runs the inn."),
+                                            "1_1_0": text_sha256("Erin Solstice runs the inn.")}
+
+
+def test_record_missing_from_index_is_redone(tmp_path):
+    store = write_log(tmp_path, ["1_0_0", "1_1_0"])
+    with open(store.index_path, "r", encoding="utf-8") as f:
+        first = f.readline()
+    with open(store.index_path, "w", encoding="utf-8") as f:
+        f.write(first)  # Crash between the log write and the index write
+    with store:
+        assert store.processed_ids() == {"1_0_0"}
+
+
+def test_index_keeps_error_status(tmp_path):
+    store = write_log(tmp_path, ["1_0_0"])
+    with store:
+        store.append(dict(record("1_1_0"), extraction={"error": "invalid JSON"}))
+        assert store.error_ids() == {"1_1_0"}
+    reopened = ResultLog.for_volume("Vol_01", str(tmp_path), fsync=False)
+    assert reopened.error_ids() == {"1_1_0"}
+    with reopened:
+        reopened.append(record("1_1_0"))  # Retried successfully
+        assert reopened.error_ids() == set()
+
+
+def test_index_without_status_is_rebuilt_on_open(tmp_path):
+    store = write_log(tmp_path, ["1_0_0"])
+    with store:
+        store.append(dict(record("1_1_0"), extraction={"error": "invalid JSON"}))
+    sha = text_sha256("Erin Solstice runs the inn.")
+    with open(store.index_path, "w", encoding="utf-8") as f:
+        f.write(f"1_0_0\t{sha}\n1_1_0\t{sha}\n")  # Index written before the status field
+    with store:
+        assert store.error_ids() == {"1_1_0"}
+    with open(store.index_path, "r", encoding="utf-8") as f:
+        assert f.read().splitlines() == [f"1_0_0\t{sha}\tok", f"1_1_0\t{sha}\terror"]
@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+from cooccurrence_matrix import build, chapter_positions, compute_matrices, incidence_matrix
+from graph_store import GraphStore
+from tests.test_graph_store import RECORDS
+
+# Chapter 1: {0, 1}, {0}; chapter 2: {1, 2}; chapter 4: {0, 2} (chapter 3 has no mentions)
+CHUNKS = [(("Vol_01", 1, "1.00"), {0, 1}), (("Vol_01", 1, "1.00"), {0}),
+          (("Vol_01", 2, "1.01"), {1, 2}), (("Vol_01", 4, "1.03"), {0, 2})]
+
+
+def test_matrices():
+    X, chunk_chapter, chapters = incidence_matrix(CHUNKS, 3)
+    positions, n_positions = chapter_positions(chapters)
+    assert positions.tolist() == [0, 1, 3] and n_positions == 4
+    result = compute_matrices(X, chunk_chapter, len(chapters), window=2, positions=positions, n_positions=n_positions)
+    assert result["cooccurrence"].toarray().tolist() == [[3, 1, 1], [1, 2, 1], [1, 1, 2]]
+    assert result["timeline"].toarray().tolist() == [[2, 1, 0], [0, 1, 1], [1, 0, 1]]
+    # Windows 1-2, 2-3, 3-4: entities 0 and 2 only share the first and last
+    assert result["windowed"].toarray()[0, 2] == 2
+
+
+def test_graph_cache_follows_ingests_and_opens_read_only(tmp_path, wiki_dir):
+    graph_path = str(tmp_path / "graph.sqlite")
+    with pytest.raises(FileNotFoundError):
+        build("graph", graph_path=graph_path, graph_dir=str(tmp_path))
+    assert not os.path.exists(graph_path)
+
+    with GraphStore(graph_path, wiki_dir=str(wiki_dir)) as store:
+        store.ingest_records("Vol_01", RECORDS)
+    assert build("graph", graph_path=graph_path, graph_dir=str(tmp_path))["rebuilt"]
+    cached = build("graph", graph_path=graph_path, graph_dir=str(tmp_path))
+    assert not cached["rebuilt"]
+    assert cached["cooccurrence"].diagonal().sum() == 7  # One per mention
+
+    # Same export ingested again (e.g. --force after a wiki change): the cache is stale
+    with GraphStore(graph_path, wiki_dir=str(wiki_dir)) as store:
+        store.ingest_records("Vol_01", RECORDS)
+    assert build("graph", graph_path=graph_path, graph_dir=str(tmp_path))["rebuilt"]
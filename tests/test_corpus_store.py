@@ -0,0 +1,28 @@
+import json
+
+import chunk_chapters
+from chunk_chapters import load_chunks, sync_corpus
+from corpus_store import open_corpus
+
+
+def test_store_round_trips_the_chunks(processed_dir):
+    chunks = load_chunks("Vol_01", str(processed_dir))
+    assert sync_corpus("Vol_01", str(processed_dir)) == "built"
+    assert sync_corpus("Vol_01", str(processed_dir)) == "fresh"
+    with open_corpus("Vol_01", str(processed_dir)) as store:
+        assert len(store) == len(chunks)
+        assert list(store.iter_chunks()) == chunks
+        assert store.get("2_0_0") == chunks[2]
+        assert [store.chunk_id(row) for row in store.chapter_rows(1)] == ["1_0_0", "1_1_0"]
+
+
+def test_store_and_chunker_exports_match(processed_dir, monkeypatch, tmp_path):
+    monkeypatch.setattr(chunk_chapters, "PROCESSED_DIR", str(processed_dir))
+    sync_corpus("Vol_01", str(processed_dir))
+    chunk_chapters.export_chunks_json("Vol_01")
+    with open_corpus("Vol_01", str(processed_dir)) as store:
+        assert store.export_json(str(tmp_path / "store.json")) == 4
+
+    exported = (processed_dir / "Vol_01" / "chunks.json").read_text(encoding="utf-8")
+    assert exported == (tmp_path / "store.json").read_text(encoding="utf-8")
+    assert json.loads(exported) == load_chunks("Vol_01", str(processed_dir))
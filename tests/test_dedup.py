@@ -0,0 +1,52 @@
+import json
+import random
+
+import numpy as np
+
+from dedup import find_duplicates, similarity, text_signature, update
+
+WORDS = ("inn goblin liscor antinium drake gnoll pasta adventurer skill level class night "
+         "door window crossbow tavern floor rain stone field wall fire hill lake road").split()
+
+
+def text(seed, n=400):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def test_near_copies_are_similar_and_short_texts_never_compare():
+    original = text(1).split()
+    edited = list(original)
+    for i in range(0, len(edited), 40):
+        edited[i] = "Erin"  # 2.5% of the words
+    a, comparable = text_signature(" ".join(original))
+    b, _ = text_signature(" ".join(edited))
+    c, _ = text_signature(text(2))
+    assert comparable
+    assert similarity(a, b) >= 0.7 > similarity(a, c)
+    assert not text_signature("Too short to compare.")[1]
+
+
+def test_lowest_rank_copy_is_canonical():
+    signatures = [text_signature(t)[0] for t in (text(1), text(2), text(1))]
+    found = find_duplicates(["Vol_Unknown/a", "Vol_01/b", "Vol_02/a"], [(1, 0), (0, 1), (0, 2)],
+                            np.asarray(signatures))
+    assert found == {"Vol_Unknown/a": ("Vol_02/a", 1.0)}
+
+
+def test_chapter_duplicates_are_written_per_volume(tmp_path):
+    raw, processed = tmp_path / "raw", tmp_path / "processed"
+    for vol_name, chapters in (("Vol_01", {"1.00.txt": text(1), "1.01.txt": text(2)}),
+                               ("Vol_Unknown", {"1.00_(draft).txt": text(1), "9.99.txt": text(3)})):
+        (raw / vol_name).mkdir(parents=True)
+        index = [{"order": i, "title": name[:-4], "filename": name} for i, name in enumerate(chapters, 1)]
+        (raw / vol_name / "index.json").write_text(json.dumps(index), encoding="utf-8")
+        for name, body in chapters.items():
+            (raw / vol_name / name).write_text(body, encoding="utf-8")
+
+    by_volume = update("chapters", ["Vol_01", "Vol_Unknown"], str(raw), str(processed), workers=1)
+    assert by_volume == {"Vol_01": {}, "Vol_Unknown": {"1.00_(draft).txt": {"canonical": "Vol_01/1.00.txt",
+                                                                           "similarity": 1.0}}}
+    stored = json.loads((processed / "Vol_Unknown" / "duplicate_chapters.json").read_text(encoding="utf-8"))
+    assert stored == by_volume["Vol_Unknown"]
+    assert (processed / "Vol_01" / "dedup_chapters.npz").exists()  # Signature cache for the next run
@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from embedding_index import VectorIndex, build_indexes, load_meta
+
+
+def test_query_and_similar(processed_dir, tmp_path):
+    vector_dir = str(tmp_path / "vectors")
+    assert build_indexes(processed_dir=str(processed_dir), vector_dir=vector_dir) == {"Vol_01": "built"}
+    assert build_indexes(processed_dir=str(processed_dir), vector_dir=vector_dir) == {"Vol_01": "fresh"}
+    index = VectorIndex(vector_dir)
+    assert index.search("pasta stole", k=1, exact=True)[0][2] == "2_0_0"
+    assert all(hit[3] <= 2 for hit in index.search("goblins", k=4, chapters=(1, 2), exact=True))
+    similar = index.similar("Vol_01", "1_0_0", k=3, exact=True)
+    assert "1_0_0" not in [hit[2] for hit in similar] and len(similar) == 3
+
+
+def test_refit_re_embeds_every_volume(processed_dir, tmp_path):
+    vector_dir = tmp_path / "vectors"
+    other = processed_dir / "Vol_02"
+    other.mkdir()
+    (other / "chunks.jsonl").write_text(json.dumps({"chunk_id": "1_0_0", "chapter_order": 1, "chapter_title": "2.00",
+                                                    "text": "Ceria and Yvlon left Celum."}) + "\n", encoding="utf-8")
+    build_indexes(processed_dir=str(processed_dir), vector_dir=str(vector_dir))
+
+    with open(processed_dir / "Vol_01" / "chunks.jsonl", "a", encoding="utf-8") as f:
+        f.write(json.dumps({"chunk_id": "4_0_0", "chapter_order": 4, "chapter_title": "1.03",
+                            "text": "Ksmvr joined the Horns."}) + "\n")
+    statuses = build_indexes(["Vol_01"], refit=True, processed_dir=str(processed_dir), vector_dir=str(vector_dir))
+    assert statuses == {"Vol_01": "built", "Vol_02": "built"}
+    assert load_meta(str(vector_dir / "Vol_01"))["model"] == load_meta(str(vector_dir / "Vol_02"))["model"]
+
+
+def test_volume_from_another_model_is_rejected(processed_dir, tmp_path):
+    vector_dir = tmp_path / "vectors"
+    build_indexes(processed_dir=str(processed_dir), vector_dir=str(vector_dir))
+    meta_path = vector_dir / "Vol_01" / "meta.json"
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    meta_path.write_text(json.dumps(dict(meta, model="0-00000000")), encoding="utf-8")
+    with pytest.raises(ValueError):
+        VectorIndex(str(vector_dir)).search("goblins")
@@ -0,0 +1,74 @@
+from entity_spotter import can_route_locally, known_entities, spot_chunk, spotter_extraction, volume_vocabulary
+from gazetteer import Gazetteer
+
+SPOTTER = Gazetteer({"Erin Solstice": "character", "Liscor": "location",
+                     "Pisces Jealnet": "character", "Pisces Other": "character"}, fuzzy=False)
+
+
+def spot(text, others=()):
+    chunk = {"chunk_id": "1_0_0", "chapter_order": 1, "chapter_title": "1.00", "text": text}
+    chunks = [chunk] + [dict(chunk, text=other) for other in others]
+    return spot_chunk(chunk, SPOTTER, volume_vocabulary(chunks))
+
+
+def extraction_record(*names):
+    return {"extraction": {"characters": [{"name": name} for name in names], "locations": []}}
+
+
+def test_wiki_names_only_route_locally():
+    record = spot("Erin Solstice walked to Liscor. She sighed.")
+    assert record["unresolved"] == {}
+    assert can_route_locally(record, {})
+    extraction = spotter_extraction(record)
+    assert [c["name"] for c in extraction["characters"]] == ["Erin Solstice"]
+    assert extraction["locations"] == [{"name": "Liscor"}]
+
+
+def test_non_wiki_name_goes_to_the_llm():
+    record = spot("Erin Solstice walked to Liscor with Zorbulax. Zorbulax laughed.")
+    assert record["unresolved"] == {"Zorbulax": 2}
+    assert not can_route_locally(record, {})
+
+
+def test_sentence_initial_name_still_counts_as_unresolved():
+    # Only ever capitalized in the volume, so not ordinary vocabulary
+    record = spot("Erin Solstice nodded. Zorbulax laughed.", others=["The inn was quiet."])
+    assert "Zorbulax" in record["unresolved"]
+    assert not can_route_locally(record, {})
+
+
+def test_sentence_initial_vocabulary_is_not_a_name():
+    record = spot("Erin Solstice nodded. Quietly, she left.", others=["She left quietly."])
+    assert record["unresolved"] == {}
+
+
+def test_earlier_extractions_resolve_and_are_kept():
+    record = spot("Erin Solstice walked to Liscor with Zorbulax. Zorbulax laughed.")
+    known = known_entities([extraction_record("Zorbulax the Red")])
+    assert can_route_locally(record, known)
+    names = [c["name"] for c in spotter_extraction(record, known)["characters"]]
+    assert names == ["Erin Solstice", "Zorbulax the Red"]
+
+
+def test_carried_over_names_keep_their_extracted_type_and_confidence():
+    record = spot("Erin Solstice walked to Liscor with Zorbulax. Zorbulax laughed.")
+    earlier = {"extraction": {"characters": [{"name": "Zorbulax the Red", "type": "new", "confidence": 0.7}],
+                              "locations": []}}
+    characters = spotter_extraction(record, known_entities([earlier]))["characters"]
+    assert characters[0] == {"name": "Erin Solstice", "type": "known", "confidence": 1.0,
+                             "context": "wiki name match"}
+    assert characters[1] == {"name": "Zorbulax the Red", "type": "new", "confidence": 0.7,
+                             "context": "extracted earlier in this volume"}
+
+
+def test_names_shared_by_several_earlier_extractions_do_not_resolve():
+    record = spot("Erin Solstice met Zorbulax.")
+    known = known_entities([extraction_record("Zorbulax the Red", "Zorbulax the Blue")])
+    assert "Zorbulax" not in known
+    assert not can_route_locally(record, known)
+
+
+def test_ambiguous_wiki_match_goes_to_the_llm():
+    record = spot("Erin Solstice waved at Pisces.")
+    assert record["ambiguous"] == {"Pisces": ["Pisces Jealnet", "Pisces Other"]}
+    assert not can_route_locally(record, {})
@@ -0,0 +1,12 @@
+from extract_entities import ReplyTally, parse_extraction, split_batch_reply
+
+
+def test_parse_outcomes_are_tallied_per_run():
+    first, second = ReplyTally(), ReplyTally()
+    parse_extraction('{"characters": [], "locations": []}', tally=first)
+    parse_extraction('{"characters": [{"name": "Erin"', tally=first)
+    chunks = [{"chunk_id": "1_0_0"}, {"chunk_id": "1_1_0"}]
+    split_batch_reply('{"results": {"1_0_0": {"characters": [], "locations": []}, "1_1_0": {}}}', chunks,
+                      tally=second)
+    assert (first.replies, first.parse_failures) == (2, 1)
+    assert (second.replies, second.parse_failures) == (2, 1)
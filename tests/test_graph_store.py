@@ -0,0 +1,74 @@
+import json
+
+from graph_store import GraphStore
+
+
+def record(chunk_id, characters, locations=()):
+    order, scene, _ = (int(part) for part in chunk_id.split("_"))
+    return {"chunk_id": chunk_id, "chapter_order": order, "scene_index": scene,
+            "extraction": {"characters": [{"name": name, "type": "known", "confidence": 0.9} for name in characters],
+                           "locations": [{"name": name} for name in locations]}}
+
+
+RECORDS = [
+    record("1_0_0", ["Erin Solstice"], ["Liscor"]),
+    record("1_1_0", ["Erin Solstice", "Relc Grasstongue"]),
+    record("2_0_0", ["Relc Grasstongue", "Klbkch"], ["Liscor"]),
+    {"chunk_id": "3_0_0", "chapter_order": 3, "scene_index": 0, "extraction": {"error": "invalid JSON"}},
+]
+
+
+def test_queries_over_an_ingested_volume(tmp_path, wiki_dir):
+    with GraphStore(str(tmp_path / "graph.sqlite"), wiki_dir=str(wiki_dir)) as store:
+        assert store.ingest_records("Vol_01", RECORDS, {1: "1.00", 2: "1.01"}) == 7
+        assert store.appearances("Erin Solstice") == [("Vol_01", 1, "1.00", 2)]
+        assert store.first_appearance("Relc Grasstongue") == ("Vol_01", 1, "1.00", "1_1_0")
+        assert store.neighbours("Relc Grasstongue") == [("Erin Solstice", "character", 1),
+                                                        ("Klbkch", "character", 1), ("Liscor", "location", 1)]
+        assert store.cooccurrence("Erin Solstice", "Liscor") == [("Vol_01", 1)]
+        assert store.appearances("Liscor", kind="character") == []
+        assert store.stats()["mentions"] == 7
+
+
+def test_reingest_replaces_the_volume(tmp_path, wiki_dir):
+    with GraphStore(str(tmp_path / "graph.sqlite"), wiki_dir=str(wiki_dir)) as store:
+        store.ingest_records("Vol_01", RECORDS)
+        store.ingest_records("Vol_01", RECORDS[:1])
+        assert store.appearances("Relc Grasstongue") == []
+        assert store.stats()["entities"] == 2  # Entities left without mentions are dropped
+
+
+def test_unchanged_export_is_not_ingested_again(tmp_path, wiki_dir):
+    output_dir = tmp_path / "processed"
+    export = output_dir / "Vol_01" / "extracted_entities.json"
+    export.parent.mkdir(parents=True)
+    export.write_text(json.dumps(RECORDS), encoding="utf-8")
+    with GraphStore(str(tmp_path / "graph.sqlite"), wiki_dir=str(wiki_dir)) as store:
+        assert store.ingest(output_dir=str(output_dir)) == {"Vol_01": "ingested"}
+        assert store.ingest(output_dir=str(output_dir)) == {"Vol_01": "fresh"}
+        export.write_text(json.dumps(RECORDS[:2]), encoding="utf-8")
+        assert store.ingest(output_dir=str(output_dir)) == {"Vol_01": "ingested"}
+
+
+def test_queries_resolve_names_like_ingest(tmp_path, wiki_dir):
+    graph_path = str(tmp_path / "graph.sqlite")
+    records = [record("1_0_0", ["Erin", "Pisc"], ["Liscor"]), record("2_0_0", ["Relc", "Klbkch", "Zorbulax"])]
+    with GraphStore(graph_path, wiki_dir=str(wiki_dir)) as store:
+        store.ingest_records("Vol_01", records, {1: "1.00", 2: "1.01"})
+    with GraphStore(graph_path, read_only=True, wiki_dir=str(wiki_dir)) as store:
+        assert store.find_entities("Erin") == store.find_entities("Erin Solstice") != []
+        assert store.appearances("Pisc") == [("Vol_01", 1, "1.00", 1)]
+        assert store.first_appearance("Klbkch") == ("Vol_01", 2, "1.01", "2_0_0")
+        assert [row[0] for row in store.neighbours("Relc")] == ["Klbkch", "Zorbulax"]
+        assert store.appearances("Zorbulax") == [("Vol_01", 2, "1.01", 1)]  # Not in the wiki: raw name
+
+
+def test_pre_canonical_graph_is_cleared(tmp_path, wiki_dir):
+    graph_path = str(tmp_path / "graph.sqlite")
+    with GraphStore(graph_path, wiki_dir=str(wiki_dir)) as store:
+        store.ingest_records("Vol_01", [record("1_0_0", ["Erin"])])
+        store.conn.execute("ALTER TABLE mentions DROP COLUMN surface")  # As written before canonicalization
+        store.conn.execute("UPDATE entities SET name = 'Erin', name_key = 'erin'")
+        store.conn.commit()
+    with GraphStore(graph_path, wiki_dir=str(wiki_dir)) as store:
+        assert store.stats() == {"volumes": 0, "entities": 0, "mentions": 0, "cooccurrence": 0}
@@ -0,0 +1,47 @@
+import pytest
+
+from json_repair import JSONRepairError, parse_json, validate_extraction
+
+
+def test_strict_json_needs_no_repair():
+    parsed = parse_json('{"characters": [], "locations": []}')
+    assert parsed.value == {"characters": [], "locations": []}
+    assert parsed.repairs == []
+    assert parsed.open_path == []
+
+
+def test_fenced_reply():
+    parsed = parse_json('```json\n{"characters": [{"name": "Erin"}], "locations": []}\n```')
+    assert parsed.value == {"characters": [{"name": "Erin"}], "locations": []}
+    assert "fence" in parsed.repairs
+
+
+def test_trailing_commas():
+    parsed = parse_json('{"characters": [{"name": "Erin"},], "locations": [{"name": "Liscor"},],}')
+    assert parsed.value == {"characters": [{"name": "Erin"}], "locations": [{"name": "Liscor"}]}
+    assert "trailing_comma" in parsed.repairs
+
+
+def test_truncated_reply_keeps_complete_members():
+    parsed = parse_json('Here you go: {"characters": [{"name": "Erin"}, {"name": "Rel')
+    assert parsed.value == {"characters": [{"name": "Erin"}]}
+    assert "truncated" in parsed.repairs
+    assert parsed.open_path == ["characters"]
+
+
+def test_object_cut_after_a_complete_member_keeps_that_member():
+    parsed = parse_json('{"characters":[{"name":"Erin","confid')
+    assert parsed.value == {"characters": [{"name": "Erin"}]}
+    assert parsed.open_path == ["characters"]
+
+
+def test_truncated_section_is_reported_missing():
+    parsed = parse_json('{"characters": [{"name": "Erin", "type": "known"}], "locations": [{"name": "Lis')
+    extraction, missing, _ = validate_extraction(parsed.value, incomplete=parsed.open_path[:1])
+    assert extraction["characters"][0]["name"] == "Erin"
+    assert missing == ["locations"]
+
+
+def test_no_json_object():
+    with pytest.raises(JSONRepairError):
+        parse_json("I could not find any characters in this scene.")
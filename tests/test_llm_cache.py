@@ -0,0 +1,63 @@
+import pytest
+
+import extract_entities
+from llm_cache import CacheMiss, MODE_REPLAY, ResponseCache, cache_key
+from rate_limit import RateLimiter
+
+
+def test_key_depends_on_model_params_and_prompt():
+    params = {"temperature": 0.1}
+    key = cache_key("glm-4.6", params, "prompt")
+    assert key == cache_key("glm-4.6", dict(params), "prompt")
+    assert key != cache_key("mock", params, "prompt")
+    assert key != cache_key("glm-4.6", {"temperature": 0.2}, "prompt")
+    assert key != cache_key("glm-4.6", params, "prompt!")
+
+
+def test_readwrite_stores_and_replay_serves(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(path)
+    assert cache.get("a") is None
+    cache.put("a", "glm-4.6", '{"characters": []}')
+    assert cache.get("a") == '{"characters": []}'
+    assert cache.delete("a") and cache.get("a") is None
+    cache.put("b", "glm-4.6", "reply")
+    cache.close()
+
+    replay = ResponseCache(path, mode=MODE_REPLAY)
+    assert replay.get("b") == "reply"
+    replay.put("c", "glm-4.6", "ignored")
+    with pytest.raises(CacheMiss):
+        replay.get("c")
+    assert replay.stats()["hits"] == 1 and replay.stats()["misses"] == 1
+
+
+def test_replay_needs_an_existing_cache(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ResponseCache(str(tmp_path / "missing.sqlite"), mode=MODE_REPLAY)
+
+
+def test_evict_drops_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    for key in ("old", "new"):
+        cache.put(key, "glm-4.6", "x" * 100)
+    cache.conn.execute("UPDATE responses SET accessed_at = 0 WHERE key = 'old'")
+    assert cache.evict(max_bytes=150) == 1
+    assert cache.get("old") is None and cache.get("new") is not None
+
+
+def test_replay_serves_a_recorded_live_reply_without_a_client(tmp_path, monkeypatch):
+    monkeypatch.setattr(extract_entities, "API_KEY", None)
+    monkeypatch.setattr(extract_entities, "client", None)
+    path = str(tmp_path / "cache.sqlite")
+    recorded = ResponseCache(path)
+    key = cache_key(extract_entities.MODEL_NAME, extract_entities.SAMPLING_PARAMS, "prompt")
+    recorded.put(key, extract_entities.MODEL_NAME, "live reply")
+    recorded.close()
+
+    cache = ResponseCache(path, mode=MODE_REPLAY)
+    content = extract_entities.complete("prompt", "1_0_0", None, False, RateLimiter(), cache=cache)
+    assert content == "live reply"
+    assert extract_entities.client is None
+    with pytest.raises(CacheMiss):
+        extract_entities.complete("other prompt", "1_1_0", None, False, RateLimiter(), cache=cache)
@@ -0,0 +1,81 @@
+import json
+import os
+
+import pytest
+
+import chunk_chapters
+import pipeline
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """One raw volume with two chapters and a fake chunk stage that counts its runs."""
+    raw = tmp_path / "raw"
+    processed = tmp_path / "processed"
+    monkeypatch.setattr(chunk_chapters, "RAW_DIR", str(raw))
+    monkeypatch.setattr(chunk_chapters, "PROCESSED_DIR", str(processed))
+    vol_dir = raw / "Vol_01"
+    vol_dir.mkdir(parents=True)
+    index = [{"order": 1, "title": "1.00", "filename": "1.00.txt"}, {"order": 2, "title": "1.01", "filename": "1.01.txt"}]
+    (vol_dir / "index.json").write_text(json.dumps(index), encoding="utf-8")
+    for entry in index:
+        (vol_dir / entry["filename"]).write_text(f"Chapter {entry['title']}.", encoding="utf-8")
+
+    runs = []
+
+    def fake_chunk(vol_names, options, workers):
+        for vol_name in vol_names:
+            os.makedirs(processed / vol_name, exist_ok=True)
+            (processed / vol_name / chunk_chapters.CHUNKS_FILENAME).write_text("{}\n", encoding="utf-8")
+        runs.append(list(vol_names))
+        return vol_names
+
+    monkeypatch.setitem(pipeline.RUNNERS, "chunk", fake_chunk)
+    return tmp_path, runs
+
+
+def run(tmp_path, **options):
+    return pipeline.run_pipeline(["Vol_01"], stages=["chunk"], state_path=str(tmp_path / "state.json"),
+                                 options=dict({"keep_duplicates": True}, **options))
+
+
+def test_fresh_volume_is_skipped(workdir):
+    tmp_path, runs = workdir
+    assert run(tmp_path)["chunk"]["ran"] == ["Vol_01"]
+    assert run(tmp_path)["chunk"] == {"ran": [], "fresh": ["Vol_01"], "failed": []}
+    assert runs == [["Vol_01"]]
+
+
+def test_changed_input_makes_the_volume_stale(workdir):
+    tmp_path, runs = workdir
+    run(tmp_path)
+    chapter = tmp_path / "raw" / "Vol_01" / "1.01.txt"
+    chapter.write_text("Chapter 1.01, edited.", encoding="utf-8")
+    assert run(tmp_path)["chunk"]["ran"] == ["Vol_01"]
+    assert run(tmp_path)["chunk"]["fresh"] == ["Vol_01"]
+
+
+def test_touched_but_unchanged_input_stays_fresh(workdir):
+    tmp_path, runs = workdir
+    run(tmp_path)
+    chapter = tmp_path / "raw" / "Vol_01" / "1.00.txt"
+    stat = chapter.stat()
+    os.utime(chapter, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert run(tmp_path)["chunk"]["fresh"] == ["Vol_01"]
+
+
+def test_changed_parameters_or_output_make_the_volume_stale(workdir):
+    tmp_path, runs = workdir
+    run(tmp_path)
+    assert run(tmp_path, overlap=64)["chunk"]["ran"] == ["Vol_01"]
+    (tmp_path / "processed" / "Vol_01" / chunk_chapters.CHUNKS_FILENAME).write_text("", encoding="utf-8")
+    assert run(tmp_path, overlap=64)["chunk"]["ran"] == ["Vol_01"]
+    assert len(runs) == 3
+
+
+def test_force_reruns_a_fresh_volume(workdir):
+    tmp_path, runs = workdir
+    run(tmp_path)
+    summary = pipeline.run_pipeline(["Vol_01"], stages=["chunk"], force=["chunk"],
+                                    state_path=str(tmp_path / "state.json"), options={"keep_duplicates": True})
+    assert summary["chunk"]["ran"] == ["Vol_01"]
@@ -0,0 +1,53 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+import graph_store
+from graph_store import GraphStore
+from query_server import serve
+from tests.test_graph_store import record
+
+
+@pytest.fixture
+def base_url(processed_dir, wiki_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(graph_store, "WIKI_DIR", str(wiki_dir))
+    graph_path = str(tmp_path / "graph.sqlite")
+    with GraphStore(graph_path) as store:
+        store.ingest_records("Vol_01", [record("1_0_0", ["Erin"], ["Liscor"]), record("1_1_0", ["Relc", "Erin"]),
+                                        record("2_0_0", ["Pisces", "Klbkch"])], {1: "1.00", 2: "1.01"})
+    server, url = serve(processed_dir=str(processed_dir), graph_path=graph_path)
+    yield url
+    server.shutdown()
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_corpus_endpoints(base_url):
+    assert get(f"{base_url}/volumes") == (200, [{"volume": "Vol_01", "chunks": 4, "chapters": 3}])
+    status, chapter = get(f"{base_url}/volumes/Vol_01/chapters/1?text=1")
+    assert status == 200 and [chunk["chunk_id"] for chunk in chapter["chunks"]] == ["1_0_0", "1_1_0"]
+    assert "text" in chapter["chunks"][0]
+    assert get(f"{base_url}/volumes/Vol_01/chunks/2_0_0")[1]["chapter_title"] == "1.01"
+    assert get(f"{base_url}/volumes/Vol_01/chunks/9_0_0")[0] == 404
+    assert get(f"{base_url}/nowhere")[0] == 404
+
+
+def test_entity_endpoints_resolve_names_like_ingest(base_url):
+    # The docstring examples: short names resolve to the wiki titles stored on ingest
+    assert get(f"{base_url}/entities/Relc/appearances") == (
+        200, [{"volume": "Vol_01", "chapter_order": 1, "chapter_title": "1.00", "mentions": 1}])
+    assert get(f"{base_url}/entities/Klbkch/first")[1]["chunk_id"] == "2_0_0"
+    assert get(f"{base_url}/entities/Pisc/first")[1]["chunk_id"] == "2_0_0"
+    status, neighbours = get(f"{base_url}/entities/Erin%20Solstice/neighbours?limit=10")
+    assert status == 200 and {n["name"] for n in neighbours} == {"Liscor", "Relc Grasstongue"}
+    assert get(f"{base_url}/cooccurrence?a=Erin&b=Relc")[1]["shared_chunks"] == 1
+    assert get(f"{base_url}/entities/Zorbulax/appearances")[0] == 404
+    assert get(f"{base_url}/entities/Erin/neighbours?limit=x")[0] == 400
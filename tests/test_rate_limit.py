@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+import rate_limit
+from rate_limit import HostLimiter, RateLimiter, TokenBucket, backoff_delay
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(rate_limit.time, "sleep", clock.sleep)
+    return clock
+
+
+def test_bucket_allows_a_burst_then_waits_for_refill(clock):
+    bucket = TokenBucket(capacity=3, refill_per_sec=1.0)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() == pytest.approx(1.0)
+    assert bucket.reserve() == pytest.approx(2.0)  # Reservations queue up behind each other
+    clock.now += 10
+    assert bucket.reserve() == 0.0
+
+
+def test_oversized_request_is_clamped_to_capacity(clock):
+    bucket = TokenBucket(capacity=100, refill_per_sec=10.0)
+    assert bucket.reserve(500) == 0.0
+    assert bucket.reserve(50) == pytest.approx(5.0)
+
+
+def test_limiter_waits_for_the_tighter_limit(clock):
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=600)
+    assert limiter.acquire(tokens=600) == 0.0
+    # One request token is left, but the token budget needs 300 / 10 per second
+    assert limiter.acquire(tokens=300) == pytest.approx(30.0)
+    assert clock.slept == [pytest.approx(30.0)]
+
+
+def test_unlimited_limiter_never_waits(clock):
+    limiter = RateLimiter()
+    assert all(limiter.acquire(tokens=10 ** 6) == 0.0 for _ in range(100))
+
+
+def test_host_limiter_spaces_requests_per_host(clock):
+    limiter = HostLimiter(min_interval=2.0)
+    assert limiter.acquire("https://a.example/1") == 0.0
+    assert limiter.acquire("https://b.example/1") == 0.0
+    assert limiter.acquire("https://a.example/2") == pytest.approx(2.0)
+
+
+def test_backoff_is_jittered_and_capped():
+    random.seed(0)
+    delays = [backoff_delay(attempt, base=1.0, cap=8.0) for attempt in range(10) for _ in range(20)]
+    assert all(0 <= delay <= 8.0 for delay in delays)
+    assert max(backoff_delay(0, base=1.0) for _ in range(50)) <= 1.0
@@ -0,0 +1,23 @@
+import json
+
+import scrape_chapters
+
+
+def test_chapter_exception_is_recorded_and_index_still_written(tmp_path, monkeypatch):
+    chapters = [{"title": "1.00", "url": "https://example.test/1.00"},
+                {"title": "1.01", "url": "https://example.test/1.01"}]
+    monkeypatch.setattr(scrape_chapters, "get_soup", lambda *args, **kwargs: object())
+    monkeypatch.setattr(scrape_chapters, "parse_toc", lambda soup, base_url: [("Vol_01", chapters)])
+
+    def fake_scrape_chapter(url, vol_dir, title, *args):
+        if title == "1.01":
+            raise OSError("disk full")
+        return "new", {"etag": '"abc"'}
+
+    monkeypatch.setattr(scrape_chapters, "scrape_chapter", fake_scrape_chapter)
+    counts = scrape_chapters.scrape(data_dir=str(tmp_path), workers=2, min_interval=0, jitter=0)
+
+    assert counts == {"new": 1, "error": 1}
+    index = json.loads((tmp_path / "Vol_01" / "index.json").read_text(encoding="utf-8"))
+    assert [entry["title"] for entry in index] == ["1.00", "1.01"]
+    assert index[0]["etag"] == '"abc"' and "etag" not in index[1]
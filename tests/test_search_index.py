@@ -0,0 +1,35 @@
+import search_index
+from search_index import SearchIndex, build_volume_index, parse_range, tokenize
+
+
+def test_build_is_skipped_while_chunks_are_unchanged(processed_dir, tmp_path):
+    index_dir = str(tmp_path / "index")
+    assert build_volume_index("Vol_01", processed_dir=str(processed_dir), index_dir=index_dir) == "built"
+    assert build_volume_index("Vol_01", processed_dir=str(processed_dir), index_dir=index_dir) == "fresh"
+    with open(processed_dir / "Vol_01" / "chunks.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"chunk_id": "4_0_0", "chapter_order": 4, "chapter_title": "1.03", "text": "Ceria left."}\n')
+    assert build_volume_index("Vol_01", processed_dir=str(processed_dir), index_dir=index_dir) == "built"
+    assert search_index.list_indexed_volumes(index_dir) == ["Vol_01"]
+
+
+def test_phrase_and_entity_queries(processed_dir, tmp_path):
+    index_dir = str(tmp_path / "index")
+    build_volume_index("Vol_01", processed_dir=str(processed_dir), index_dir=index_dir)
+    index = SearchIndex(index_dir)
+    try:
+        assert [hit[1] for hit in index.search("Erin Solstice")] == ["1_0_0", "1_1_0"]
+        assert index.search("Solstice Erin") == []
+        assert index.search("the goblins") == [("Vol_01", "3_0_0", 3, "1.02", 2)]
+        assert [hit[1] for hit in index.search("Erin", chapters=parse_range("2-3"))] == ["3_0_0"]
+
+        aliases = {"Pisces Jealnet": ["Pisc"]}
+        assert index.entity_mentions("Erin Solstice", aliases={}) == {("Vol_01", 1, "1.00"): 2}
+        assert index.entity_mentions("Erin Solstice", aliases={}, variants=True) == {
+            ("Vol_01", 1, "1.00"): 4, ("Vol_01", 3, "1.02"): 1}  # "Erin" and "Solstice" hits
+        assert index.entity_mentions("Pisces Jealnet", aliases=aliases) == {("Vol_01", 2, "1.01"): 1}
+    finally:
+        index.close()
+
+
+def test_tokenize_folds_case_and_punctuation():
+    assert tokenize("Erin's inn—Liscor!") == tokenize("erin s INN liscor")
@@ -0,0 +1,51 @@
+import glob
+import os
+
+import pytest
+
+from chunk_chapters import MAX_CHARS, RAW_DIR, chunk_text, split_into_scenes
+from segmenter import segment_chapter
+
+SAMPLES = {
+    "plain": "Erin opened the inn.\nRelc came in.\nHe wanted pasta.",
+    "separators": "First scene.\n***\nSecond scene.\n* * *\nThird.\n———\nFourth.\n––\nFifth.\n_hv_\nSixth.",
+    "separator_only": "* * *\nScene after a leading break.\n\n———\n\n",
+    "blank_scenes": "One.\n***\n   \n***\nTwo.",
+    "long_paragraphs": "\n".join(f"Paragraph {i} " + "word " * (i * 7) for i in range(40)),
+    "oversized_paragraph": "Short.\n" + "x" * 500 + "\nShort again.\nAnd more.",
+    "indented": "  Leading spaces.\n\tTabbed line.\n***\n  Another scene  \n",
+}
+
+
+def legacy_chunks(text, max_chars):
+    return [chunk for scene in split_into_scenes(text) for chunk in chunk_text(scene, max_chars)]
+
+
+def segmented_chunks(text, max_chars):
+    return [text[start:end] for _, _, start, end in segment_chapter(text, max_chars)]
+
+
+@pytest.mark.parametrize("name", sorted(SAMPLES))
+@pytest.mark.parametrize("max_chars", [40, 120, MAX_CHARS])
+def test_matches_legacy_chunker(name, max_chars):
+    text = SAMPLES[name]
+    assert segmented_chunks(text, max_chars) == legacy_chunks(text, max_chars)
+
+
+def test_indexes_follow_scenes_and_sub_chunks():
+    text = SAMPLES["separators"] + "\n***\n" + SAMPLES["long_paragraphs"]
+    positions = [(scene, sub) for scene, sub, _, _ in segment_chapter(text, 200)]
+    assert positions[0] == (0, 0)
+    for (scene, sub), (next_scene, next_sub) in zip(positions, positions[1:]):
+        assert (next_scene, next_sub) in ((scene, sub + 1), (scene + 1, 0))
+
+
+RAW_CHAPTERS = sorted(glob.glob(os.path.join(RAW_DIR, "Vol_*", "*.txt")))[:20]
+
+
+@pytest.mark.skipif(not RAW_CHAPTERS, reason="no scraped chapters in data/raw")
+@pytest.mark.parametrize("path", RAW_CHAPTERS, ids=os.path.basename)
+def test_matches_legacy_chunker_on_scraped_chapters(path):
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    assert segmented_chunks(text, MAX_CHARS) == legacy_chunks(text, MAX_CHARS)
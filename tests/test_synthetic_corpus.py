@@ -0,0 +1,32 @@
+import json
+import os
+
+from benchmarks.synthetic_corpus import generate
+from html_extract import extract_chapter_text
+
+
+def test_volumes_in_scraper_layout(tmp_path, wiki_dir):
+    totals = generate(str(tmp_path / "out"), chapters=12, words=300, wiki_dir=str(wiki_dir))
+    assert totals["volumes"] == 1 and totals["chapters"] == 12
+    vol_dir = tmp_path / "out" / "raw" / "Vol_01"
+    index = json.loads((vol_dir / "index.json").read_text(encoding="utf-8"))
+    assert [entry["order"] for entry in index] == list(range(1, 13))
+    assert all((vol_dir / entry["filename"]).exists() for entry in index)
+
+
+def test_output_is_deterministic(tmp_path, wiki_dir):
+    for name in ("a", "b"):
+        generate(str(tmp_path / name), chapters=3, words=200, seed=7, wiki_dir=str(wiki_dir))
+    for filename in os.listdir(tmp_path / "a" / "raw" / "Vol_01"):
+        assert (tmp_path / "a" / "raw" / "Vol_01" / filename).read_bytes() == \
+            (tmp_path / "b" / "raw" / "Vol_01" / filename).read_bytes()
+
+
+def test_site_pages_extract_to_the_raw_text(tmp_path, wiki_dir):
+    generate(str(tmp_path), chapters=3, words=300, site=True, wiki_dir=str(wiki_dir))
+    index = json.loads((tmp_path / "raw" / "Vol_01" / "index.json").read_text(encoding="utf-8"))
+    for entry in index:
+        path = entry["url"].split("wanderinginn.com/")[1]
+        html = (tmp_path / "site" / path / "index.html").read_text(encoding="utf-8")
+        raw = (tmp_path / "raw" / "Vol_01" / entry["filename"]).read_text(encoding="utf-8")
+        assert extract_chapter_text(html, backend="stream") == raw
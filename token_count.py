@@ -0,0 +1,134 @@
+import json
+import os
+import re
+from functools import lru_cache
+
+CALIBRATION_PATH = "data/processed/token_calibration.json"
+PARAGRAPH_CACHE_SIZE = 1 << 18
+
+# GPT-style pre-tokenization: contractions, words, numbers, punctuation runs, whitespace runs
+PRETOKEN_RE = re.compile(r"'(?:s|t|re|ve|m|ll|d)| ?[^\W\d_]+| ?\d{1,3}| ?[^\s\w]+|\s+")
+SHORT_WORD_CHARS = 6   # Words up to this length are usually a single BPE token
+CHARS_PER_EXTRA_PIECE = 4
+
+
+class CharCounter:
+    """Legacy estimate: len(text) // chars_per_token."""
+
+    def __init__(self, chars_per_token=4.0):
+        self.chars_per_token = chars_per_token
+        # Default ratio keeps the legacy name; calibrated ratios are spelled out
+        self.name = "chars" if chars_per_token == 4.0 else f"chars:{chars_per_token:.4f}"
+
+    def count(self, text):
+        return int(len(text) // self.chars_per_token)
+
+
+class RegexCounter:
+    """
+    Local BPE approximation that needs no vocabulary files.
+    Each pre-token is one token; long words add one piece per CHARS_PER_EXTRA_PIECE
+    characters past SHORT_WORD_CHARS, roughly how BPE splits rare words.
+    """
+
+    name = "regex"
+
+    def count(self, text):
+        tokens = 0
+        for piece in PRETOKEN_RE.findall(text):
+            length = len(piece.lstrip(" "))
+            if length > SHORT_WORD_CHARS and piece.strip().isalpha():
+                tokens += 1 + (length - SHORT_WORD_CHARS + CHARS_PER_EXTRA_PIECE - 1) // CHARS_PER_EXTRA_PIECE
+            else:
+                tokens += 1
+        return tokens
+
+
+class TiktokenCounter:
+    """Exact BPE counts via tiktoken (optional dependency; needs its encoding files)."""
+
+    name = "tiktoken"
+
+    def __init__(self, encoding="cl100k_base"):
+        import tiktoken
+        self.encoding = tiktoken.get_encoding(encoding)
+
+    def count(self, text):
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+
+class CachedCounter:
+    """Memoizes counts per text (paragraphs repeat a lot: dialogue tags, separators, headers)."""
+
+    def __init__(self, counter, maxsize=PARAGRAPH_CACHE_SIZE):
+        self.counter = counter
+        self.name = counter.name
+        self.count = lru_cache(maxsize=maxsize)(counter.count)
+
+    def cache_info(self):
+        return self.count.cache_info()
+
+
+def reference_counter():
+    """Best exact-ish counter available here: tiktoken if it loads, else the regex counter."""
+    try:
+        return TiktokenCounter()
+    except Exception:
+        return RegexCounter()
+
+
+def calibrate(texts, reference=None, path=CALIBRATION_PATH):
+    """
+    Fits chars-per-token on `texts` against a reference counter and saves it, so
+    the cheap character estimate tracks the real tokenizer on this corpus.
+    """
+    reference = reference or reference_counter()
+    chars = 0
+    tokens = 0
+    for text in texts:
+        chars += len(text)
+        tokens += reference.count(text)
+    ratio = chars / tokens if tokens else 4.0
+
+    calibration = {"reference": reference.name, "chars_per_token": ratio, "chars": chars, "tokens": tokens}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(calibration, f, indent=2)
+    return calibration
+
+
+def load_calibrated(path=CALIBRATION_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        calibration = json.load(f)
+    return CharCounter(round(calibration["chars_per_token"], 4))
+
+
+def get_counter(name="auto", cached=True):
+    """
+    Counter factory: "chars" | "chars:<ratio>" | "regex" | "tiktoken" | "calibrated" | "auto".
+    "auto" prefers tiktoken, then a saved calibration, then the regex counter.
+    A counter's `name` is always a spec this factory accepts, so worker processes
+    can rebuild the exact counter the parent resolved.
+    """
+    if name == "chars":
+        counter = CharCounter()
+    elif name.startswith("chars:"):
+        counter = CharCounter(float(name.split(":", 1)[1]))
+    elif name == "regex":
+        counter = RegexCounter()
+    elif name == "tiktoken":
+        counter = TiktokenCounter()
+    elif name == "calibrated":
+        counter = load_calibrated()
+        if counter is None:
+            raise FileNotFoundError(f"No token calibration at {CALIBRATION_PATH}; run calibrate() first")
+    elif name == "auto":
+        try:
+            counter = TiktokenCounter()
+        except Exception:
+            counter = load_calibrated() or RegexCounter()
+    else:
+        raise ValueError(f"Unknown token counter: {name}")
+    return CachedCounter(counter) if cached else counter